@@ -26,6 +26,7 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import argparse
 import os
 import sys
 import platform
@@ -34,6 +35,12 @@ from PIL import Image, ImageFont, ImageDraw, ImageEnhance
 import yaml
 import shutil
 import json
+import time
+import threading
+import hashlib
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from config_utils import *
 
 
@@ -68,6 +75,7 @@ else:
 artifacts_folder = "../../../model-artifacts/"
 output_images_folder = "../../../output_images/"
 output_binary_folder = "../../../output_binaries/"
+benchmark_results_folder = "../../../benchmark_results/"
 
 tensor_bits = 8
 debug_level = 0
@@ -227,7 +235,88 @@ def get_url_from_link_file(url):
     return url
 
 
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+
+
+@contextmanager
+def path_lock(path):
+    """
+    Lock on a file path, across the threads of this process and across processes (lock file next to path)
+
+    :param path: File path to lock
+    """
+    with _path_locks_lock:
+        lock = _path_locks.setdefault(os.path.realpath(path), threading.Lock())
+    with lock:
+        os.makedirs(os.path.dirname(os.path.realpath(path)), exist_ok=True)
+        with open(path + ".lock", "w") as lock_file:
+            try:
+                import fcntl
+
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            yield
+
+
+def download_file(url, file_path, chunk_size=1024 * 1024):
+    """
+    Download url to file_path, a partial download of an interrupted run is resumed
+
+    :param url: Url or .link file url
+    :param file_path: Destination file
+    :param chunk_size: Size of the streamed chunks
+    """
+    url = get_url_from_link_file(url)
+    part_path = file_path + ".part"
+    offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    request_headers = dict(headers)
+    if offset > 0:
+        request_headers["Range"] = f"bytes={offset}-"
+    with requests.get(
+        url, allow_redirects=True, headers=request_headers, stream=True, timeout=60
+    ) as r:
+        # 416 : the partial file is already complete
+        if r.status_code != 416:
+            r.raise_for_status()
+            # servers without range support send the whole file again
+            mode = "ab" if r.status_code == 206 else "wb"
+            with open(part_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+    os.replace(part_path, file_path)
+
+
+def download_models(models_configs, model_names, num_threads=8):
+    """
+    Download all the models concurrently, before running them
+
+    :param models_configs: Model configurations
+    :param model_names: List of model names
+    :param num_threads: Number of concurrent downloads
+    """
+    def download_one(model_name):
+        try:
+            download_model(models_configs, model_name)
+        except Exception as e:
+            print(f"Download of {model_name} failed : {e}")
+
+    num_threads = max(1, min(num_threads, len(model_names)))
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(download_one, model_names))
+
+
 def download_model(models_configs, model_name):
+    if model_name in models_configs.keys():
+        # models sharing a file are downloaded once, by whoever gets the lock first
+        with path_lock(models_configs[model_name]["session"]["model_path"]):
+            _download_model(models_configs, model_name)
+    else:
+        _download_model(models_configs, model_name)
+
+
+def _download_model(models_configs, model_name):
 
     model_artifacts_path = model_artifacts_base_path + model_name + "/model"
     if not os.path.isdir(model_artifacts_path):
@@ -249,19 +338,9 @@ def download_model(models_configs, model_name):
                     "original_model_type"
                 ] == "caffe":
                     print("Downloading  ", model_source["prototext"])
-                    r = requests.get(
-                        get_url_from_link_file(model_source["model_url"]),
-                        allow_redirects=True,
-                        headers=headers,
-                    )
-                    open(model_source["prototext"], "wb").write(r.content)
+                    download_file(model_source["model_url"], model_source["prototext"])
                     print("Downloading  ", model_source["caffe_model"])
-                    r = requests.get(
-                        get_url_from_link_file(model_source["caffe_model_url"]),
-                        allow_redirects=True,
-                        headers=headers,
-                    )
-                    open(model_source["caffe_model"], "wb").write(r.content)
+                    download_file(model_source["caffe_model_url"], model_source["caffe_model"])
 
                     graph, params = loadcaffemodel(
                         model_source["prototext"], model_source["caffe_model"]
@@ -273,12 +352,7 @@ def download_model(models_configs, model_name):
 
                 else:
                     print("Downloading  ", model_path)
-                    r = requests.get(
-                        get_url_from_link_file(model_source["model_url"]),
-                        allow_redirects=True,
-                        headers=headers,
-                    )
-                    open(model_path, "wb").write(r.content)
+                    download_file(model_source["model_url"], model_path)
 
                 filename = os.path.splitext(model_path)
                 abs_path = os.path.realpath(model_path)
@@ -307,12 +381,7 @@ def download_model(models_configs, model_name):
                     meta_layers_names_list
                 ):
                     print("Downloading  ", meta_layers_names_list)
-                    r = requests.get(
-                        get_url_from_link_file(model_source["meta_arch_url"]),
-                        allow_redirects=True,
-                        headers=headers,
-                    )
-                    open(meta_layers_names_list, "wb").write(r.content)
+                    download_file(model_source["meta_arch_url"], meta_layers_names_list)
                 shutil.copy(meta_layers_names_list, model_artifacts_path)
         shutil.copy(model_path, model_artifacts_path)
     else:
@@ -321,6 +390,97 @@ def download_model(models_configs, model_name):
         )
 
 
+compile_stamp_file = ".compile_stamp"
+
+
+def get_compile_hash(model_path, delegate_options, extra_files=()):
+    """
+    Returns the hash of the model file(s) and the delegate options used for compilation
+
+    :param model_path: Model file
+    :param delegate_options: Delegate / provider options
+    :param extra_files: Other input files of the compilation (e.g. meta architecture file)
+    :return: Hex digest
+    """
+    h = hashlib.sha256()
+    for file_name in [model_path] + [f for f in extra_files if f]:
+        if not os.path.isfile(file_name):
+            continue
+        with open(file_name, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    h.update(json.dumps(delegate_options, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def is_compiled(artifacts_folder_path, compile_hash):
+    """
+    Check whether the artifacts were compiled from the same model and options
+
+    :param artifacts_folder_path: Artifacts folder of the model
+    :param compile_hash: Hash returned by get_compile_hash
+    """
+    stamp_path = os.path.join(artifacts_folder_path, compile_stamp_file)
+    if not os.path.isfile(stamp_path):
+        return False
+    with open(stamp_path) as f:
+        return f.read().strip() == compile_hash
+
+
+def write_compile_stamp(artifacts_folder_path, compile_hash):
+    """
+    Record the hash of a completed compilation in the artifacts folder
+
+    :param artifacts_folder_path: Artifacts folder of the model
+    :param compile_hash: Hash returned by get_compile_hash
+    """
+    with open(os.path.join(artifacts_folder_path, compile_stamp_file), "w") as f:
+        f.write(compile_hash + "\n")
+
+
+def get_num_procs(ncpus, num_models, mem_per_proc_gb=4.0):
+    """
+    Returns the number of models run in parallel, limited by the cpus and the available memory
+
+    :param ncpus: Number of cpus to use
+    :param num_models: Number of models to run
+    :param mem_per_proc_gb: Expected peak memory of one model run in GB
+    """
+    num_procs = max(1, min(ncpus, num_models))
+    try:
+        with open("/proc/meminfo") as f:
+            meminfo = dict(line.split(":", 1) for line in f)
+        mem_available_gb = int(meminfo["MemAvailable"].split()[0]) / (1024 * 1024)
+        num_procs = max(1, min(num_procs, int(mem_available_gb // mem_per_proc_gb)))
+    except (OSError, KeyError, ValueError):
+        pass
+    return num_procs
+
+
+def run_models(run_model, models, num_procs):
+    """
+    Run the models in a pool of num_procs processes
+
+    Each model gets a fresh process (maxtasksperchild=1) as the compilation keeps state in the process -
+    also when the models run one at a time (num_procs=1, for example if the available memory is low).
+    A failing model is reported and does not stop the others.
+
+    :param run_model: Function run_model(model, mIdx)
+    :param models: List of model names
+    :param num_procs: Number of models run in parallel
+    """
+    with multiprocessing.Pool(processes=max(1, num_procs), maxtasksperchild=1) as pool:
+        results = [
+            (model, pool.apply_async(run_model, (model, mIdx)))
+            for mIdx, model in enumerate(models)
+        ]
+        for model, result in results:
+            try:
+                result.get()
+            except Exception as e:
+                print(f"\nRun of {model} failed : {e}\n")
+
+
 def load_labels(filename):
     with open(filename, "r") as f:
         return [line.strip() for line in f.readlines()]
@@ -550,3 +710,320 @@ def det_box_overlay(outputs, org_image_rgb, od_type, framework=None):
 
     source_img = source_img.convert("RGB")
     return (classes, source_img)
+
+
+class ImagePreprocessor:
+    """
+    Vectorized preprocessing of a batch of images into a reusable input tensor
+
+    The images are resized and written directly in the final dtype (uint8 or
+    float32) and layout (NCHW or NHWC) into a buffer allocated once, the mean
+    and scale are applied to all the channels at once. The returned tensor is
+    overwritten by the next call.
+    """
+
+    def __init__(
+        self,
+        height,
+        width,
+        batch=1,
+        layout="NCHW",
+        dtype=np.float32,
+        mean=None,
+        scale=None,
+        backend="pil",
+        interpolation=None,
+        resize_short_edge=None,
+        num_threads=None,
+    ):
+        """
+        :param height: Height of input tensor
+        :param width: Width of input tensor
+        :param batch: Batch size of input tensor
+        :param layout: NCHW or NHWC
+        :param dtype: np.uint8 or np.float32, mean and scale are only used for float32
+        :param mean: Per channel mean, None to skip the normalization
+        :param scale: Per channel scale
+        :param backend: pil (default, used for the reference outputs) or cv2 (faster)
+        :param interpolation: Resize interpolation (nearest, linear, cubic, lanczos, area), default lanczos for pil and linear for cv2
+        :param resize_short_edge: Resize the short edge to this size keeping the aspect ratio and center crop, None to resize directly
+        :param num_threads: Number of threads to prepare the images of a batch, default min(batch, cpu count)
+        """
+        assert layout in ("NCHW", "NHWC"), f"invalid layout {layout}"
+        assert backend in ("pil", "cv2"), f"invalid backend {backend}"
+        self.height = int(height)
+        self.width = int(width)
+        self.layout = layout
+        self.dtype = np.dtype(dtype)
+        self.backend = backend
+        self.interpolation = interpolation or ("lanczos" if backend == "pil" else "linear")
+        self.resize_short_edge = resize_short_edge
+        self.num_threads = num_threads or min(int(batch), os.cpu_count() or 1)
+        self.executor = None
+        shape = (
+            (int(batch), 3, self.height, self.width)
+            if layout == "NCHW"
+            else (int(batch), self.height, self.width, 3)
+        )
+        self.buffer = np.empty(shape, dtype=self.dtype)
+
+        # mean/scale broadcast over a single image, channels without a value are left unchanged
+        self.mean = self.scale = None
+        if mean is not None and self.dtype == np.float32:
+            self.mean = np.zeros(3, dtype=np.float32)
+            self.scale = np.ones(3, dtype=np.float32)
+            num_channels = min(len(mean), len(scale), 3)
+            self.mean[:num_channels] = mean[:num_channels]
+            self.scale[:num_channels] = scale[:num_channels]
+            if layout == "NCHW":
+                self.mean = self.mean.reshape(3, 1, 1)
+                self.scale = self.scale.reshape(3, 1, 1)
+
+    def _read_pil(self, image_file):
+        pil_interpolation = {
+            "nearest": Image.NEAREST,
+            "linear": Image.BILINEAR,
+            "cubic": Image.BICUBIC,
+            "lanczos": Image.LANCZOS,
+            "area": Image.BOX,
+        }[self.interpolation]
+        img = Image.open(image_file).convert("RGB")
+        if self.resize_short_edge is not None:
+            width, height = img.size
+            short_edge = min(width, height)
+            new_width = (width * self.resize_short_edge) // short_edge
+            new_height = (height * self.resize_short_edge) // short_edge
+            img = img.resize((new_width, new_height), pil_interpolation)
+            left = new_width // 2 - self.width // 2
+            top = new_height // 2 - self.height // 2
+            img = img.crop((left, top, left + self.width, top + self.height))
+        else:
+            img = img.resize((self.width, self.height), pil_interpolation)
+        return img, np.asarray(img)
+
+    def _read_cv2(self, image_file):
+        import cv2
+
+        cv2_interpolation = {
+            "nearest": cv2.INTER_NEAREST,
+            "linear": cv2.INTER_LINEAR,
+            "cubic": cv2.INTER_CUBIC,
+            "lanczos": cv2.INTER_LANCZOS4,
+            "area": cv2.INTER_AREA,
+        }[self.interpolation]
+        # BGR to RGB
+        img = cv2.imread(image_file)[:, :, ::-1]
+        if self.resize_short_edge is not None:
+            height, width, _ = img.shape
+            short_edge = min(height, width)
+            new_height = (height * self.resize_short_edge) // short_edge
+            new_width = (width * self.resize_short_edge) // short_edge
+            img = cv2.resize(img, (new_width, new_height), interpolation=cv2_interpolation)
+            startx = new_width // 2 - self.width // 2
+            starty = new_height // 2 - self.height // 2
+            img = img[starty : starty + self.height, startx : startx + self.width]
+        else:
+            img = cv2.resize(img, (self.width, self.height), interpolation=cv2_interpolation)
+        return None, img
+
+    def _prepare(self, idx, image_file):
+        if self.backend == "pil":
+            img, data = self._read_pil(image_file)
+        else:
+            img, data = self._read_cv2(image_file)
+        out = self.buffer[idx]
+        # the cast to the final dtype is done by the copy into the buffer
+        out[...] = data.transpose(2, 0, 1) if self.layout == "NCHW" else data
+        if self.mean is not None:
+            np.subtract(out, self.mean, out=out)
+            np.multiply(out, self.scale, out=out)
+        return img
+
+    def __call__(self, image_files):
+        """
+        Prepare the input tensor for a batch of images
+
+        :param image_files: List of input image filename, one per batch entry
+        :return: Input Images (PIL images, None with the cv2 backend)
+        :return: Input tensor
+        """
+        assert len(image_files) == len(self.buffer), "one image per batch entry is needed"
+        if self.num_threads > 1 and len(image_files) > 1:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.num_threads)
+            imgs = list(self.executor.map(self._prepare, range(len(image_files)), image_files))
+        else:
+            imgs = [self._prepare(idx, f) for idx, f in enumerate(image_files)]
+        return imgs, self.buffer
+
+
+_image_preprocessors = {}
+
+
+def get_image_preprocessor(height, width, batch=1, layout="NCHW", dtype=np.float32, mean=None, scale=None, **kwargs):
+    """
+    Returns the ImagePreprocessor for the given arguments, created once per process so that its buffer is reused
+
+    :return: ImagePreprocessor
+    """
+    key = (
+        int(height), int(width), int(batch), layout, np.dtype(dtype).str,
+        None if mean is None else tuple(mean), None if scale is None else tuple(scale),
+        tuple(sorted(kwargs.items())),
+    )
+    if key not in _image_preprocessors:
+        _image_preprocessors[key] = ImagePreprocessor(
+            height, width, batch=batch, layout=layout, dtype=dtype, mean=mean, scale=scale, **kwargs
+        )
+    return _image_preprocessors[key]
+
+
+def positive_int(value):
+    """
+    argparse type for the options that must be at least 1
+
+    :param value: String value of the option
+    :return: The value as int
+    """
+    ivalue = int(value)
+    if ivalue < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return ivalue
+
+
+def add_benchmark_args(parser):
+    """
+    Add the steady-state benchmark options to an argument parser
+
+    :param parser: argparse.ArgumentParser of the example script
+    """
+    parser.add_argument(
+        "--benchmark_iters",
+        type=int,
+        default=0,
+        help="Number of timed iterations on a preloaded input after the regular run, 0 to disable",
+    )
+    parser.add_argument(
+        "--benchmark_warmup",
+        type=int,
+        default=10,
+        help="Number of untimed warm-up iterations before the timed ones",
+    )
+    parser.add_argument(
+        "--benchmark_sessions",
+        type=positive_int,
+        default=1,
+        help="Number of concurrent sessions of the same model, one thread per session",
+    )
+
+
+def get_time_stats(values):
+    """
+    Returns the summary statistics of a list of times
+
+    :param values: List of times
+    :return: Dictionary with mean, median, p90, p99, min and max
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return {}
+    return {
+        "mean": float(np.mean(values)),
+        "median": float(np.median(values)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "min": float(np.min(values)),
+        "max": float(np.max(values)),
+    }
+
+
+def run_benchmark(sessions, run_session, get_times=None, warmup=10, iterations=100):
+    """
+    Steady-state benchmark of one or more sessions of the same model
+
+    Each session is driven by its own thread on an already preprocessed input,
+    so only the runtime call is timed. The timed loops of all the sessions are
+    started together so that the throughput reflects the concurrent runs.
+
+    :param sessions: List of runtime sessions of the same model
+    :param run_session: Function running one inference on the given session
+    :param get_times: Function returning (copy time, offload time, total time) in ns
+                      of the last run of the given session, None to use host time
+    :param warmup: Number of untimed iterations per session
+    :param iterations: Number of timed iterations per session
+    :return: Dictionary with the timing statistics in ms
+    """
+    barrier = threading.Barrier(len(sessions))
+    results = [None] * len(sessions)
+
+    def worker(idx):
+        sess = sessions[idx]
+        for _ in range(warmup):
+            run_session(sess)
+        # total (without copy), offload, copy and host time of each iteration
+        samples = np.zeros((iterations, 4), dtype=np.float64)
+        barrier.wait()
+        start_time = time.perf_counter()
+        for k in range(iterations):
+            iter_start = time.perf_counter()
+            run_session(sess)
+            host_time = (time.perf_counter() - iter_start) * 1000000000
+            if get_times is not None:
+                copy_time, offload_time, total_time = get_times(sess)
+            else:
+                copy_time, offload_time, total_time = 0, host_time, host_time
+            samples[k] = (total_time - copy_time, offload_time, copy_time, host_time)
+        results[idx] = (samples, start_time, time.perf_counter())
+
+    threads = [
+        threading.Thread(target=worker, args=(idx,)) for idx in range(1, len(sessions))
+    ]
+    for t in threads:
+        t.start()
+    worker(0)
+    for t in threads:
+        t.join()
+
+    samples = np.concatenate([r[0] for r in results]) / 1000000
+    wall_time = max(r[2] for r in results) - min(r[1] for r in results)
+    return {
+        "num_sessions": len(sessions),
+        "warmup": warmup,
+        "iterations": iterations,
+        "wall_time_ms": wall_time * 1000,
+        "throughput_fps": len(samples) / wall_time if wall_time > 0 else 0.0,
+        "total_time_ms": get_time_stats(samples[:, 0]),
+        "offload_time_ms": get_time_stats(samples[:, 1]),
+        "copy_time_ms": get_time_stats(samples[:, 2]),
+        "host_time_ms": get_time_stats(samples[:, 3]),
+        "samples_ms": {
+            "total": [round(v, 4) for v in samples[:, 0].tolist()],
+        },
+    }
+
+
+def get_benchmark_result_path(rt_type, model):
+    return os.path.join(benchmark_results_folder, rt_type + "_" + model + ".json")
+
+
+def save_benchmark_result(rt_type, model, result):
+    """
+    Print the benchmark summary and save it as json in benchmark_results_folder
+
+    :param rt_type: Runtime type as used in the test report (ort-py, tfl-py, dlr-py)
+    :param model: Name of the model
+    :param result: Dictionary returned by run_benchmark
+    """
+    result = dict(result, rt_type=rt_type, model=model)
+    total = result["total_time_ms"]
+    print(
+        f"\nBenchmark : {model}, Sessions : {result['num_sessions']}, Iterations : {result['iterations']}, "
+        f"Total time mean/median/p90/p99 : {total['mean']:.2f}/{total['median']:.2f}/{total['p90']:.2f}/{total['p99']:.2f}, "
+        f"Offload Time median : {result['offload_time_ms']['median']:.2f}, Copy Time median : {result['copy_time_ms']['median']:.2f}, "
+        f"Throughput fps : {result['throughput_fps']:.2f}\n"
+    )
+    os.makedirs(benchmark_results_folder, exist_ok=True)
+    file_name = get_benchmark_result_path(rt_type, model)
+    with open(file_name + ".tmp", "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(file_name + ".tmp", file_name)
@@ -3,11 +3,9 @@ import time
 import os
 import sys
 import numpy as np
-import PIL
-from PIL import Image, ImageFont, ImageDraw, ImageEnhance
+from PIL import Image
 import argparse
 import re
-import multiprocessing
 import platform
 import shutil
 
@@ -20,8 +18,6 @@ from model_configs import *
 
 from config_utils import postprocess_utils as formatter_transform
 
-mutex_lock = multiprocessing.Lock()
-
 model_optimizer_found = False
 if platform.machine() != "aarch64":
     try:
@@ -62,6 +58,18 @@ parser.add_argument(
 parser.add_argument(
     "-n", "--ncpus", type=int, default=None, help="Number of threads to spawn"
 )
+parser.add_argument(
+    "--mem_per_proc",
+    type=float,
+    default=4.0,
+    help="Expected peak memory in GB of one model run, limits the number of models run in parallel",
+)
+parser.add_argument(
+    "--force_compile",
+    action="store_true",
+    help="Compile the models even if the artifacts are up to date",
+)
+add_benchmark_args(parser)
 args = parser.parse_args()
 os.environ["TIDL_RT_PERFSTATS"] = "1"
 
@@ -79,8 +87,6 @@ class_test_images = ["../../../test_data/airshow.jpg"]
 od_test_images = ["../../../test_data/ADE_val_00001801.jpg"]
 seg_test_images = ["../../../test_data/ADE_val_00001801.jpg"]
 
-# Initialize semaphore for multi-threading
-sem = multiprocessing.Semaphore(0)
 if platform.machine() == "aarch64":
     ncpus = 1
 else:
@@ -89,9 +95,6 @@ else:
     else:
         ncpus = os.cpu_count()
 
-idx = 0
-nthreads = 0
-run_count = 0
 
 if "SOC" in os.environ:
     SOC = os.environ["SOC"]
@@ -153,17 +156,16 @@ def get_benchmark_output(interpreter):
     return copy_time, proc_time, totaltime
 
 
-def infer_image(sess, image_files, config):
+def preprocess_input(sess, image_files, config):
     '''
-    Invoke the runtime session
+    Prepare the input tensor of the runtime session
 
     :param sess: Runtime session
     :param image_files: List of input image filename
     :param config: Configuration dictionary
     :return: Input Images
-    :return: Output tensors
-    :return: Total Processing time
-    :return: Subgraphs Processing time
+    :return: Input tensor name
+    :return: Input tensor
     :return: Height of input tensor
     :return: Width of input tensor
     '''
@@ -174,34 +176,46 @@ def infer_image(sess, image_files, config):
     floating_model = input_details[0].type == "tensor(float)"
     height = input_details[0].shape[2]
     width = input_details[0].shape[3]
-    channel = input_details[0].shape[1]
     batch = input_details[0].shape[0]
-    imgs = []
-    shape = [batch, channel, height, width]
 
     # Prepare the input data
-    input_data = np.zeros(shape)
-    for i in range(batch):
-        imgs.append(
-            Image.open(image_files[i])
-            .convert("RGB")
-            .resize((width, height), PIL.Image.LANCZOS)
-        )
-        temp_input_data = np.expand_dims(imgs[i], axis=0)
-        temp_input_data = np.transpose(temp_input_data, (0, 3, 1, 2))
-        input_data[i] = temp_input_data[0]
     if floating_model:
-        input_data = np.float32(input_data)
-        for mean, scale, ch in zip(
-            config["session"]["input_mean"],
-            config["session"]["input_scale"],
-            range(input_data.shape[1]),
-        ):
-            input_data[:, ch, :, :] = (input_data[:, ch, :, :] - mean) * scale
+        preprocessor = get_image_preprocessor(
+            height,
+            width,
+            batch=batch,
+            layout="NCHW",
+            dtype=np.float32,
+            mean=config["session"]["input_mean"],
+            scale=config["session"]["input_scale"],
+        )
     else:
-        input_data = np.uint8(input_data)
+        preprocessor = get_image_preprocessor(
+            height, width, batch=batch, layout="NCHW", dtype=np.uint8
+        )
         config["session"]["input_mean"] = [0, 0, 0]
         config["session"]["input_scale"] = [1, 1, 1]
+    imgs, input_data = preprocessor(image_files)
+
+    return imgs, input_name, input_data, height, width
+
+
+def infer_image(sess, image_files, config):
+    '''
+    Invoke the runtime session
+
+    :param sess: Runtime session
+    :param image_files: List of input image filename
+    :param config: Configuration dictionary
+    :return: Input Images
+    :return: Output tensors
+    :return: Total Processing time
+    :return: Subgraphs Processing time
+    :return: Height of input tensor
+    :return: Width of input tensor
+    '''
+
+    imgs, input_name, input_data, height, width = preprocess_input(sess, image_files, config)
 
     # Invoke the session
     start_time = time.time()
@@ -223,11 +237,6 @@ def run_model(model, mIdx):
     :param mIdx: Run number
     '''
     print("\nRunning_Model : ", model, " \n")
-    if platform.machine() != "aarch64":
-        mutex_lock.acquire()
-        download_model(models_configs, model)
-        mutex_lock.release()
-
     config = models_configs[model]
 
     # Run graph optimization
@@ -291,6 +300,19 @@ def run_model(model, mIdx):
         delegate_options["object_detection:meta_layers_names_list"] = config["session"].get("meta_layers_names_list", "")
         delegate_options["object_detection:meta_arch_type"] = config["session"].get("meta_arch_type", -1)
 
+    # Skip the compilation if the artifacts were compiled from the same model and options
+    if args.compile:
+        compile_hash = get_compile_hash(
+            config["session"]["model_path"],
+            delegate_options,
+            [config["session"].get("meta_layers_names_list")],
+        )
+        if not args.force_compile and is_compiled(
+            delegate_options["artifacts_folder"], compile_hash
+        ):
+            print(f"\nSkipping compilation of {model}, artifacts are up to date\n")
+            return
+
     # Create/Cleanup artifacts_folder
     if args.compile or args.disable_offload:
         os.makedirs(delegate_options["artifacts_folder"], exist_ok=True)
@@ -320,30 +342,33 @@ def run_model(model, mIdx):
             numFrames = delegate_options["advanced_options:calibration_frames"]
 
     # Create the Inference Session
-    if args.disable_offload:
-        # Using default EP if offload is disabled
-        EP_list = ["CPUExecutionProvider"]
-        sess = rt.InferenceSession(
-            config["session"]["model_path"], providers=EP_list, sess_options=so
-        )
-    elif args.compile:
-        # Using TIDL Compilation Provider if compiling the model
-        EP_list = ["TIDLCompilationProvider", "CPUExecutionProvider"]
-        sess = rt.InferenceSession(
-            config["session"]["model_path"],
-            providers=EP_list,
-            provider_options=[delegate_options, {}],
-            sess_options=so,
-        )
-    else:
-        # Using TIDL Execution Provider if running the inference
-        EP_list = ["TIDLExecutionProvider", "CPUExecutionProvider"]
-        sess = rt.InferenceSession(
-            config["session"]["model_path"],
-            providers=EP_list,
-            provider_options=[delegate_options, {}],
-            sess_options=so,
-        )
+    def create_session():
+        if args.disable_offload:
+            # Using default EP if offload is disabled
+            EP_list = ["CPUExecutionProvider"]
+            return rt.InferenceSession(
+                config["session"]["model_path"], providers=EP_list, sess_options=so
+            )
+        elif args.compile:
+            # Using TIDL Compilation Provider if compiling the model
+            EP_list = ["TIDLCompilationProvider", "CPUExecutionProvider"]
+            return rt.InferenceSession(
+                config["session"]["model_path"],
+                providers=EP_list,
+                provider_options=[delegate_options, {}],
+                sess_options=so,
+            )
+        else:
+            # Using TIDL Execution Provider if running the inference
+            EP_list = ["TIDLExecutionProvider", "CPUExecutionProvider"]
+            return rt.InferenceSession(
+                config["session"]["model_path"],
+                providers=EP_list,
+                provider_options=[delegate_options, {}],
+                sess_options=so,
+            )
+
+    sess = create_session()
 
     # Adding input_details and output_details to configuration
     input_details = sess.get_inputs()
@@ -405,6 +430,20 @@ def run_model(model, mIdx):
     total_proc_time = total_proc_time / 1000000
     sub_graphs_time = sub_graphs_time / 1000000
 
+    # Steady-state benchmark on the last input, preprocessed once
+    if args.benchmark_iters > 0 and not args.compile:
+        _, input_name, input_data, _, _ = preprocess_input(sess, input_images, config)
+        sessions = [sess] + [create_session() for _ in range(args.benchmark_sessions - 1)]
+        result = run_benchmark(
+            sessions,
+            lambda s: s.run(None, {input_name: input_data}),
+            get_benchmark_output,
+            warmup=args.benchmark_warmup,
+            iterations=args.benchmark_iters,
+        )
+        save_benchmark_result("ort-py", model, result)
+        del sessions
+
     # Post-Processing for inference
     output_image_file_name = "py_out_" + model + "_" + os.path.basename(input_image[i % len(input_image)])
     output_bin_file_name = output_image_file_name.replace(".jpg", "") + ".bin"
@@ -437,7 +476,7 @@ def run_model(model, mIdx):
         elif config["task_type"] == "segmentation":
             for j in range(batch):
                 imgs[j] = imgs[j].resize(
-                    (output[0][j].shape[-1], output[0][j].shape[-2]), PIL.Image.LANCZOS
+                    (output[0][j].shape[-1], output[0][j].shape[-2]), Image.LANCZOS
                 )
                 classes, image = seg_mask_overlay(output[0][j], imgs[j])
                 images.append(image)
@@ -466,10 +505,17 @@ def run_model(model, mIdx):
             delegate_options["artifacts_folder"], config, int(height), int(width)
         )
 
+    # Stamp the artifacts, the model may have been updated in place by the compilation (shape inference)
+    if args.compile:
+        compile_hash = get_compile_hash(
+            config["session"]["model_path"],
+            delegate_options,
+            [config["session"].get("meta_layers_names_list")],
+        )
+        write_compile_stamp(delegate_options["artifacts_folder"], compile_hash)
+
     log = f"\n \nCompleted_Model : {mIdx+1:5d}, Name : {model:50s}, Total time : {total_proc_time/(i+1):10.2f}, Offload Time : {sub_graphs_time/(i+1):10.2f} , DDR RW MBs : 0, Output Image File : {output_image_file_name}, Output Bin File : {output_bin_file_name}\n \n "  # {classes} \n \n'
     print(log)
-    if ncpus > 1:
-        sem.release()
 
 
 if len(args.models) > 0:
@@ -495,47 +541,8 @@ log = f"\nRunning {len(models)} Models - {models}\n"
 print(log)
 
 
-def join_one(nthreads):
-    '''
-    Join the thread
-
-    :param nthreads: Thread count
-    '''
-    global run_count
-    sem.acquire()
-    run_count = run_count + 1
-    return nthreads - 1
-
-def spawn_one(models, idx, nthreads):
-    '''
-    Spawn a process
-
-    :param models: Name of the model to run
-    :param idx: Index
-    :param nthreads: Thread count
-    '''
-    p = multiprocessing.Process(
-        target=run_model,
-        args=(
-            models,
-            idx,
-        ),
-    )
-    p.start()
-    return idx + 1, nthreads + 1
-
-
-# Run the models using multi-processing if possible
-if ncpus > 1:
-    for t in range(min(len(models), ncpus)):
-        idx, nthreads = spawn_one(models[idx], idx, nthreads)
-
-    while idx < len(models):
-        nthreads = join_one(nthreads)
-        idx, nthreads = spawn_one(models[idx], idx, nthreads)
+# Download all the models up front, then run them in a pool of processes
+if platform.machine() != "aarch64":
+    download_models(models_configs, models)
 
-    for n in range(nthreads):
-        nthreads = join_one(nthreads)
-else:
-    for mIdx, model in enumerate(models):
-        run_model(model, mIdx)
\ No newline at end of file
+run_models(run_model, models, get_num_procs(ncpus, len(models), args.mem_per_proc))
@@ -3,11 +3,8 @@ import time
 import os
 import sys
 import numpy as np
-import PIL
-from PIL import Image, ImageFont, ImageDraw, ImageEnhance
 import argparse
 import re
-import multiprocessing
 import platform
 from threading import Lock
 
@@ -19,8 +16,6 @@ from common_utils import *
 from model_configs import *
 from config_utils import postprocess_utils as formatter_transform
 
-mutex_lock = multiprocessing.Lock()
-
 required_options = {
     "tidl_tools_path": tidl_tools_path,
     "artifacts_folder": artifacts_folder,
@@ -45,6 +40,18 @@ parser.add_argument(
 parser.add_argument(
     "-n", "--ncpus", type=int, default=None, help="Number of threads to spawn"
 )
+parser.add_argument(
+    "--mem_per_proc",
+    type=float,
+    default=4.0,
+    help="Expected peak memory in GB of one model run, limits the number of models run in parallel",
+)
+parser.add_argument(
+    "--force_compile",
+    action="store_true",
+    help="Compile the models even if the artifacts are up to date",
+)
+add_benchmark_args(parser)
 args = parser.parse_args()
 os.environ["TIDL_RT_PERFSTATS"] = "1"
 
@@ -56,8 +63,6 @@ class_test_images = ["../../../test_data/airshow.jpg"]
 od_test_images = ["../../../test_data/ADE_val_00001801.jpg"]
 seg_test_images = ["../../../test_data/ADE_val_00001801.jpg"]
 
-# Initialize semaphore for multi-threading
-sem = multiprocessing.Semaphore(0)
 if platform.machine() == "aarch64":
     ncpus = 1
 else:
@@ -66,9 +71,6 @@ else:
     else:
         ncpus = os.cpu_count()
 
-idx = 0
-nthreads = 0
-run_count = 0
 if "SOC" in os.environ:
     SOC = os.environ["SOC"]
 else:
@@ -133,64 +135,96 @@ def get_benchmark_output(interpreter):
     return copy_time, totaltime, proc_time, write_total / 1000000, read_total / 1000000
 
 
-def infer_image(interpreter, image_files, config):
+def get_benchmark_times(interpreter):
     '''
-    Invoke the runtime session
+    Returns copy, subgraphs processing and total time of the last run
+
+    :param interpreter: Runtime session
+    '''
+    copy_time, totaltime, proc_time, _, _ = get_benchmark_output(interpreter)
+    return copy_time, proc_time, totaltime
+
+
+def preprocess_input(interpreter, image_files, config):
+    '''
+    Prepare the input tensor of the runtime session
 
     :param interpreter: Runtime session
     :param image_files: List of input image filename
     :param config: Configuration dictionary
     :return: Input Images
-    :return: Output tensors
-    :return: Total Processing time
-    :return: Subgraphs Processing time
-    :return: DDR write time
-    :return: DDR read time
+    :return: Input tensor
     :return: Height of input tensor
     :return: Width of input tensor
     '''
 
     # Get input details from the session
     input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
     floating_model = input_details[0]["dtype"] == np.float32
     batch = input_details[0]["shape"][0]
     height = input_details[0]["shape"][1]
     width = input_details[0]["shape"][2]
-    channel = input_details[0]["shape"][3]
     new_height = height
     new_width = width
-    imgs = []
-    shape = [batch, new_height, new_width, channel]
 
     # Prepare the input data
-    input_data = np.zeros(shape)
-    for i in range(batch):
-        imgs.append(
-            Image.open(image_files[i])
-            .convert("RGB")
-            .resize((new_width, new_height), PIL.Image.LANCZOS)
-        )
-        temp_input_data = np.expand_dims(imgs[i], axis=0)
-        input_data[i] = temp_input_data[0]
     if floating_model:
-        input_data = np.float32(input_data)
-        for mean, scale, ch in zip(
-            config["session"]["input_mean"],
-            config["session"]["input_scale"],
-            range(input_data.shape[3]),
-        ):
-            input_data[:, :, :, ch] = (input_data[:, :, :, ch] - mean) * scale
+        preprocessor = get_image_preprocessor(
+            new_height,
+            new_width,
+            batch=batch,
+            layout="NHWC",
+            dtype=np.float32,
+            mean=config["session"]["input_mean"],
+            scale=config["session"]["input_scale"],
+        )
     else:
-        input_data = np.uint8(input_data)
+        preprocessor = get_image_preprocessor(
+            new_height, new_width, batch=batch, layout="NHWC", dtype=np.uint8
+        )
         config["session"]["input_mean"] = [0, 0, 0]
         config["session"]["input_scale"] = [1, 1, 1]
+    imgs, input_data = preprocessor(image_files)
 
-    # Allocate and set tensors
-    interpreter.resize_tensor_input(input_details[0]["index"], [batch, new_height, new_width, channel])
+    return imgs, input_data, new_height, new_width
+
+
+def set_input(interpreter, input_data):
+    '''
+    Allocate the tensors of the runtime session and set the input tensor
+
+    :param interpreter: Runtime session
+    :param input_data: Input tensor
+    '''
+    input_details = interpreter.get_input_details()
+    interpreter.resize_tensor_input(input_details[0]["index"], list(input_data.shape))
     interpreter.allocate_tensors()
     interpreter.set_tensor(input_details[0]["index"], input_data)
 
+
+def infer_image(interpreter, image_files, config):
+    '''
+    Invoke the runtime session
+
+    :param interpreter: Runtime session
+    :param image_files: List of input image filename
+    :param config: Configuration dictionary
+    :return: Input Images
+    :return: Output tensors
+    :return: Total Processing time
+    :return: Subgraphs Processing time
+    :return: DDR write time
+    :return: DDR read time
+    :return: Height of input tensor
+    :return: Width of input tensor
+    '''
+
+    output_details = interpreter.get_output_details()
+    imgs, input_data, new_height, new_width = preprocess_input(interpreter, image_files, config)
+
+    # Allocate and set tensors
+    set_input(interpreter, input_data)
+
     # Invoke the session
     start_time = time.time()
     interpreter.invoke()
@@ -235,11 +269,6 @@ def run_model(model, mIdx):
     :param mIdx: Run number
     '''
     print("\nRunning_Model : ", model)
-    if platform.machine() != "aarch64":
-        mutex_lock.acquire()
-        download_model(models_configs, model)
-        mutex_lock.release()
-
     config = models_configs[model]
 
     # Set input images
@@ -268,6 +297,19 @@ def run_model(model, mIdx):
         delegate_options["object_detection:confidence_threshold"] = config["object_detection:confidence_threshold"]
         delegate_options["object_detection:top_k"] = config["object_detection:top_k"]
 
+    # Skip the compilation if the artifacts were compiled from the same model and options
+    if args.compile:
+        compile_hash = get_compile_hash(
+            config["session"]["model_path"],
+            delegate_options,
+            [config["session"].get("meta_layers_names_list")],
+        )
+        if not args.force_compile and is_compiled(
+            delegate_options["artifacts_folder"], compile_hash
+        ):
+            print(f"\nSkipping compilation of {model}, artifacts are up to date\n")
+            return
+
     # Create/Cleanup artifacts_folder
     if args.compile or args.disable_offload:
         os.makedirs(delegate_options["artifacts_folder"], exist_ok=True)
@@ -288,27 +330,30 @@ def run_model(model, mIdx):
             numFrames = delegate_options["advanced_options:calibration_frames"]
 
     # Create the Inference Session
-    if args.disable_offload:
-        interpreter = tflite.Interpreter(
-            model_path=config["session"]["model_path"], num_threads=2
-        )
-    elif args.compile:
-        interpreter = tflite.Interpreter(
-            model_path=config["session"]["model_path"],
-            experimental_delegates=[
-                tflite.load_delegate(
-                    os.path.join(tidl_tools_path, "tidl_model_import_tflite.so"),
-                    delegate_options,
-                )
-            ],
-        )
-    else:
-        interpreter = tflite.Interpreter(
-            model_path=config["session"]["model_path"],
-            experimental_delegates=[
-                tflite.load_delegate("libtidl_tfl_delegate.so", delegate_options)
-            ],
-        )
+    def create_session():
+        if args.disable_offload:
+            return tflite.Interpreter(
+                model_path=config["session"]["model_path"], num_threads=2
+            )
+        elif args.compile:
+            return tflite.Interpreter(
+                model_path=config["session"]["model_path"],
+                experimental_delegates=[
+                    tflite.load_delegate(
+                        os.path.join(tidl_tools_path, "tidl_model_import_tflite.so"),
+                        delegate_options,
+                    )
+                ],
+            )
+        else:
+            return tflite.Interpreter(
+                model_path=config["session"]["model_path"],
+                experimental_delegates=[
+                    tflite.load_delegate("libtidl_tfl_delegate.so", delegate_options)
+                ],
+            )
+
+    interpreter = create_session()
 
     # Adding input_details and output_details to configuration
     input_details = interpreter.get_input_details()
@@ -388,6 +433,22 @@ def run_model(model, mIdx):
     total_proc_time = total_proc_time / 1000000
     sub_graphs_time = sub_graphs_time / 1000000
 
+    # Steady-state benchmark on the last input, preprocessed once
+    if args.benchmark_iters > 0 and not args.compile:
+        _, input_data, _, _ = preprocess_input(interpreter, input_images, config)
+        sessions = [interpreter] + [create_session() for _ in range(args.benchmark_sessions - 1)]
+        for session in sessions:
+            set_input(session, input_data)
+        result = run_benchmark(
+            sessions,
+            lambda s: s.invoke(),
+            get_benchmark_times if SOC != "am62" else None,
+            warmup=args.benchmark_warmup,
+            iterations=args.benchmark_iters,
+        )
+        save_benchmark_result("tfl-py", model, result)
+        del sessions
+
     # Post-Processing for inference
     output_image_file_name = "py_out_" + model + "_" + os.path.basename(input_image[i % len(input_image)])
     output_bin_file_name = output_image_file_name.replace(".jpg", "") + ".bin"
@@ -443,10 +504,17 @@ def run_model(model, mIdx):
             delegate_options["artifacts_folder"], config, int(new_height), int(new_width)
         )
 
+    # Stamp the artifacts, the model may have been updated in place by the compilation (shape inference)
+    if args.compile:
+        compile_hash = get_compile_hash(
+            config["session"]["model_path"],
+            delegate_options,
+            [config["session"].get("meta_layers_names_list")],
+        )
+        write_compile_stamp(delegate_options["artifacts_folder"], compile_hash)
+
     log = f"\n \nCompleted_Model : {mIdx+1:5d}, Name : {model:50s}, Total time : {total_proc_time/(i+1):10.2f}, Offload Time : {sub_graphs_time/(i+1):10.2f} , DDR RW MBs : {(total_ddr_write+total_ddr_read)/(i+1):10.2f}, Output Image File : {output_image_file_name}, Output Bin File : {output_bin_file_name}\n \n "  # {classes} \n \n'
     print(log)
-    if ncpus > 1:
-        sem.release()
 
 if len(args.models) > 0:
     models = args.models
@@ -472,47 +540,8 @@ log = f"Running {len(models)} Models - {models}\n"
 print(log)
 
 
-def join_one(nthreads):
-    '''
-    Join the thread
+# Download all the models up front, then run them in a pool of processes
+if platform.machine() != "aarch64":
+    download_models(models_configs, models)
 
-    :param nthreads: Thread count
-    '''
-    global run_count
-    sem.acquire()
-    run_count = run_count + 1
-    return nthreads - 1
-
-
-def spawn_one(models, idx, nthreads):
-    '''
-    Spawn a process
-
-    :param models: Name of the model to run
-    :param idx: Index
-    :param nthreads: Thread count
-    '''
-    p = multiprocessing.Process(
-        target=run_model,
-        args=(
-            models,
-            idx,
-        ),
-    )
-    p.start()
-    return idx + 1, nthreads + 1
-
-# Run the models using multi-processing if possible
-if ncpus > 1:
-    for t in range(min(len(models), ncpus)):
-        idx, nthreads = spawn_one(models[idx], idx, nthreads)
-
-    while idx < len(models):
-        nthreads = join_one(nthreads)
-        idx, nthreads = spawn_one(models[idx], idx, nthreads)
-
-    for n in range(nthreads):
-        nthreads = join_one(nthreads)
-else:
-    for mIdx, model in enumerate(models):
-        run_model(model, mIdx)
+run_models(run_model, models, get_num_procs(ncpus, len(models), args.mem_per_proc))
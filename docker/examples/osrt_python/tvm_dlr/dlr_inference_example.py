@@ -5,12 +5,6 @@ import sys
 from PIL import Image
 import argparse
 
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    "-z", "--run_model_zoo", action="store_true", help="Run model zoo models"
-)
-args = parser.parse_args()
-
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 
@@ -18,6 +12,13 @@ sys.path.append(parent)
 from common_utils import *
 from model_configs import *
 
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "-z", "--run_model_zoo", action="store_true", help="Run model zoo models"
+)
+add_benchmark_args(parser)
+args = parser.parse_args()
+
 output_images_folder = "../../../output_images/"
 
 if platform.machine() == "aarch64":
@@ -30,39 +31,24 @@ model_input_width = 299
 
 # preprocessing / postprocessing for tflite model
 def preprocess_for_tflite_inceptionnetv3(image_path):
-    import cv2
-    import numpy as np
-
-    # read the image using openCV
-    img = cv2.imread(image_path)
-    # convert to RGB
-    img = img[:, :, ::-1]
-
     # This TFLite model is trained using 299x299 images.
     # The general rule of thumb for classification models
     # is to scale the input image while preserving
     # the original aspect ratio, so we scale the short edge
     # to 299 pixels, and then
-    # center-crop the scaled image to 224x224
-    orig_height, orig_width, _ = img.shape
-    short_edge = min(img.shape[:2])
-    new_height = (orig_height * model_input_height) // short_edge
-    new_width = (orig_width * model_input_width) // short_edge
-    img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-
-    startx = new_width // 2 - (model_input_width // 2)
-    starty = new_height // 2 - (model_input_height // 2)
-    img = img[starty : starty + model_input_height, startx : startx + model_input_width]
-
-    # apply scaling and mean subtraction.
-    # if your model is built with an input
-    # normalization layer, then you might
-    # need to skip this
-    img = img.astype("uint8")
-    # for mean, scale, ch in zip([128, 128, 128], [0.0078125, 0.0078125, 0.0078125], range(img.shape[2])):
-    #        img[:,:,ch] = ((img[:,:,ch] - mean) * scale)
-    # convert HWC to NHWC
-    img = np.expand_dims(img, axis=0)
+    # center-crop the scaled image to 299x299
+    # The model has an input normalization layer, the
+    # image is kept as uint8 NHWC
+    preprocessor = get_image_preprocessor(
+        model_input_height,
+        model_input_width,
+        layout="NHWC",
+        dtype=np.uint8,
+        backend="cv2",
+        interpolation="cubic",
+        resize_short_edge=model_input_height,
+    )
+    _, img = preprocessor([image_path])
     return img
 
 
@@ -72,41 +58,24 @@ def postprocess_for_tflite_inceptionnetv3(res):
 
 # preprocessing / postprocessing for onnx model
 def preprocess_for_onnx_mobilenetv2(image_path):
-    import cv2
-    import numpy as np
-
-    # read the image using openCV
-    img = cv2.imread(image_path)
-    # convert to RGB
-    img = img[:, :, ::-1]
-
     # Most of the onnx models are trained using
     # 224x224 images. The general rule of thumb
     # is to scale the input image while preserving
     # the original aspect ratio so that the
     # short edge is 256 pixels, and then
     # center-crop the scaled image to 224x224
-    orig_height, orig_width, _ = img.shape
-    short_edge = min(img.shape[:2])
-    new_height = (orig_height * 256) // short_edge
-    new_width = (orig_width * 256) // short_edge
-    img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-
-    startx = new_width // 2 - (224 // 2)
-    starty = new_height // 2 - (224 // 2)
-    img = img[starty : starty + 224, startx : startx + 224]
-
-    # apply scaling and mean subtraction.
-    # if your model is built with an input
-    # normalization layer, then you might
-    # need to skip this
-    img = img.astype("uint8")
-    # for mean, scale, ch in zip([123.675, 116.28, 103.53], [0.017125, 0.017507, 0.017429], range(img.shape[2])):
-    #        img[:,:,ch] = ((img.astype('float32')[:,:,ch] - mean) * scale)
-
-    # convert HWC to NCHW
-    img = np.expand_dims(np.transpose(img, (2, 0, 1)), axis=0)
-
+    # The model has an input normalization layer, the
+    # image is kept as uint8 NCHW
+    preprocessor = get_image_preprocessor(
+        224,
+        224,
+        layout="NCHW",
+        dtype=np.uint8,
+        backend="cv2",
+        interpolation="cubic",
+        resize_short_edge=256,
+    )
+    _, img = preprocessor([image_path])
     return img
 
 
@@ -116,44 +85,20 @@ def postprocess_for_onnx_mobilenetv2(res):
 
 # preprocessing / postprocessing for mxnet model
 def preprocess_for_mxnet_mobilenetv3(image_path):
-    import cv2
-    import numpy as np
-
-    # read the image using openCV
-    img = cv2.imread(image_path)
-
-    # convert to RGB
-    img = img[:, :, ::-1]
-
-    # Most of the onnx models are trained using
-    # 224x224 images. The general rule of thumb
-    # is to scale the input image while preserving
-    # the original aspect ratio so that the
-    # short edge is 256 pixels, and then
-    # center-crop the scaled image to 224x224
-    orig_height, orig_width, _ = img.shape
-    short_edge = min(img.shape[:2])
-    new_height = (orig_height * 256) // short_edge
-    new_width = (orig_width * 256) // short_edge
-    img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-
-    startx = new_width // 2 - (224 // 2)
-    starty = new_height // 2 - (224 // 2)
-    img = img[starty : starty + 224, startx : startx + 224]
-
-    # apply scaling and mean subtraction.
-    # if your model is built with an input
-    # normalization layer, then you might
-    # need to skip this
-    img = img.astype("float32")
-    for mean, scale, ch in zip(
-        [128.0, 128.0, 128.0], [0.0078125, 0.0078125, 0.0078125], range(img.shape[2])
-    ):
-        img[:, :, ch] = (img.astype("float32")[:, :, ch] - mean) * scale
-
-    # convert HWC to NCHW
-    img = np.expand_dims(np.transpose(img, (2, 0, 1)), axis=0)
-
+    # scale the short edge to 256 pixels, center-crop to 224x224,
+    # then apply scaling and mean subtraction to the float32 NCHW image
+    preprocessor = get_image_preprocessor(
+        224,
+        224,
+        layout="NCHW",
+        dtype=np.float32,
+        mean=[128.0, 128.0, 128.0],
+        scale=[0.0078125, 0.0078125, 0.0078125],
+        backend="cv2",
+        interpolation="cubic",
+        resize_short_edge=256,
+    )
+    _, img = preprocessor([image_path])
     return img
 
 
@@ -179,6 +124,21 @@ def model_create_and_run(
 
     print(f"\n Processing time in ms : {proc_time/numImages:10.1f}\n")
 
+    # Steady-state benchmark on the last input, preprocessed once
+    if args.benchmark_iters > 0:
+        sessions = [model] + [
+            DLRModel(model_dir, "cpu") for _ in range(args.benchmark_sessions - 1)
+        ]
+        result = run_benchmark(
+            sessions,
+            lambda s: s.run({model_input_name: img}),
+            None,
+            warmup=args.benchmark_warmup,
+            iterations=args.benchmark_iters,
+        )
+        save_benchmark_result("dlr-py", model_dir.split("/")[-2], result)
+        del sessions
+
     res = postprocess_func(res)
     res_np = np.array(res)
 
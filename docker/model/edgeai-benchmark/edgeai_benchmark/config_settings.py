@@ -69,6 +69,10 @@ class ConfigSettings(core.ConfigRuntimeOptions):
         self.modelartifacts_path = './work_dirs/modelartifacts/{target_device}'
         # path where compiled packaged model artifacts are placed
         self.modelpackage_path = './work_dirs/modelpackage/{target_device}'
+        # compression of the packaged artifacts: 'gz' or 'zst' (needs the zstandard package)
+        self.package_compression = 'gz'
+        # compression level for package_compression - None will use the default (gz: 9, zst: 3)
+        self.package_compression_level = None
         # create your datasets under this folder
         self.datasets_path = f'./dependencies/datasets'
         # target_device indicates the SoC for which the model compilation will take place
@@ -154,6 +158,9 @@ class ConfigSettings(core.ConfigRuntimeOptions):
         # for selective loading, provide a list of dataset names such as
         # ['imagenet', 'coco', 'cocoseg21', 'ade20k', 'cocokpts', 'kitti_lidar_det', 'ti-robokit_semseg_zed1hd', 'ycbv']
         self.dataset_loading = True
+        # create the datasets only when a pipeline uses them, in the process that runs the pipeline
+        # (only the dataset arguments are copied to the pipelines). set to False to load them upfront.
+        self.dataset_lazy_loading = True
         # which configs to run from the default list. example [0,10] [10,null] etc.
         self.config_range = None
         # writing of dataset.yaml, config.yaml, param.yaml and result.yaml depends on this flag
@@ -180,6 +187,26 @@ class ConfigSettings(core.ConfigRuntimeOptions):
         self.report_perfsim = False
         # use TIDL offload to speedup inference
         self.tidl_offload = True
+        # reuse the runtime input/output buffers across frames (onnxruntime io binding, tflite tensor views)
+        self.zero_copy = False
+        # folder where compiled artifacts are cached and shared across run_dirs (keyed by model, options and calibration)
+        # None disables the cache. example: './work_dirs/artifacts_cache/{target_device}'
+        self.artifacts_cache_dir = None
+        # how the calibration frames are chosen from the calibration dataset: None (the first calibration_frames)
+        # or 'diversity' (frames that are far apart in activation ranges, or in image statistics if those are not available)
+        self.calibration_selection = None
+        # folder where the float activation statistics of the calibration dataset are cached, keyed by the model and
+        # the calibration data - shared by the tensor_bits variants of a model. None disables it.
+        self.calibration_cache_dir = None
+        # split the inference frames of one model across these many processes (pc emulation only) - each process
+        # opens its own session on the same artifacts. None or 1 runs the inference in the process of the pipeline.
+        # the shards are limited to the free cores (cpu_count // parallel_processes, or the idle cores in the long tail)
+        self.inference_shards = None
+        # minimum number of frames per inference shard - fewer shards are used for smaller datasets
+        self.inference_shard_min_frames = 100
+        # on evm, query the performance stats (invoke/core/subgraph time, ddr transfer) of every these many frames.
+        # the result has the mean and the percentiles (p50/p90/p99) of the sampled frames. 0 or None turns it off.
+        self.infer_stats_interval = 1
         # input optimization to improve FPS: False or None
         # None will cause the default value set in sessions.__init__ to be used.
         self.input_optimization = None
@@ -33,6 +33,26 @@ class BaseRuntimeWrapper:
             self.kwargs = kwargs
         else:
             self.kwargs.update(kwargs)
+        #
+        # zero_copy: reuse preallocated input/output buffers of the runtime instead of allocating per frame
+        self.kwargs['zero_copy'] = self.kwargs.get('zero_copy', False)
+        self._reset_buffer_stats()
+
+    def _reset_buffer_stats(self):
+        self._buffer_stats = {'num_frames': 0, 'saved_bytes': 0, 'num_realloc': 0}
+
+    def get_buffer_stats(self):
+        # per frame allocation savings of zero_copy
+        num_frames = max(self._buffer_stats['num_frames'], 1)
+        return {
+            'alloc_saved_bytes_per_frame': self._buffer_stats['saved_bytes'] / num_frames,
+            'num_buffer_realloc': self._buffer_stats['num_realloc'],
+        }
+
+    def detach_outputs(self, outputs):
+        # outputs that are kept beyond the next run - runtimes that return views of their
+        # internal buffers (zero_copy) copy them here. nothing to be done by default.
+        return outputs
 
     def _get_input_details_onnx(self, interpreter, input_details=None):
         if input_details is None:
@@ -28,6 +28,8 @@
 
 
 import os
+import sys
+import numpy as np
 
 from . import presets
 from .basert_runtime import BaseRuntimeWrapper
@@ -39,6 +41,7 @@ class ONNXRuntimeWrapper(BaseRuntimeWrapper):
         self._start_import_done = False
         self._start_inference_done = False
         self._num_run_import = 0
+        self._io_binding = None
 
     def start_import(self):
         self.is_import = True
@@ -47,6 +50,8 @@ class ONNXRuntimeWrapper(BaseRuntimeWrapper):
         self.interpreter = self._create_interpreter(is_import=True)
         self.kwargs['input_details'] = self.get_input_details(self.interpreter, self.kwargs.get('input_details', None))
         self.kwargs['output_details'] = self.get_output_details(self.interpreter, self.kwargs.get('output_details', None))
+        # calibration always runs without io binding
+        self._io_binding = None
         self._start_import_done = True
         return self.interpreter
 
@@ -70,14 +75,18 @@ class ONNXRuntimeWrapper(BaseRuntimeWrapper):
         self.interpreter = self._create_interpreter(is_import=False)
         self.kwargs['input_details'] = self.get_input_details(self.interpreter, self.kwargs.get('input_details', None))
         self.kwargs['output_details'] = self.get_output_details(self.interpreter, self.kwargs.get('output_details', None))
+        self._start_io_binding()
         self._start_inference_done = True
         return self.interpreter
 
-    def run_inference(self, input_data, output_keys=None):
+    def run_inference(self, input_data, output_keys=None, input_norm=None):
         if not self._start_inference_done:
             self.start_inference()
         #
         input_data = self._format_input_data(input_data)
+        if input_norm is not None:
+            input_data = self._normalize_into_input_buffers(input_data, input_norm)
+        #
         return self._run(input_data, output_keys)
 
     def _run(self, input_data, output_keys=None):
@@ -87,10 +96,98 @@ class ONNXRuntimeWrapper(BaseRuntimeWrapper):
         #
         # output_details is not mandatory, output_keys can be None
         output_keys = output_keys or [d_info['name'] for d_info in self.kwargs['output_details']]
+        if self._io_binding is not None:
+            return self._run_with_io_binding(input_data, output_keys)
+        #
         # run the actual import step
         outputs = self.interpreter.run(output_keys, input_data)
         return outputs
 
+    def _start_io_binding(self):
+        # with zero_copy, inputs are bound without copy and outputs are written into buffers reused across frames
+        self._io_binding = self.interpreter.io_binding() if self.kwargs['zero_copy'] else None
+        self._input_buffers = {}
+        self._output_buffers = {}
+        self._output_refcounts = {}
+        self._dynamic_outputs = set()
+        self._reset_buffer_stats()
+
+    def _normalize_into_input_buffers(self, input_data, input_norm):
+        # input_norm: list of (mean, scale) per input - (input - mean) * scale is written into input buffers
+        # that are owned by the session and reused across frames, instead of creating normalized copies of the input.
+        # onnxruntime reads the bound inputs only during the run, so the buffers can be overwritten in the next frame.
+        for (name, tensor), (mean, scale) in zip(list(input_data.items()), input_norm):
+            dtype = np.result_type(tensor, mean, scale)
+            buffer = self._input_buffers.get(name, None)
+            if buffer is None or buffer.shape != tensor.shape or buffer.dtype != dtype:
+                buffer = self._input_buffers[name] = np.empty(tensor.shape, dtype=dtype)
+            else:
+                # the normalized copy and the temporary of the input normalizer are not needed
+                self._buffer_stats['saved_bytes'] += 2 * buffer.nbytes
+            #
+            np.subtract(tensor, mean, out=buffer)
+            np.multiply(buffer, scale, out=buffer)
+            input_data[name] = buffer
+        #
+        return input_data
+
+    def _bind_output_buffer(self, name):
+        # the outputs returned for the previous frame may still be in use (referenced from outside),
+        # in that case they are left to their users and a new buffer is bound instead of overwriting them
+        if sys.getrefcount(self._output_buffers[name]) > self._output_refcounts[name]:
+            self._output_buffers[name] = np.empty_like(self._output_buffers[name])
+            self._output_refcounts[name] = sys.getrefcount(self._output_buffers[name])
+            self._buffer_stats['num_realloc'] += 1
+        else:
+            self._buffer_stats['saved_bytes'] += self._output_buffers[name].nbytes
+        #
+        buffer = self._output_buffers[name]
+        self._io_binding.bind_output(name, 'cpu', 0, buffer.dtype.type, list(buffer.shape), buffer.ctypes.data)
+
+    def _run_with_io_binding(self, input_data, output_keys):
+        io_binding = self._io_binding
+        io_binding.clear_binding_inputs()
+        io_binding.clear_binding_outputs()
+        for name, data in input_data.items():
+            # onnxruntime reads the input directly from this memory
+            io_binding.bind_cpu_input(name, np.ascontiguousarray(data))
+        #
+        for name in output_keys:
+            if name in self._output_buffers:
+                self._bind_output_buffer(name)
+            else:
+                io_binding.bind_output(name, 'cpu')
+            #
+        #
+        try:
+            self.interpreter.run_with_iobinding(io_binding)
+        except Exception:
+            if not self._output_buffers:
+                raise
+            #
+            # output shape changed - these outputs are allocated by onnxruntime from now on
+            self._dynamic_outputs.update(self._output_buffers.keys())
+            self._output_buffers = {}
+            return self._run_with_io_binding(input_data, output_keys)
+        #
+        ort_outputs = io_binding.get_outputs()
+        outputs = []
+        for idx, name in enumerate(output_keys):
+            if name in self._output_buffers:
+                outputs.append(self._output_buffers[name])
+            else:
+                output = ort_outputs[idx].numpy()
+                outputs.append(output)
+                # the buffer is used from the next frame onwards
+                if name not in self._dynamic_outputs:
+                    self._output_buffers[name] = np.empty_like(output)
+                    self._output_refcounts[name] = sys.getrefcount(self._output_buffers[name])
+                #
+            #
+        #
+        self._buffer_stats['num_frames'] += 1
+        return outputs
+
     def _create_interpreter(self, is_import):
         # move the import inside the function, so that onnxruntime needs to be installed
         # only if someone wants to use it
@@ -27,6 +27,7 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import weakref
 import numpy as np
 import copy
 
@@ -40,6 +41,7 @@ class TFLiteRuntimeWrapper(BaseRuntimeWrapper):
         self._start_import_done = False
         self._start_inference_done = False
         self._num_run_import = 0
+        self._output_views = []
 
     def start_import(self):
         self.is_import = True
@@ -71,14 +73,19 @@ class TFLiteRuntimeWrapper(BaseRuntimeWrapper):
         self.interpreter = self._create_interpreter(is_import=False)
         self.kwargs['input_details'] = self.get_input_details(self.interpreter, self.kwargs.get('input_details', None))
         self.kwargs['output_details'] = self.get_output_details(self.interpreter, self.kwargs.get('output_details', None))
+        self._output_views = []
+        self._reset_buffer_stats()
         self._start_inference_done = True
         return self.interpreter
 
-    def run_inference(self, input_data, output_keys=None):
+    def run_inference(self, input_data, output_keys=None, input_norm=None):
         if not self._start_inference_done:
             self.start_inference()
         #
         input_data = self._format_input_data(input_data)
+        if self.kwargs['zero_copy']:
+            return self._run_zero_copy(input_data, output_keys, input_norm)
+        #
         return self._run(input_data, output_keys)
 
     def _run(self, input_data, output_keys=None):
@@ -95,6 +102,56 @@ class TFLiteRuntimeWrapper(BaseRuntimeWrapper):
         outputs = [self._get_tensor(output_detail) for output_detail in output_details]
         return outputs
 
+    def _run_zero_copy(self, input_data, output_keys=None, input_norm=None):
+        # inputs are written into the interpreter input buffers and the outputs are views of the interpreter
+        # output buffers - the outputs are valid only until the next run, use detach_outputs() to keep them.
+        # input_norm: optional list of (mean, scale) per input - the normalization is then written
+        # directly into the input buffer, instead of creating normalized copies of the input.
+        if self.kwargs.get('extra_inputs'):
+            input_data.update(self.kwargs['extra_inputs'])
+        #
+        input_details = self.kwargs['input_details']
+        output_details = self.kwargs['output_details']
+        input_norm = input_norm or [None] * len(input_details)
+        for (input_detail, c_data_entry, c_norm) in zip(input_details, input_data, input_norm):
+            self._set_tensor_view(input_detail, c_data_entry, c_norm)
+        #
+        # tflite refuses to invoke while views of its buffers are referenced - report who holds them
+        if any(view_ref() is not None for view_ref in self._output_views):
+            raise RuntimeError('outputs of the previous run are still referenced - '
+                               'use detach_outputs() on the outputs that need to be kept across runs')
+        #
+        self.interpreter.invoke()
+        outputs = [self._get_tensor_view(output_detail) for output_detail in output_details]
+        self._output_views = [weakref.ref(output) for output in outputs]
+        self._buffer_stats['num_frames'] += 1
+        return outputs
+
+    def detach_outputs(self, outputs):
+        # copy the arrays that share memory with the interpreter output buffers (zero_copy),
+        # so that they are not overwritten by the next run. other arrays are returned as such.
+        output_views = [view_ref() for view_ref in self._output_views]
+        output_views = [view for view in output_views if view is not None]
+        if not output_views:
+            return outputs
+        #
+        return self._detach_outputs(outputs, output_views)
+
+    def _detach_outputs(self, outputs, output_views):
+        if isinstance(outputs, np.ndarray):
+            if any(np.may_share_memory(outputs, view) for view in output_views):
+                self._buffer_stats['num_realloc'] += 1
+                outputs = outputs.copy()
+            #
+        elif isinstance(outputs, list):
+            outputs = [self._detach_outputs(output, output_views) for output in outputs]
+        elif isinstance(outputs, tuple):
+            outputs = tuple(self._detach_outputs(output, output_views) for output in outputs)
+        elif isinstance(outputs, dict):
+            outputs = {key: self._detach_outputs(output, output_views) for key, output in outputs.items()}
+        #
+        return outputs
+
     def _create_interpreter(self, is_import):
         # move the import inside the function, so that tflite_runtime needs to be installed
         # only if some one wants to use it
@@ -132,6 +189,33 @@ class TFLiteRuntimeWrapper(BaseRuntimeWrapper):
         #
         self.interpreter.set_tensor(model_input['index'], tensor)
 
+    def _set_tensor_view(self, model_input, tensor, input_norm=None):
+        view = self.interpreter.tensor(model_input['index'])()
+        if input_norm is not None and view.dtype == np.float32:
+            # same as (tensor - mean) * scale, but without the intermediate arrays
+            mean, scale = input_norm
+            np.subtract(tensor, mean, out=view)
+            np.multiply(view, scale, out=view)
+            # the normalized copy and the temporary of the input normalizer are not needed
+            self._buffer_stats['saved_bytes'] += 2 * view.nbytes
+        else:
+            if input_norm is not None:
+                mean, scale = input_norm
+                tensor = (tensor - mean) * scale
+            #
+            self._set_tensor(model_input, tensor)
+        #
+        # the view must not be alive during invoke
+        del view
+
+    def _get_tensor_view(self, model_output):
+        if model_output['type'] == np.int8 or model_output['type']  == np.uint8:
+            return self._get_tensor(model_output)
+        #
+        tensor = self.interpreter.tensor(model_output['index'])()
+        self._buffer_stats['saved_bytes'] += tensor.nbytes
+        return tensor
+
     def _get_tensor(self, model_output):
         tensor = self.interpreter.get_tensor(model_output['index'])
         if model_output['type'] == np.int8 or model_output['type']  == np.uint8:
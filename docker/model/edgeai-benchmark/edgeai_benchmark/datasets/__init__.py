@@ -26,10 +26,13 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import warnings
+import functools
 
 from .. import constants
 
+from .dataset_base import *
 from .onnx_backend_dataset import *
 from .tidl_unit_dataset import *
 
@@ -215,8 +218,8 @@ def _get_additional_datasets(settings, download=False, dataset_list=None):
         # all the imagenet models will use this variant.
         print(f'Value of download here: {download}')# TODO: LUKE remove
         try:
-            dataset_cache[DATASET_CATEGORY_IMAGENET]['calibration_dataset'] = ImageNetDataSetType(**imagenet_cls_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_IMAGENET]['input_dataset'] = ImageNetDataSetType(**imagenet_cls_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_IMAGENET]['calibration_dataset'] = _create_dataset(settings, ImageNetDataSetType, **imagenet_cls_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_IMAGENET]['input_dataset'] = _create_dataset(settings, ImageNetDataSetType, **imagenet_cls_val_cfg, download=False)
         except Exception as e:
             dataset_cache[DATASET_CATEGORY_IMAGENET]['calibration_dataset'] = DATASET_CATEGORY_IMAGENET
             dataset_cache[DATASET_CATEGORY_IMAGENET]['input_dataset'] = DATASET_CATEGORY_IMAGENET
@@ -260,8 +263,8 @@ def get_datasets(settings, download=False, dataset_list=None):
         # all the imagenet models will use this variant.
         print(f'Value of download here: {download}')# TODO: LUKE remove
         try:
-            dataset_cache[DATASET_CATEGORY_IMAGENET]['calibration_dataset'] = ImageNetDataSetType(**imagenet_cls_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_IMAGENET]['input_dataset'] = ImageNetDataSetType(**imagenet_cls_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_IMAGENET]['calibration_dataset'] = _create_dataset(settings, ImageNetDataSetType, **imagenet_cls_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_IMAGENET]['input_dataset'] = _create_dataset(settings, ImageNetDataSetType, **imagenet_cls_val_cfg, download=False)
         except Exception as e:
             dataset_cache[DATASET_CATEGORY_IMAGENET]['calibration_dataset'] = DATASET_CATEGORY_IMAGENET
             dataset_cache[DATASET_CATEGORY_IMAGENET]['input_dataset'] = DATASET_CATEGORY_IMAGENET
@@ -287,8 +290,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             name=DATASET_CATEGORY_COCOKPTS,
             filter_imgs=filter_imgs)
         try:
-            dataset_cache[DATASET_CATEGORY_COCOKPTS]['calibration_dataset'] = COCOKeypoints(**coco_kpts_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_COCOKPTS]['input_dataset'] = COCOKeypoints(**coco_kpts_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_COCOKPTS]['calibration_dataset'] = _create_dataset(settings, COCOKeypoints, **coco_kpts_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_COCOKPTS]['input_dataset'] = _create_dataset(settings, COCOKeypoints, **coco_kpts_val_cfg, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_COCOKPTS]['calibration_dataset'] = DATASET_CATEGORY_COCOKPTS
             dataset_cache[DATASET_CATEGORY_COCOKPTS]['input_dataset'] = DATASET_CATEGORY_COCOKPTS
@@ -313,8 +316,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             name=DATASET_CATEGORY_YCBV,
             filter_imgs=filter_imgs)
         try:
-            dataset_cache[DATASET_CATEGORY_YCBV]['calibration_dataset'] = YCBV(**ycbv_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_YCBV]['input_dataset'] = YCBV(**ycbv_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_YCBV]['calibration_dataset'] = _create_dataset(settings, YCBV, **ycbv_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_YCBV]['input_dataset'] = _create_dataset(settings, YCBV, **ycbv_val_cfg, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_YCBV]['calibration_dataset'] = DATASET_CATEGORY_YCBV
             dataset_cache[DATASET_CATEGORY_YCBV]['input_dataset'] = DATASET_CATEGORY_YCBV
@@ -336,8 +339,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames,5000),
             name=DATASET_CATEGORY_COCO)
         try:
-            dataset_cache[DATASET_CATEGORY_COCO]['calibration_dataset'] = COCODetection(**coco_det_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_COCO]['input_dataset'] = COCODetection(**coco_det_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_COCO]['calibration_dataset'] = _create_dataset(settings, COCODetection, **coco_det_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_COCO]['input_dataset'] = _create_dataset(settings, COCODetection, **coco_det_val_cfg, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_COCO]['calibration_dataset'] = DATASET_CATEGORY_COCO
             dataset_cache[DATASET_CATEGORY_COCO]['input_dataset'] = DATASET_CATEGORY_COCO
@@ -359,8 +362,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames,3226),
             name=DATASET_CATEGORY_WIDERFACE)
         try:
-            dataset_cache[DATASET_CATEGORY_WIDERFACE]['calibration_dataset'] = WiderFaceDetection(**widerface_det_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_WIDERFACE]['input_dataset'] = WiderFaceDetection(**widerface_det_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_WIDERFACE]['calibration_dataset'] = _create_dataset(settings, WiderFaceDetection, **widerface_det_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_WIDERFACE]['input_dataset'] = _create_dataset(settings, WiderFaceDetection, **widerface_det_val_cfg, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_WIDERFACE]['calibration_dataset'] = DATASET_CATEGORY_WIDERFACE
             dataset_cache[DATASET_CATEGORY_WIDERFACE]['input_dataset'] = DATASET_CATEGORY_WIDERFACE
@@ -382,8 +385,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames,5000),
             name=DATASET_CATEGORY_COCOSEG21)
         try:
-            dataset_cache[DATASET_CATEGORY_COCOSEG21]['calibration_dataset'] = COCOSegmentation(**cocoseg21_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_COCOSEG21]['input_dataset'] = COCOSegmentation(**cocoseg21_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_COCOSEG21]['calibration_dataset'] = _create_dataset(settings, COCOSegmentation, **cocoseg21_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_COCOSEG21]['input_dataset'] = _create_dataset(settings, COCOSegmentation, **cocoseg21_val_cfg, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_COCOSEG21]['calibration_dataset'] = DATASET_CATEGORY_COCOSEG21
             dataset_cache[DATASET_CATEGORY_COCOSEG21]['input_dataset'] = DATASET_CATEGORY_COCOSEG21
@@ -405,8 +408,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames,2000),
             name=DATASET_CATEGORY_ADE20K)
         try:
-            dataset_cache[DATASET_CATEGORY_ADE20K]['calibration_dataset'] = ADE20KSegmentation(**ade20k_seg_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_ADE20K]['input_dataset'] = ADE20KSegmentation(**ade20k_seg_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_ADE20K]['calibration_dataset'] = _create_dataset(settings, ADE20KSegmentation, **ade20k_seg_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_ADE20K]['input_dataset'] = _create_dataset(settings, ADE20KSegmentation, **ade20k_seg_val_cfg, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_ADE20K]['calibration_dataset'] = DATASET_CATEGORY_ADE20K
             dataset_cache[DATASET_CATEGORY_ADE20K]['input_dataset'] = DATASET_CATEGORY_ADE20K
@@ -428,8 +431,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames,2000),
             name=DATASET_CATEGORY_ADE20K32)
         try:
-            dataset_cache[DATASET_CATEGORY_ADE20K32]['calibration_dataset'] = ADE20KSegmentation(**ade20k_seg_calib_cfg, num_classes=32, download=download)
-            dataset_cache[DATASET_CATEGORY_ADE20K32]['input_dataset'] = ADE20KSegmentation(**ade20k_seg_val_cfg, num_classes=32, download=False)
+            dataset_cache[DATASET_CATEGORY_ADE20K32]['calibration_dataset'] = _create_dataset(settings, ADE20KSegmentation, **ade20k_seg_calib_cfg, num_classes=32, download=download)
+            dataset_cache[DATASET_CATEGORY_ADE20K32]['input_dataset'] = _create_dataset(settings, ADE20KSegmentation, **ade20k_seg_val_cfg, num_classes=32, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_ADE20K32]['calibration_dataset'] = DATASET_CATEGORY_ADE20K32
             dataset_cache[DATASET_CATEGORY_ADE20K32]['input_dataset'] = DATASET_CATEGORY_ADE20K32
@@ -451,8 +454,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames,1449),
             name=DATASET_CATEGORY_VOC2012)
         try:
-            dataset_cache[DATASET_CATEGORY_VOC2012]['calibration_dataset'] = VOC2012Segmentation(**voc_seg_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_VOC2012]['input_dataset'] = VOC2012Segmentation(**voc_seg_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_VOC2012]['calibration_dataset'] = _create_dataset(settings, VOC2012Segmentation, **voc_seg_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_VOC2012]['input_dataset'] = _create_dataset(settings, VOC2012Segmentation, **voc_seg_val_cfg, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_VOC2012]['calibration_dataset'] = DATASET_CATEGORY_VOC2012
             dataset_cache[DATASET_CATEGORY_VOC2012]['input_dataset'] = DATASET_CATEGORY_VOC2012
@@ -476,8 +479,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             name=DATASET_CATEGORY_NYUDEPTHV2)
 
         try:
-            dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['calibration_dataset'] = NYUDepthV2(**nyudepthv2_calib_cfg, download=download)
-            dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['input_dataset'] = NYUDepthV2(**nyudepthv2_val_cfg, download=False)
+            dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['calibration_dataset'] = _create_dataset(settings, NYUDepthV2, **nyudepthv2_calib_cfg, download=download)
+            dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['input_dataset'] = _create_dataset(settings, NYUDepthV2, **nyudepthv2_val_cfg, download=False)
         except:
             dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['calibration_dataset'] = DATASET_CATEGORY_NYUDEPTHV2
             dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['input_dataset'] = DATASET_CATEGORY_NYUDEPTHV2
@@ -507,8 +510,8 @@ def get_datasets(settings, download=False, dataset_list=None):
         )
 
         try:
-            dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['calibration_dataset'] = RobokitSegmentation(**dataset_calib_cfg, download=True)
-            dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['input_dataset'] = RobokitSegmentation(**dataset_val_cfg, download=True)
+            dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['calibration_dataset'] = _create_dataset(settings, RobokitSegmentation, **dataset_calib_cfg, download=True)
+            dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['input_dataset'] = _create_dataset(settings, RobokitSegmentation, **dataset_val_cfg, download=True)
         except:
             dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['calibration_dataset'] = DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD
             dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['input_dataset'] = DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD
@@ -538,8 +541,8 @@ def get_datasets(settings, download=False, dataset_list=None):
         )
 
         try:
-            dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['calibration_dataset'] = RobokitVisualLocalization(**dataset_calib_cfg, download=True)
-            dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['input_dataset'] = RobokitVisualLocalization(**dataset_val_cfg, download=True)
+            dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['calibration_dataset'] = _create_dataset(settings, RobokitVisualLocalization, **dataset_calib_cfg, download=True)
+            dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['input_dataset'] = _create_dataset(settings, RobokitVisualLocalization, **dataset_val_cfg, download=True)
         except:
             dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['calibration_dataset'] = DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD
             dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['input_dataset'] = DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD
@@ -570,12 +573,12 @@ def get_datasets(settings, download=False, dataset_list=None):
 
         if dataset_cache[DATASET_CATEGORY_PANDASET_FRAME]['dataset_init'] is False:
             try:
-                # load pandaset dataset first
-                ps = load_pandaset(dataset_calib_cfg['path'])
+                # the pandaset api object is loaded along with the dataset
+                ps_loader = functools.partial(_get_pandaset_kwargs, dataset_calib_cfg['path'])
                 dataset_cache[DATASET_CATEGORY_PANDASET_FRAME]['calibration_dataset'] = \
-                    PandaSetDataset(**dataset_calib_cfg, ps=ps, download=False, read_anno=False)
+                    _create_dataset(settings, PandaSetDataset, **dataset_calib_cfg, download=False, read_anno=False, dataset_kwargs_loader=ps_loader)
                 dataset_cache[DATASET_CATEGORY_PANDASET_FRAME]['input_dataset'] = \
-                    PandaSetDataset(**dataset_val_cfg, ps=ps, download=False, read_anno=True)
+                    _create_dataset(settings, PandaSetDataset, **dataset_val_cfg, download=False, read_anno=True, dataset_kwargs_loader=ps_loader)
                 dataset_cache[DATASET_CATEGORY_PANDASET_FRAME]['dataset_init'] =  True
             except Exception as message:
                 dataset_cache[DATASET_CATEGORY_PANDASET_FRAME]['calibration_dataset'] = DATASET_CATEGORY_PANDASET_FRAME
@@ -608,12 +611,12 @@ def get_datasets(settings, download=False, dataset_list=None):
         # To revisit
         if dataset_cache[DATASET_CATEGORY_PANDASET_MV_IMAGE]['dataset_init'] is False:
             try:
-                # load pandaset dataset first
-                ps = load_pandaset(dataset_calib_cfg['path'])
+                # the pandaset api object is loaded along with the dataset
+                ps_loader = functools.partial(_get_pandaset_kwargs, dataset_calib_cfg['path'])
                 dataset_cache[DATASET_CATEGORY_PANDASET_MV_IMAGE]['calibration_dataset'] = \
-                    PandaSetDataset(**dataset_calib_cfg, ps=ps, download=False, read_anno=False)
+                    _create_dataset(settings, PandaSetDataset, **dataset_calib_cfg, download=False, read_anno=False, dataset_kwargs_loader=ps_loader)
                 dataset_cache[DATASET_CATEGORY_PANDASET_MV_IMAGE]['input_dataset'] = \
-                    PandaSetDataset(**dataset_val_cfg, ps=ps, download=False, read_anno=True)
+                    _create_dataset(settings, PandaSetDataset, **dataset_val_cfg, download=False, read_anno=True, dataset_kwargs_loader=ps_loader)
                 dataset_cache[DATASET_CATEGORY_PANDASET_MV_IMAGE]['dataset_init'] =  True
             except Exception as message:
                 dataset_cache[DATASET_CATEGORY_PANDASET_MV_IMAGE]['calibration_dataset'] = DATASET_CATEGORY_PANDASET_MV_IMAGE
@@ -640,8 +643,8 @@ def get_datasets(settings, download=False, dataset_list=None):
                 num_frames=min(settings.num_frames,500),
                 name=DATASET_CATEGORY_CITYSCAPES)
             try:
-                dataset_cache[DATASET_CATEGORY_CITYSCAPES]['calibration_dataset'] = CityscapesSegmentation(**cityscapes_seg_calib_cfg, download=False)
-                dataset_cache[DATASET_CATEGORY_CITYSCAPES]['input_dataset'] = CityscapesSegmentation(**cityscapes_seg_val_cfg, download=False)
+                dataset_cache[DATASET_CATEGORY_CITYSCAPES]['calibration_dataset'] = _create_dataset(settings, CityscapesSegmentation, **cityscapes_seg_calib_cfg, download=False)
+                dataset_cache[DATASET_CATEGORY_CITYSCAPES]['input_dataset'] = _create_dataset(settings, CityscapesSegmentation, **cityscapes_seg_val_cfg, download=False)
             except:
                 dataset_cache[DATASET_CATEGORY_CITYSCAPES]['calibration_dataset'] = DATASET_CATEGORY_CITYSCAPES
                 dataset_cache[DATASET_CATEGORY_CITYSCAPES]['input_dataset'] = DATASET_CATEGORY_CITYSCAPES
@@ -669,8 +672,8 @@ def get_datasets(settings, download=False, dataset_list=None):
                 num_frames=min(settings.num_frames,3769),
                 name=DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS)
             try:
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['calibration_dataset'] = KittiLidar3D(**dataset_calib_cfg, download=False, read_anno=False)
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['input_dataset'] = KittiLidar3D(**dataset_val_cfg, download=False, read_anno=True)
+                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['calibration_dataset'] = _create_dataset(settings, KittiLidar3D, **dataset_calib_cfg, download=False, read_anno=False)
+                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['input_dataset'] = _create_dataset(settings, KittiLidar3D, **dataset_val_cfg, download=False, read_anno=True)
             except Exception as message:
                 dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['calibration_dataset'] = DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS
                 dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['input_dataset'] = DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS
@@ -698,8 +701,8 @@ def get_datasets(settings, download=False, dataset_list=None):
                 num_frames=min(settings.num_frames,3769),
                 name=DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS)
             try:
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['calibration_dataset'] = KittiLidar3D(**dataset_calib_cfg, download=False, read_anno=False)
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['input_dataset'] = KittiLidar3D(**dataset_val_cfg, download=False, read_anno=True)
+                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['calibration_dataset'] = _create_dataset(settings, KittiLidar3D, **dataset_calib_cfg, download=False, read_anno=False)
+                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['input_dataset'] = _create_dataset(settings, KittiLidar3D, **dataset_val_cfg, download=False, read_anno=True)
             except Exception as message:
                 dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['calibration_dataset'] = DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS
                 dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['input_dataset'] = DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS
@@ -724,8 +727,8 @@ def get_datasets(settings, download=False, dataset_list=None):
                 max_disp=192,
                 num_frames=min(settings.num_frames,50))
             try:
-                dataset_cache[DATASET_CATEGORY_KITTI_2015]['calibration_dataset'] = Kitti2015(**dataset_calib_cfg, download=False)
-                dataset_cache[DATASET_CATEGORY_KITTI_2015]['input_dataset'] = Kitti2015(**dataset_val_cfg, download=False)
+                dataset_cache[DATASET_CATEGORY_KITTI_2015]['calibration_dataset'] = _create_dataset(settings, Kitti2015, **dataset_calib_cfg, download=False)
+                dataset_cache[DATASET_CATEGORY_KITTI_2015]['input_dataset'] = _create_dataset(settings, Kitti2015, **dataset_val_cfg, download=False)
             except Exception as message:
                 dataset_cache[DATASET_CATEGORY_KITTI_2015]['calibration_dataset'] = DATASET_CATEGORY_KITTI_2015
                 dataset_cache[DATASET_CATEGORY_KITTI_2015]['input_dataset'] = DATASET_CATEGORY_KITTI_2015
@@ -756,12 +759,12 @@ def get_datasets(settings, download=False, dataset_list=None):
 
             if dataset_cache[DATASET_CATEGORY_NUSCENES_FRAME]['dataset_init'] is False:
                 try:
-                    # load nuscnes dataset first
-                    nusc, nusc_can_bus = load_nuscenes(dataset_calib_cfg['path'])
+                    # the nuscenes api object is loaded along with the dataset
+                    nusc_loader = functools.partial(_get_nuscenes_kwargs, dataset_calib_cfg['path'], with_can_bus=True)
                     dataset_cache[DATASET_CATEGORY_NUSCENES_FRAME]['calibration_dataset'] = \
-                        NuScenesDataset(**dataset_calib_cfg, nusc=nusc, nusc_can_bus=nusc_can_bus, download=False, read_anno=False)
+                        _create_dataset(settings, NuScenesDataset, **dataset_calib_cfg, download=False, read_anno=False, dataset_kwargs_loader=nusc_loader)
                     dataset_cache[DATASET_CATEGORY_NUSCENES_FRAME]['input_dataset'] = \
-                        NuScenesDataset(**dataset_val_cfg, nusc=nusc, nusc_can_bus=nusc_can_bus, download=False, read_anno=True)
+                        _create_dataset(settings, NuScenesDataset, **dataset_val_cfg, download=False, read_anno=True, dataset_kwargs_loader=nusc_loader)
                     dataset_cache[DATASET_CATEGORY_NUSCENES_FRAME]['dataset_init'] =  True
                 except Exception as message:
                     dataset_cache[DATASET_CATEGORY_NUSCENES_FRAME]['calibration_dataset'] = DATASET_CATEGORY_NUSCENES_FRAME
@@ -794,12 +797,12 @@ def get_datasets(settings, download=False, dataset_list=None):
             # To revisit
             if dataset_cache[DATASET_CATEGORY_NUSCENES_MV_IMAGE]['dataset_init'] is False:
                 try:
-                    # load nuscnes dataset first
-                    nusc, nusc_can_bus = load_nuscenes(dataset_calib_cfg['path'])
+                    # the nuscenes api object is loaded along with the dataset
+                    nusc_loader = functools.partial(_get_nuscenes_kwargs, dataset_calib_cfg['path'], with_can_bus=False)
                     dataset_cache[DATASET_CATEGORY_NUSCENES_MV_IMAGE]['calibration_dataset'] = \
-                        NuScenesDataset(**dataset_calib_cfg, nusc=nusc, nusc_can_bus=None, download=False, read_anno=False)
+                        _create_dataset(settings, NuScenesDataset, **dataset_calib_cfg, download=False, read_anno=False, dataset_kwargs_loader=nusc_loader)
                     dataset_cache[DATASET_CATEGORY_NUSCENES_MV_IMAGE]['input_dataset'] = \
-                        NuScenesDataset(**dataset_val_cfg, nusc=nusc, nusc_can_bus=None, download=False, read_anno=True)
+                        _create_dataset(settings, NuScenesDataset, **dataset_val_cfg, download=False, read_anno=True, dataset_kwargs_loader=nusc_loader)
                     dataset_cache[DATASET_CATEGORY_NUSCENES_MV_IMAGE]['dataset_init'] =  True
                 except Exception as message:
                     dataset_cache[DATASET_CATEGORY_NUSCENES_MV_IMAGE]['calibration_dataset'] = DATASET_CATEGORY_NUSCENES_MV_IMAGE
@@ -812,6 +815,42 @@ def get_datasets(settings, download=False, dataset_list=None):
     return dataset_cache
 
 
+def _create_dataset(settings, dataset_type, download=False, dataset_kwargs_loader=None, **kwargs):
+    # if the dataset folder is already there, the dataset is created on first use, in the process that uses it.
+    # otherwise it is created right away - which downloads it if download is set.
+    if dataset_type is None:
+        raise RuntimeError('the dataset type could not be imported')
+    #
+    path = kwargs.get('path', None)
+    if settings.dataset_lazy_loading and download != 'always' and isinstance(path, str) and os.path.exists(path):
+        return LazyDataset(dataset_type, dict(download=False, **kwargs), dataset_kwargs_loader=dataset_kwargs_loader)
+    #
+    if dataset_kwargs_loader is not None:
+        kwargs.update(dataset_kwargs_loader())
+    #
+    return dataset_type(download=download, **kwargs)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_nuscenes(path):
+    return load_nuscenes(path)
+
+
+def _get_nuscenes_kwargs(path, with_can_bus=True):
+    # the calibration and input datasets share the loaded nuscenes api object
+    nusc, nusc_can_bus = _load_nuscenes(path)
+    return dict(nusc=nusc, nusc_can_bus=(nusc_can_bus if with_can_bus else None))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_pandaset(path):
+    return load_pandaset(path)
+
+
+def _get_pandaset_kwargs(path):
+    return dict(ps=_load_pandaset(path))
+
+
 def download_datasets(settings, download=True, dataset_list=None):
     # just creating the dataset classes with download=True will check if the dataset folders are present
     # if the dataset folders are missing, it will be downloaded and extracted
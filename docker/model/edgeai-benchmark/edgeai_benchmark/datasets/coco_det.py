@@ -76,12 +76,10 @@ https://arxiv.org/abs/1405.0312, https://cocodataset.org/
 import numbers
 import os
 import random
-import json
 import shutil
 import tempfile
 import numpy as np
 from colorama import Fore
-from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
 from ..utils.config_utils.dataset_utils import *
@@ -118,14 +116,13 @@ class COCODetection(DatasetBase):
             self.annotation_file = annotation_file
         #
         self._load_dataset()
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
+        # the annotations are already loaded in coco_dataset
+        self.dataset_store = self.coco_dataset.dataset
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def _load_dataset(self):
         shuffle = self.kwargs.get('shuffle', False)
-        self.coco_dataset = COCO(self.annotation_file)
+        self.coco_dataset = load_coco(self.annotation_file)
         filter_imgs = self.kwargs['filter_imgs'] if 'filter_imgs' in self.kwargs else None
         if isinstance(filter_imgs, str):
             # filter images with the given list
@@ -82,7 +82,6 @@ import shutil
 import tempfile
 import numpy as np
 from colorama import Fore
-from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
 from .. import utils
@@ -118,15 +117,14 @@ class COCOKeypointDetection(DatasetBase):
             self.annotation_file = annotation_file
         #
         self._load_dataset()
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
+        # the annotations are already loaded in coco_dataset
+        self.dataset_store = self.coco_dataset.dataset
         self.num_keypoints = len(self.dataset_store["categories"][0]["keypoints"])
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def _load_dataset(self):
         shuffle = self.kwargs.get('shuffle', False)
-        self.coco_dataset = COCO(self.annotation_file)
+        self.coco_dataset = load_coco(self.annotation_file)
         filter_imgs = self.kwargs['filter_imgs'] if 'filter_imgs' in self.kwargs else None
         if isinstance(filter_imgs, str):
             # filter images with the given list
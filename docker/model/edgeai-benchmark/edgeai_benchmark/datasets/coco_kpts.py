@@ -106,14 +106,12 @@ https://arxiv.org/abs/1405.0312, https://cocodataset.org/
 import numbers
 import os
 import random
-import json
 import json_tricks
 import shutil
 import tempfile
 import numpy as np
 from collections import OrderedDict, defaultdict
 from colorama import Fore
-from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
 
@@ -167,7 +165,7 @@ class COCOKeypoints(DatasetBase):
         self.image_dir = os.path.join(image_base_dir, self.kwargs['split'])
 
         self.annotation_file = os.path.join(annotations_dir, f'person_keypoints_{self.kwargs["split"]}.json')
-        self.coco_dataset = COCO(self.annotation_file)
+        self.coco_dataset = load_coco(self.annotation_file)
 
         filter_imgs = self.kwargs['filter_imgs'] if 'filter_imgs' in self.kwargs else None
         if isinstance(filter_imgs, str):
@@ -244,9 +242,8 @@ class COCOKeypoints(DatasetBase):
 
         self.id2name, self.name2id = _get_mapping_id_name(self.coco_dataset.imgs)
         # store dataset info
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
+        # the annotations are already loaded in coco_dataset
+        self.dataset_store = self.coco_dataset.dataset
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def download(self, path, split):
@@ -76,12 +76,14 @@ https://arxiv.org/abs/1405.0312, https://cocodataset.org/
 import os
 import random
 import copy
+import hashlib
+import shutil
+import multiprocessing
 import numpy as np
 import PIL
 import cv2
 import tempfile
 from colorama import Fore
-from pycocotools.coco import COCO
 from pycocotools import mask as coco_mask
 import json
 
@@ -91,6 +93,10 @@ from .dataset_base import *
 __all__ = ['COCOSegmentation']
 
 
+# bump this if the way the label masks are rasterized changes
+LABEL_CACHE_VERSION = 1
+
+
 class COCOSegmentation(DatasetBase):
     def __init__(self, num_classes=21, download=False, num_frames=None, name="cocoseg21", **kwargs):
         super().__init__(num_classes=num_classes, num_frames=num_frames, name=name, **kwargs)
@@ -128,7 +134,7 @@ class COCOSegmentation(DatasetBase):
         self.image_dir = os.path.join(image_base_dir, split)
 
         self.annotation_file = os.path.join(annotations_dir, f'instances_{split}.json')
-        self.coco_dataset = COCO(self.annotation_file)
+        self.coco_dataset = load_coco(self.annotation_file)
 
         self.cat_ids = self.coco_dataset.getCatIds()
         img_ids = self.coco_dataset.getImgIds()
@@ -160,9 +166,13 @@ class COCOSegmentation(DatasetBase):
             self.tempfiles.append(temp_dir)
         #
         self.label_dir = os.path.join(run_dir, 'labels')
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
+        # the annotations are already loaded in coco_dataset
+        self.dataset_store = self.coco_dataset.dataset
+        # rasterized label masks are cached per (annotation file, category map) and shared across runs.
+        # the cache is created on first use - in label_cache_dir (or in label_dir if that is not writable)
+        self.label_cache_dir = self.kwargs.get('label_cache_dir', None) or os.path.join(root, 'labels_cache')
+        self.label_cache_workers = self.kwargs.get('label_cache_workers', None) or min(os.cpu_count() or 1, 8)
+        self.label_cache = None
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def download(self, path, split):
@@ -201,17 +211,7 @@ class COCOSegmentation(DatasetBase):
         img = self.coco_dataset.loadImgs([img_id])[0]
         image_path = os.path.join(self.image_dir, img['file_name'])
         if with_label:
-            os.makedirs(self.label_dir, exist_ok=True)
-            ann_ids = self.coco_dataset.getAnnIds(imgIds=img_id, iscrowd=None)
-            anno = self.coco_dataset.loadAnns(ann_ids)
-            image = PIL.Image.open(image_path)
-            image, anno = self._filter_and_remap_categories(image, anno)
-            image, target = self._convert_polys_to_mask(image, anno)
-            # write the label file to a temorary dir so that it can be used by evaluate()
-            image_basename = os.path.basename(image_path)
-            label_path = os.path.join(self.label_dir, image_basename)
-            label_path = os.path.splitext(label_path)[0] + '.png'
-            cv2.imwrite(label_path, target)
+            label_path = self.get_label_path(idx)
             return image_path, label_path
         else:
             return image_path
@@ -235,6 +235,7 @@ class COCOSegmentation(DatasetBase):
     def evaluate(self, predictions, **kwargs):
         cmatrix = None
         num_frames = min(self.num_frames, len(predictions))
+        self.build_label_cache(num_frames)
         for n in range(num_frames):
             image_file, label_file = self.__getitem__(n, with_label=True)
             label_img = PIL.Image.open(label_file)
@@ -250,6 +251,147 @@ class COCOSegmentation(DatasetBase):
         accuracy = utils.segmentation_accuracy(cmatrix)
         return accuracy
 
+    def get_label_path(self, idx):
+        if self.label_cache is None:
+            self.build_label_cache()
+        #
+        img_id = self.img_ids[idx]
+        label_file = self.label_cache['labels'].get(str(img_id), None)
+        if label_file is None:
+            label_file = _rasterize_label_file(self._get_label_task(img_id))
+            self.label_cache['labels'][str(img_id)] = label_file
+        #
+        return os.path.join(self.label_cache['label_dir'], label_file)
+
+    def build_label_cache(self, num_frames=None):
+        '''
+        rasterize the label masks of the first num_frames frames into the label cache.
+        masks that are already in the cache are reused, the missing ones are created in parallel.
+        '''
+        if self.label_cache is None:
+            self.label_cache = self._load_label_cache()
+        #
+        num_frames = self.num_frames if num_frames is None else min(num_frames, self.num_frames)
+        img_ids = [img_id for img_id in self.img_ids[:num_frames] if str(img_id) not in self.label_cache['labels']]
+        if not img_ids:
+            return self.label_cache
+        #
+        print(utils.log_color('\nINFO', 'creating label masks', f'{len(img_ids)} frames in {self.label_cache["label_dir"]}'))
+        label_tasks = [self._get_label_task(img_id) for img_id in img_ids]
+        num_workers = min(self.label_cache_workers, len(label_tasks))
+        if num_workers > 1 and not multiprocessing.current_process().daemon:
+            with multiprocessing.Pool(num_workers) as pool:
+                label_files = pool.map(_rasterize_label_file, label_tasks, chunksize=16)
+            #
+        else:
+            label_files = [_rasterize_label_file(label_task) for label_task in label_tasks]
+        #
+        self.label_cache['labels'].update({str(img_id): label_file for img_id, label_file in zip(img_ids, label_files)})
+        self._write_label_cache_manifest()
+        return self.label_cache
+
+    def _get_label_cache_key(self):
+        with open(self.annotation_file, 'rb') as afp:
+            annotation_hash = hashlib.sha256(afp.read()).hexdigest()
+        #
+        cache_info = dict(version=LABEL_CACHE_VERSION, annotation_hash=annotation_hash,
+                          categories=list(self.categories))
+        cache_key = hashlib.sha256(json.dumps(cache_info, sort_keys=True).encode()).hexdigest()
+        return cache_key, cache_info
+
+    def _load_label_cache(self):
+        split = self.kwargs['split']
+        cache_key, cache_info = self._get_label_cache_key()
+        label_dir = os.path.join(self.label_cache_dir, f'{split}_{cache_key[:16]}')
+        try:
+            os.makedirs(label_dir, exist_ok=True)
+            is_writable = os.access(label_dir, os.W_OK)
+        except OSError:
+            is_writable = False
+        #
+        if not is_writable:
+            # fallback to a per run folder - the masks are created again in each run
+            label_dir = os.path.join(self.label_dir, f'{split}_{cache_key[:16]}')
+            os.makedirs(label_dir, exist_ok=True)
+        #
+        self._remove_stale_label_caches(os.path.dirname(label_dir), label_dir)
+        labels = {}
+        manifest_file = os.path.join(label_dir, 'manifest.json')
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file) as mfp:
+                    manifest = json.load(mfp)
+                #
+                if manifest.get('cache_key', None) == cache_key:
+                    labels = {img_id: label_file for img_id, label_file in manifest['labels'].items()
+                              if os.path.exists(os.path.join(label_dir, label_file))}
+                #
+            except (OSError, ValueError, KeyError):
+                labels = {}
+            #
+        #
+        return dict(label_dir=label_dir, cache_key=cache_key, cache_info=cache_info, labels=labels)
+
+    def _remove_stale_label_caches(self, label_cache_dir, label_dir):
+        # label caches of the same split created from an older version of the annotation file
+        split = self.kwargs['split']
+        for cache_dir in os.listdir(label_cache_dir):
+            cache_dir = os.path.join(label_cache_dir, cache_dir)
+            manifest_file = os.path.join(cache_dir, 'manifest.json')
+            if cache_dir == label_dir or not os.path.basename(cache_dir).startswith(f'{split}_') or \
+                    not os.path.exists(manifest_file):
+                continue
+            #
+            try:
+                with open(manifest_file) as mfp:
+                    manifest = json.load(mfp)
+                #
+            except (OSError, ValueError):
+                continue
+            #
+            if manifest.get('annotation_file', None) == os.path.abspath(self.annotation_file) and \
+                    manifest.get('cache_info', {}).get('categories', None) == list(self.categories):
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            #
+        #
+
+    def _write_label_cache_manifest(self):
+        # other processes may be using the same cache - merge with what is there and replace atomically
+        label_dir = self.label_cache['label_dir']
+        manifest_file = os.path.join(label_dir, 'manifest.json')
+        labels = {}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file) as mfp:
+                    manifest = json.load(mfp)
+                #
+                if manifest.get('cache_key', None) == self.label_cache['cache_key']:
+                    labels.update(manifest['labels'])
+                #
+            except (OSError, ValueError, KeyError):
+                pass
+            #
+        #
+        labels.update(self.label_cache['labels'])
+        manifest = dict(cache_key=self.label_cache['cache_key'], cache_info=self.label_cache['cache_info'],
+                        annotation_file=os.path.abspath(self.annotation_file), labels=labels)
+        manifest_file_tmp = f'{manifest_file}.{os.getpid()}.tmp'
+        with open(manifest_file_tmp, 'w') as mfp:
+            json.dump(manifest, mfp)
+        #
+        os.replace(manifest_file_tmp, manifest_file)
+
+    def _get_label_task(self, img_id):
+        img = self.coco_dataset.loadImgs([img_id])[0]
+        ann_ids = self.coco_dataset.getAnnIds(imgIds=img_id, iscrowd=None)
+        anno = self.coco_dataset.loadAnns(ann_ids)
+        _, anno = self._filter_and_remap_categories(None, anno)
+        segmentations = [obj["segmentation"] for obj in anno]
+        cats = [obj["category_id"] for obj in anno]
+        label_file = os.path.splitext(img['file_name'])[0] + '.png'
+        label_path = os.path.join(self.label_cache['label_dir'], label_file)
+        return label_path, segmentations, cats, img['height'], img['width']
+
     def get_dataset_info(self):
         if 'dataset_info' in self.kwargs:
             return self.kwargs['dataset_info']
@@ -299,35 +441,55 @@ class COCOSegmentation(DatasetBase):
         w, h = image.size
         segmentations = [obj["segmentation"] for obj in anno]
         cats = [obj["category_id"] for obj in anno]
-        if segmentations:
-            masks = self._convert_poly_to_mask(segmentations, h, w)
-            cats = np.array(cats, dtype=masks.dtype)
-            cats = cats.reshape(-1, 1, 1)
-            # merge all instance masks into a single segmentation map
-            # with its corresponding categories
-            target = (masks * cats).max(axis=0)
-            # discard overlapping instances
-            target[masks.sum(0) > 1] = 255
-        else:
-            target = np.zeros((h, w), dtype=np.uint8)
-        #
+        target = _convert_polys_to_mask(segmentations, cats, h, w)
         return image, target
 
     def _convert_poly_to_mask(self, segmentations, height, width):
-        masks = []
-        for polygons in segmentations:
-            rles = coco_mask.frPyObjects(polygons, height, width)
-            mask = coco_mask.decode(rles)
-            if len(mask.shape) < 3:
-                mask = mask[..., None]
-            mask = mask.any(axis=2)
-            mask = mask.astype(np.uint8)
-            masks.append(mask)
-        if masks:
-            masks = np.stack(masks, axis=0)
-        else:
-            masks = np.zeros((0, height, width), dtype=np.uint8)
-        return masks
+        return _convert_poly_to_mask(segmentations, height, width)
+
+
+# module level functions, so that the label masks can be created in worker processes
+def _convert_polys_to_mask(segmentations, cats, height, width):
+    if segmentations:
+        masks = _convert_poly_to_mask(segmentations, height, width)
+        cats = np.array(cats, dtype=masks.dtype)
+        cats = cats.reshape(-1, 1, 1)
+        # merge all instance masks into a single segmentation map
+        # with its corresponding categories
+        target = (masks * cats).max(axis=0)
+        # discard overlapping instances
+        target[masks.sum(0) > 1] = 255
+    else:
+        target = np.zeros((height, width), dtype=np.uint8)
+    #
+    return target
+
+
+def _convert_poly_to_mask(segmentations, height, width):
+    masks = []
+    for polygons in segmentations:
+        rles = coco_mask.frPyObjects(polygons, height, width)
+        mask = coco_mask.decode(rles)
+        if len(mask.shape) < 3:
+            mask = mask[..., None]
+        mask = mask.any(axis=2)
+        mask = mask.astype(np.uint8)
+        masks.append(mask)
+    if masks:
+        masks = np.stack(masks, axis=0)
+    else:
+        masks = np.zeros((0, height, width), dtype=np.uint8)
+    return masks
+
+
+def _rasterize_label_file(label_task):
+    label_path, segmentations, cats, height, width = label_task
+    target = _convert_polys_to_mask(segmentations, cats, height, width)
+    # write to a temporary file first - the cache may be shared by several processes
+    label_path_tmp = f'{os.path.splitext(label_path)[0]}.{os.getpid()}.tmp.png'
+    cv2.imwrite(label_path_tmp, target)
+    os.replace(label_path_tmp, label_path)
+    return os.path.basename(label_path)
 
 
 if __name__ == '__main__':
@@ -335,7 +497,6 @@ if __name__ == '__main__':
     # python3 -m edgeai_benchmark.datasets.coco_seg
     # to create a converted dataset if you wish to load it using the dataset loader ImageSegmentation() in image_seg.py
     # to load it using CocoSegmentation dataset in this file, this conversion is not required.
-    import shutil
     output_folder = './dependencies/datasets/coco-seg21-converted'
     split = 'val2017'
     coco_seg = COCOSegmentation(path='./dependencies/datasets/coco', split=split)
@@ -346,6 +507,8 @@ if __name__ == '__main__':
     os.makedirs(images_output_folder)
     os.makedirs(labels_output_folder)
 
+    # the label masks are created in parallel (or reused from the label cache) before copying
+    coco_seg.build_label_cache()
     output_filelist = os.path.join(output_folder, f'{split}.txt')
     with open(output_filelist, 'w') as list_fp:
         for n in range(num_frames):
@@ -1,3 +1,4 @@
+import os
 from .. import utils
 
 
@@ -19,3 +20,136 @@ class DatasetBase(utils.ParamsBase):
         #
         color_map = utils.get_color_palette(num_classes)
         return color_map
+
+    def get_dataset_kwargs(self):
+        # the arguments that the dataset was created with
+        return self.kwargs
+
+
+class LazyDataset(DatasetBase):
+    '''
+    handle to a dataset that is created on first use, in the process that uses it.
+    copying or pickling the handle (for example to send it to a pipeline process) transfers only
+    the dataset type and its arguments - not the loaded annotations.
+    dataset_kwargs_loader is an optional (picklable) callable that returns additional, heavy arguments
+    for the dataset (for example an already loaded dataset api object) - it is also called on first use.
+    '''
+    def __init__(self, dataset_type, dataset_kwargs, dataset_kwargs_loader=None):
+        # DatasetBase.__init__ is not called - the params belong to the dataset once it is created
+        object.__setattr__(self, '_lazy_dataset_type', dataset_type)
+        object.__setattr__(self, '_lazy_dataset_kwargs', dataset_kwargs)
+        object.__setattr__(self, '_lazy_dataset_kwargs_loader', dataset_kwargs_loader)
+        object.__setattr__(self, '_lazy_dataset', None)
+
+    @property
+    def __class__(self):
+        # report the type of the actual dataset - class names used in configs and cache keys stay the same
+        return self._lazy_dataset_type
+
+    def __reduce__(self):
+        return LazyDataset, (self._lazy_dataset_type, self._lazy_dataset_kwargs, self._lazy_dataset_kwargs_loader)
+
+    def is_loaded(self):
+        return self._lazy_dataset is not None
+
+    def get_dataset_kwargs(self):
+        # available without loading the dataset
+        return self._lazy_dataset_kwargs
+
+    def get_dataset(self):
+        if self._lazy_dataset is None:
+            dataset_kwargs = dict(self._lazy_dataset_kwargs)
+            if self._lazy_dataset_kwargs_loader is not None:
+                dataset_kwargs.update(self._lazy_dataset_kwargs_loader())
+            #
+            object.__setattr__(self, '_lazy_dataset', self._lazy_dataset_type(**dataset_kwargs))
+        #
+        return self._lazy_dataset
+
+    def __getattr__(self, name):
+        # called only for the attributes that are not in the handle itself
+        # special methods are not forwarded - for example copy.deepcopy() looks up __deepcopy__,
+        # which must not load the dataset. copies then go through __reduce__ and are fresh handles.
+        if name.startswith('_lazy_') or (name.startswith('__') and name.endswith('__')):
+            raise AttributeError(name)
+        #
+        return getattr(self.get_dataset(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get_dataset(), name, value)
+
+    def __getitem__(self, *args, **kwargs):
+        return self.get_dataset().__getitem__(*args, **kwargs)
+
+    def __len__(self):
+        return len(self.get_dataset())
+
+    def __call__(self, *args, **kwargs):
+        return self.get_dataset()(*args, **kwargs)
+
+    # the methods of DatasetBase/ParamsBase must go to the dataset, which may override them
+    def initialize(self):
+        return self.get_dataset().initialize()
+
+    def get_param(self, param_name):
+        return self.get_dataset().get_param(param_name)
+
+    def set_param(self, param_name, value):
+        return self.get_dataset().set_param(param_name, value)
+
+    def peek_param(self, param_name):
+        return self.get_dataset().peek_param(param_name)
+
+    def get_params(self):
+        return self.get_dataset().get_params()
+
+    def peek_params(self):
+        return self.get_dataset().peek_params()
+
+    def get_color_map(self, num_classes=None):
+        return self.get_dataset().get_color_map(num_classes)
+
+
+# bump this if the content of the annotation index files changes
+ANNOTATION_INDEX_VERSION = 1
+
+
+def load_coco(annotation_file):
+    '''
+    load the annotation file with pycocotools - the indexed COCO object is stored in a pickle file
+    next to the annotation file (if that folder is writable), so that it can be loaded quickly the next time.
+    the index is created again if the annotation file changes.
+    '''
+    import pickle
+    from pycocotools.coco import COCO
+    stat = os.stat(annotation_file)
+    index_header = dict(version=ANNOTATION_INDEX_VERSION, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    index_file = os.path.splitext(annotation_file)[0] + '.index.pkl'
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'rb') as ifp:
+                if pickle.load(ifp) == index_header:
+                    return pickle.load(ifp)
+                #
+            #
+        except Exception as e:
+            print(utils.log_color('\nWARNING', 'annotation index could not be loaded', f'{index_file} - {e}'))
+        #
+    #
+    coco_dataset = COCO(annotation_file)
+    if os.access(os.path.dirname(index_file), os.W_OK):
+        index_file_tmp = f'{index_file}.{os.getpid()}.tmp'
+        try:
+            with open(index_file_tmp, 'wb') as ifp:
+                pickle.dump(index_header, ifp, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(coco_dataset, ifp, protocol=pickle.HIGHEST_PROTOCOL)
+            #
+            os.replace(index_file_tmp, index_file)
+        except OSError as e:
+            print(utils.log_color('\nWARNING', 'annotation index could not be written', f'{index_file} - {e}'))
+            if os.path.exists(index_file_tmp):
+                os.remove(index_file_tmp)
+            #
+        #
+    #
+    return coco_dataset
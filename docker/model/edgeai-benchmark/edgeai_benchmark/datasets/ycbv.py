@@ -37,7 +37,6 @@ import numpy as np
 from collections import OrderedDict, defaultdict
 from colorama import Fore
 import cv2
-from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 from plyfile import PlyData
 from sklearn.neighbors import KDTree
@@ -97,7 +96,7 @@ class YCBV(DatasetBase):
         assert self.kwargs['split'] in image_split_dirs, f'invalid path to coco dataset images/split {kwargs["split"]}'
         self.image_dir = os.path.join(self.kwargs['path'], self.kwargs['split'])
         self.annotation_file = os.path.join(annotations_dir, 'instances_{}.json'.format(split))
-        self.coco_dataset = COCO(self.annotation_file)
+        self.coco_dataset = load_coco(self.annotation_file)
         max_frames = len(self.coco_dataset.imgs)
         num_frames = self.kwargs.get('num_frames', None)
         num_frames = min(num_frames, max_frames) if num_frames is not None else max_frames
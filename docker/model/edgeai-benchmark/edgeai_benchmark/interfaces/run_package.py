@@ -34,10 +34,19 @@ import tarfile
 import yaml
 import glob
 import re
+import functools
+import multiprocessing
 
 from .. import utils
 
 
+# compression of the package tarfile: extension, default level and the command to extract it
+PACKAGE_COMPRESSION_DICT = {
+    'gz': {'extension': '.tar.gz', 'level': 9, 'extract': 'tar --one-top-level -zxvf'},
+    'zst': {'extension': '.tar.zst', 'level': 3, 'extract': 'tar --one-top-level --zstd -xvf'},
+}
+
+
 def run_package(settings, work_dir, out_dir, include_results=False, custom_model=False, param_template=None):
     # now write out the package
     package_artifacts(settings, work_dir, out_dir, include_results=include_results, custom_model=custom_model,
@@ -50,8 +59,66 @@ def match_string(patterns, filename):
     return got_match
 
 
+def write_tarfile(tarfile_name, input_files, arc_names, compression='gz', compression_level=None):
+    # the files are streamed into the tarfile - written to a temporary file and renamed at the end,
+    # so that an interrupted packaging does not leave a tarfile that looks up to date
+    compression_level = compression_level or PACKAGE_COMPRESSION_DICT[compression]['level']
+    temp_tarfile_name = tarfile_name + '.tmp'
+    if compression == 'zst':
+        # move the import inside the function, so that zstandard needs to be installed
+        # only if some one wants to use it
+        import zstandard
+        with open(temp_tarfile_name, 'wb') as fp:
+            with zstandard.ZstdCompressor(level=compression_level).stream_writer(fp) as zfp:
+                with tarfile.open(fileobj=zfp, mode='w|') as tfp:
+                    for inpf, arcname in zip(input_files, arc_names):
+                        tfp.add(inpf, arcname=arcname)
+                    #
+                #
+            #
+        #
+    elif compression == 'gz':
+        with tarfile.open(temp_tarfile_name, 'w:gz', compresslevel=compression_level) as tfp:
+            for inpf, arcname in zip(input_files, arc_names):
+                tfp.add(inpf, arcname=arcname)
+            #
+        #
+    else:
+        assert False, f'unsupported package_compression: {compression}, must be one of {list(PACKAGE_COMPRESSION_DICT.keys())}'
+    #
+    os.replace(temp_tarfile_name, tarfile_name)
+
+
+def get_tarfile_stamp_name(tarfile_name):
+    # the packaging options that the tarfile was written with are stored next to it
+    return tarfile_name + '.stamp.yaml'
+
+
+def write_tarfile_stamp(tarfile_name, package_options):
+    with open(get_tarfile_stamp_name(tarfile_name), 'w') as fp:
+        yaml.safe_dump(package_options, fp)
+    #
+
+
+def is_tarfile_uptodate(tarfile_name, input_files, package_options):
+    # the tarfile is newer than all the files (and folders) that go into it
+    # and it was written with the same packaging options
+    tarfile_stamp_name = get_tarfile_stamp_name(tarfile_name)
+    if not (os.path.exists(tarfile_name) and os.path.exists(tarfile_stamp_name)):
+        return False
+    #
+    with open(tarfile_stamp_name) as fp:
+        if yaml.safe_load(fp) != package_options:
+            return False
+        #
+    #
+    tarfile_mtime = os.path.getmtime(tarfile_name)
+    return all(os.path.getmtime(f) <= tarfile_mtime for f in input_files)
+
+
 def package_artifact(pipeline_param, work_dir, out_dir, make_package_tar=True, make_package_dir=False,
-                     include_results=False, param_template=None):
+                     include_results=False, param_template=None, compression='gz', compression_level=None,
+                     incremental=True):
     input_files = []
     packaged_files = []
 
@@ -110,8 +177,18 @@ def package_artifact(pipeline_param, work_dir, out_dir, make_package_tar=True, m
     if 'result' in pipeline_param:
         del pipeline_param['result']
     #
-    with open(param_file, 'w') as pfp:
-        yaml.safe_dump(pipeline_param, pfp)
+    # re-write only if it changed - so that an unchanged run_dir does not look newer than its package
+    param_str = yaml.safe_dump(pipeline_param)
+    param_changed = True
+    if os.path.exists(param_file):
+        with open(param_file) as fp:
+            param_changed = (fp.read() != param_str)
+        #
+    #
+    if param_changed:
+        with open(param_file, 'w') as pfp:
+            pfp.write(param_str)
+        #
     #
 
     # copy model files
@@ -189,13 +266,20 @@ def package_artifact(pipeline_param, work_dir, out_dir, make_package_tar=True, m
 
     tarfile_size = 0
     if make_package_tar:
-        tarfile_name = package_run_dir + '.tar.gz'
-        tfp = tarfile.open(tarfile_name, 'w:gz')
-        for inpf, pf in zip(input_files, packaged_files):
-            outpf = pf.replace(package_run_dir, '')
-            tfp.add(inpf, arcname=outpf)
+        tarfile_name = package_run_dir + PACKAGE_COMPRESSION_DICT[compression]['extension']
+        # the folders are also checked, as adding or removing files changes their mtime
+        input_folders = [run_dir, model_folder, artifacts_folder, artifacts_folder_tempdir]
+        input_folders = [d for d in input_folders if os.path.isdir(d)]
+        arc_names = [pf.replace(package_run_dir, '') for pf in packaged_files]
+        package_options = {'include_results': include_results, 'param_template': param_template,
+                           'compression_level': compression_level or PACKAGE_COMPRESSION_DICT[compression]['level'],
+                           'arc_names': arc_names}
+        if incremental and is_tarfile_uptodate(tarfile_name, input_files + input_folders, package_options):
+            print(utils.log_color('INFO', 'package is up to date', tarfile_name))
+        else:
+            write_tarfile(tarfile_name, input_files, arc_names, compression, compression_level)
+            write_tarfile_stamp(tarfile_name, package_options)
         #
-        tfp.close()
         tarfile_size = os.path.getsize(tarfile_name)
     else:
         package_run_dir = None
@@ -203,60 +287,85 @@ def package_artifact(pipeline_param, work_dir, out_dir, make_package_tar=True, m
     return package_run_dir, tarfile_size
 
 
+def package_model(run_dir, work_dir, out_dir, include_results=False, custom_model=False, param_template=None,
+                    compression='gz', compression_level=None, incremental=True):
+    # package one run_dir - returns the artifact_id and its entry in artifacts.yaml
+    try:
+        param_yaml = os.path.join(run_dir, 'param.yaml')
+        result_yaml = os.path.join(run_dir, 'result.yaml')
+        read_yaml = result_yaml if os.path.exists(result_yaml) else param_yaml
+        with open(read_yaml) as fp:
+            pipeline_param = yaml.safe_load(fp)
+        #
+        package_run_dir, tarfile_size = package_artifact(pipeline_param, work_dir, out_dir,
+                            include_results=include_results, param_template=param_template,
+                            compression=compression, compression_level=compression_level, incremental=incremental)
+        if package_run_dir is not None:
+            task_type = pipeline_param['task_type']
+            package_run_dir = os.path.basename(package_run_dir)
+            model_path = pipeline_param['session']['model_path']
+            model_path = model_path[0] if isinstance(model_path, (list,tuple)) else model_path
+
+            run_dir = pipeline_param['session']['run_dir']
+            run_dir_basename = os.path.basename(run_dir)
+            run_dir_splits = run_dir_basename.split('_')
+            artifact_id = '_'.join(run_dir_splits[:2]) if not custom_model else None
+            runtime_name = pipeline_param['session']['session_name']
+            model_name = utils.get_artifact_name(artifact_id) if not custom_model else None
+            model_name = model_name or run_dir_basename
+
+            # artifacts generated using scripts/benchmark_resolution.py will not produce good accuracy
+            # that is only for performance test
+            suffix_highres = artifact_id.split('_')[0] if not custom_model else ''
+            is_highres = suffix_highres.endswith('1') or suffix_highres.endswith('2')
+            is_shortlisted = utils.is_shortlisted_model(artifact_id) and (not is_highres) if not custom_model else True
+            is_recommended = utils.is_recommended_model(artifact_id) if not custom_model else True
+
+            artifacts_dict = {'task_type': task_type, 'session_name': runtime_name,
+                              'run_dir': package_run_dir, 'model_name': model_name,
+                              'size': tarfile_size,
+                              'shortlisted': is_shortlisted,
+                              'recommended': is_recommended}
+            print(utils.log_color('SUCCESS', 'finished packaging', run_dir))
+            sys.stdout.flush()
+            return artifact_id, artifacts_dict
+        else:
+            print(utils.log_color('WARNING', 'could not package', run_dir))
+        #
+    except:
+        print(utils.log_color('WARNING', 'could not package', run_dir))
+    #
+    sys.stdout.flush()
+    return None
+
+
 def package_artifacts(settings, work_dir, out_dir, include_results=False, custom_model=False, param_template=None):
     print(f'INFO: packaging artifacts to {out_dir} please wait...')
     run_dirs = glob.glob(f'{work_dir}/*')
     run_dirs = sorted(run_dirs)
+    run_dirs = [run_dir for run_dir in run_dirs if os.path.isdir(run_dir)]
 
-    packaged_artifacts_dict = {}
-    for run_dir in run_dirs:
-        if not os.path.isdir(run_dir):
-            continue
+    compression = settings.package_compression
+    package_func = functools.partial(package_model, work_dir=work_dir, out_dir=out_dir,
+        include_results=include_results, custom_model=custom_model, param_template=param_template,
+        compression=compression, compression_level=settings.package_compression_level,
+        incremental=settings.run_incremental)
+
+    # the models are packaged independently - in parallel if parallel_processes is set
+    parallel_processes = min(settings.parallel_processes or 1, max(len(run_dirs), 1))
+    if parallel_processes > 1:
+        with multiprocessing.Pool(parallel_processes) as pool:
+            packaged_entries = pool.map(package_func, run_dirs, chunksize=1)
         #
-        try:
-            param_yaml = os.path.join(run_dir, 'param.yaml')
-            result_yaml = os.path.join(run_dir, 'result.yaml')
-            read_yaml = result_yaml if os.path.exists(result_yaml) else param_yaml
-            with open(read_yaml) as fp:
-                pipeline_param = yaml.safe_load(fp)
-            #
-            package_run_dir, tarfile_size = package_artifact(pipeline_param, work_dir, out_dir,
-                                include_results=include_results, param_template=param_template)
-            if package_run_dir is not None:
-                task_type = pipeline_param['task_type']
-                package_run_dir = os.path.basename(package_run_dir)
-                model_path = pipeline_param['session']['model_path']
-                model_path = model_path[0] if isinstance(model_path, (list,tuple)) else model_path
-
-                run_dir = pipeline_param['session']['run_dir']
-                run_dir_basename = os.path.basename(run_dir)
-                run_dir_splits = run_dir_basename.split('_')
-                artifact_id = '_'.join(run_dir_splits[:2]) if not custom_model else None
-                runtime_name = pipeline_param['session']['session_name']
-                model_name = utils.get_artifact_name(artifact_id) if not custom_model else None
-                model_name = model_name or run_dir_basename
-
-                # artifacts generated using scripts/benchmark_resolution.py will not produce good accuracy
-                # that is only for performance test
-                suffix_highres = artifact_id.split('_')[0] if not custom_model else ''
-                is_highres = suffix_highres.endswith('1') or suffix_highres.endswith('2')
-                is_shortlisted = utils.is_shortlisted_model(artifact_id) and (not is_highres) if not custom_model else True
-                is_recommended = utils.is_recommended_model(artifact_id) if not custom_model else True
-
-                artifacts_dict = {'task_type': task_type, 'session_name': runtime_name,
-                                  'run_dir': package_run_dir, 'model_name': model_name,
-                                  'size': tarfile_size,
-                                  'shortlisted': is_shortlisted,
-                                  'recommended': is_recommended}
-                packaged_artifacts_dict.update({artifact_id:artifacts_dict})
-                print(utils.log_color('SUCCESS', 'finished packaging', run_dir))
-            else:
-                print(utils.log_color('WARNING', 'could not package', run_dir))
-            #
-        except:
-            print(utils.log_color('WARNING', 'could not package', run_dir))
+    else:
+        packaged_entries = [package_func(run_dir) for run_dir in run_dirs]
+    #
+    packaged_artifacts_dict = {}
+    for packaged_entry in packaged_entries:
+        if packaged_entry is not None:
+            artifact_id, artifacts_dict = packaged_entry
+            packaged_artifacts_dict.update({artifact_id:artifacts_dict})
         #
-        sys.stdout.flush()
     #
     if include_results:
         results_yaml = os.path.join(work_dir, 'results.yaml')
@@ -281,8 +390,10 @@ def package_artifacts(settings, work_dir, out_dir, include_results=False, custom
         fp.write('\n'.join(packaged_artifacts_list))
     #
     with open(os.path.join(out_dir, 'extract.sh'), 'w') as fp:
-        # Note: append '-exec rm -f "{}" \;' to delete the original .tar.gz files
-        fp.write('find . -name "*.tar.gz" -exec tar --one-top-level -zxvf "{}" \;')
+        # Note: append '-exec rm -f "{}" \;' to delete the original tar files
+        extension = PACKAGE_COMPRESSION_DICT[compression]['extension']
+        extract_cmd = PACKAGE_COMPRESSION_DICT[compression]['extract']
+        fp.write(f'find . -name "*{extension}" -exec {extract_cmd} "{{}}" \\;')
     #
 
 
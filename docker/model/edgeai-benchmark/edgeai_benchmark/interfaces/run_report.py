@@ -28,7 +28,8 @@
 
 import os
 import datetime
-import yaml
+import sqlite3
+import pickle
 import glob
 
 from .. import utils
@@ -40,31 +41,37 @@ def get_run_dirs(work_dir):
     return run_dirs
 
 
-def run_rewrite_results(work_dir, results_yaml):
+def load_results(work_dir, parallel_processes=None):
+    '''
+    returns the results of all the run_dirs in work_dir and the results index file (None if it could not be used)
+    '''
     run_dirs = get_run_dirs(work_dir)
-    results = {}
-    for run_dir in run_dirs:
-        result_yaml = os.path.join(run_dir, 'result.yaml')
-        config_yaml = os.path.join(run_dir, 'config.yaml')
-        result_or_config_yaml = None
-        if os.path.exists(result_yaml):
-            result_or_config_yaml = result_yaml
-        elif os.path.exists(config_yaml):
-            result_or_config_yaml = config_yaml
+    try:
+        # the results index is updated as each pipeline finishes - only the run_dirs that changed outside of it are parsed
+        with utils.ResultsIndex(work_dir) as results_index:
+            results = results_index.load_results(run_dirs, parallel_processes=parallel_processes)
+            index_file = results_index.index_file
         #
-        if result_or_config_yaml:
-            with open(result_or_config_yaml) as fp:
-                result = yaml.safe_load(fp)
-                model_id = result['session']['model_id']
-                session_name = result['session']['session_name']
-                artifact_id = f'{model_id}_{session_name}'
-                results[artifact_id] = result
-            #
+    except (sqlite3.Error, OSError, pickle.UnpicklingError, EOFError) as e:
+        print(f'WARNING: results index could not be used, reading the yaml files: {e}')
+        index_file = None
+        results = {}
+        for run_dir, _, _, _, result in utils.load_run_results(run_dirs, parallel_processes=parallel_processes):
+            model_id = result['session']['model_id']
+            session_name = result['session']['session_name']
+            artifact_id = f'{model_id}_{session_name}'
+            results[artifact_id] = result
         #
     #
-    results = utils.sorted_dict(results)
-    with open(results_yaml, 'w') as rfp:
-        yaml.safe_dump(results, rfp)
+    return utils.sorted_dict(results), index_file
+
+
+def run_rewrite_results(work_dir, results_yaml, parallel_processes=None):
+    results, index_file = load_results(work_dir, parallel_processes=parallel_processes)
+    # results.yaml is up to date if it was written after the last change to the results index
+    if index_file is None or not os.path.exists(results_yaml) or \
+            os.path.getmtime(results_yaml) <= os.path.getmtime(index_file):
+        utils.dump_yaml(results, results_yaml)
     #
     return results
 
@@ -101,22 +108,23 @@ def run_report(settings, rewrite_results=True, skip_pattern=None):
     for work_id, work_dir in enumerate(work_dirs):
         results_yaml = os.path.join(work_dir, 'results.yaml')
         # generate results.yaml, aggregating results from all the artifacts across all work_dirs.
+        results = None
         if rewrite_results:
-            run_rewrite_results(work_dir, results_yaml)
+            results = run_rewrite_results(work_dir, results_yaml, parallel_processes=settings.parallel_processes)
         #
         work_dir_splits = os.path.normpath(work_dir).split(os.sep)
         run_dirs = get_run_dirs(work_dir)
         work_dir_key = '_'.join(work_dir_splits[-2:])
         if skip_pattern is None or skip_pattern not in work_dir_key:
-            with open(results_yaml) as rfp:
-                results = yaml.safe_load(rfp)
-                results_collection[work_dir_key] = results
-                if len(run_dirs) > work_dir_results_max_len:
-                    work_dir_results_max_len = len(run_dirs)
-                    work_dir_results_max_id = work_id
-                    work_dir_results_max_name = work_dir_key
-                    work_dir_results_max_path = work_dir
-                #
+            if results is None:
+                results = utils.load_yaml(results_yaml)
+            #
+            results_collection[work_dir_key] = results
+            if len(run_dirs) > work_dir_results_max_len:
+                work_dir_results_max_len = len(run_dirs)
+                work_dir_results_max_id = work_id
+                work_dir_results_max_name = work_dir_key
+                work_dir_results_max_path = work_dir
             #
             work_dir_keys.append(work_dir_key)
         #
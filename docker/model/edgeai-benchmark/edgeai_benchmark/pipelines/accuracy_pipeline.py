@@ -38,6 +38,14 @@ from .. import utils, constants
 from .base_pipeline import BasePipeline
 
 
+# the dataset kwargs that identify the calibration data in the artifacts cache key
+CALIBRATION_DATASET_KEYS = ('path', 'split', 'num_frames', 'name')
+
+# session stats that are counted per inference shard - they are summed (or averaged over the frames) across the shards
+SHARD_STATS_SUM_KEYS = ('num_buffer_realloc',)
+SHARD_STATS_MEAN_KEYS = ('alloc_saved_bytes_per_frame',)
+
+
 class AccuracyPipeline(BasePipeline):
     def __init__(self, settings, pipeline_config):
         super().__init__(settings, pipeline_config)
@@ -63,6 +71,9 @@ class AccuracyPipeline(BasePipeline):
                     yaml.safe_dump(param_result, fp, sort_keys=False)
                 #
             #
+            if self.settings.write_results:
+                utils.update_results_index(self.run_dir, param_result)
+            #
             print(utils.log_color('\nSUCCESS', 'found results', f'{result_dict}\n'))
             return param_result
         #
@@ -74,6 +85,10 @@ class AccuracyPipeline(BasePipeline):
 
         # now actually run the import and inference
         param_result = self._run(description=description)
+        # record it in the results index of the work_dir - used by run_report
+        if self.settings.write_results:
+            utils.update_results_index(self.run_dir, param_result)
+        #
 
         result_dict = param_result.get('result', {})
         self.write_log(utils.log_color('\n\nSUCCESS', 'benchmark results', f'{result_dict}\n'))
@@ -104,11 +119,19 @@ class AccuracyPipeline(BasePipeline):
 
             start_time = time.time()
             self.write_log(utils.log_color('\nINFO', f'import {description}', self.run_dir_base + ' - this may take some time...'))
-            # import stats
-            if self.pipeline_config['task_type'] != 'bev_detection':
-                self._import_model(description)
+            # the same model compiled with the same options and calibration may be available in the artifacts cache
+            artifacts_cache_key = self.session.get_artifacts_cache_key(self._get_calibration_config())
+            if self.session.load_cached_artifacts(artifacts_cache_key):
+                self.write_log(utils.log_color('\nINFO', f'import skipped {description}', f'{self.run_dir_base} - using cached artifacts {artifacts_cache_key}'))
             else:
-                self._import_bev_model(description)
+                # import stats
+                if self.pipeline_config['task_type'] != 'bev_detection':
+                    self._import_model(description)
+                else:
+                    self._import_bev_model(description)
+                #
+                self.session.store_cached_artifacts(artifacts_cache_key)
+            #
             elapsed_time = time.time() - start_time
             self.write_log(utils.log_color('\nINFO', f'import completed {description}', f'{self.run_dir_base} - {elapsed_time:.0f} sec'))
 
@@ -154,6 +177,104 @@ class AccuracyPipeline(BasePipeline):
         #
         return param_result
 
+    def _get_calibration_config(self):
+        # identity of the data seen by the import - the artifacts depend on it
+        calibration_dataset = self.pipeline_config.get('calibration_dataset', None)
+        # only the arguments that identify the data - without loading the dataset or walking through it
+        dataset_kwargs = calibration_dataset.get_dataset_kwargs() \
+            if hasattr(calibration_dataset, 'get_dataset_kwargs') else {}
+        dataset_config = {key: utils.pretty_object(dataset_kwargs.get(key, None)) for key in CALIBRATION_DATASET_KEYS}
+        preprocess = self.pipeline_config.get('preprocess', None)
+        preprocess_config = getattr(preprocess, 'transforms', preprocess)
+        calibration_config = {
+            'dataset_name': calibration_dataset.__class__.__name__,
+            'dataset': dataset_config,
+            'preprocess': utils.pretty_object(preprocess_config),
+            'task_name': self.pipeline_config.get('task_name', None),
+        }
+        if self.settings.calibration_selection:
+            # the frames that are used for calibration depend on it
+            calibration_config['calibration_selection'] = self.settings.calibration_selection
+        #
+        return calibration_config
+
+    def _get_calibration_cache(self):
+        # input features and float activation ranges of all the frames in the calibration dataset.
+        # these depend only on the model and the calibration data - so they are computed once
+        # and stored in calibration_cache_dir (if it is set) for the other variants of the model.
+        session = self.pipeline_config['session']
+        calibration_dataset = self.pipeline_config['calibration_dataset']
+        preprocess = self.pipeline_config['preprocess']
+        cache_file = None
+        if self.settings.calibration_cache_dir:
+            calibration_config = self._get_calibration_config()
+            calibration_config.pop('calibration_selection', None)
+            cache_key = session.get_calibration_cache_key(calibration_config)
+            cache_file = os.path.join(self.settings.calibration_cache_dir, f'{cache_key}.pkl')
+            calibration_cache = utils.load_calibration_cache(cache_file)
+            if calibration_cache is not None:
+                self.write_log(utils.log_color('\nINFO', 'calibration cache', f'{self.run_dir_base} - using {cache_file}'))
+                return calibration_cache
+            #
+        #
+        input_features = []
+        def _get_calibration_inputs():
+            input_features.clear()
+            for data_index in range(len(calibration_dataset)):
+                info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
+                input_data, info_dict = preprocess(calibration_dataset[data_index], info_dict)
+                input_features.append(utils.get_input_feature(input_data))
+                yield input_data
+            #
+        #
+        try:
+            activation_ranges = session.get_activation_ranges(_get_calibration_inputs())
+        except Exception as e:
+            self.write_log(utils.log_color('\nWARNING', 'calibration cache', f'{self.run_dir_base} - float activation ranges could not be computed: {e}'))
+            activation_ranges = None
+        #
+        if len(input_features) != len(calibration_dataset):
+            # the activation ranges are not supported for this session (or failed) - only the input features
+            for _ in _get_calibration_inputs():
+                pass
+            #
+        #
+        calibration_cache = dict(input_features=np.array(input_features), activation_ranges=activation_ranges)
+        if cache_file is not None:
+            utils.save_calibration_cache(cache_file, calibration_cache)
+        #
+        return calibration_cache
+
+    def _get_calibration_indices(self, calibration_frames):
+        # indices of the frames of the calibration dataset to be used for calibration
+        calibration_selection = self.settings.calibration_selection
+        assert calibration_selection in utils.CALIBRATION_SELECTION_TYPES, \
+            f'invalid calibration_selection: {calibration_selection} - must be one of {utils.CALIBRATION_SELECTION_TYPES}'
+        if not calibration_selection and not self.settings.calibration_cache_dir:
+            return list(range(calibration_frames))
+        #
+        calibration_cache = self._get_calibration_cache()
+        activation_ranges = calibration_cache['activation_ranges']
+        if calibration_selection == 'diversity':
+            if activation_ranges is not None:
+                features = utils.get_activation_feature(activation_ranges['frame_min'], activation_ranges['frame_max'])
+            else:
+                features = calibration_cache['input_features']
+            #
+            calibration_indices = utils.select_diverse_indices(features, calibration_frames)
+            self.write_log(utils.log_color('\nINFO', 'calibration frames', f'{self.run_dir_base} - {calibration_indices}'))
+        else:
+            calibration_indices = list(range(calibration_frames))
+        #
+        if activation_ranges is not None and self.settings.write_results:
+            # float activation ranges seen by the calibration - useful to find the layers that need 16bit
+            activation_stats = utils.get_activation_stats(activation_ranges, calibration_indices)
+            with open(os.path.join(self.run_dir, 'activation_stats.yaml'), 'w') as fp:
+                yaml.safe_dump(activation_stats, fp, sort_keys=False)
+            #
+        #
+        return calibration_indices
+
     def _import_model(self, description=''):
         session = self.pipeline_config['session']
         calibration_dataset = self.pipeline_config['calibration_dataset']
@@ -167,10 +288,12 @@ class AccuracyPipeline(BasePipeline):
                                                  f'should be >= calibration_frames ({calibration_frames})')
         run_dir_base = os.path.split(session.get_param('run_dir'))[-1]
 
+        calibration_indices = self._get_calibration_indices(calibration_frames)
+
         is_ok = session.start_import()
         assert is_ok, utils.log_color('\nERROR', f'start_import() did not succeed for:', run_dir_base)
 
-        for data_index in range(calibration_frames):
+        for data_index in calibration_indices:
             info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
             input_data = calibration_dataset[data_index]
             input_data, info_dict = preprocess(input_data, info_dict)
@@ -185,76 +308,48 @@ class AccuracyPipeline(BasePipeline):
         session = self.pipeline_config['session']
         input_dataset = self.pipeline_config['input_dataset']
         assert input_dataset is not None, f'got input_dataset={input_dataset}. please check settings.dataset_loading'
-        preprocess = self.pipeline_config['preprocess']
-        postprocess = self.pipeline_config['postprocess']
         run_dir_base = os.path.split(session.get_param('run_dir'))[-1]
         num_frames = self.pipeline_config.get('num_frames', self.settings.num_frames)
         num_frames = min(len(input_dataset), num_frames) if num_frames else len(input_dataset)
 
-        is_ok = session.start_inference()
-        assert is_ok, utils.log_color('\nERROR', f'start_infer() did not succeed for:', run_dir_base)
-
-        if self.settings.target_machine == constants.TARGET_MACHINE_EVM:
-            invoke_time = 0.0
-            core_time = 0.0
-            subgraph_time = 0.0
-            ddr_transfer = 0.0
-            num_frames_ddr = 0
-        #
-
-        output_list = []
         pbar_desc = f'infer {description}: {run_dir_base}'
-        for data_index in utils.progress_step(range(num_frames), desc=pbar_desc, position=0):
-            info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
-            data = input_dataset[data_index]
-            data, info_dict = preprocess(data, info_dict)
-            output, info_dict = session.run_inference(data, info_dict)
-
-            stats_dict = session.infer_stats()
-            if self.settings.target_machine == constants.TARGET_MACHINE_EVM:
-                invoke_time += info_dict['session_invoke_time']
-                core_time += stats_dict['core_time']
-                subgraph_time += stats_dict['subgraph_time']
-                if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                    ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                    num_frames_ddr += 1
-               #
-           #
-            if self.settings.flip_test:
-                outputs_flip, info_dict = session.run_inference(info_dict['flip_img'], info_dict)
-                info_dict['outputs_flip'] = outputs_flip
-
-                stats_dict = session.infer_stats()
-                if self.settings.target_machine == constants.TARGET_MACHINE_EVM:
-                    invoke_time += info_dict['session_invoke_time']
-                    core_time += stats_dict['core_time']
-                    subgraph_time += stats_dict['subgraph_time']
-                    if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                        ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                        num_frames_ddr += 1
-                    #
-                #
-            else:
-                info_dict['outputs_flip'] = None
-            #
+        inference_shards = self._get_inference_shards(num_frames)
+        if inference_shards > 1:
+            output_list, infer_stats, stats_dict = self._infer_frames_sharded(num_frames, inference_shards, pbar_desc)
+        else:
+            output_list, infer_stats, stats_dict, _ = _infer_frame_range(self.settings, self.pipeline_config,
+                self.dataset_info, 0, num_frames, pbar_desc, self._get_infer_stats_collector())
+        #
+        self._set_infer_stats_dict(infer_stats, stats_dict)
+        return output_list
 
-            # needed in postprocess to understand the detection threshold set
-            info_dict['runtime_options'] = session.kwargs['runtime_options']
+    def _get_infer_stats_collector(self):
+        # the per frame performance stats are available only on evm - can be turned off with infer_stats_interval
+        infer_stats_interval = self.settings.infer_stats_interval \
+            if self.settings.target_machine == constants.TARGET_MACHINE_EVM else 0
+        return utils.InferStatsCollector(interval=infer_stats_interval)
 
-            output, info_dict = postprocess(output, info_dict)
-            output_list.append(output)
-        #
+    def _set_infer_stats_dict(self, infer_stats, stats_dict):
         # compute and populate final stats so that it can be used in result
         self.infer_stats_dict = {
             'num_subgraphs': stats_dict['num_subgraphs'],
         }
         if self.settings.target_machine == constants.TARGET_MACHINE_EVM:
-            self.infer_stats_dict.update({
-                'infer_time_invoke_ms': invoke_time * constants.MILLI_CONST / num_frames,
-                'infer_time_core_ms': core_time * constants.MILLI_CONST / num_frames,
-                'infer_time_subgraph_ms': subgraph_time * constants.MILLI_CONST / num_frames,
-                'ddr_transfer_mb': (ddr_transfer / num_frames_ddr / constants.MEGA_CONST) if num_frames_ddr > 0 else 0
-            })
+            # mean of the sampled frames, as well as the percentiles
+            infer_stats_keys = {'invoke_time': ('infer_time_invoke_ms', constants.MILLI_CONST),
+                                'core_time': ('infer_time_core_ms', constants.MILLI_CONST),
+                                'subgraph_time': ('infer_time_subgraph_ms', constants.MILLI_CONST),
+                                'ddr_transfer': ('ddr_transfer_mb', 1.0/constants.MEGA_CONST)}
+            for stats_name, stats_values in infer_stats.get_stats().items():
+                result_key, result_scale = infer_stats_keys[stats_name]
+                for value_name, value in stats_values.items():
+                    value_key = result_key if value_name == 'mean' else f'{result_key}_{value_name}'
+                    self.infer_stats_dict[value_key] = value * result_scale
+                #
+            #
+            if infer_stats.interval > 0:
+                self.infer_stats_dict.setdefault('ddr_transfer_mb', 0)
+            #
         #
         if 'perfsim_time' in stats_dict:
             self.infer_stats_dict.update({'perfsim_time_ms': stats_dict['perfsim_time'] * constants.MILLI_CONST})
@@ -265,9 +360,79 @@ class AccuracyPipeline(BasePipeline):
         if 'perfsim_macs' in stats_dict:
             self.infer_stats_dict.update({'perfsim_gmacs': stats_dict['perfsim_macs'] / constants.GIGA_CONST})
         #
-        # close the interpreter
-        session.close_interpreter()
-        return output_list
+        if 'alloc_saved_bytes_per_frame' in stats_dict:
+            self.infer_stats_dict.update({'alloc_saved_mb_per_frame': stats_dict['alloc_saved_bytes_per_frame'] / constants.MEGA_CONST,
+                                          'num_buffer_realloc': stats_dict['num_buffer_realloc']})
+        #
+
+    def _get_inference_shards(self, num_frames):
+        # sharding is for pc emulation - on evm, the processes would only compete for the same accelerator
+        inference_shards = self.settings.inference_shards or 1
+        if inference_shards <= 1 or self.settings.target_machine != constants.TARGET_MACHINE_PC_EMULATION:
+            return 1
+        #
+        # a session that still holds its interpreter (eg. import in the same process, without force_gc) cannot be sent
+        if self.pipeline_config['session'].interpreter is not None:
+            return 1
+        #
+        # each shard should get enough frames to be worth creating the session again
+        inference_shards = min(inference_shards, num_frames // self.settings.inference_shard_min_frames)
+        # and the shards should only use the cores that the other pipelines are not using
+        return max(min(inference_shards, self._get_free_cores()), 1)
+
+    def _get_free_cores(self):
+        # cores for this pipeline: its share while all the parallel pipelines are running,
+        # more in the long tail of the run, when fewer pipelines are running and the other cores are idle
+        cpu_count = os.cpu_count() or 1
+        parallel_processes = self.settings.parallel_processes or 1
+        free_cores = cpu_count // parallel_processes
+        if hasattr(os, 'getloadavg'):
+            # the load includes this pipeline, whose core is used by the shards while it waits for them
+            free_cores = max(free_cores, cpu_count - int(np.ceil(os.getloadavg()[0])) + 1)
+        #
+        return free_cores
+
+    def _infer_frames_sharded(self, num_frames, inference_shards, pbar_desc):
+        # each shard runs in its own process, with its own session on the same artifacts.
+        # the datasets in the pipeline_config are sent as lightweight handles and are loaded in those processes.
+        shard_bounds = np.linspace(0, num_frames, inference_shards+1).round().astype(int)
+        # only what the inference needs is sent to the shards
+        shard_config = {k:v for k, v in self.pipeline_config.items() if k in ('session', 'input_dataset', 'preprocess', 'postprocess')}
+        if isinstance(self.pipeline_config.get('metric', None), dict):
+            shard_config['metric'] = self.pipeline_config['metric']
+        #
+        shard_args = [(self.settings, shard_config, self.dataset_info, int(shard_start), int(shard_end),
+                       f'{pbar_desc} [{shard_index+1}/{inference_shards}]', self._get_infer_stats_collector(), shard_index)
+                      for shard_index, (shard_start, shard_end) in enumerate(zip(shard_bounds[:-1], shard_bounds[1:]))]
+        self.write_log(utils.log_color('\nINFO', 'infer shards', f'{self.run_dir_base} - {num_frames} frames in {inference_shards} processes'))
+        with utils.mp_context.Pool(inference_shards) as pool:
+            shard_results = pool.starmap(_infer_frame_range, shard_args, chunksize=1)
+        #
+        # outputs are in the order of the frames, as starmap returns the results in the order of the shards
+        output_list = []
+        infer_stats = self._get_infer_stats_collector()
+        for shard_output_list, shard_infer_stats, _, _ in shard_results:
+            output_list.extend(shard_output_list)
+            infer_stats.merge(shard_infer_stats)
+        #
+        # the stats of the model are the same in all the shards, the counters of the frames are combined
+        stats_dict = dict(shard_results[0][2])
+        shard_num_frames = np.diff(shard_bounds)
+        shard_stats_dicts = [shard_result[2] for shard_result in shard_results]
+        for stats_key in SHARD_STATS_SUM_KEYS:
+            if stats_key in stats_dict:
+                stats_dict[stats_key] = sum(shard_stats[stats_key] for shard_stats in shard_stats_dicts)
+            #
+        #
+        for stats_key in SHARD_STATS_MEAN_KEYS:
+            if stats_key in stats_dict:
+                stats_dict[stats_key] = sum(shard_stats[stats_key] * shard_frames for shard_stats, shard_frames in
+                    zip(shard_stats_dicts, shard_num_frames)) / num_frames
+            #
+        #
+        # the session in this process did not run - take the details that inference populates (input/output details etc.)
+        self.pipeline_config['session'].kwargs.update(shard_results[0][3])
+        return output_list, infer_stats, stats_dict
 
     def _import_bev_model(self, description=''):
         session = self.pipeline_config['session']
@@ -359,13 +524,7 @@ class AccuracyPipeline(BasePipeline):
         is_ok = session.start_inference()
         assert is_ok, utils.log_color('\nERROR', f'start_infer() did not succeed for:', run_dir_base)
 
-        if self.settings.target_machine == constants.TARGET_MACHINE_EVM:
-            invoke_time = 0.0
-            core_time = 0.0
-            subgraph_time = 0.0
-            ddr_transfer = 0.0
-            num_frames_ddr = 0
-
+        infer_stats = self._get_infer_stats_collector()
         output_list = []
         pbar_desc = f'infer {description}: {run_dir_base}'
 
@@ -406,6 +565,8 @@ class AccuracyPipeline(BasePipeline):
             #for i in range(len(data)):
             #    data[i].tofile(f"./testdata/bevdet_frame_{data_index:03d}_input_{i}.dat")
             output, info_dict = session.run_inference(data, info_dict)
+            # outputs are kept across frames below - these should not be views of the runtime buffers
+            output = session.detach_outputs(output)
 
             # Save output for next frames
             if self.pipeline_config.get('task_name', {}) == 'BEVFormer' or \
@@ -428,58 +589,32 @@ class AccuracyPipeline(BasePipeline):
             #for i in range(len(output)):
             #    output[i].tofile(f"./testdata/bevdet_frame_{data_index:03d}_output_{i}.dat")
 
-            stats_dict = session.infer_stats()
-            if self.settings.target_machine == constants.TARGET_MACHINE_EVM:
-                invoke_time += info_dict['session_invoke_time']
-                core_time += stats_dict['core_time']
-                subgraph_time += stats_dict['subgraph_time']
-                if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                    ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                    num_frames_ddr += 1
-
+            is_stats_frame = infer_stats.is_sample(data_index)
+            stats_samples = [infer_stats.get_sample(session, info_dict)] if is_stats_frame else None
             if self.settings.flip_test:
+                # with zero_copy, the outputs may be views that would be overwritten by the next run
+                output = session.detach_outputs(output)
                 outputs_flip, info_dict = session.run_inference(info_dict['flip_img'], info_dict)
                 info_dict['outputs_flip'] = outputs_flip
-
-                stats_dict = session.infer_stats()
-                if self.settings.target_machine == constants.TARGET_MACHINE_EVM:
-                    invoke_time += info_dict['session_invoke_time']
-                    core_time += stats_dict['core_time']
-                    subgraph_time += stats_dict['subgraph_time']
-                    if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                        ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                        num_frames_ddr += 1
+                if is_stats_frame:
+                    stats_samples.append(infer_stats.get_sample(session, info_dict))
             else:
                 info_dict['outputs_flip'] = None
 
+            if is_stats_frame:
+                infer_stats.add_sample(*stats_samples)
+
             # needed in postprocess to understand the detection threshold set
             info_dict['runtime_options'] = runtime_options
 
             output, info_dict = postprocess(output, info_dict)
+            output = session.detach_outputs(output)
             output_list.append(output)
 
         #
-        # compute and populate final stats so that it can be used in result
-        self.infer_stats_dict = {
-            'num_subgraphs': stats_dict['num_subgraphs'],
-        }
-        if self.settings.target_machine == constants.TARGET_MACHINE_EVM:
-            self.infer_stats_dict.update({
-                'infer_time_invoke_ms': invoke_time * constants.MILLI_CONST / num_frames,
-                'infer_time_core_ms': core_time * constants.MILLI_CONST / num_frames,
-                'infer_time_subgraph_ms': subgraph_time * constants.MILLI_CONST / num_frames,
-                'ddr_transfer_mb': (ddr_transfer / num_frames_ddr / constants.MEGA_CONST) if num_frames_ddr > 0 else 0
-            })
-        #
-        if 'perfsim_time' in stats_dict:
-            self.infer_stats_dict.update({'perfsim_time_ms': stats_dict['perfsim_time'] * constants.MILLI_CONST})
-        #
-        if 'perfsim_ddr_transfer' in stats_dict:
-            self.infer_stats_dict.update({'perfsim_ddr_transfer_mb': stats_dict['perfsim_ddr_transfer'] / constants.MEGA_CONST})
-        #
-        if 'perfsim_macs' in stats_dict:
-            self.infer_stats_dict.update({'perfsim_gmacs': stats_dict['perfsim_macs'] / constants.GIGA_CONST})
-        #
+        # the stats of the model (num_subgraphs, perfsim etc.) are the same for all the frames - query them once
+        stats_dict = session.infer_stats()
+        self._set_infer_stats_dict(infer_stats, stats_dict)
         # close the interpreter
         session.close_interpreter()
         return output_list
@@ -509,3 +644,61 @@ class AccuracyPipeline(BasePipeline):
             output_dict.update(output)
         #
         return output_dict
+
+
+def _infer_frame_range(settings, pipeline_config, dataset_info, start_index, end_index, pbar_desc, infer_stats, position=0):
+    # run the inference on the frames [start_index, end_index) of the input_dataset.
+    # this is a function (not a method) so that it can be run in a separate process for a shard of the frames.
+    session = pipeline_config['session']
+    input_dataset = pipeline_config['input_dataset']
+    preprocess = pipeline_config['preprocess']
+    postprocess = pipeline_config['postprocess']
+    run_dir_base = os.path.split(session.get_param('run_dir'))[-1]
+
+    # the image savers in the postprocess count the frames to name the outputs and to stop after num_output_frames -
+    # each shard has its own copy of them, so they have to continue from the first frame of the shard
+    for transform in getattr(postprocess, 'transforms', []):
+        if hasattr(transform, 'output_frame_idx'):
+            transform.output_frame_idx = start_index
+        #
+    #
+
+    is_ok = session.start_inference()
+    assert is_ok, utils.log_color('\nERROR', f'start_infer() did not succeed for:', run_dir_base)
+
+    output_list = []
+    for frame_index, data_index in enumerate(utils.progress_step(range(start_index, end_index), desc=pbar_desc, position=position)):
+        info_dict = {'dataset_info': dataset_info, 'label_offset_pred': pipeline_config.get('metric',{}).get('label_offset_pred',None)}
+        data = input_dataset[data_index]
+        data, info_dict = preprocess(data, info_dict)
+        output, info_dict = session.run_inference(data, info_dict)
+
+        is_stats_frame = infer_stats.is_sample(frame_index)
+        stats_samples = [infer_stats.get_sample(session, info_dict)] if is_stats_frame else None
+        if settings.flip_test:
+            # with zero_copy, the outputs may be views that would be overwritten by the next run
+            output = session.detach_outputs(output)
+            outputs_flip, info_dict = session.run_inference(info_dict['flip_img'], info_dict)
+            info_dict['outputs_flip'] = outputs_flip
+            if is_stats_frame:
+                stats_samples.append(infer_stats.get_sample(session, info_dict))
+            #
+        else:
+            info_dict['outputs_flip'] = None
+        #
+        if is_stats_frame:
+            infer_stats.add_sample(*stats_samples)
+        #
+
+        # needed in postprocess to understand the detection threshold set
+        info_dict['runtime_options'] = session.kwargs['runtime_options']
+
+        output, info_dict = postprocess(output, info_dict)
+        output = session.detach_outputs(output)
+        output_list.append(output)
+    #
+    # the stats of the model (num_subgraphs, perfsim etc.) are the same for all the frames - query them once
+    stats_dict = session.infer_stats()
+    # close the interpreter
+    session.close_interpreter()
+    return output_list, infer_stats, stats_dict, session.kwargs
@@ -31,6 +31,7 @@ import functools
 import itertools
 import warnings
 import copy
+import pickle
 import traceback
 import re
 import wurlitzer
@@ -50,6 +51,10 @@ class PipelineRunner():
         # since this happends int he beginning, this can be quite annoying
         # instead it may be better to make a copy opf the whole proc_func just before executaion of it
         self.copy_dataloader = False
+        # every task is pickled to be sent to the process that runs it - datasets are sent as
+        # lightweight handles (datasets.LazyDataset) that are loaded in that process.
+        # in verbose mode, the pickled size of each task is written to the log - show a breakdown if it is larger than this
+        self.task_pickle_size_warning = 8 * 1024 * 1024
         self.settings = settings
         self.pipeline_configs = pipeline_configs
         if settings.sort_pipeline_configs:
@@ -232,10 +237,29 @@ class PipelineRunner():
                 run_task = functools.partial(self._run_pipeline, basic_settings, pipeline_config, description=description, log_file=log_file)
                 task_list_for_model.append({'proc_name':proc_name, 'proc_func':run_task, 'proc_log':log_file, 'proc_error':proc_error_regex_list})
             #
+            # pickling a task only to measure it takes time for large configs - do it only in verbose mode
+            if task_list_for_model and self.settings.verbose:
+                self._log_task_pickle_stats(model_id, pipeline_config, task_list_for_model[0]['proc_func'])
+            #
             task_entries.update({model_id:task_list_for_model})
         #
         return task_entries
 
+    def _log_task_pickle_stats(self, model_id, pipeline_config, proc_func):
+        try:
+            pickle_size, pickle_time = utils.get_pickle_stats(proc_func)
+        except Exception as e:
+            print(utils.log_color('WARNING', 'task pickle', f'{model_id} - could not be pickled: {e}'))
+            return
+        #
+        print(utils.log_color('INFO', 'task pickle', f'{model_id} - size: {pickle_size/1024:.1f} KB, time: {pickle_time*1000:.1f} ms'))
+        if pickle_size > self.task_pickle_size_warning:
+            pickle_sizes = {k:utils.get_pickle_stats(v)[0] for k, v in pipeline_config.items()}
+            pickle_sizes = sorted(pickle_sizes.items(), key=lambda kv:kv[1], reverse=True)
+            pickle_sizes = ', '.join([f'{k}: {v/1024:.1f} KB' for k, v in pickle_sizes])
+            print(utils.log_color('WARNING', 'task pickle', f'{model_id} - large pipeline_config: {pickle_sizes}'))
+        #
+
     def run(self, task_entries=None):
         if task_entries is None:
             task_entries = self.get_tasks()
@@ -246,9 +270,11 @@ class PipelineRunner():
             for proc_entry in task_list:
                 os.chdir(cwd)
                 proc_func = proc_entry['proc_func']
-                # data loader was not copied at initialization - make a copy of the whole proc_func
+                # data loader was not copied at initialization - make a copy of the whole proc_func.
+                # a pickle round trip makes the same copy that is sent to a pipeline process: the datasets
+                # are lightweight handles that are loaded when the task uses them (deepcopy is much slower)
                 if not self.copy_dataloader:
-                    proc_func = copy.deepcopy(proc_func)
+                    proc_func = pickle.loads(pickle.dumps(proc_func, protocol=pickle.HIGHEST_PROTOCOL))
                 #
                 result = proc_func()
                 result_entries.update({task_name:result})
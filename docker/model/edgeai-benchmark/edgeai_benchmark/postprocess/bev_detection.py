@@ -239,7 +239,6 @@
 
 import os
 import sys
-import copy
 import numpy as np
 import cv2
 import matplotlib.pyplot as plt 
@@ -896,73 +895,103 @@ def _is_polygon_valid(position: np.ndarray, img_size: np.ndarray) -> bool:
     return valid_bbox
 
 
+# corner index pairs of the 12 edges of the boxes from get_camera_box_corners_3d() / get_lidar_box_corners_3d()
+BOX_3D_EDGES = np.array(((0, 1), (1, 2), (2, 3), (3, 0),
+                         (4, 5), (5, 6), (6, 7), (7, 4),
+                         (0, 4), (1, 5), (2, 6), (3, 7)))
+
+
+def _adjust_points_in_the_img(points, slope, w, h):
+    # move the points that are outside the image along their edge to the image border
+    x, y = points[..., 0], points[..., 1]
+    left = x < 0
+    y = np.where(left, slope*(0-x)+y, y)
+    x = np.where(left, 0, x)
+    right = x > w
+    y = np.where(right, slope*(w-x)+y, y)
+    x = np.where(right, w, x)
+    top = y < 0
+    x = np.where(top, (0-y)/slope + x, x)
+    y = np.where(top, 0, y)
+    bottom = y > h
+    x = np.where(bottom, (h-y)/slope + x, x)
+    y = np.where(bottom, h, y)
+    return np.stack((x, y), axis=-1)
+
+
+def adjust_edges_in_the_img(img_size, corners, depths, edges=BOX_3D_EDGES):
+    """Clip the edges of the projected boxes to the image, for all the boxes
+    and edges at once.
+
+    Args:
+        img_size (tuple): (height, width) of the image.
+        corners (np.ndarray): Projected corners with shape (..., 8, 2).
+        depths (np.ndarray): Depths of the corners with shape (..., 8).
+        edges (np.ndarray): Corner index pairs of the edges with shape (E, 2).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Start and end points of the
+        edges with shape (..., E, 2) in int32 and whether each edge is to be
+        drawn with shape (..., E).
+    """
+    edges = np.asarray(edges)
+    h, w = img_size
+    a = corners[..., edges[:, 0], :]
+    b = corners[..., edges[:, 1], :]
+    depths_a = depths[..., edges[:, 0]]
+    depths_b = depths[..., edges[:, 1]]
+
+    valid = ~(((depths_a < 1e-5) & (depths_b < 1e-5)) | ((depths_a > 1e5) & (depths_b > 1e5)))
+    valid &= ~(((a[..., 0] < 0) & (b[..., 0] < 0)) | ((a[..., 0] > w) & (b[..., 0] > w)) |
+               ((a[..., 1] < 0) & (b[..., 1] < 0)) | ((a[..., 1] > h) & (b[..., 1] > h)))
+    img_max = np.array((w, h))
+    inside = np.all((a >= 0) & (b >= 0) & (a <= img_max) & (b <= img_max), axis=-1)
+
+    # the edges that are not drawn (or are vertical) give inf/nan here - they are masked out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (b[..., 1]-a[..., 1])/(b[..., 0]-a[..., 0])
+        a = np.where(inside[..., None], a, _adjust_points_in_the_img(a, slope, w, h)).astype(np.int32)
+        b = np.where(inside[..., None], b, _adjust_points_in_the_img(b, slope, w, h)).astype(np.int32)
+
+    outside = ((a[..., 0] <= 0) & (b[..., 0] <= 0)) | ((a[..., 0] >= w) & (b[..., 0] >= w)) | \
+              ((a[..., 1] <= 0) & (b[..., 1] <= 0)) | ((a[..., 1] >= h) & (b[..., 1] >= h))
+    valid &= inside | ~outside
+    return a, b, valid
+
+
 def adjust_edge_in_the_img(img_size, corners, depths, i, j):
-    if depths[i] < 1e-5 and depths[j] < 1e-5:
-        return None, None
-    if depths[i] > 1e5 and depths[j] > 1e5:
+    a, b, valid = adjust_edges_in_the_img(img_size, corners, depths, ((i, j),))
+    if not valid[0]:
         return None, None
-    a = np.copy(corners[i])
-    b = np.copy(corners[j])
-    h, w = img_size
-    if (a[0]<0 and b[0]<0) or (a[0]>w and b[0]>w) or (a[1]<0 and b[1]<0) or (a[1]>h and b[1]>h) : 
-        return  None, None
-    if (a[0]>=0) and (b[0]>=0) and (a[0]<=w) and (b[0]<=w) and (a[1]>=0) and (b[1]>=0) and (a[1]<=h) and (b[1]<=h):
-        a = a.astype(np.int32)
-        b = b.astype(np.int32)
-        return a, b
-    slope = (b[1]-a[1])/(b[0]-a[0])
-    def adjust_point(a):
-        if a[0]< 0:
-            a[1] = slope*(0-a[0])+a[1] 
-            a[0] = 0
-        if a[0] > w:
-            a[1] = slope*(w-a[0])+a[1]
-            a[0] = w 
-        if a[1] < 0:
-            a[0] = (0-a[1])/slope + a[0]
-            a[1] = 0
-        if a[1] > h:
-            a[0] = (h-a[1])/slope + a[0]
-            a[1] = h
-    adjust_point(a), adjust_point(b)
-    a = a.astype(np.int32)
-    b = b.astype(np.int32)
-    
-    if (a[0]<=0 and b[0]<=0) or (a[0]>=w and b[0]>=w) or (a[1]<=0 and b[1]<=0) or (a[1]>=h and b[1]>=h) : 
-        return  None, None
-    return  a, b
-    
+    return a[0], b[0]
+
 
 def points_img2cam(points, cam2img):
     """Project points in image coordinates to camera coordinates.
 
     Args:
-        points (Tensor or np.ndarray): 2.5D points in 2D images with shape
+        points (np.ndarray): 2.5D points in 2D images with shape
             [N, 3], 3 corresponds with x, y in the image and depth.
-        cam2img (Tensor or np.ndarray): Camera intrinsic matrix. The shape can
+        cam2img (np.ndarray): Camera intrinsic matrix. The shape can
             be [3, 3], [3, 4] or [4, 4].
 
     Returns:
-        Tensor or np.ndarray: Points in 3D space with shape [N, 3], 3
+        np.ndarray: Points in 3D space with shape [N, 3], 3
         corresponds with x, y, z in 3D space.
     """
     assert cam2img.shape[0] <= 4
     assert cam2img.shape[1] <= 4
     assert points.shape[1] == 3
 
-    xys = points[:, :2]
-    depths = points[:, 2].view(-1, 1)
-    unnormed_xys = np.concatenate([xys * depths, depths], axis=1)
+    depths = points[:, 2:3]
+    unnormed_xyzs = np.concatenate([points[:, :2] * depths, depths], axis=1)
 
-    pad_cam2img = np.eye(4, dtype=xys.dtype)
+    pad_cam2img = np.eye(4, dtype=points.dtype)
     pad_cam2img[:cam2img.shape[0], :cam2img.shape[1]] = cam2img
-    inv_pad_cam2img = np.linalg.inv(pad_cam2img).transpose(0, 1)
-
-    # Do operation in homogeneous coordinates.
-    num_points = unnormed_xys.shape[0]
-    homo_xys = np.concatenate((unnormed_xys, np.ones((num_points, 1), dtype=xys.dtype)), axis=1)
+    inv_pad_cam2img = np.linalg.inv(pad_cam2img)
 
-    points3D = np.matmul(homo_xys, inv_pad_cam2img)[:, :3]
+    # only the first three rows of the transform are needed - no homogeneous coordinates
+    points3D = unnormed_xyzs @ inv_pad_cam2img[:3, :3].T + inv_pad_cam2img[:3, 3]
 
     return points3D
 
@@ -972,35 +1001,29 @@ def points_cam2img(points_3d: np.ndarray,
     """Project points in camera coordinates to image coordinates.
 
     Args:
-        points_3d (Tensor or np.ndarray): Points in shape (N, 3).
-        proj_mat (Tensor or np.ndarray): Transformation matrix between
-            coordinates.
+        points_3d (np.ndarray): Points in shape (N, 3).
+        proj_mat (np.ndarray): Transformation matrix between
+            coordinates. Stacked matrices with shape (C, 3|4, 3|4) project
+            the points on all of them at once.
         with_depth (bool): Whether to keep depth in the output.
             Defaults to False.
 
     Returns:
-        Tensor or np.ndarray: Points in image coordinates with shape [N, 2] if
-        ``with_depth=False``, else [N, 3].
+        np.ndarray: Points in image coordinates with shape [N, 2] if
+        ``with_depth=False``, else [N, 3] - [C, N, 2|3] for stacked matrices.
     """
-    points_shape = list(points_3d.shape)
-    points_shape[-1] = 1
-
-    assert len(proj_mat.shape) == 2, \
-        'The dimension of the projection matrix should be 2 ' \
+    assert len(proj_mat.shape) >= 2, \
+        'The dimension of the projection matrix should be at least 2 ' \
         f'instead of {len(proj_mat.shape)}.'
-    d1, d2 = proj_mat.shape[:2]
+    d1, d2 = proj_mat.shape[-2:]
     assert (d1 == 3 and d2 == 3) or (d1 == 3 and d2 == 4) or \
         (d1 == 4 and d2 == 4), 'The shape of the projection matrix ' \
         f'({d1}*{d2}) is not supported.'
-    if d1 == 3:
-        proj_mat_expanded = np.eye(4,  dtype=proj_mat.dtype)
-        proj_mat_expanded[:d1, :d2] = proj_mat
-        proj_mat = proj_mat_expanded
-
-    # previous implementation use new_zeros, new_one yields better results
-    points_4 = np.concatenate([points_3d, np.ones(points_shape)], axis=-1)
 
-    point_2d = points_4 @ proj_mat.T
+    # only the first three rows of the transform are needed - no homogeneous coordinates
+    point_2d = points_3d @ np.swapaxes(proj_mat[..., :3, :3], -1, -2)
+    if d2 == 4:
+        point_2d = point_2d + proj_mat[..., None, :3, 3]
     point_2d_res = point_2d[..., :2] / point_2d[..., 2:3]
 
     if with_depth:
@@ -1013,22 +1036,17 @@ def rotation_3d_in_axis(points, angles, axis=1):
     """Rotate points by angles according to axis.
 
     Args:
-        points (np.ndarray or Tensor): Points with shape (N, M, 3).
-        angles (np.ndarray or Tensor or float): Vector of angles with shape
+        points (np.ndarray): Points with shape (N, M, 3).
+        angles (np.ndarray or float): Vector of angles with shape
             (N, ).
-        axis (int): The axis to be rotated. Defaults to 0.
-        return_mat (bool): Whether or not to return the rotation matrix
-            (transposed). Defaults to False.
-        clockwise (bool): Whether the rotation is clockwise. Defaults to False.
+        axis (int): The axis to be rotated. Defaults to 1.
 
     Raises:
         ValueError: When the axis is not in range [-3, -2, -1, 0, 1, 2], it
             will raise ValueError.
 
     Returns:
-        Tuple[np.ndarray, np.ndarray] or Tuple[Tensor, Tensor] or np.ndarray or
-        Tensor: Rotated points with shape (N, M, 3) and rotation matrix with
-        shape (N, 3, 3).
+        np.ndarray: Rotated points with shape (N, M, 3).
     """
     batch_free = len(points.shape) == 2
     if batch_free:
@@ -1046,47 +1064,61 @@ def rotation_3d_in_axis(points, angles, axis=1):
 
     rot_sin = np.sin(angles)
     rot_cos = np.cos(angles)
-    ones = np.ones_like(rot_cos)
-    zeros = np.zeros_like(rot_cos)
 
-    if points.shape[-1] == 3:
+    # transposed rotation matrix of each of the points, filled in place
+    num_dims = points.shape[-1]
+    rot_mat_T = np.zeros((angles.shape[0], num_dims, num_dims), dtype=rot_cos.dtype)
+    if num_dims == 3:
         if axis == 1 or axis == -2:
-            rot_mat_T = np.stack([
-                np.stack([rot_cos, zeros, -rot_sin]),
-                np.stack([zeros, ones, zeros]),
-                np.stack([rot_sin, zeros, rot_cos])
-            ])
+            rot_mat_T[:, 0, 0] = rot_cos
+            rot_mat_T[:, 0, 2] = -rot_sin
+            rot_mat_T[:, 1, 1] = 1
+            rot_mat_T[:, 2, 0] = rot_sin
+            rot_mat_T[:, 2, 2] = rot_cos
         elif axis == 2 or axis == -1:
-            rot_mat_T = np.stack([
-                np.stack([rot_cos, rot_sin, zeros]),
-                np.stack([-rot_sin, rot_cos, zeros]),
-                np.stack([zeros, zeros, ones])
-            ])
+            rot_mat_T[:, 0, 0] = rot_cos
+            rot_mat_T[:, 0, 1] = rot_sin
+            rot_mat_T[:, 1, 0] = -rot_sin
+            rot_mat_T[:, 1, 1] = rot_cos
+            rot_mat_T[:, 2, 2] = 1
         elif axis == 0 or axis == -3:
-            rot_mat_T = np.stack([
-                np.stack([ones, zeros, zeros]),
-                np.stack([zeros, rot_cos, rot_sin]),
-                np.stack([zeros, -rot_sin, rot_cos])
-            ])
+            rot_mat_T[:, 0, 0] = 1
+            rot_mat_T[:, 1, 1] = rot_cos
+            rot_mat_T[:, 1, 2] = rot_sin
+            rot_mat_T[:, 2, 1] = -rot_sin
+            rot_mat_T[:, 2, 2] = rot_cos
         else:
             raise ValueError(
                 f'axis should in range [-3, -2, -1, 0, 1, 2], got {axis}')
     else:
-        rot_mat_T = np.stack([
-            np.stack([rot_cos, rot_sin]),
-            np.stack([-rot_sin, rot_cos])
-        ])
+        rot_mat_T[:, 0, 0] = rot_cos
+        rot_mat_T[:, 0, 1] = rot_sin
+        rot_mat_T[:, 1, 0] = -rot_sin
+        rot_mat_T[:, 1, 1] = rot_cos
 
     if points.shape[0] == 0:
         points_new = points
     else:
-        points_new = np.einsum('aij,jka->aik', points, rot_mat_T)
+        points_new = np.matmul(points, rot_mat_T)
 
     if batch_free:
         points_new = points_new.squeeze(0)
 
     return points_new
 
+
+def _get_box_corners_norm(origin):
+    # unit box corners in the order (x0y0z0, x0y0z1, x0y1z1, x0y1z0, x1y0z0, x1y0z1, x1y1z1, x1y1z0)
+    corners_norm = np.stack(np.unravel_index(np.arange(8), [2] * 3), axis=1).astype(np.float64)
+    corners_norm = corners_norm[[0, 1, 3, 2, 4, 5, 7, 6]]
+    return corners_norm - np.array(origin)
+
+
+# use relative origin (0.5, 1, 0.5) for camera boxes and (0.5, 0.5, 0) for lidar boxes
+CAMERA_BOX_CORNERS_NORM = _get_box_corners_norm((0.5, 1, 0.5))
+LIDAR_BOX_CORNERS_NORM = _get_box_corners_norm((0.5, 0.5, 0))
+
+
 def get_camera_box_corners_3d(bboxes_3d):
     """Convert boxes to corners in clockwise order, in the form of (x0y0z0,
     x0y0z1, x0y1z1, x0y1z0, x1y0z0, x1y0z1, x1y1z1, x1y1z0).
@@ -1111,13 +1143,8 @@ def get_camera_box_corners_3d(bboxes_3d):
     Returns:
         Tensor: A tensor with 8 corners of each box in shape (N, 8, 3).
     """
-    dims = copy.deepcopy(bboxes_3d[:,3:6])
-    corners_norm = np.stack(np.unravel_index(np.arange(8), [2] * 3), axis=1).astype(dims.dtype)
-
-    corners_norm = corners_norm[[0, 1, 3, 2, 4, 5, 7, 6]]
-    # use relative origin (0.5, 1, 0.5)
-    corners_norm = corners_norm - np.array([0.5, 1, 0.5])
-    corners = dims.reshape([-1, 1, 3]) * corners_norm.reshape([1, 8, 3])
+    dims = bboxes_3d[:, 3:6]
+    corners = dims.reshape([-1, 1, 3]) * CAMERA_BOX_CORNERS_NORM.reshape([1, 8, 3])
 
     corners = rotation_3d_in_axis(
         corners, bboxes_3d[:, 6], axis=1)
@@ -1145,13 +1172,8 @@ def get_lidar_box_corners_3d(bboxes_3d):
     Returns:
         Tensor: A tensor with 8 corners of each box in shape (N, 8, 3).
     """
-    dims = copy.deepcopy(bboxes_3d[:,3:6])
-    corners_norm = np.stack(np.unravel_index(np.arange(8), [2] * 3), axis=1).astype(dims.dtype)
-
-    corners_norm = corners_norm[[0, 1, 3, 2, 4, 5, 7, 6]]
-    # use relative origin (0.5, 0.5, 0)
-    corners_norm = corners_norm - np.array([0.5, 0.5, 0])
-    corners = dims.reshape([-1, 1, 3]) * corners_norm.reshape([1, 8, 3])
+    dims = bboxes_3d[:, 3:6]
+    corners = dims.reshape([-1, 1, 3]) * LIDAR_BOX_CORNERS_NORM.reshape([1, 8, 3])
 
     # rotate around z axis
     corners = rotation_3d_in_axis(
@@ -1160,34 +1182,52 @@ def get_lidar_box_corners_3d(bboxes_3d):
     return corners
 
 
+def proj_lidar_bbox3d_to_imgs(corners_3d, lidar2imgs):
+    """Project the 3D bbox corners on the images of all the cameras at once.
+
+    Args:
+        corners_3d (np.ndarray): Corners of the bboxes in lidar coordinate
+            system with shape (N, 8, 3).
+        lidar2imgs (np.ndarray): Stacked lidar to image transforms with
+            shape (C, 4, 4).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Projected corners with
+        shape (C, N, 8, 2), their (clipped) depths with shape (C, N, 8) and
+        whether any corner of the box is in front of the camera with shape (C, N).
+    """
+    num_bbox = corners_3d.shape[0]
+    lidar2imgs = np.asarray(lidar2imgs).reshape(-1, 4, 4)
+    num_imgs = lidar2imgs.shape[0]
+
+    # only the first three rows of the transform are needed - no homogeneous coordinates
+    pts_2d = np.matmul(corners_3d.reshape(-1, 3), np.swapaxes(lidar2imgs[:, :3, :3], -1, -2), dtype=np.float64)
+    pts_2d += lidar2imgs[:, None, :3, 3]
+
+    depths = pts_2d[..., 2].reshape(num_imgs, num_bbox, 8)
+    valid_bbox = np.any((depths >= 1e-5) & (depths <= 1e5), axis=-1)
+    depths = np.clip(depths, a_min=1e-5, a_max=1e5)
+    imgfov_pts_2d = pts_2d[..., :2].reshape(num_imgs, num_bbox, 8, 2) / depths[..., None]
+
+    return imgfov_pts_2d, depths, valid_bbox
+
+
 def proj_lidar_bbox3d_to_img(corners_3d, single_lidar2img):
     """Project the 3D bbox on 2D plane.
 
     Args:
-        bboxes_3d (:obj:`LiDARInstance3DBoxes`): 3D bbox in lidar coordinate
-            system to visualize.
-        input_meta (dict): Meta information.
+        corners_3d (np.ndarray): Corners of the bboxes in lidar coordinate
+            system with shape (N, 8, 3).
+        single_lidar2img (np.ndarray): Lidar to image transform.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Projected corners and depths
+        of the bboxes that are in front of the camera and their indices.
     """
-    num_bbox = corners_3d.shape[0]
-    pts_4d = np.concatenate(
-        [corners_3d.reshape(-1, 3),
-        np.ones((num_bbox * 8, 1))], axis=-1)
-    lidar2img = copy.deepcopy(single_lidar2img).reshape(4, 4)
-    pts_2d = pts_4d @ lidar2img.T
-    
-    valid_box_idx = np.logical_and(pts_2d[:, 2]>=1e-5, pts_2d[:, 2]<=1e5)
-    valid_box_idx = valid_box_idx.reshape(-1,8)
-    valid_box_idx = np.where(valid_box_idx.sum(-1)>0)[0]
-    pts_2d = pts_2d.reshape(-1,8,4)
-    pts_2d = pts_2d[valid_box_idx]
-    num_bbox = pts_2d.shape[0]
-    pts_2d = pts_2d.reshape(-1,4)
-    pts_2d[:, 2] = np.clip(pts_2d[:, 2], a_min=1e-5, a_max=1e5)
-    pts_2d[:, 0] /= pts_2d[:, 2]
-    pts_2d[:, 1] /= pts_2d[:, 2]
-    imgfov_pts_2d, depths = pts_2d[..., :2].reshape(num_bbox, 8, 2), pts_2d[...,2].reshape(num_bbox, 8)
-
-    return imgfov_pts_2d, depths, valid_box_idx
+    imgfov_pts_2d, depths, valid_bbox = proj_lidar_bbox3d_to_imgs(corners_3d, single_lidar2img)
+    valid_box_idx = np.flatnonzero(valid_bbox[0])
+
+    return imgfov_pts_2d[0, valid_box_idx], depths[0, valid_box_idx], valid_box_idx
 
 
 # BBoxes regresssion (post-processing) class for BEVDet
@@ -2091,11 +2131,13 @@ class BEVImageSave():
                 lidar_points = lidar_points[:, [0,1,2]]
 
         lidar_img = np.zeros(self.lidar_image_size, dtype=np.uint8)
-        for point in lidar_points:
-            x, y, z = point
-            if self.xy_bound[0] <= x < self.xy_bound[1] and \
-               self.xy_bound[2] <= y < self.xy_bound[3]:
-                lidar_img[int(y*self.sf) + self.lidar_image_center, int(x*self.sf) + self.lidar_image_center] = (255, 255, 255)
+        x, y = lidar_points[:, 0], lidar_points[:, 1]
+        in_bound = (self.xy_bound[0] <= x) & (x < self.xy_bound[1]) & \
+                   (self.xy_bound[2] <= y) & (y < self.xy_bound[3])
+        # astype() truncates towards zero, same as int()
+        rows = (y[in_bound]*self.sf).astype(np.int32) + self.lidar_image_center
+        cols = (x[in_bound]*self.sf).astype(np.int32) + self.lidar_image_center
+        lidar_img[rows, cols] = (255, 255, 255)
 
         for idx, corners in enumerate(corners_3d):
             corners = (corners[:, [0, 1]] * self.sf + self.lidar_image_center).astype(np.int32)
@@ -2111,6 +2153,19 @@ class BEVImageSave():
         cv2.imwrite(save_path, lidar_img)
 
 
+    def draw_box_edges(self, img, corners_2d, depths, labels, valid_bbox, img_size):
+        # clip the edges of all the valid boxes to the image at once, only the drawing is per edge
+        valid_idx = np.flatnonzero(valid_bbox)
+        if len(valid_idx) == 0:
+            return img
+
+        starts, ends, valid_edges = adjust_edges_in_the_img(img_size, corners_2d[valid_idx], depths[valid_idx])
+        for idx, box_starts, box_ends, box_valid_edges in zip(valid_idx, starts, ends, valid_edges):
+            for a, b in zip(box_starts[box_valid_edges], box_ends[box_valid_edges]):
+                cv2.line(img, tuple(a), tuple(b), self.bbox_color[labels[idx]], self.thickness)
+        return img
+
+
     def __call__(self, detections, info_dict):
         if self.output_frame_idx >= self.num_output_frames:
             self.output_frame_idx += 1
@@ -2150,18 +2205,8 @@ class BEVImageSave():
             corners_2d = uv_origin[..., :2].reshape(num_bbox, 8, 2)
 
 
-            for idx, corners in enumerate(corners_2d):
-                if _is_polygon_valid(corners, img_size):
-                    depths = depths_3d[idx]
-                    edges = (
-                        (0,1),(1,2),(2,3),(3,0),
-                        (4,5),(5,6),(6,7),(7,4),
-                        (0,4),(1,5),(2,6),(3,7)
-                    )
-                    for a,b in edges:
-                        a,b = adjust_edge_in_the_img(img_size, corners, depths, a, b , )
-                        if a is not None:
-                            cv2.line(img, tuple(a), tuple(b), self.bbox_color[labels_3d[idx]], self.thickness)
+            valid_bbox = _is_polygon_valid(corners_2d, img_size)
+            self.draw_box_edges(img, corners_2d, depths_3d, labels_3d, valid_bbox, img_size)
             save_path = os.path.join(save_dir, 'output_frame-{:04d}.png'.format(self.output_frame_idx))
             cv2.imwrite(save_path, img)
 
@@ -2176,9 +2221,7 @@ class BEVImageSave():
             corners_3d = get_lidar_box_corners_3d(bboxes_3d)
             if info_dict['task_name'] == 'BEVDet':
                 ego2lidar = np.linalg.inv(info_dict['lidar2ego']) 
-                for i in range(corners_3d.shape[0]):
-                    corners_3d[i] = (ego2lidar[:3, :3] @ corners_3d[i].T).T
-                    corners_3d[i] = corners_3d[i] + ego2lidar[:3, 3]
+                corners_3d = corners_3d @ ego2lidar[:3, :3].T + ego2lidar[:3, 3]
             trans2imgs = info_dict['lidar2imgs_org']
             """
             corners_3d = get_lidar_box_corners_3d(bboxes_3d)
@@ -2189,25 +2232,12 @@ class BEVImageSave():
                 trans2imgs = info_dict['lidar2imgs_org']
             """
 
+            # project the boxes on all the cameras at once
+            corners_2d, depths_2d, valid_bbox = proj_lidar_bbox3d_to_imgs(corners_3d, np.stack(trans2imgs))
+            valid_bbox = valid_bbox & _is_polygon_valid(corners_2d, img_size)
+
             for i, single_img in enumerate(imgs):
-                trans2img = trans2imgs[i]
-                corners_2d = proj_lidar_bbox3d_to_img(corners_3d, trans2img)
-
-                corners_2d , depths_2d, valid_bbox_idx= proj_lidar_bbox3d_to_img(corners_3d, trans2img)
-                labels = labels_3d[valid_bbox_idx]
-
-                for idx, corners in enumerate(corners_2d):
-                    if _is_polygon_valid(corners, img_size):
-                        depths = depths_2d[i]
-                        edges = (
-                            (0,1),(1,2),(2,3),(3,0),
-                            (4,5),(5,6),(6,7),(7,4),
-                            (0,4),(1,5),(2,6),(3,7)
-                        )
-                        for a,b in edges:
-                            a,b = adjust_edge_in_the_img(img_size, corners, depths, a, b , )
-                            if a is not None:
-                                cv2.line(single_img, tuple(a), tuple(b), self.bbox_color[labels[idx]], self.thickness)
+                self.draw_box_edges(single_img, corners_2d[i], depths_2d[i], labels_3d, valid_bbox[i], img_size)
                 save_path = os.path.join(save_dir, 'output_frame-{:04d}_{}.png'.format(self.output_frame_idx, i))
                 cv2.imwrite(save_path, single_img)
 
@@ -675,21 +675,13 @@ class GetPETRGeometry():
         coords[..., :2] = coords[..., :2] * np.maximum(
             coords[..., 2:3], np.ones_like(coords[..., 2:3]) * eps)
 
-        img2lidars = []
-        img2lidar = []
-        for i in range(len(info_dict['lidar2imgs'])):
-            img2lidar.append(np.linalg.inv(info_dict['lidar2imgs'][i]))
-        img2lidars.append(np.asarray(img2lidar))
-        img2lidars = np.asarray(img2lidars)
-        
-        #img2lidars = coords.new_tensor(img2lidars)  # (B, N, 4, 4)
-
-        coords = np.repeat(coords.reshape(1, 1, W, H, D, 4, 1), N, 1)
-        #img2lidars = img2lidars.reshape(B, N, 1, 1, 1, 4, 4).repeat(1, 1, W, H, D, 1, 1)
-        img2lidars = np.repeat(img2lidars.reshape(B, N, 1, 1, 1, 4, 4), W, 2)
-        img2lidars = np.repeat(img2lidars, H, 3)
-        img2lidars = np.repeat(img2lidars, D, 4)
-        coords3d = np.squeeze(np.matmul(img2lidars, coords), -1)[..., :3]
+        # invert the stacked lidar2imgs of all the cameras at once
+        img2lidars = np.linalg.inv(np.stack(info_dict['lidar2imgs'])).reshape(B, N, 4, 4)
+
+        # (W, H, D, 4) x (B, N, 4, 3) -> (B, N, W, H, D, 3) - broadcast in matmul instead of repeating
+        # the matrices for every point
+        img2lidars_T = np.swapaxes(img2lidars[..., :3, :], -1, -2)
+        coords3d = np.matmul(coords, img2lidars_T.reshape(B, N, 1, 1, 4, 3))
         coords3d[..., 0:1] = (coords3d[..., 0:1] - self.position_range[0]) / (
             self.position_range[3] - self.position_range[0])
         coords3d[..., 1:2] = (coords3d[..., 1:2] - self.position_range[1]) / (
@@ -993,10 +985,8 @@ class GetBEVFormerGeometry():
 
     def point_sampling(self, reference_points, pc_range,  info_dict):
 
-        lidar2img = []
-        lidar2img.append(info_dict['lidar2imgs'])
-        lidar2img = np.asarray(lidar2img)
-        #lidar2img = reference_points.new_tensor(lidar2img)  # (B, N, 4, 4)
+        # (B, N, 4, 4)
+        lidar2img = np.stack(info_dict['lidar2imgs'])[None]
         reference_points = reference_points.copy()
 
         reference_points[..., 0:1] = reference_points[..., 0:1] * \
@@ -1011,17 +1001,12 @@ class GetBEVFormerGeometry():
 
         reference_points = np.transpose(reference_points, (1, 0, 2, 3)) # 4x1x2500x4
         D, B, num_query = reference_points.shape[:3]
-        num_cam = lidar2img.shape[1]
 
+        # (D, B, 1, num_query, 4) x (B, N, 4, 4) -> (D, B, N, num_query, 4) for all the cameras at once -
+        # broadcast in matmul instead of repeating the points and the matrices
         reference_points = reference_points.reshape(D, B, 1, num_query, 4)
-        reference_points = np.expand_dims(np.repeat(reference_points, num_cam, 2), -1)
-
-        lidar2img = lidar2img.reshape(1, B, num_cam, 1, 4, 4)
-        lidar2img = np.repeat(lidar2img, D, 0)
-        lidar2img = np.repeat(lidar2img, num_query, 3)
-
-        reference_points_cam = np.squeeze(np.matmul(lidar2img.astype(np.float32),
-                                            reference_points.astype(np.float32)), -1)
+        reference_points_cam = np.matmul(reference_points.astype(np.float32),
+                                         np.swapaxes(lidar2img.astype(np.float32), -1, -2))
         eps = 1e-5
 
         bev_mask = (reference_points_cam[..., 2:3] > eps)
@@ -1257,17 +1242,14 @@ class GetFastBEVGeometry():
 
     @staticmethod
     def _compute_projection(img_meta, stride, noise=0):
-        projection = []
         intrinsic = np.eye(3)
         intrinsic[:2] /= stride
-        for cam_id in range(len(img_meta['lidar2imgs'])):
-            extrinsic = img_meta['lidar2imgs'][cam_id]
-            if noise > 0:
-                projection.append(intrinsic @ extrinsic[:3] + noise)
-            else:
-                projection.append(intrinsic @ extrinsic[:3])
+        # project with the stacked lidar2imgs of all the cameras at once
+        projection = intrinsic @ np.stack(img_meta['lidar2imgs'])[:, :3]
+        if noise > 0:
+            projection = projection + noise
 
-        return np.stack(projection)
+        return projection
 
     @staticmethod
     def get_points(n_voxels, voxel_size, origin):
@@ -1339,9 +1321,10 @@ class GetFastBEVGeometry():
         n_images, n_channels, height, width = self.feats_size
         n_x, n_y, n_z = points.shape[-3:]
 
-        points = np.broadcast_to(points.reshape(1, 3, -1), (n_images, 3, n_x*n_y*n_z))
-        points = np.concatenate((points, np.ones_like(points[:, :1])), axis=1)
-    
+        # the points are shared by all the images - broadcast them in matmul instead of copying them
+        points = points.reshape(3, -1)
+        points = np.concatenate((points, np.ones_like(points[:1])), axis=0)
+
         # ego_to_cam
         points_2d_3 = np.matmul(projection, points)  # lidar2img
         x = (points_2d_3[:, 0] / points_2d_3[:, 2]).round().astype(np.longlong)  # [6, 160000]
@@ -1352,16 +1335,12 @@ class GetFastBEVGeometry():
         # xy coordinate
         xy_coor = y * width + x
 
-        coor      = np.full((1, xy_coor.shape[1]), width*height*n_images)
-        cum_valid = np.full((1, xy_coor.shape[1]), True)
-        cum_valid = cum_valid[0]
-
-        for i in reversed(range(n_images)):
-            valid_idx = np.multiply(cum_valid, valid[i]).astype(bool)
-            coor[0, valid_idx] = xy_coor[i, valid_idx] + i*width*height
-            cum_valid[valid_idx] = False
+        # each point takes the last image that it is valid in
+        image_idx = n_images - 1 - np.argmax(valid[::-1], axis=0)
+        coor = xy_coor[image_idx, np.arange(xy_coor.shape[1])] + image_idx*width*height
+        coor = np.where(np.any(valid, axis=0), coor, width*height*n_images)
 
-        return coor[0]
+        return coor
 
     def precompute_proj_info(self, data, info_dict, prev_img_metas=None):
         xy_coor_list   = []
@@ -76,6 +76,8 @@ def get_common_session_cfg(settings, work_dir=None, input_optimization=True, inp
     input_optimization = input_optimization if settings.input_optimization is None else settings.input_optimization
     common_session_cfg = dict(work_dir=work_dir, target_machine=settings.target_machine,
               target_device=settings.target_device, run_suffix=settings.run_suffix, tidl_offload=settings.tidl_offload,
+              zero_copy=settings.zero_copy,
+              artifacts_cache_dir=settings.artifacts_cache_dir,
               input_optimization=input_optimization, input_data_layout=input_data_layout,
               input_mean=input_mean, input_scale=input_scale,
               run_dir_tree_depth=settings.run_dir_tree_depth,
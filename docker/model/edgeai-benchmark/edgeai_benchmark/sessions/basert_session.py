@@ -35,6 +35,9 @@ import re
 import csv
 import itertools
 import copy
+import hashlib
+import json
+import yaml
 from colorama import Fore
 import numpy as np
 import tarfile
@@ -42,7 +45,15 @@ import gc
 
 from .. import utils
 from .. import constants
+from ..core import presets
 from ..preprocess.transforms import ImageNormMeanScale
+from ..preprocess import functional as preprocess_functional
+
+
+# bump this if the content of the artifacts cache entries changes
+ARTIFACTS_CACHE_VERSION = 2
+# session kwargs that are filled in by the import - stored with the artifacts, so that a cache hit restores them
+ARTIFACTS_CACHE_SESSION_KEYS = ('input_details', 'output_details')
 
 
 class BaseRTSession(utils.ParamsBase):
@@ -68,6 +79,9 @@ class BaseRTSession(utils.ParamsBase):
         assert 'TIDL_TOOLS_PATH' in os.environ, 'TIDL_TOOLS_PATH must be set in environemnt variable'
         tidl_tools_path = os.environ['TIDL_TOOLS_PATH']
         self.kwargs['tidl_tools_path'] = tidl_tools_path
+        # artifacts_cache_dir: compiled artifacts are stored here keyed by a hash of everything that affects them,
+        # so that the same model compiled with the same options is imported only once
+        self.kwargs['artifacts_cache_dir'] = self.kwargs.get('artifacts_cache_dir', None)
 
         # work_dir at top level
         self.kwargs['work_dir'] = self.kwargs.get('work_dir', None)
@@ -165,6 +179,186 @@ class BaseRTSession(utils.ParamsBase):
         #
         self.is_import_done = True
 
+    def get_artifacts_cache_key(self, calibration_config=None):
+        # content address of the compiled artifacts: hash of the model (after the optimizations in get_model),
+        # the runtime_options that affect the compilation, the tidl_tools and the calibration data/preprocessing
+        if not self.kwargs['artifacts_cache_dir']:
+            return None
+        #
+        if not self.is_start_import_done:
+            self._prepare_model()
+        #
+        model_file = self.kwargs['model_file']
+        model_files = model_file if isinstance(model_file, (list,tuple)) else [model_file]
+        run_dir = self.kwargs['run_dir']
+        runtime_options = {}
+        for key, value in self.kwargs['runtime_options'].items():
+            if key in ('artifacts_folder', 'tidl_tools_path', 'import'):
+                continue
+            #
+            if isinstance(value, str) and key != constants.ADVANCED_OPTIONS_QUANT_FILE_KEY and os.path.isfile(value):
+                # files given as input in the options (eg. meta file): the contents matter, not the path
+                value = self._get_file_hash(value)
+            elif isinstance(value, str) and value.startswith(run_dir):
+                # the quant file is written by the import - only its location in the run_dir matters
+                value = os.path.relpath(value, run_dir)
+            #
+            runtime_options[key] = value
+        #
+        key_dict = {
+            'cache_version': ARTIFACTS_CACHE_VERSION,
+            'session_name': self.kwargs['session_name'],
+            'model': [self._get_file_hash(m) for m in model_files],
+            'runtime_options': utils.pretty_object(runtime_options),
+            'tidl_offload': self.kwargs['tidl_offload'],
+            'tensor_bits': self.kwargs['tensor_bits'],
+            'target_device': self.kwargs['target_device'],
+            'tidl_tools': self._get_tidl_tools_version(),
+            'calibration': utils.pretty_object(calibration_config),
+        }
+        key_str = json.dumps(key_dict, sort_keys=True, default=str)
+        return hashlib.sha256(key_str.encode()).hexdigest()
+
+    def get_calibration_cache_key(self, calibration_config=None):
+        # identity of the float model and the calibration data - unlike get_artifacts_cache_key(), this does not depend on
+        # the runtime_options or tensor_bits, so that the 8bit, 16bit and mixed precision variants of a model share it
+        if not self.is_start_import_done:
+            self._prepare_model()
+        #
+        model_file = self.kwargs['model_file']
+        model_files = model_file if isinstance(model_file, (list,tuple)) else [model_file]
+        key_dict = {
+            'session_name': self.kwargs['session_name'],
+            'model': [self._get_file_hash(m) for m in model_files],
+            'input_mean': self.kwargs['input_mean'],
+            'input_scale': self.kwargs['input_scale'],
+            'calibration': utils.pretty_object(calibration_config),
+        }
+        key_str = json.dumps(utils.pretty_object(key_dict), sort_keys=True, default=str)
+        return hashlib.sha256(key_str.encode()).hexdigest()
+
+    def get_activation_ranges(self, input_data_list):
+        # min/max of the activations of the float model for each input - see utils.get_activation_ranges()
+        # returns None if that is not supported for this session
+        return None
+
+    def load_cached_artifacts(self, cache_key):
+        # link the cached artifacts into the run_dir - returns False if they are not in the cache
+        if cache_key is None:
+            return False
+        #
+        cache_dir = os.path.join(self.kwargs['artifacts_cache_dir'], cache_key)
+        if not os.path.exists(os.path.join(cache_dir, 'cache_info.yaml')):
+            return False
+        #
+        artifacts_folder = self.kwargs['artifacts_folder']
+        os.makedirs(artifacts_folder, exist_ok=True)
+        self.clear()
+        self._link_folder(os.path.join(cache_dir, 'artifacts'), artifacts_folder)
+        quant_file = self._get_quant_file()
+        cached_quant_file = os.path.join(cache_dir, 'model', os.path.basename(quant_file)) if quant_file else None
+        if cached_quant_file and os.path.exists(cached_quant_file):
+            # copied, as the import writes this file in place
+            shutil.copy2(cached_quant_file, quant_file)
+        #
+        # the session info that the import fills in - input_details, output_details
+        with open(os.path.join(cache_dir, 'cache_info.yaml')) as fp:
+            cache_info = yaml.safe_load(fp)
+        #
+        for key, value in cache_info.get('session', {}).items():
+            self.kwargs[key] = value
+        #
+        self.is_import_done = True
+        return True
+
+    def store_cached_artifacts(self, cache_key):
+        # add the artifacts of the import that was just done to the cache
+        if cache_key is None:
+            return
+        #
+        artifacts_cache_dir = self.kwargs['artifacts_cache_dir']
+        cache_dir = os.path.join(artifacts_cache_dir, cache_key)
+        if os.path.exists(cache_dir):
+            return
+        #
+        # populate a temporary folder and rename it - a partially written entry is never seen as a cache hit
+        os.makedirs(artifacts_cache_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix=f'{cache_key}.', dir=artifacts_cache_dir)
+        # the cache must not depend on the run_dir - so no symlinks here
+        self._link_folder(self.kwargs['artifacts_folder'], os.path.join(temp_dir, 'artifacts'), allow_symlink=False)
+        quant_file = self._get_quant_file()
+        if quant_file and os.path.exists(quant_file):
+            os.makedirs(os.path.join(temp_dir, 'model'), exist_ok=True)
+            shutil.copy2(quant_file, os.path.join(temp_dir, 'model', os.path.basename(quant_file)))
+        #
+        with open(os.path.join(temp_dir, 'cache_info.yaml'), 'w') as fp:
+            cache_info = {'run_dir': self.kwargs['run_dir'], 'model_path': self.kwargs['model_path'],
+                          'session': {key: self.kwargs[key] for key in ARTIFACTS_CACHE_SESSION_KEYS}}
+            yaml.safe_dump(utils.pretty_object(cache_info), fp, sort_keys=False)
+        #
+        try:
+            os.rename(temp_dir, cache_dir)
+        except OSError:
+            # the same artifacts were stored in parallel by another process
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        #
+
+    def _get_quant_file(self):
+        quant_file = self.kwargs['runtime_options'].get(constants.ADVANCED_OPTIONS_QUANT_FILE_KEY, None)
+        return quant_file if isinstance(quant_file, str) else None
+
+    def _get_tidl_tools_version(self):
+        # the version string and the import libraries of the tidl_tools being used
+        tidl_tools_path = self.kwargs['tidl_tools_path']
+        tools_version = {'version': presets.TIDL_VERSION_STR}
+        if os.path.isdir(tidl_tools_path):
+            for file_name in sorted(os.listdir(tidl_tools_path)):
+                file_path = os.path.join(tidl_tools_path, file_name)
+                if os.path.isfile(file_path) and (file_name.startswith('version') or 'import' in file_name):
+                    file_stat = os.stat(file_path)
+                    tools_version[file_name] = f'{file_stat.st_size}_{int(file_stat.st_mtime)}'
+                #
+            #
+        #
+        return tools_version
+
+    def _get_file_hash(self, file_name):
+        hasher = hashlib.sha256()
+        with open(file_name, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b''):
+                hasher.update(chunk)
+            #
+        #
+        return hasher.hexdigest()
+
+    def _link_folder(self, src_folder, dst_folder, allow_symlink=True):
+        for root, dirs, files in os.walk(src_folder):
+            dst_root = os.path.join(dst_folder, os.path.relpath(root, src_folder))
+            os.makedirs(dst_root, exist_ok=True)
+            for f in files:
+                self._link_file(os.path.join(root, f), os.path.join(dst_root, f), allow_symlink)
+            #
+        #
+
+    def _link_file(self, src_file, dst_file, allow_symlink=True):
+        # hard link if possible (same file system), else symlink - copy as the last resort.
+        # note: the artifacts folder is cleared (files removed, not re-written) before an import, so linked files are safe.
+        try:
+            os.link(src_file, dst_file)
+            return
+        except OSError:
+            pass
+        #
+        if allow_symlink:
+            try:
+                os.symlink(os.path.abspath(src_file), dst_file)
+                return
+            except OSError:
+                pass
+            #
+        #
+        shutil.copy2(src_file, dst_file)
+
     def start_inference(self):
         self._prepare_model()
         artifacts_folder = self.kwargs['artifacts_folder']
@@ -229,6 +423,9 @@ class BaseRTSession(utils.ParamsBase):
         if hasattr(self.interpreter, 'get_TI_benchmark_data'):
             stats_dict = self._tidl_infer_stats()
         #
+        if self.kwargs.get('zero_copy', False) and hasattr(self, 'get_buffer_stats'):
+            stats_dict.update(self.get_buffer_stats())
+        #
         try:
             perfsim_stats = self._infer_perfsim_stats()
             stats_dict.update(perfsim_stats)
@@ -245,6 +442,24 @@ class BaseRTSession(utils.ParamsBase):
         session_name = self.get_session_name()
         return constants.SESSION_NAMES_DICT[session_name]
 
+    def _get_input_norm(self, input_data):
+        # with zero_copy, the input normalization is written directly into the input buffers of the runtime.
+        # only the case where input_normalizer applies the same mean/scale to every 4d input is handled here,
+        # None is returned otherwise and the input_normalizer is used as such.
+        mean, scale = self.input_normalizer.mean, self.input_normalizer.scale
+        if not isinstance(input_data, tuple) or mean is None or scale is None:
+            return None
+        #
+        input_norm = []
+        for tensor in input_data:
+            if not isinstance(tensor, np.ndarray) or tensor.ndim != 4:
+                return None
+            #
+            input_norm.append(preprocess_functional._normalize_pre(tensor, mean, scale,
+                self.input_normalizer.data_layout, inplace=True))
+        #
+        return input_norm
+
     def _update_output_details(self, outputs):
         if outputs is None:
             return
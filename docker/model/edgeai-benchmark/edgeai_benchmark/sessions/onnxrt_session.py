@@ -63,6 +63,26 @@ class ONNXRTSession(BaseRTSession, ONNXRuntimeWrapper):
         self._update_output_details(output)
         return output, info_dict
 
+    def get_activation_ranges(self, input_data_list):
+        if not self.is_start_import_done:
+            self._prepare_model()
+        #
+        model_file = self.kwargs['model_file']
+        if isinstance(model_file, (list,tuple)):
+            return None
+        #
+        def _normalize_input(input_data):
+            if not isinstance(input_data, (list,tuple)):
+                input_data = (input_data,)
+            #
+            if self.input_normalizer is not None:
+                input_data, _ = self.input_normalizer(input_data, {})
+            #
+            return input_data
+        #
+        input_data_list = (_normalize_input(input_data) for input_data in input_data_list)
+        return utils.get_activation_ranges(model_file, input_data_list, extra_inputs=self.kwargs.get('extra_inputs', None))
+
     def start_inference(self):
         os.chdir(self.cwd)
         BaseRTSession.start_inference(self)
@@ -76,12 +96,17 @@ class ONNXRTSession(BaseRTSession, ONNXRuntimeWrapper):
             input_data = (input_data,)
         #
 
+        input_norm = None
         if self.input_normalizer is not None:
-            input_data, _ = self.input_normalizer(input_data, {})
+            input_norm = self._get_input_norm(input_data) if self.kwargs['zero_copy'] else None
+            if input_norm is None:
+                input_data, _ = self.input_normalizer(input_data, {})
+            #
+        #
 
         # run the actual inference
         start_time = time.time()
-        outputs = ONNXRuntimeWrapper.run_inference(self, input_data)
+        outputs = ONNXRuntimeWrapper.run_inference(self, input_data, input_norm=input_norm)
         info_dict['session_invoke_time'] = (time.time() - start_time)
         self._update_output_details(outputs)
 
@@ -77,14 +77,19 @@ class TFLiteRTSession(BaseRTSession, TFLiteRuntimeWrapper):
             input_data = (input_data,)
         #
 
+        input_norm = None
         if self.input_normalizer is not None:
-            input_data, _ = self.input_normalizer(input_data, {})
+            input_norm = self._get_input_norm(input_data) if self.kwargs['zero_copy'] else None
+            if input_norm is None:
+                input_data, _ = self.input_normalizer(input_data, {})
+            #
         #
 
         # measure the time across only interpreter.run
         # time for setting the tensor and other overheads would be optimized out in c-api
         start_time = time.time()
-        outputs = TFLiteRuntimeWrapper.run_inference(self, input_data)
+        outputs = TFLiteRuntimeWrapper.run_inference(self, input_data, input_norm=input_norm)
         info_dict['session_invoke_time'] = (time.time() - start_time)
         self._update_output_details(outputs)
         return outputs, info_dict
+
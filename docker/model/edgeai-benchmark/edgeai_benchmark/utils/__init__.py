@@ -46,3 +46,6 @@ from .parallel_runner import *
 from .sequential_runner import *
 
 from .artifacts_id_to_model_name import *
+from .results_index import *
+from .calibration_utils import *
+from .infer_stats_utils import *
@@ -0,0 +1,206 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import pickle
+import numpy as np
+
+
+__all__ = ['CALIBRATION_SELECTION_TYPES', 'get_input_feature', 'get_activation_feature', 'select_diverse_indices',
+           'get_activation_ranges', 'get_activation_stats', 'load_calibration_cache', 'save_calibration_cache']
+
+
+CALIBRATION_SELECTION_TYPES = (None, 'diversity')
+
+# bump this if the content of the calibration cache files changes
+CALIBRATION_CACHE_VERSION = 1
+
+
+def get_input_feature(input_data, grid_size=4, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    '''
+    feature vector of a preprocessed input (or a list of inputs) - used to compare calibration frames.
+    the value distribution (quantiles) of each channel and a coarse grid_size x grid_size thumbnail.
+    the channel axis is taken to be the smallest one, so that both NCHW and NHWC inputs work.
+    '''
+    input_data = input_data if isinstance(input_data, (list,tuple)) else (input_data,)
+    features = []
+    for tensor in input_data:
+        tensor = np.asarray(tensor, dtype=np.float32)
+        tensor = tensor.reshape([d for d in tensor.shape if d != 1] or [1])
+        if tensor.ndim != 3:
+            features.append(np.quantile(tensor, quantiles))
+            continue
+        #
+        channel_axis = int(np.argmin(tensor.shape))
+        tensor = np.moveaxis(tensor, channel_axis, 0)
+        num_channels, height, width = tensor.shape
+        features.append(np.quantile(tensor.reshape(num_channels, -1), quantiles, axis=1).ravel())
+        grid_h, grid_w = min(grid_size, height), min(grid_size, width)
+        tensor = tensor[:, :height//grid_h*grid_h, :width//grid_w*grid_w]
+        thumbnail = tensor.reshape(num_channels, grid_h, height//grid_h, grid_w, width//grid_w).mean(axis=(2,4))
+        features.append(thumbnail.ravel())
+    #
+    return np.concatenate(features)
+
+
+def get_activation_feature(frame_min, frame_max):
+    '''
+    feature vector of each frame from the activation ranges that it produces in the float model -
+    frames that stretch different tensors are different for calibration, even if they look similar.
+    '''
+    return np.log1p(np.maximum(np.abs(frame_min), np.abs(frame_max)))
+
+
+def select_diverse_indices(features, num_select):
+    '''
+    greedy k-center selection: start with the frame closest to the mean, then keep adding the frame
+    that is farthest from the frames selected so far. returns the selected indices in ascending order.
+    '''
+    features = np.asarray(features, dtype=np.float64)
+    num_frames = features.shape[0]
+    if num_select >= num_frames:
+        return list(range(num_frames))
+    #
+    # standardize, so that every dimension of the feature contributes
+    features = features.reshape(num_frames, -1)
+    features_std = features.std(axis=0)
+    features_std[features_std == 0] = 1.0
+    features = (features - features.mean(axis=0)) / features_std
+    selected = [int(np.argmin(np.linalg.norm(features, axis=1)))]
+    distance = np.linalg.norm(features - features[selected[0]], axis=1)
+    while len(selected) < num_select:
+        index = int(np.argmax(distance))
+        selected.append(index)
+        distance = np.minimum(distance, np.linalg.norm(features - features[index], axis=1))
+    #
+    return sorted(selected)
+
+
+def _create_activation_interpreter(model_file):
+    # move the import inside the function, so that onnx and onnxruntime needs to be installed
+    # only if someone wants to use it
+    import onnx
+    import onnxruntime
+    model = onnx.shape_inference.infer_shapes(onnx.load(model_file))
+    # make all the intermediate float tensors outputs of the model
+    output_names = set(output.name for output in model.graph.output)
+    model.graph.output.extend([value_info for value_info in model.graph.value_info
+                               if value_info.type.tensor_type.elem_type == onnx.TensorProto.FLOAT and
+                               value_info.name not in output_names])
+    sess_options = onnxruntime.SessionOptions()
+    # suppress warnings
+    sess_options.log_severity_level = 3
+    return onnxruntime.InferenceSession(model.SerializeToString(), providers=['CPUExecutionProvider'],
+                                        sess_options=sess_options)
+
+
+def get_activation_ranges(model_file, input_data_list, extra_inputs=None):
+    '''
+    run the float onnx model with onnxruntime on the CPU (without TIDL) and return the min and max
+    of every float tensor for each input: dict(tensor_names, frame_min[frames,tensors], frame_max[frames,tensors])
+    '''
+    interpreter = _create_activation_interpreter(model_file)
+    input_names = [model_input.name for model_input in interpreter.get_inputs()]
+    tensor_names = [model_output.name for model_output in interpreter.get_outputs() if model_output.type == 'tensor(float)']
+    frame_min = []
+    frame_max = []
+    for input_data in input_data_list:
+        input_data = input_data if isinstance(input_data, (list,tuple)) else (input_data,)
+        input_data = dict(zip(input_names, input_data))
+        if extra_inputs:
+            input_data.update(extra_inputs)
+        #
+        outputs = interpreter.run(tensor_names, input_data)
+        frame_min.append([np.min(output) if output.size else 0.0 for output in outputs])
+        frame_max.append([np.max(output) if output.size else 0.0 for output in outputs])
+    #
+    return dict(tensor_names=tensor_names, frame_min=np.array(frame_min, dtype=np.float32),
+                frame_max=np.array(frame_max, dtype=np.float32))
+
+
+def get_activation_stats(activation_ranges, indices=None, percentile=99.0):
+    '''
+    per tensor statistics of the activation ranges over the frames given by indices (default: all):
+    min and max over the frames and percentiles of the frame min and frame max - outlier frames affect only the former.
+    '''
+    frame_min = activation_ranges['frame_min']
+    frame_max = activation_ranges['frame_max']
+    if indices is not None:
+        frame_min = frame_min[indices]
+        frame_max = frame_max[indices]
+    #
+    stats_min = frame_min.min(axis=0)
+    stats_max = frame_max.max(axis=0)
+    stats_min_p = np.percentile(frame_min, 100.0-percentile, axis=0)
+    stats_max_p = np.percentile(frame_max, percentile, axis=0)
+    activation_stats = {}
+    for tensor_index, tensor_name in enumerate(activation_ranges['tensor_names']):
+        activation_stats[tensor_name] = {
+            'min': float(stats_min[tensor_index]), 'max': float(stats_max[tensor_index]),
+            f'min_p{100.0-percentile:g}': float(stats_min_p[tensor_index]),
+            f'max_p{percentile:g}': float(stats_max_p[tensor_index])}
+    #
+    return activation_stats
+
+
+def load_calibration_cache(cache_file):
+    '''returns the content of the cache file - or None if it doesn't exist or is from another version'''
+    if not os.path.exists(cache_file):
+        return None
+    #
+    try:
+        with open(cache_file, 'rb') as fp:
+            if pickle.load(fp) == CALIBRATION_CACHE_VERSION:
+                return pickle.load(fp)
+            #
+        #
+    except Exception as e:
+        print(f'WARNING: could not load the calibration cache {cache_file} - {e}')
+    #
+    return None
+
+
+def save_calibration_cache(cache_file, cache_data):
+    # write to a temporary file and rename it, so that parallel processes never see a partial file
+    cache_file_tmp = f'{cache_file}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file_tmp, 'wb') as fp:
+            pickle.dump(CALIBRATION_CACHE_VERSION, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(cache_data, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        #
+        os.replace(cache_file_tmp, cache_file)
+    except OSError as e:
+        # the cache is only an accelerator
+        print(f'WARNING: could not write the calibration cache {cache_file} - {e}')
+        if os.path.exists(cache_file_tmp):
+            os.remove(cache_file_tmp)
+        #
+        return False
+    #
+    return True
@@ -0,0 +1,116 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+
+__all__ = ['InferStatsCollector']
+
+
+class InferStatsCollector:
+    '''
+    per frame performance stats of the inference: invoke time, core time, subgraph time and ddr transfer.
+    the stats of the session are queried only every interval frames (interval 0 or None: never) and the samples
+    are kept in a preallocated ring buffer. the mean is over all the samples and the percentiles are over the
+    last buffer_size samples.
+    a frame can have more than one run (for example flip_test) - the times are per frame (the sum of the runs),
+    but the ddr transfer is per run (the mean of the runs for which it is available).
+    '''
+    STATS_NAMES = ('invoke_time', 'core_time', 'subgraph_time', 'ddr_transfer')
+    PER_RUN_STATS_NAMES = ('ddr_transfer',)
+
+    def __init__(self, interval=1, buffer_size=4096, percentiles=(50, 90, 99)):
+        self.interval = interval or 0
+        self.percentiles = percentiles
+        self.buffer = np.full((buffer_size, len(self.STATS_NAMES)), np.nan, dtype=np.float64)
+        self.sums = np.zeros(len(self.STATS_NAMES), dtype=np.float64)
+        self.counts = np.zeros(len(self.STATS_NAMES), dtype=np.int64)
+        self.num_samples = 0
+        self.per_run = np.array([stats_name in self.PER_RUN_STATS_NAMES for stats_name in self.STATS_NAMES])
+
+    def is_sample(self, frame_index):
+        return self.interval > 0 and (frame_index % self.interval) == 0
+
+    def get_sample(self, session, info_dict):
+        # stats of the run that just completed - ddr transfer is nan if it is not available
+        stats_dict = session.infer_stats()
+        write_total = stats_dict['write_total']
+        read_total = stats_dict['read_total']
+        ddr_transfer = (write_total + read_total) if (write_total >= 0 and read_total >= 0) else np.nan
+        return np.array([info_dict['session_invoke_time'], stats_dict['core_time'], stats_dict['subgraph_time'], ddr_transfer],
+                        dtype=np.float64)
+
+    def add_sample(self, *run_samples):
+        # one sample from get_sample() for each run of the frame
+        run_samples = np.stack(run_samples)
+        run_valid = ~np.isnan(run_samples)
+        sample = run_samples.sum(axis=0)
+        sample_sums = np.where(run_valid, run_samples, 0).sum(axis=0)
+        sample_counts = run_valid.sum(axis=0)
+        # the per run stats of a frame are valid if any of its runs has them
+        sample[self.per_run] = np.where(sample_counts[self.per_run] > 0,
+            sample_sums[self.per_run] / np.maximum(sample_counts[self.per_run], 1), np.nan)
+        self.buffer[self.num_samples % len(self.buffer)] = sample
+        valid = ~np.isnan(sample)
+        self.sums[valid] += np.where(self.per_run, sample_sums, sample)[valid]
+        self.counts[valid] += np.where(self.per_run, sample_counts, 1)[valid]
+        self.num_samples += 1
+
+    def merge(self, other):
+        # add the samples of another collector - for example from another shard of the same inference
+        for sample in other.get_samples():
+            self.buffer[self.num_samples % len(self.buffer)] = sample
+            self.num_samples += 1
+        #
+        self.sums += other.sums
+        self.counts += other.counts
+
+    def get_samples(self):
+        # the samples in the ring buffer, oldest first
+        buffer_size = len(self.buffer)
+        if self.num_samples <= buffer_size:
+            return self.buffer[:self.num_samples]
+        #
+        return np.roll(self.buffer, -(self.num_samples % buffer_size), axis=0)
+
+    def get_stats(self):
+        '''returns {stats_name: {'mean':value, 'p50':value, ...}} - only the stats that have samples'''
+        samples = self.get_samples()
+        stats = {}
+        for stats_index, stats_name in enumerate(self.STATS_NAMES):
+            if self.counts[stats_index] == 0:
+                continue
+            #
+            stats_values = samples[:, stats_index]
+            stats_values = stats_values[~np.isnan(stats_values)]
+            stats[stats_name] = {'mean': float(self.sums[stats_index] / self.counts[stats_index])}
+            for percentile in (self.percentiles if stats_values.size > 0 else ()):
+                stats[stats_name][f'p{percentile}'] = float(np.percentile(stats_values, percentile))
+            #
+        #
+        return stats
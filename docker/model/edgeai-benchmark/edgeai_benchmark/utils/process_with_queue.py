@@ -35,6 +35,7 @@ import traceback
 import queue
 import copy
 import functools
+import pickle
 
 from .progress_step import *
 from .logger_utils import *
@@ -44,6 +45,16 @@ from .logger_utils import *
 mp_context = multiprocessing.get_context('spawn')
 
 
+def get_pickle_stats(obj):
+    '''
+    returns the size in bytes and the time in sec taken to pickle obj.
+    with the spawn method, this is what has to be sent to the process that runs a task.
+    '''
+    start_time = time.time()
+    pickle_size = len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    return pickle_size, time.time() - start_time
+
+
 class ProcessWithQueue(mp_context.Process):
     def __init__(self, group=None, target=None, name=None, args=(), kwargs=None,
         result_queue=None, log_file=None, **proc_kwargs):
@@ -0,0 +1,212 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import glob
+import pickle
+import sqlite3
+import multiprocessing
+import yaml
+
+
+__all__ = ['YamlLoader', 'YamlDumper', 'load_yaml', 'dump_yaml', 'get_run_result_file', 'load_run_result',
+           'load_run_results', 'ResultsIndex', 'update_results_index']
+
+
+# the C implementation (libyaml) is much faster - use it if pyyaml was built with it
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+YamlDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+RESULTS_INDEX_NAME = 'results_index.db'
+# bump this if the table layout changes - the index is then rebuilt from the yaml files
+RESULTS_INDEX_VERSION = 1
+
+
+def load_yaml(yaml_file):
+    with open(yaml_file) as fp:
+        return yaml.load(fp, Loader=YamlLoader)
+    #
+
+
+def dump_yaml(data, yaml_file, sort_keys=True):
+    with open(yaml_file, 'w') as fp:
+        yaml.dump(data, fp, Dumper=YamlDumper, sort_keys=sort_keys, default_flow_style=False)
+    #
+
+
+def get_run_result_file(run_dir):
+    # result.yaml is written after inference, config.yaml after import
+    for yaml_name in ('result.yaml', 'config.yaml'):
+        yaml_file = os.path.join(run_dir, yaml_name)
+        if os.path.exists(yaml_file):
+            return yaml_file
+        #
+    #
+    return None
+
+
+def _get_artifact_id(result):
+    model_id = result['session']['model_id']
+    session_name = result['session']['session_name']
+    return f'{model_id}_{session_name}'
+
+
+def load_run_result(run_dir):
+    '''
+    returns (run_dir, source, mtime_ns, size, result) or None if there is no result in run_dir
+    '''
+    yaml_file = get_run_result_file(run_dir)
+    if yaml_file is None:
+        return None
+    #
+    stat = os.stat(yaml_file)
+    result = load_yaml(yaml_file)
+    return run_dir, os.path.basename(yaml_file), stat.st_mtime_ns, stat.st_size, result
+
+
+def load_run_results(run_dirs, parallel_processes=None):
+    parallel_processes = min(parallel_processes or 1, len(run_dirs))
+    if parallel_processes > 1 and not multiprocessing.current_process().daemon:
+        with multiprocessing.Pool(parallel_processes) as pool:
+            run_results = pool.map(load_run_result, run_dirs, chunksize=8)
+        #
+    else:
+        run_results = [load_run_result(run_dir) for run_dir in run_dirs]
+    #
+    return [run_result for run_result in run_results if run_result is not None]
+
+
+class ResultsIndex:
+    '''
+    sqlite index of the results of all the run_dirs in a work_dir.
+    each row holds the result/config of one run_dir along with the stat of the yaml file it came from,
+    so that only the run_dirs that changed since the last update need to be parsed again.
+    '''
+    def __init__(self, work_dir, timeout=60.0):
+        self.work_dir = work_dir
+        self.index_file = os.path.join(work_dir, RESULTS_INDEX_NAME)
+        self.timeout = timeout
+        self.connection = None
+
+    def __enter__(self):
+        self.connection = sqlite3.connect(self.index_file, timeout=self.timeout)
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != RESULTS_INDEX_VERSION:
+            with self.connection:
+                self.connection.execute('DROP TABLE IF EXISTS results')
+                self.connection.execute(f'PRAGMA user_version = {RESULTS_INDEX_VERSION}')
+            #
+        #
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS results (run_dir TEXT PRIMARY KEY, artifact_id TEXT, source TEXT, '
+                'mtime_ns INTEGER, size INTEGER, model_id TEXT, session_name TEXT, task_type TEXT, '
+                'has_result INTEGER, result BLOB)')
+        #
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        #
+
+    def update(self, run_results):
+        rows = []
+        for run_dir, source, mtime_ns, size, result in run_results:
+            session = result['session']
+            rows.append((os.path.basename(run_dir), _get_artifact_id(result), source, mtime_ns, size,
+                         session['model_id'], session['session_name'], result.get('task_type', None),
+                         int(result.get('result', None) is not None),
+                         pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)))
+        #
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO results VALUES (?,?,?,?,?,?,?,?,?,?)', rows)
+        #
+
+    def load_results(self, run_dirs=None, parallel_processes=None):
+        '''
+        refresh the index from the yaml files that changed and return {artifact_id: result}
+        '''
+        run_dirs = [d for d in glob.glob(f'{self.work_dir}/*') if os.path.isdir(d)] if run_dirs is None else run_dirs
+        index_entries = {row[0]: row[1:] for row in
+                         self.connection.execute('SELECT run_dir, source, mtime_ns, size FROM results')}
+        stale_run_dirs = []
+        result_run_dirs = set()
+        for run_dir in run_dirs:
+            yaml_file = get_run_result_file(run_dir)
+            if yaml_file is None:
+                continue
+            #
+            result_run_dirs.add(os.path.basename(run_dir))
+            stat = os.stat(yaml_file)
+            index_entry = (os.path.basename(yaml_file), stat.st_mtime_ns, stat.st_size)
+            if index_entries.get(os.path.basename(run_dir), None) != index_entry:
+                stale_run_dirs.append(run_dir)
+            #
+        #
+        if stale_run_dirs:
+            self.update(load_run_results(stale_run_dirs, parallel_processes))
+        #
+        # also the run_dirs that still exist, but whose yaml file was removed
+        removed_run_dirs = set(index_entries.keys()) - result_run_dirs
+        if removed_run_dirs:
+            with self.connection:
+                self.connection.executemany('DELETE FROM results WHERE run_dir=?', [(d,) for d in removed_run_dirs])
+            #
+        #
+        results = {artifact_id: pickle.loads(result) for artifact_id, result in
+                   self.connection.execute('SELECT artifact_id, result FROM results ORDER BY artifact_id')}
+        return results
+
+
+def update_results_index(run_dir, param_result):
+    '''
+    record the result of a pipeline that just finished in the results index of its work_dir.
+    param_result must be the content of the result.yaml (or config.yaml) that was written to run_dir.
+    '''
+    if not param_result or 'session' not in param_result:
+        return False
+    #
+    source = 'result.yaml' if 'result' in param_result else 'config.yaml'
+    yaml_file = os.path.join(run_dir, source)
+    # the report reads result.yaml if it exists - do not record an older result.yaml as config.yaml
+    if not os.path.exists(yaml_file) or get_run_result_file(run_dir) != yaml_file:
+        return False
+    #
+    try:
+        stat = os.stat(yaml_file)
+        with ResultsIndex(os.path.dirname(os.path.normpath(run_dir))) as results_index:
+            results_index.update([(run_dir, source, stat.st_mtime_ns, stat.st_size, param_result)])
+        #
+    except (sqlite3.Error, OSError) as e:
+        # the index is only an accelerator - the report falls back to the yaml files
+        print(f'WARNING: could not update the results index: {e}')
+        return False
+    #
+    return True
@@ -0,0 +1,171 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+################################################################
+# Micro benchmark of the camera projection helpers used by the BEV pre/post processing.
+# The batched helpers (all the cameras and all the boxes at once) are checked against
+# per camera / per box reference loops and then both are timed.
+# Synthetic boxes and cameras are used, so no dataset needs to be downloaded.
+#
+# Example:
+#   python ./tests/benchmark_bev_projection.py --num_boxes 300 --num_cams 6
+################################################################
+
+import argparse
+import time
+import numpy as np
+
+from edgeai_benchmark.postprocess import bev_detection
+
+
+def get_lidar2imgs(num_cams, img_size):
+    height, width = img_size
+    intrinsic = np.eye(4)
+    intrinsic[:3, :3] = [[width/2, 0, width/2], [0, width/2, height/2], [0, 0, 1]]
+    lidar2imgs = []
+    for cam_id in range(num_cams):
+        # cameras looking outwards, evenly spaced around the z axis
+        yaw = cam_id * 2 * np.pi / num_cams
+        lidar2cam = np.eye(4)
+        lidar2cam[:3, :3] = [[np.sin(yaw), -np.cos(yaw), 0], [0, 0, -1], [np.cos(yaw), np.sin(yaw), 0]]
+        lidar2imgs.append((intrinsic @ lidar2cam).astype(np.float32))
+    #
+    return np.stack(lidar2imgs)
+
+
+################################################################
+# reference loop implementation - one camera, one box and one edge at a time
+def adjust_edge_loop(img_size, corners, depths, i, j):
+    if depths[i] < 1e-5 and depths[j] < 1e-5:
+        return None, None
+    if depths[i] > 1e5 and depths[j] > 1e5:
+        return None, None
+    a = np.copy(corners[i])
+    b = np.copy(corners[j])
+    h, w = img_size
+    if (a[0]<0 and b[0]<0) or (a[0]>w and b[0]>w) or (a[1]<0 and b[1]<0) or (a[1]>h and b[1]>h):
+        return None, None
+    if (a[0]>=0) and (b[0]>=0) and (a[0]<=w) and (b[0]<=w) and (a[1]>=0) and (b[1]>=0) and (a[1]<=h) and (b[1]<=h):
+        return a.astype(np.int32), b.astype(np.int32)
+    slope = (b[1]-a[1])/(b[0]-a[0])
+    def adjust_point(p):
+        if p[0] < 0:
+            p[1] = slope*(0-p[0])+p[1]
+            p[0] = 0
+        if p[0] > w:
+            p[1] = slope*(w-p[0])+p[1]
+            p[0] = w
+        if p[1] < 0:
+            p[0] = (0-p[1])/slope + p[0]
+            p[1] = 0
+        if p[1] > h:
+            p[0] = (h-p[1])/slope + p[0]
+            p[1] = h
+    adjust_point(a), adjust_point(b)
+    a = a.astype(np.int32)
+    b = b.astype(np.int32)
+    if (a[0]<=0 and b[0]<=0) or (a[0]>=w and b[0]>=w) or (a[1]<=0 and b[1]<=0) or (a[1]>=h and b[1]>=h):
+        return None, None
+    return a, b
+
+
+def proj_and_adjust_loop(corners_3d, lidar2imgs, img_size):
+    edges = []
+    for lidar2img in lidar2imgs:
+        for corners in corners_3d:
+            pts_2d = np.concatenate([corners, np.ones((8, 1))], axis=-1) @ lidar2img.T
+            if not np.any((pts_2d[:, 2] >= 1e-5) & (pts_2d[:, 2] <= 1e5)):
+                continue
+            #
+            depths = np.clip(pts_2d[:, 2], 1e-5, 1e5)
+            corners_2d = pts_2d[:, :2] / depths[:, None]
+            if not bev_detection._is_polygon_valid(corners_2d, img_size):
+                continue
+            #
+            for i, j in bev_detection.BOX_3D_EDGES:
+                a, b = adjust_edge_loop(img_size, corners_2d, depths, i, j)
+                if a is not None:
+                    edges.append((tuple(a), tuple(b)))
+                #
+            #
+        #
+    #
+    return edges
+
+
+def proj_and_adjust_batched(corners_3d, lidar2imgs, img_size):
+    edges = []
+    corners_2d, depths, valid_bbox = bev_detection.proj_lidar_bbox3d_to_imgs(corners_3d, lidar2imgs)
+    valid_bbox = valid_bbox & bev_detection._is_polygon_valid(corners_2d, img_size)
+    starts, ends, valid_edges = bev_detection.adjust_edges_in_the_img(img_size, corners_2d, depths)
+    valid_edges = valid_edges & valid_bbox[..., None]
+    for a, b in zip(starts[valid_edges], ends[valid_edges]):
+        edges.append((tuple(a), tuple(b)))
+    #
+    return edges
+
+
+def time_fn(num_repeats, fn, *fn_args):
+    start = time.perf_counter()
+    for _ in range(num_repeats):
+        fn(*fn_args)
+    #
+    return (time.perf_counter() - start) / num_repeats
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    img_size = (900, 1600)
+    bboxes_3d = np.concatenate([rng.uniform(-50, 50, (args.num_boxes, 2)), rng.uniform(-2, 1, (args.num_boxes, 1)),
+                                rng.uniform(0.5, 5, (args.num_boxes, 3)), rng.uniform(-np.pi, np.pi, (args.num_boxes, 1))],
+                               axis=1).astype(np.float32)
+    corners_3d = bev_detection.get_lidar_box_corners_3d(bboxes_3d)
+    lidar2imgs = get_lidar2imgs(args.num_cams, img_size)
+
+    # make sure both implementations agree before timing them
+    edges_loop = proj_and_adjust_loop(corners_3d, lidar2imgs, img_size)
+    edges_batched = proj_and_adjust_batched(corners_3d, lidar2imgs, img_size)
+    assert len(edges_loop) == len(edges_batched) and \
+        all(np.array_equal(e1, e2) for e1, e2 in zip(edges_loop, edges_batched))
+
+    print(f'boxes: {args.num_boxes}, cameras: {args.num_cams}, edges drawn: {len(edges_batched)}')
+    loop_ms = time_fn(args.num_repeats, proj_and_adjust_loop, corners_3d, lidar2imgs, img_size) * 1000
+    batched_ms = time_fn(args.num_repeats, proj_and_adjust_batched, corners_3d, lidar2imgs, img_size) * 1000
+    print(f'project + clip edges - loop: {loop_ms:.2f} ms/frame, batched: {batched_ms:.2f} ms/frame, '
+          f'speedup: {loop_ms/batched_ms:.1f}x')
+    corners_ms = time_fn(args.num_repeats, bev_detection.get_lidar_box_corners_3d, bboxes_3d) * 1000
+    print(f'get_lidar_box_corners_3d: {corners_ms:.3f} ms/frame')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_boxes', type=int, default=300, help='number of 3D boxes')
+    parser.add_argument('--num_cams', type=int, default=6, help='number of cameras around the vehicle')
+    parser.add_argument('--num_repeats', type=int, default=10, help='number of timed repeats')
+    args = parser.parse_args()
+    main(args)
@@ -32,7 +32,7 @@
 
 from .pruner_module import PrunerQuantModule, PrunerModule, SigmoidPruningParametrization, BlendPruningParametrization, IncrementalPruningParametrization
 from .utils import get_bn_adjusted_weight, create_bn_conv_mapping, create_next_conv_node_list, get_net_weights_all
-from .utils import create_channel_pruned_model
-
+from .utils import create_channel_pruned_model, PruningDependencyGraph
+from .parametrization import PruningMaskManager
 
 
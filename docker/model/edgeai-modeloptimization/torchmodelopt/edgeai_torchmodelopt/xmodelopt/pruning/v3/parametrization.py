@@ -24,6 +24,77 @@ def is_depthwise(fx_model, source, source_partition):
     return weight.shape[1]==1
 
 
+def _channel_importance(net_weight, fpgm_weights=True, p=2):
+    # importance of each channel along dim 0, computed for all channels at once
+    # fpgm : L2 distance of the channel from the (rough) geometric median, else the p-norm of the channel
+    flat_weight = net_weight.reshape(net_weight.size(0), -1)
+    if fpgm_weights:
+        rough_median = torch.median(net_weight, dim=0).values
+        return torch.norm(flat_weight - rough_median.reshape(1, -1), p=2, dim=1)
+    else:
+        return torch.norm(flat_weight, p=p, dim=1)
+
+
+def _blend_threshold(weight_abs, keep_elem_k, dim=None):
+    # same value as (min(topk(k=keep_elem_k, largest=True)) + max(topk(k=n-keep_elem_k, largest=False)))/2
+    # i.e. the mid point between the smallest kept value and the largest pruned value, with two kthvalue calls
+    keepdim = dim is not None
+    if dim is None:
+        weight_abs, dim = weight_abs.reshape(-1), 0
+    num_elem = weight_abs.size(dim)
+    lower = torch.kthvalue(weight_abs, num_elem-keep_elem_k, dim=dim, keepdim=keepdim).values
+    upper = torch.kthvalue(weight_abs, num_elem-keep_elem_k+1, dim=dim, keepdim=keepdim).values
+    return (upper + lower)/2
+
+
+def _n2m_soft_mask(weight_abs, m, pruning_ratio, alpha_factor):
+    # prune n elements for every m elements, all the complete blocks of m are thresholded together
+    soft_mask = torch.ones_like(weight_abs)
+    flat_weight = weight_abs.reshape(-1)
+    flat_mask = soft_mask.view(-1)
+    num_elem = len(flat_weight)
+    num_full = (num_elem//m)*m
+    for start_iter, end_iter in ((0, num_full), (num_full, num_elem)):
+        block_size = m if start_iter==0 else end_iter - start_iter
+        if block_size==0 or end_iter==start_iter:
+            continue
+        keep_elem_k = min(int((1-pruning_ratio)*m), block_size)
+        if (keep_elem_k==0) or ((block_size - keep_elem_k)==0):
+            continue
+        blocks = flat_weight[start_iter:end_iter].reshape(-1, block_size)
+        t = _blend_threshold(blocks, keep_elem_k, dim=1)
+        flat_mask[start_iter:end_iter] = ((blocks < t)*alpha_factor + (blocks >= t)*1.0).reshape(-1)
+    return soft_mask
+
+
+def _row_soft_mask(weight_abs, num_rows, pruning_ratio, alpha_factor):
+    # prune the pruning ratio number of elements in each of the first num_rows rows
+    soft_mask = torch.ones_like(weight_abs)
+    rows = weight_abs[:num_rows].reshape(num_rows, -1)
+    keep_elem_k = int((1-pruning_ratio)*rows.size(1))
+    if keep_elem_k==0 or keep_elem_k==rows.size(1):
+        return soft_mask
+    t = _blend_threshold(rows, keep_elem_k, dim=1)
+    soft_mask[:num_rows] = ((rows < t)*alpha_factor + (rows >= t)*1.0).reshape(soft_mask[:num_rows].shape)
+    return soft_mask
+
+
+def _total_epochs_knee_point(init_train_ep, total_epochs):
+    # epoch by which network should be pruned as desired
+    return (total_epochs-init_train_ep)*2//3
+
+
+def _blend_alpha_factor(epoch_count, init_train_ep, total_epochs, p):
+    # alpha factor gets multiplied to weights that needs to be pruned, it starts with 1 and parabolically moves towards 0
+    total_epochs_knee_point = _total_epochs_knee_point(init_train_ep, total_epochs)
+    if epoch_count<=init_train_ep:
+        return 1
+    elif epoch_count>total_epochs_knee_point:
+        return 0
+    else:
+        return math.pow(abs(epoch_count-total_epochs_knee_point),p)/math.pow(total_epochs_knee_point-init_train_ep, p)
+
+
 class IncrementalPruningParametrization(nn.Module):
     # incrementally a portion of weights are completely zeroed out every epoch
     def __init__(self, fx_model, source, source_partition, channel_pruning=False, pruning_ratio=0.6, n2m_pruning=False,  
@@ -78,51 +149,30 @@ class IncrementalPruningParametrization(nn.Module):
             else:
                 soft_mask = torch.ones_like(net_weight)
         else:
-            # epoch by which network should be pruned as desired
-            total_epochs_knee_point = (self.total_epochs-self.init_train_ep)*2//3 
+            total_epochs_knee_point = _total_epochs_knee_point(self.init_train_ep, self.total_epochs)
             alpha_factor = 0
                      
             if self.n2m_pruning: 
                 # self.m is the m in n:m pruning
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(math.ceil(len(net_weight.view(-1))/self.m)):
-                    start_iter = self.m*i
-                    end_iter = min(self.m*(i+1), len(net_weight.view(-1)))
-                    prune_elements = (self.pruning_ratio)*(self.epoch_count-self.init_train_ep)/(total_epochs_knee_point-self.init_train_ep)
-                    keep_elem_k = min(int((1-prune_elements)*self.m), end_iter - start_iter)
-                    if (keep_elem_k==0) or ((end_iter - start_iter - keep_elem_k)==0):
-                        continue    
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=(end_iter - start_iter - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask.view(-1)[start_iter:end_iter] = (weight_abs.view(-1)[start_iter:end_iter] < t)*alpha_factor + (weight_abs.view(-1)[start_iter:end_iter] >= t)*1.0
+                prune_elements = (self.pruning_ratio)*(self.epoch_count-self.init_train_ep)/(total_epochs_knee_point-self.init_train_ep)
+                soft_mask = _n2m_soft_mask(weight_abs, self.m, prune_elements, alpha_factor)
             
             else:
                 if self.channel_pruning:
                      # FPGM based finding channels to prune
                     net_weight = torch.permute(net_weight,self.new_shape)
                     if self.fpgm_weights:
-                        weight_to_opt = net_weight
-                        rough_median = torch.median(weight_to_opt, dim=0).values
-                        all_dist = torch.ones(weight_to_opt.shape[0], device = net_weight.device)
-                        for i in range(all_dist.shape[0]):
-                            all_dist[i] = torch.norm(weight_to_opt[i]-rough_median, p=2)
-                        net_weight=all_dist
+                        net_weight = _channel_importance(net_weight, fpgm_weights=True)
                     else:
                         # L2 norm based finding channel to prune
-                        L2_norm_channel = torch.ones(net_weight.size(0), device = net_weight.device)
-                        for i in range(net_weight.size(0)):
-                            L2_norm_channel[i] = torch.norm(net_weight[i], p=1).item() 
-                        net_weight = L2_norm_channel
+                        net_weight = _channel_importance(net_weight, fpgm_weights=False, p=1)
                 
                 # unstructured + channel pruning
                 weight_abs = torch.abs(net_weight)
                 prune_elements = (self.pruning_ratio)*(self.epoch_count-self.init_train_ep)/(total_epochs_knee_point-self.init_train_ep)
                 keep_elem_k = int((1-prune_elements)*weight_abs.nelement())
-                Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
+                t = _blend_threshold(weight_abs, keep_elem_k)
                 soft_mask = (weight_abs < t)*alpha_factor + (weight_abs >= t)*1.0
         
         return soft_mask 
@@ -200,6 +250,9 @@ class SoftPruningParametrization(nn.Module):
                 mask = torch.ones_like(net_weight).to(net_weight.device)
         elif net_weight.size(self.pruning_dim)<=32 and channel_pruning:
             mask = torch.ones(net_weight.size(self.pruning_dim)).to(net_weight.device)
+        elif kwargs.get('mask', None) is not None:
+            # mask already computed along with the other layers (PruningMaskManager)
+            mask = kwargs.get('mask')
         else:
             mask = self.create_mask(net_weight)
 
@@ -274,26 +327,16 @@ class SigmoidPruningParametrization(SoftPruningParametrization):
                      # FPGM based finding channels to prune
                     net_weight = torch.permute(net_weight,self.new_shape)
                     if self.fpgm_weights:
-                        weight_to_opt = net_weight
-                        rough_median = torch.median(weight_to_opt, dim=0).values
-                        all_dist = torch.ones(weight_to_opt.shape[0], device = net_weight.device)
-                        for i in range(all_dist.shape[0]):
-                            all_dist[i] = torch.norm(weight_to_opt[i]-rough_median, p=2) #L2 distance
-                        net_weight=all_dist
+                        net_weight = _channel_importance(net_weight, fpgm_weights=True) #L2 distance
                     
                     # # channel pruning, calculating L2 norm for each channel and pruning on the basis of that
                     else:
-                        L2_norm_channel = torch.ones(net_weight.size(0), device = net_weight.device)
-                        for i in range(net_weight.size(0)):
-                            L2_norm_channel[i] = torch.norm(net_weight[i], p=2).item()
-                        net_weight = L2_norm_channel
+                        net_weight = _channel_importance(net_weight, fpgm_weights=False, p=2)
 
                 # unstructured pruning + channel pruning
                 weight_abs = torch.abs(net_weight)
                 keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
+                t = _blend_threshold(weight_abs, keep_elem_k)
                 weight_offseted = weight_abs - t
                 
             sigmoid_domain = 3.0
@@ -322,68 +365,33 @@ class BlendPruningParametrization(SoftPruningParametrization):
             else:
                 soft_mask = torch.ones_like(net_weight)
         else:
-            # alpha factor gets multiplied to weights that needs to be pruned, it starts with 1 and parabolically moves towards 0
-            total_epochs_knee_point = (self.total_epochs-self.init_train_ep)*2//3
-            if self.epoch_count<=self.init_train_ep:
-                alpha_factor = 1
-            elif self.epoch_count>total_epochs_knee_point:
-                alpha_factor = 0
-            else:
-                alpha_factor = math.pow(abs(self.epoch_count-total_epochs_knee_point),self.p)/math.pow(total_epochs_knee_point-self.init_train_ep, self.p)
+            alpha_factor = _blend_alpha_factor(self.epoch_count, self.init_train_ep, self.total_epochs, self.p)
                      
             if self.n2m_pruning:
                 # prune 41 elements for every 64 elements (pass 41/64 in the self.pruning_ratio)
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(math.ceil(len(net_weight.view(-1))/self.m)):
-                    start_iter = self.m*i
-                    end_iter = min(self.m*(i+1), len(net_weight.view(-1)))
-                    keep_elem_k = min(int((1-self.pruning_ratio)*self.m), end_iter - start_iter)
-                    if (keep_elem_k==0) or ((end_iter - start_iter - keep_elem_k)==0):
-                        continue
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=(end_iter - start_iter - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask.view(-1)[start_iter:end_iter] = (weight_abs.view(-1)[start_iter:end_iter] < t)*alpha_factor + (weight_abs.view(-1)[start_iter:end_iter] >= t)*1.0
+                soft_mask = _n2m_soft_mask(weight_abs, self.m, self.pruning_ratio, alpha_factor)
             
             elif self.prunechannelunstructured:
                 # prune the pruning ratio number of elements in each layer of the model instead of considering the weights of full model
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(weight_abs.shape[self.pruning_dim]):
-                    keep_elem_k = int((1-self.pruning_ratio)*weight_abs[i].nelement())
-                    if keep_elem_k==0:
-                        continue
-                    Wh = torch.topk(torch.abs(weight_abs[i]).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs[i]).view(-1), k=(weight_abs[i].nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask[i] = (weight_abs[i] < t)*alpha_factor + (weight_abs[i] >= t)*1.0
+                soft_mask = _row_soft_mask(weight_abs, weight_abs.shape[self.pruning_dim], self.pruning_ratio, alpha_factor)
             
             else:
                 if self.channel_pruning:
                      # FPGM based finding channels to prune
                     net_weight = torch.permute(net_weight,self.new_shape)
                     if self.fpgm_weights:
-                        weight_to_opt = net_weight
-                        rough_median = torch.median(weight_to_opt, dim=0).values
-                        all_dist = torch.ones(weight_to_opt.shape[0], device = net_weight.device)
-                        for i in range(all_dist.shape[0]):
-                            all_dist[i] = torch.norm(weight_to_opt[i]-rough_median, p=2)
-                        net_weight=all_dist
+                        net_weight = _channel_importance(net_weight, fpgm_weights=True)
                         
                     else:
                         # L2 norm based finding channel to prune
-                        L2_norm_channel = torch.ones(net_weight.size(0), device = net_weight.device)
-                        for i in range(net_weight.size(0)):
-                            L2_norm_channel[i] = torch.norm(net_weight[i], p=2).item() 
-                        net_weight = L2_norm_channel
+                        net_weight = _channel_importance(net_weight, fpgm_weights=False, p=2)
                 
                 # unstructured + channel pruning
                 weight_abs = torch.abs(net_weight)
                 keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
+                t = _blend_threshold(weight_abs, keep_elem_k)
                 soft_mask = (weight_abs < t)*alpha_factor + (weight_abs >= t)*1.0
                 
         return soft_mask   
@@ -409,42 +417,17 @@ class ChannelOnlyBlendPruningParametrization(BlendPruningParametrization):
             else:
                 soft_mask = torch.ones_like(net_weight)
         else:
-            # alpha factor gets multiplied to weights that needs to be pruned, it starts with 1 and parabolically moves towards 0
-            total_epochs_knee_point = (self.total_epochs-self.init_train_ep)*2//3
-            if self.epoch_count<=self.init_train_ep:
-                alpha_factor = 1
-            elif self.epoch_count>total_epochs_knee_point:
-                alpha_factor = 0
-            else:
-                alpha_factor = math.pow(abs(self.epoch_count-total_epochs_knee_point),self.p)/math.pow(total_epochs_knee_point-self.init_train_ep, self.p)
+            alpha_factor = _blend_alpha_factor(self.epoch_count, self.init_train_ep, self.total_epochs, self.p)
                      
             if self.n2m_pruning:
                 # prune 41 elements for every 64 elements (pass 41/64 in the self.pruning_ratio)
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(math.ceil(len(net_weight.view(-1))/self.m)):
-                    start_iter = self.m*i
-                    end_iter = min(self.m*(i+1), len(net_weight.view(-1)))
-                    keep_elem_k = min(int((1-self.pruning_ratio)*self.m), end_iter - start_iter)
-                    if (keep_elem_k==0) or ((end_iter - start_iter - keep_elem_k)==0):
-                        continue
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=(end_iter - start_iter - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask.view(-1)[start_iter:end_iter] = (weight_abs.view(-1)[start_iter:end_iter] < t)*alpha_factor + (weight_abs.view(-1)[start_iter:end_iter] >= t)*1.0
+                soft_mask = _n2m_soft_mask(weight_abs, self.m, self.pruning_ratio, alpha_factor)
             
             elif self.prunechannelunstructured:
                 # prune the pruning ratio number of elements in each layer of the model instead of considering the weights of full model
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(weight_abs.shape[self.pruning_dim]):
-                    keep_elem_k = int((1-self.pruning_ratio)*weight_abs[i].nelement())
-                    if keep_elem_k==0:
-                        continue
-                    Wh = torch.topk(torch.abs(weight_abs[i]).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs[i]).view(-1), k=(weight_abs[i].nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask[i] = (weight_abs[i] < t)*alpha_factor + (weight_abs[i] >= t)*1.0
+                soft_mask = _row_soft_mask(weight_abs, weight_abs.shape[self.pruning_dim], self.pruning_ratio, alpha_factor)
             
             else:
                 if self.channel_pruning:
@@ -454,38 +437,24 @@ class ChannelOnlyBlendPruningParametrization(BlendPruningParametrization):
                     #channel Pruning
                     net_weight = net_weight.permute(2,0,1,3)
                     if self.fpgm_weights:
-                        weight_to_opt = net_weight
-                        rough_median = torch.median(weight_to_opt, dim=0).values
-                        all_dist = torch.ones(weight_to_opt.shape[0], device = net_weight.device)
-                        for i in range(all_dist.shape[0]):
-                            all_dist[i] = torch.norm(weight_to_opt[i]-rough_median, p=2)
-                        channel_norm = all_dist                    
+                        channel_norm = _channel_importance(net_weight, fpgm_weights=True)
                     else:
                         # L2 norm based finding channel to prune
-                        L2_norm_channel = torch.ones(net_weight.size(0), device = net_weight.device)
-                        for i in range(net_weight.size(0)):
-                            L2_norm_channel[i] = torch.norm(net_weight[i], p=2).item() 
-                        channel_norm = L2_norm_channel 
+                        channel_norm = _channel_importance(net_weight, fpgm_weights=False, p=2)
                     
                     weight_abs = torch.abs(channel_norm)
                     soft_mask = torch.ones(self.shape1[:3])
                     soft_mask = soft_mask.permute(2,1,0)
                     keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    for i, w in enumerate(weight_abs):
-                        if w < t:
-                            soft_mask[i] *= alpha_factor
+                    t = _blend_threshold(weight_abs, keep_elem_k)
+                    soft_mask[(weight_abs < t).to(soft_mask.device)] *= alpha_factor
                     soft_mask = soft_mask.permute(2,1,0)
                     soft_mask = soft_mask.reshape(-1)
                 
                 else:
                     weight_abs = torch.abs(net_weight)
                     keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
+                    t = _blend_threshold(weight_abs, keep_elem_k)
                     soft_mask = (weight_abs < t)*alpha_factor + (weight_abs >= t)*1.0
 
         return soft_mask 
@@ -509,42 +478,17 @@ class HeadOnlyBlendPruningParametrization(BlendPruningParametrization):
             else:
                 soft_mask = torch.ones_like(net_weight)
         else:
-            # alpha factor gets multiplied to weights that needs to be pruned, it starts with 1 and parabolically moves towards 0
-            total_epochs_knee_point = (self.total_epochs-self.init_train_ep)*2//3
-            if self.epoch_count<=self.init_train_ep:
-                alpha_factor = 1
-            elif self.epoch_count>total_epochs_knee_point:
-                alpha_factor = 0
-            else:
-                alpha_factor = math.pow(abs(self.epoch_count-total_epochs_knee_point),self.p)/math.pow(total_epochs_knee_point-self.init_train_ep, self.p)
+            alpha_factor = _blend_alpha_factor(self.epoch_count, self.init_train_ep, self.total_epochs, self.p)
                      
             if self.n2m_pruning:
                 # prune 41 elements for every 64 elements (pass 41/64 in the self.pruning_ratio)
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(math.ceil(len(net_weight.view(-1))/self.m)):
-                    start_iter = self.m*i
-                    end_iter = min(self.m*(i+1), len(net_weight.view(-1)))
-                    keep_elem_k = min(int((1-self.pruning_ratio)*self.m), end_iter - start_iter)
-                    if (keep_elem_k==0) or ((end_iter - start_iter - keep_elem_k)==0):
-                        continue
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=(end_iter - start_iter - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask.view(-1)[start_iter:end_iter] = (weight_abs.view(-1)[start_iter:end_iter] < t)*alpha_factor + (weight_abs.view(-1)[start_iter:end_iter] >= t)*1.0
+                soft_mask = _n2m_soft_mask(weight_abs, self.m, self.pruning_ratio, alpha_factor)
             
             elif self.prunechannelunstructured:
                 # prune the pruning ratio number of elements in each layer of the model instead of considering the weights of full model
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(weight_abs.shape[self.pruning_dim]):
-                    keep_elem_k = int((1-self.pruning_ratio)*weight_abs[i].nelement())
-                    if keep_elem_k==0:
-                        continue
-                    Wh = torch.topk(torch.abs(weight_abs[i]).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs[i]).view(-1), k=(weight_abs[i].nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask[i] = (weight_abs[i] < t)*alpha_factor + (weight_abs[i] >= t)*1.0
+                soft_mask = _row_soft_mask(weight_abs, weight_abs.shape[self.pruning_dim], self.pruning_ratio, alpha_factor)
             
             else:
                 if self.channel_pruning:
@@ -554,38 +498,24 @@ class HeadOnlyBlendPruningParametrization(BlendPruningParametrization):
                     #head Pruning
                     net_weight = net_weight.permute(1,0,2,3)
                     if self.fpgm_weights:
-                        weight_to_opt = net_weight
-                        rough_median = torch.median(weight_to_opt, dim=0).values
-                        all_dist = torch.ones(weight_to_opt.shape[0], device = net_weight.device)
-                        for i in range(all_dist.shape[0]):
-                            all_dist[i] = torch.norm(weight_to_opt[i]-rough_median, p=2)
-                        head_norm = all_dist                    
+                        head_norm = _channel_importance(net_weight, fpgm_weights=True)
                     else:
                         # L2 norm based finding channel to prune
-                        L2_norm_channel = torch.ones(net_weight.size(0), device = net_weight.device)
-                        for i in range(net_weight.size(0)):
-                            L2_norm_channel[i] = torch.norm(net_weight[i], p=2).item() 
-                        head_norm = L2_norm_channel 
+                        head_norm = _channel_importance(net_weight, fpgm_weights=False, p=2)
                     
                     weight_abs = torch.abs(head_norm)
                     soft_mask = torch.ones(self.shape1[:3])
                     soft_mask = soft_mask.permute(1,0,2)
                     keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    for i, w in enumerate(weight_abs):
-                        if w < t:
-                            soft_mask[i] *= alpha_factor
+                    t = _blend_threshold(weight_abs, keep_elem_k)
+                    soft_mask[(weight_abs < t).to(soft_mask.device)] *= alpha_factor
                     soft_mask = soft_mask.permute(1,0,2)
                     soft_mask = soft_mask.reshape(-1)
                 
                 else:
                     weight_abs = torch.abs(net_weight)
                     keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
+                    t = _blend_threshold(weight_abs, keep_elem_k)
                     soft_mask = (weight_abs < t)*alpha_factor + (weight_abs >= t)*1.0
 
         return soft_mask 
@@ -607,42 +537,17 @@ class HeadChannelBlendPruningParametrization(BlendPruningParametrization):
             else:
                 soft_mask = torch.ones_like(net_weight)
         else:
-            # alpha factor gets multiplied to weights that needs to be pruned, it starts with 1 and parabolically moves towards 0
-            total_epochs_knee_point = (self.total_epochs-self.init_train_ep)*2//3
-            if self.epoch_count<=self.init_train_ep:
-                alpha_factor = 1
-            elif self.epoch_count>total_epochs_knee_point:
-                alpha_factor = 0
-            else:
-                alpha_factor = math.pow(abs(self.epoch_count-total_epochs_knee_point),self.p)/math.pow(total_epochs_knee_point-self.init_train_ep, self.p)
+            alpha_factor = _blend_alpha_factor(self.epoch_count, self.init_train_ep, self.total_epochs, self.p)
                      
             if self.n2m_pruning:
                 # prune 41 elements for every 64 elements (pass 41/64 in the self.pruning_ratio)
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(math.ceil(len(net_weight.view(-1))/self.m)):
-                    start_iter = self.m*i
-                    end_iter = min(self.m*(i+1), len(net_weight.view(-1)))
-                    keep_elem_k = min(int((1-self.pruning_ratio)*self.m), end_iter - start_iter)
-                    if (keep_elem_k==0) or ((end_iter - start_iter - keep_elem_k)==0):
-                        continue
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1)[start_iter:end_iter], k=(end_iter - start_iter - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask.view(-1)[start_iter:end_iter] = (weight_abs.view(-1)[start_iter:end_iter] < t)*alpha_factor + (weight_abs.view(-1)[start_iter:end_iter] >= t)*1.0
+                soft_mask = _n2m_soft_mask(weight_abs, self.m, self.pruning_ratio, alpha_factor)
             
             elif self.prunechannelunstructured:
                 # prune the pruning ratio number of elements in each layer of the model instead of considering the weights of full model
                 weight_abs = torch.abs(net_weight)
-                soft_mask = torch.ones_like(net_weight)
-                for i in range(weight_abs.shape[self.pruning_dim]):
-                    keep_elem_k = int((1-self.pruning_ratio)*weight_abs[i].nelement())
-                    if keep_elem_k==0:
-                        continue
-                    Wh = torch.topk(torch.abs(weight_abs[i]).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs[i]).view(-1), k=(weight_abs[i].nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    soft_mask[i] = (weight_abs[i] < t)*alpha_factor + (weight_abs[i] >= t)*1.0
+                soft_mask = _row_soft_mask(weight_abs, weight_abs.shape[self.pruning_dim], self.pruning_ratio, alpha_factor)
             
             else:
                 if self.channel_pruning:
@@ -652,29 +557,17 @@ class HeadChannelBlendPruningParametrization(BlendPruningParametrization):
                     #channel Pruning
                     net_weight = net_weight.permute(2,0,1,3)
                     if self.fpgm_weights:
-                        weight_to_opt = net_weight
-                        rough_median = torch.median(weight_to_opt, dim=0).values
-                        all_dist = torch.ones(weight_to_opt.shape[0], device = net_weight.device)
-                        for i in range(all_dist.shape[0]):
-                            all_dist[i] = torch.norm(weight_to_opt[i]-rough_median, p=2)
-                        channel_norm = all_dist                    
+                        channel_norm = _channel_importance(net_weight, fpgm_weights=True)
                     else:
                         # L2 norm based finding channel to prune
-                        L2_norm_channel = torch.ones(net_weight.size(0), device = net_weight.device)
-                        for i in range(net_weight.size(0)):
-                            L2_norm_channel[i] = torch.norm(net_weight[i], p=2).item() 
-                        channel_norm = L2_norm_channel 
+                        channel_norm = _channel_importance(net_weight, fpgm_weights=False, p=2)
                     
                     weight_abs = torch.abs(channel_norm)
                     soft_mask = torch.ones(self.shape1[:3])
                     soft_mask = soft_mask.permute(2,1,0)
                     keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    for i, w in enumerate(weight_abs):
-                        if w < t:
-                            soft_mask[i] *= alpha_factor
+                    t = _blend_threshold(weight_abs, keep_elem_k)
+                    soft_mask[(weight_abs < t).to(soft_mask.device)] *= alpha_factor
                     soft_mask = soft_mask.permute(2,1,0)
                     channel_soft_mask = soft_mask.reshape(-1)
                     
@@ -682,47 +575,130 @@ class HeadChannelBlendPruningParametrization(BlendPruningParametrization):
                     #head Pruning
                     net_weight = net_weight.permute(2,1,0,3)
                     if self.fpgm_weights:
-                        weight_to_opt = net_weight
-                        rough_median = torch.median(weight_to_opt, dim=0).values
-                        all_dist = torch.ones(weight_to_opt.shape[0], device = net_weight.device)
-                        for i in range(all_dist.shape[0]):
-                            all_dist[i] = torch.norm(weight_to_opt[i]-rough_median, p=2)
-                        head_norm = all_dist                    
+                        head_norm = _channel_importance(net_weight, fpgm_weights=True)
                     else:
                         # L2 norm based finding channel to prune
-                        L2_norm_channel = torch.ones(net_weight.size(0), device = net_weight.device)
-                        for i in range(net_weight.size(0)):
-                            L2_norm_channel[i] = torch.norm(net_weight[i], p=2).item() 
-                        head_norm = L2_norm_channel 
+                        head_norm = _channel_importance(net_weight, fpgm_weights=False, p=2)
                     
                     weight_abs = torch.abs(head_norm)
                     soft_mask = torch.ones(self.shape1[:3])
                     soft_mask = soft_mask.permute(1,0,2)
                     keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
-                    for i, w in enumerate(weight_abs):
-                        if w < t:
-                            soft_mask[i] *= alpha_factor
+                    t = _blend_threshold(weight_abs, keep_elem_k)
+                    soft_mask[(weight_abs < t).to(soft_mask.device)] *= alpha_factor
                     soft_mask = soft_mask.permute(1,0,2)
                     head_soft_mask = soft_mask.reshape(-1)
                     
-                    for i, w in enumerate(channel_soft_mask):
-                        if w == 1:
-                            channel_soft_mask[i] *= head_soft_mask[i]
+                    channel_kept = (channel_soft_mask == 1)
+                    channel_soft_mask[channel_kept] *= head_soft_mask[channel_kept]
                     soft_mask = channel_soft_mask
                 
                 else:
                     weight_abs = torch.abs(net_weight)
                     keep_elem_k = int((1-self.pruning_ratio)*weight_abs.nelement())
-                    Wh = torch.topk(torch.abs(weight_abs).view(-1), k=keep_elem_k, largest=True)
-                    Wl = torch.topk(torch.abs(weight_abs).view(-1), k=(weight_abs.nelement() - keep_elem_k), largest=False)
-                    t = (torch.min(Wh.values)+ torch.max(Wl.values))/2
+                    t = _blend_threshold(weight_abs, keep_elem_k)
                     soft_mask = (weight_abs < t)*alpha_factor + (weight_abs >= t)*1.0
 
         return soft_mask 
 
+class PruningMaskManager():
+    '''
+    Computes the blend masks of all the pruned layers together, instead of each BlendPruningParametrization sorting its own weights.
+    The importance scores of every layer are concatenated and a single (stable) sort gives the per layer thresholds,
+    the masks are then split back per layer. Masks match BlendPruningParametrization.create_mask for channel and unstructured
+    pruning, n2m and prunechannelunstructured are left to the parametrization itself.
+    With global_threshold, a single threshold over the scores of all the layers keeps the same total number of elements
+    (or channels), so the layers get different pruning ratios - but no layer is pruned more than max_pruning_ratio.
+    '''
+    def __init__(self, channel_pruning=False, pruning_ratio=0.6, init_train_ep=5, epoch_count=0, total_epochs=10, p=2, fpgm_weights=True,
+                 global_threshold=False, max_pruning_ratio=0.8, **kwargs):
+        self.channel_pruning = channel_pruning
+        self.pruning_ratio = pruning_ratio
+        self.init_train_ep = init_train_ep
+        self.epoch_count = epoch_count
+        self.total_epochs = total_epochs
+        self.p = p
+        self.fpgm_weights = fpgm_weights
+        self.global_threshold = global_threshold
+        self.max_pruning_ratio = max_pruning_ratio
+        self.scores = dict()
+        self.keep_elems = dict()
+        self.masks = dict()
+    
+    @staticmethod
+    def supports(pruning_class, n2m_pruning=False, prunechannelunstructured=False, **kwargs):
+        return pruning_class is BlendPruningParametrization and not(n2m_pruning) and not(prunechannelunstructured)
+    
+    @staticmethod
+    def is_supported(pruning_class, n2m_pruning=False, prunechannelunstructured=False, epoch_count=0, init_train_ep=5, **kwargs):
+        # before init_train_ep the masks are all ones anyway
+        return PruningMaskManager.supports(pruning_class, n2m_pruning, prunechannelunstructured) and epoch_count>init_train_ep
+    
+    def add(self, name, net_weight, pruning_dim=0, pruning_ratio=None):
+        pruning_ratio = self.pruning_ratio if pruning_ratio is None else pruning_ratio
+        net_weight = net_weight.detach()
+        # layers that SoftPruningParametrization does not prune, need not be scored
+        if int(pruning_ratio*net_weight.nelement())==0 or (self.channel_pruning and net_weight.size(pruning_dim)<=32):
+            return
+        if self.channel_pruning:
+            new_shape = list(range(len(net_weight.shape)))
+            new_shape[0],new_shape[pruning_dim] = new_shape[pruning_dim],new_shape[0]
+            scores = _channel_importance(torch.permute(net_weight,new_shape), self.fpgm_weights)
+        else:
+            scores = net_weight
+        keep_elem_k = int((1-pruning_ratio)*scores.nelement())
+        if keep_elem_k==0 or keep_elem_k==scores.nelement():
+            return
+        scores = torch.abs(scores)
+        if self.global_threshold and self.channel_pruning:
+            # the channel importance of different layers is on different scales, compare them relative to the layer mean
+            scores = scores / (scores.mean() + 1e-10)
+        self.scores[name] = scores
+        self.keep_elems[name] = keep_elem_k
+    
+    @staticmethod
+    def _layer_thresholds(flat_scores, counts, keep_elems):
+        # sort by value and then (stable) by layer, values of each layer end up contiguous and in ascending order
+        layer_ids = torch.repeat_interleave(torch.arange(len(counts), device=flat_scores.device), counts)
+        sorted_scores, order = torch.sort(flat_scores, stable=True)
+        _, layer_order = torch.sort(layer_ids[order], stable=True)
+        sorted_scores = sorted_scores[layer_order]
+        # smallest kept value and the largest pruned value of each layer
+        upper_index = torch.cumsum(counts, dim=0) - keep_elems
+        t = (sorted_scores[upper_index] + sorted_scores[upper_index-1])/2
+        return torch.repeat_interleave(t, counts)
+    
+    def compute(self):
+        alpha_factor = _blend_alpha_factor(self.epoch_count, self.init_train_ep, self.total_epochs, self.p)
+        groups = dict()
+        for name, scores in self.scores.items():
+            # a global threshold needs all the scores together, on one device
+            group_key = None if self.global_threshold else (scores.device, scores.dtype)
+            groups.setdefault(group_key, []).append(name)
+        
+        for names in groups.values():
+            device = self.scores[names[0]].device
+            counts = torch.tensor([self.scores[name].nelement() for name in names], device=device)
+            keep_elems = torch.tensor([self.keep_elems[name] for name in names], device=device)
+            flat_scores = torch.cat([self.scores[name].reshape(-1).to(device, torch.float32 if self.global_threshold else None) for name in names])
+            if self.global_threshold:
+                t = _blend_threshold(flat_scores, int(keep_elems.sum()))
+                min_keep_elems = torch.clamp(torch.ceil(counts*(1-self.max_pruning_ratio)).long(), min=1)
+                min_keep_elems = torch.minimum(min_keep_elems, counts-1)
+                t = torch.minimum(t, self._layer_thresholds(flat_scores, counts, min_keep_elems))
+            else:
+                t = self._layer_thresholds(flat_scores, counts, keep_elems)
+            flat_masks = (flat_scores < t)*alpha_factor + (flat_scores >= t)*1.0
+            for name, mask in zip(names, torch.split(flat_masks, counts.tolist())):
+                self.masks[name] = mask.reshape(self.scores[name].shape).to(self.scores[name].device)
+        
+        self.scores.clear()
+        return self.masks
+    
+    def get(self, name):
+        return self.masks.get(name, None)
+
+
 PRUNING_CLASS_DICT = {"blend": BlendPruningParametrization, 
                  "sigmoid": SigmoidPruningParametrization, 
                  "incremental": IncrementalPruningParametrization}
\ No newline at end of file
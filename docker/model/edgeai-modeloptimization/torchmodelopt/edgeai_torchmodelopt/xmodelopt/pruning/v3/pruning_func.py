@@ -2,19 +2,18 @@ import torch
 from torch import _dynamo as torch_dynamo
 import torch.nn as nn
 import torch.fx as fx
-from torch.fx.passes.utils.source_matcher_utils import  SourcePartition
 import torch.nn.utils.parametrize as parametrize
 from torch.ao.quantization import quantize_fx
 import types
 
 from .... import xnn
-from .utils import get_bn_adjusted_weight, create_bn_conv_mapping, create_next_conv_node_list, find_all_connected_nodes, get_net_weight_node_channel_prune, get_net_weights_all, get_pruning_partitions,get_num_heads_head_dims, get_parameter_indices
-from .parametrization import BlendPruningParametrization, SigmoidPruningParametrization, IncrementalPruningParametrization, ChannelOnlyBlendPruningParametrization, HeadChannelBlendPruningParametrization, HeadOnlyBlendPruningParametrization, PRUNING_CLASS_DICT
+from .utils import get_bn_adjusted_weight, get_net_weight_node_channel_prune, get_net_weights_all, get_num_heads_head_dims, get_parameter_indices
+from .utils import PruningDependencyGraph
+from .parametrization import BlendPruningParametrization, SigmoidPruningParametrization, IncrementalPruningParametrization, ChannelOnlyBlendPruningParametrization, HeadChannelBlendPruningParametrization, HeadOnlyBlendPruningParametrization, PruningMaskManager, PRUNING_CLASS_DICT
 from ... import utils
 
 def init(module, *args, example_inputs:list=None, example_kwargs:dict=None, pruning_ratio=None, total_epochs=None, pruning_class='blend',p=2.0, pruning_global=False, copy_args=None,
             pruning_type='channel', pruning_init_train_ep=5, pruning_m=None, add_methods=True, aten_graph=True, **kwargs):
-    copy_attrs = copy_attrs or []
     copy_args = copy_args or []
     example_inputs =[] if example_inputs is None else example_inputs
     example_kwargs = example_kwargs or {}
@@ -54,8 +53,11 @@ def init(module, *args, example_inputs:list=None, example_kwargs:dict=None, prun
     
     #responsible for creating a next mapping (basically helps combine the weight of BN and conv)
     
-    module.__prune_params__.pruning_partitions = get_pruning_partitions(module.__prune_params__.module)
-    module.__prune_params__.next_bn_nodes = create_bn_conv_mapping(module, module.__prune_params__.pruning_partitions)
+    # one time analysis of the graph, the partitions and their connectivity are reused by the mask updates 
+    # in every epoch and by create_channel_pruned_model
+    module.__prune_params__.dependency_graph = PruningDependencyGraph(module)
+    module.__prune_params__.pruning_partitions = module.__prune_params__.dependency_graph.pattern_partitions
+    module.__prune_params__.next_bn_nodes = module.__prune_params__.dependency_graph.next_bn_partitions
     module.__prune_params__.channel_pruning = False
     module.__prune_params__.n2m_pruning = False
     module.__prune_params__.prunechannelunstructured = False
@@ -81,9 +83,9 @@ def init(module, *args, example_inputs:list=None, example_kwargs:dict=None, prun
     
     if module.__prune_params__.channel_pruning:
         # creating the next node list, which contains the connection to all convs to the current conv
-        module.__prune_params__.next_conv_node_list = create_next_conv_node_list(module, module.__prune_params__.pruning_partitions)
+        module.__prune_params__.next_conv_node_list = module.__prune_params__.dependency_graph.next_conv_node_list
         # returns the list of all conv that share the same output
-        module.__prune_params__.all_connected_nodes = find_all_connected_nodes(module, module.__prune_params__.pruning_partitions)
+        module.__prune_params__.all_connected_nodes = module.__prune_params__.dependency_graph.all_connected_nodes
     else:
         module.__prune_params__.next_conv_node_list = None
         module.__prune_params__.all_connected_nodes = None
@@ -96,9 +98,12 @@ def init(module, *args, example_inputs:list=None, example_kwargs:dict=None, prun
         setattr(module, copy_arg, getattr(module, copy_arg))
         
     # to get net weights for each of the layers, incorporating all the required dependancies
-    module.__prune_params__.net_weights = get_net_weights_all(module, module.__prune_params__.pruning_partitions, module.__prune_params__.next_conv_node_list, module.__prune_params__.all_connected_nodes, module.__prune_params__.next_bn_nodes, module.__prune_params__.channel_pruning, module.__prune_params__.global_pruning)
+    module.__prune_params__.net_weights = get_net_weights_all(module, module.__prune_params__.pruning_partitions, module.__prune_params__.next_conv_node_list, module.__prune_params__.all_connected_nodes, module.__prune_params__.next_bn_nodes, module.__prune_params__.channel_pruning, module.__prune_params__.global_pruning,
+                                                          dependency_graph=module.__prune_params__.dependency_graph)
     
-    if module.__prune_params__.global_pruning:
+    # blend pruning uses a single threshold over all the layers (PruningMaskManager), the others need per layer ratios
+    if module.__prune_params__.global_pruning and not PruningMaskManager.supports(module.__prune_params__.pruning_class,
+            module.__prune_params__.n2m_pruning, module.__prune_params__.prunechannelunstructured):
         if module.__prune_params__.channel_pruning:
             module.__prune_params__.get_layer_pruning_ratio_channel(pruning_ratio)
         else:
@@ -243,13 +248,7 @@ def insert_parametrization(module, binary_mask=False):
     attn_proj_class = HeadOnlyBlendPruningParametrization
     attn_proj_class = ChannelOnlyBlendPruningParametrization
     
-    all_partition_nodes =[] 
-    for cls,partitions in module.__prune_params__.pruning_partitions.items():
-        for partition in partitions:
-            nodes = []
-            if isinstance(partition,SourcePartition): nodes.extend(partition.nodes)
-            # if isinstance(partition,InternalMatch): nodes.extend(list(partition.nodes_map.values()))
-            all_partition_nodes.extend([node.name for node in nodes])
+    all_partition_nodes = module.__prune_params__.dependency_graph.partition_node_names
     pruning_ratio = module.__prune_params__.pruning_ratio if isinstance(module.__prune_params__.pruning_ratio, float) else module.__prune_params__.pruning_ratio[node.target]
     net_weights = module.__prune_params__.net_weights
     pruning_class = module.__prune_params__.pruning_class
@@ -266,6 +265,18 @@ def insert_parametrization(module, binary_mask=False):
         }
     if  pruning_class == BlendPruningParametrization:
         kwargs['p'] = module.__prune_params__.p
+    
+    # masks of all the layers are computed together (single sort over all importance scores), layers not handled there compute their own
+    mask_manager = None
+    if PruningMaskManager.is_supported(pruning_class, **kwargs):
+        mask_manager = PruningMaskManager(global_threshold=module.__prune_params__.global_pruning, **kwargs)
+        for param_name, (net_weight, dim) in net_weights.items():
+            mask_manager.add(param_name, net_weight, pruning_dim=dim)
+        mask_manager.compute()
+    
+    def get_mask(param_name):
+        return mask_manager.get(param_name) if mask_manager is not None else None
+    
     for node in module.graph.nodes:
         if node.name in all_partition_nodes:
             continue
@@ -275,7 +286,7 @@ def insert_parametrization(module, binary_mask=False):
             attr = params[f'parametrizations.{node.target}.original'] if  parametrize.is_parametrized(module,node.target) else params[node.target]
             if isinstance(attr,nn.Parameter):
                 net_weight, dim = net_weights[node.target]
-                parametrization =  pruning_class(fx_model=module,source=node,source_partition=node, net_weight = net_weight,pruning_dim = dim,**kwargs)
+                parametrization =  pruning_class(fx_model=module,source=node,source_partition=node, net_weight = net_weight,pruning_dim = dim,mask=get_mask(node.target),**kwargs)
                 parametrize.register_parametrization(module, node.target, parametrization)
     
     for cls,partitions in module.__prune_params__.pruning_partitions.items():
@@ -284,7 +295,7 @@ def insert_parametrization(module, binary_mask=False):
                 weight_index, bias_index = get_parameter_indices(module,cls,partition)
                 param_name = partition.nodes[weight_index].target
                 net_weight,dim =  net_weights[param_name]
-                parametrization =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,**kwargs)
+                parametrization =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,mask=get_mask(param_name),**kwargs)
                 parametrize.register_parametrization(module, param_name, parametrization)
                 if len(partition.nodes) ==3 and module.__prune_params__.channel_pruning:
                     param_name = partition.nodes[bias_index].target
@@ -295,7 +306,7 @@ def insert_parametrization(module, binary_mask=False):
                 weight_index, bias_index = get_parameter_indices(module,cls,partition)
                 param_name = partition.nodes[weight_index].target
                 net_weight,dim =  net_weights[param_name]
-                parametrization =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,**kwargs)
+                parametrization =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,mask=get_mask(param_name),**kwargs)
                 parametrize.register_parametrization(module, param_name, parametrization)
                 if len(partition.nodes) ==11 and module.__prune_params__.channel_pruning:
                     param_name = partition.nodes[bias_index].target
@@ -309,7 +320,7 @@ def insert_parametrization(module, binary_mask=False):
 
                 param_name = partition.nodes[weight_index].target
                 net_weight,dim =  net_weights[param_name]
-                parametrization =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,**kwargs)
+                parametrization =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,mask=get_mask(param_name),**kwargs)
                 parametrize.register_parametrization(module, param_name, parametrization)
                 if module.__prune_params__.channel_pruning:
                     param_name = partition.nodes[bias_index].target
@@ -319,7 +330,7 @@ def insert_parametrization(module, binary_mask=False):
                 weight_index, bias_index = get_parameter_indices(module,cls,partition)
                 param_name = partition.nodes[weight_index].target
                 net_weight,dim =  net_weights[param_name]
-                parametrization =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,**kwargs)
+                parametrization =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,mask=get_mask(param_name),**kwargs)
                 parametrize.register_parametrization(module, param_name, parametrization)
                 if len(partition.nodes) ==6 and module.__prune_params__.channel_pruning:
                     param_name = partition.nodes[bias_index].target
@@ -332,11 +343,11 @@ def insert_parametrization(module, binary_mask=False):
                 if module.__prune_params__.channel_pruning:
                     parametrization1 = attn_proj_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,**kwargs)
                 else: 
-                    parametrization1 =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,**kwargs)
+                    parametrization1 =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,mask=get_mask(param_name),**kwargs)
                 parametrize.register_parametrization(module, param_name, parametrization1)
                 param_name = partition.nodes[weight_indices[1]].target
                 net_weight,dim =  net_weights[param_name]
-                parametrization2 =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,**kwargs)
+                parametrization2 =  pruning_class(fx_model=module,source=cls,source_partition=partition, net_weight = net_weight,pruning_dim = dim,mask=get_mask(param_name),**kwargs)
                 parametrize.register_parametrization(module, param_name, parametrization2)
                 
                 if module.__prune_params__.channel_pruning:                     
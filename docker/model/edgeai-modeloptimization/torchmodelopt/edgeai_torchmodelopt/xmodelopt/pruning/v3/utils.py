@@ -62,7 +62,10 @@ def remove_duplicates(items:list):
             result.append(item)
     return result
 
-def _is_a_proper_input_node(node:fx.Node, model:fx.graph_module.GraphModule, old_results:dict[str:bool]={}):
+def _is_a_proper_input_node(node:fx.Node, model:fx.graph_module.GraphModule, old_results:dict[str:bool]=None):
+    # old_results is the memo of this graph, it is kept by PruningDependencyGraph across calls
+    if old_results is None:
+        old_results = {}
     if node.name in old_results:
         return old_results[node.name]
 
@@ -95,20 +98,21 @@ def _is_a_proper_input_node(node:fx.Node, model:fx.graph_module.GraphModule, old
     old_results[node.name]=any([_is_a_proper_input_node(arg,model,old_results) for arg in args])
     return old_results[node.name]
 
-def _get_proper_input_args(curr_partition:fx.Node|SourcePartition, fx_model:fx.GraphModule,):
+def _get_proper_input_args(curr_partition:fx.Node|SourcePartition, fx_model:fx.GraphModule, old_results:dict[str,bool]=None):
+    old_results = {} if old_results is None else old_results
     args:List[fx.Node] = []
     if isinstance(curr_partition,fx.Node):
         node = curr_partition
         for arg in node.args:
-            if isinstance(arg,fx.Node) and _is_a_proper_input_node(arg,fx_model):
+            if isinstance(arg,fx.Node) and _is_a_proper_input_node(arg,fx_model,old_results):
                 args.append(arg)
             elif isinstance(arg,Iterable) and not isinstance(arg,str):
                 for a in arg:
-                    if isinstance(a,fx.Node) and _is_a_proper_input_node(a,fx_model):
+                    if isinstance(a,fx.Node) and _is_a_proper_input_node(a,fx_model,old_results):
                         args.append(a)
     elif isinstance(curr_partition,SourcePartition):
         for arg in curr_partition.input_nodes:
-            if _is_a_proper_input_node(arg,fx_model):
+            if _is_a_proper_input_node(arg,fx_model,old_results):
                 args.append(arg)
     args = remove_duplicates(args)
     return args
@@ -248,6 +252,97 @@ def get_pruning_partitions(module:fx.GraphModule):
     
     return get_source_partitions(module.graph,wanted_sources)
 
+class PruningDependencyGraph():
+    '''
+    one time dependency analysis of the pruned layers (partitions) of a graph module
+
+    the graph walks (proper input args, next/prev pruned partitions of a node, partition of a node, connected layers)
+    are memoized here, so that they are done once per model instead of once per node / per call.
+    the connected layers (all_connected_nodes) are reused by get_net_weights_all and create_channel_pruned_model.
+
+    the memo is valid as long as the graph structure is not changed, parameters values/shapes may change.
+    '''
+    def __init__(self, module:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]]=None):
+        self.module = module
+        self.pattern_partitions = get_pruning_partitions(module) if pattern_partitions is None else pattern_partitions
+        self.params = dict(module.named_parameters())
+        # node -> (cls, partition), the first partition containing the node, in the order of pattern_partitions
+        self.node_to_partition:dict[fx.Node,tuple[type,SourcePartition]] = {}
+        # cls -> node -> first partition of the cls containing the node
+        self.node_to_partition_by_cls:dict[Any,dict[fx.Node,SourcePartition]] = {}
+        self.partition_node_names = set()
+        self.partition_get_attr_node_names = set()
+        for cls, partitions in self.pattern_partitions.items():
+            cls_node_to_partition = self.node_to_partition_by_cls.setdefault(cls, {})
+            for partition in partitions:
+                for node in partition.nodes:
+                    self.node_to_partition.setdefault(node, (cls, partition))
+                    cls_node_to_partition.setdefault(node, partition)
+                    self.partition_node_names.add(node.name)
+                    if node.op == 'get_attr':
+                        self.partition_get_attr_node_names.add(node.name)
+        # memo of the graph walks
+        self.proper_input_results:dict[str,bool] = {}
+        self.proper_input_args_results:dict[fx.Node,List[fx.Node]] = {}
+        self.next_pruned_partitions_results:dict[str,list[tuple[type,SourcePartition]]] = {}
+        self.prev_pruned_partitions_results:dict[str,list[tuple[type,SourcePartition]]] = {}
+        self._next_bn_partitions = None
+        self._next_conv_node_list = None
+        self._all_connected_nodes = None
+
+    def refresh_params(self):
+        self.params = dict(self.module.named_parameters())
+        return self
+
+    def partition_of(self, node:fx.Node, cls=None):
+        '''returns (cls, partition) containing the node, or the partition of the given cls containing it (None if not found)'''
+        if cls is None:
+            return self.node_to_partition.get(node, None)
+        return self.node_to_partition_by_cls.get(cls, {}).get(node, None)
+
+    def proper_input_args(self, curr_partition:fx.Node|SourcePartition):
+        if isinstance(curr_partition, fx.Node):
+            if curr_partition not in self.proper_input_args_results:
+                self.proper_input_args_results[curr_partition] = _get_proper_input_args(curr_partition, self.module, self.proper_input_results)
+            return self.proper_input_args_results[curr_partition]
+        return _get_proper_input_args(curr_partition, self.module, self.proper_input_results)
+
+    def next_pruned_partitions(self, node:fx.Node):
+        return find_next_prunned_partitions(node, self.module, self.pattern_partitions, self.next_pruned_partitions_results, dependency_graph=self)
+
+    def prev_pruned_partitions(self, node:fx.Node):
+        return find_prev_pruned_partitions(node, self.module, self.pattern_partitions, self.prev_pruned_partitions_results, dependency_graph=self)
+
+    @property
+    def next_bn_partitions(self):
+        if self._next_bn_partitions is None:
+            self._next_bn_partitions = create_bn_conv_mapping(self.module, self.pattern_partitions)
+        return self._next_bn_partitions
+
+    @property
+    def next_conv_node_list(self):
+        if self._next_conv_node_list is None:
+            self._next_conv_node_list = create_next_conv_node_list(self.module, self.pattern_partitions, dependency_graph=self)
+        return self._next_conv_node_list
+
+    @property
+    def all_connected_nodes(self):
+        if self._all_connected_nodes is None:
+            self._all_connected_nodes = find_all_connected_nodes(self.module, self.pattern_partitions, dependency_graph=self)
+        return self._all_connected_nodes
+
+
+def get_dependency_graph(module:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]]=None, dependency_graph:PruningDependencyGraph=None):
+    '''returns the given dependency graph if it is of this module, else the one cached in module.__prune_params__, else a new one'''
+    if dependency_graph is not None and dependency_graph.module is module:
+        return dependency_graph
+    prune_params = getattr(module, '__prune_params__', None)
+    if prune_params is not None and isinstance(prune_params.get('dependency_graph', None), PruningDependencyGraph) \
+            and prune_params.dependency_graph.module is module:
+        return prune_params.dependency_graph
+    return PruningDependencyGraph(module, pattern_partitions)
+
+
 def get_parameter_indices(fx_model:fx.GraphModule, source:type, partition:SourcePartition):
     if source == nn.Conv2d:
         weight_index = 0
@@ -343,16 +438,16 @@ def create_bn_conv_mapping(module:fx.GraphModule, pattern_partitions:dict[Any,Li
                     
     return next_bn_partitions
 
-def find_in_node(module:fx.GraphModule, orig_partition:SourcePartition, curr_partition:SourcePartition|fx.Node, pattern_partitions:dict[Any,List[SourcePartition]], next_conv_node_list:dict[Any,List[SourcePartition]]):
+def find_in_node(module:fx.GraphModule, orig_partition:SourcePartition, curr_partition:SourcePartition|fx.Node, pattern_partitions:dict[Any,List[SourcePartition]], next_conv_node_list:dict[Any,List[SourcePartition]],
+                 dependency_graph:PruningDependencyGraph=None):
     # recursive call to find the related conv layers to the orig conv layer in its users (below layers)
     if isinstance(curr_partition,fx.Node) and  curr_partition.op == 'output':
         return
-    if nn.Conv2d in pattern_partitions:
-        conv_partitions = pattern_partitions[nn.Conv2d]
-    else:
+    if nn.Conv2d not in pattern_partitions:
         return
+    dependency_graph = get_dependency_graph(module, pattern_partitions, dependency_graph)
     
-    if orig_partition not in conv_partitions:
+    if dependency_graph.partition_of(orig_partition.nodes[0], nn.Conv2d) is not orig_partition:
         return
     
 
@@ -365,36 +460,30 @@ def find_in_node(module:fx.GraphModule, orig_partition:SourcePartition, curr_par
                 return
 
         for sub_node in curr_partition.users:
-            found = False
-            for conv_match in conv_partitions:
-                if sub_node in conv_match.nodes:
-                    find_in_node(module,orig_partition,conv_match,pattern_partitions,next_conv_node_list)
-                    found = True
-                    break
-            if found : continue
-            find_in_node(module, orig_partition, sub_node, pattern_partitions, next_conv_node_list)
+            conv_match = dependency_graph.partition_of(sub_node, nn.Conv2d)
+            if conv_match is not None:
+                find_in_node(module,orig_partition,conv_match,pattern_partitions,next_conv_node_list,dependency_graph)
+                continue
+            find_in_node(module, orig_partition, sub_node, pattern_partitions, next_conv_node_list, dependency_graph)
             
     if isinstance(curr_partition ,SourcePartition) :
-        params = dict(module.named_parameters())
-        if curr_partition in conv_partitions:
-            if curr_partition != orig_partition :
+        params = dependency_graph.params
+        if dependency_graph.partition_of(curr_partition.nodes[0], nn.Conv2d) is curr_partition:
+            if curr_partition is not orig_partition :
                 if params[curr_partition.nodes[0].target].shape[1]== params[orig_partition.nodes[0].target].shape[0]:
                     next_conv_node_list[orig_partition.output_nodes[0].name].append(curr_partition)
                 return
 
         for out in curr_partition.output_nodes:
             for user in out.users:
-                found = False
-                for conv_match in conv_partitions:
-                    if user in conv_match.nodes and conv_match != curr_partition:
-                        find_in_node(module,orig_partition,conv_match,pattern_partitions,next_conv_node_list)
-                        break
-                if found : continue
-                find_in_node(module, orig_partition, user, pattern_partitions, next_conv_node_list)
+                conv_match = dependency_graph.partition_of(user, nn.Conv2d)
+                if conv_match is not None and conv_match is not curr_partition:
+                    find_in_node(module,orig_partition,conv_match,pattern_partitions,next_conv_node_list,dependency_graph)
+                find_in_node(module, orig_partition, user, pattern_partitions, next_conv_node_list, dependency_graph)
     return
 
                         
-def create_next_conv_node_list(module:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]]):
+def create_next_conv_node_list(module:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], dependency_graph:PruningDependencyGraph=None):
     # returns list of all nodes which are connected to the current node 
     next_conv_node_list:dict[Any,List[SourcePartition]] = dict()
     
@@ -402,9 +491,10 @@ def create_next_conv_node_list(module:fx.GraphModule, pattern_partitions:dict[An
         conv_partitions = pattern_partitions[nn.Conv2d]
     else:
         return next_conv_node_list
+    dependency_graph = get_dependency_graph(module, pattern_partitions, dependency_graph)
     for match in conv_partitions:
         next_conv_node_list[match.output_nodes[0].name] = []
-        find_in_node(module,match,match,pattern_partitions,next_conv_node_list)
+        find_in_node(module,match,match,pattern_partitions,next_conv_node_list,dependency_graph)
     return next_conv_node_list
 
 def get_bn_adjusted_weight(module:fx.GraphModule, conv_partition:SourcePartition, next_bn_partitions:dict[Any,SourcePartition]):
@@ -455,40 +545,35 @@ def remove_channels_conv_next(module:fx.GraphModule, conv_partition:SourcePartit
         #BN parameters may not be removed, because we are just removing from input 
     return module 
 
-def find_next_prunned_partitions(node:fx.Node, model:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], old_result:dict[str,list[tuple[type,SourcePartition]]]=None):
-    fx_model = model
+def find_next_prunned_partitions(node:fx.Node, model:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], old_result:dict[str,list[tuple[type,SourcePartition]]]=None,
+                                 dependency_graph:PruningDependencyGraph=None):
+    dependency_graph = get_dependency_graph(model, pattern_partitions, dependency_graph)
     if old_result is None:
-        old_result = {}
+        old_result = dependency_graph.next_pruned_partitions_results
     if node.name in old_result:
         return old_result[node.name]
     result:list[tuple[type,SourcePartition]] = []
     for n_id in node.users:
         if n_id.op == 'output':
             continue
-        found = False
-        for cls,partitions in pattern_partitions.items():
-            if isinstance(partitions,tuple):
-                continue
-            for partition in partitions:
-                if n_id in partition.nodes:
-                    result.append((partition.source,partition))
-                    found = True
-                    break
-            if found:
-                break
-        if not found:
-            result.extend(find_next_prunned_partitions(n_id,model,pattern_partitions,old_result) )
+        cls_partition = dependency_graph.partition_of(n_id)
+        if cls_partition is not None:
+            cls, partition = cls_partition
+            result.append((partition.source,partition))
+        else:
+            result.extend(find_next_prunned_partitions(n_id,model,pattern_partitions,old_result,dependency_graph) )
     old_result[node.name] = result 
     return result
 
-def find_prev_pruned_partitions(node:fx.Node, model:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], old_result:dict[str,list[tuple[type,SourcePartition]]] = None):
-    
+def find_prev_pruned_partitions(node:fx.Node, model:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], old_result:dict[str,list[tuple[type,SourcePartition]]] = None,
+                                dependency_graph:PruningDependencyGraph=None):
+    dependency_graph = get_dependency_graph(model, pattern_partitions, dependency_graph)
     if old_result is None:
-        old_result = {}
+        old_result = dependency_graph.prev_pruned_partitions_results
     if node.name in old_result:
         return old_result[node.name]
     result:list[tuple[type,SourcePartition]] = []
-    args =_get_proper_input_args(node,model)
+    args = dependency_graph.proper_input_args(node)
     for n_id in args :
         if n_id.op == 'placeholder':
             continue
@@ -496,46 +581,40 @@ def find_prev_pruned_partitions(node:fx.Node, model:fx.GraphModule, pattern_part
             continue
         elif n_id.op == 'output':
             continue
-        found = False
-        for cls,partitions in pattern_partitions.items():
-            for partition in partitions:
-                if n_id in partition.nodes:
-                    found = True
-                    result.append((cls,partition))
-                    break
-            if found :
-                break
-        if not found:
-            result.extend(find_prev_pruned_partitions(n_id,model,pattern_partitions,old_result))
+        cls_partition = dependency_graph.partition_of(n_id)
+        if cls_partition is not None:
+            result.append(cls_partition)
+        else:
+            result.extend(find_prev_pruned_partitions(n_id,model,pattern_partitions,old_result,dependency_graph))
     old_result[node.name] = result 
     return result
 
-def create_channel_pruned_model(model:fx.GraphModule):
+def create_channel_pruned_model(model:fx.GraphModule, dependency_graph:PruningDependencyGraph=None):
     model.eval()
     # the QAT module will already be merged and thus we would not have to calculate all this.
     model = model
     params = dict(model.named_parameters())
-    pattern_partitions = get_pruning_partitions(model)
+    # the dependency analysis done during pruning (if any) is reused, it only depends on the graph structure
+    dependency_graph = get_dependency_graph(model, dependency_graph=dependency_graph)
+    dependency_graph.refresh_params()
+    pattern_partitions = dependency_graph.pattern_partitions
 
-    next_bn_partitions = create_bn_conv_mapping(model,pattern_partitions)
-    next_conv_node_list = create_next_conv_node_list(model,pattern_partitions)
+    next_bn_partitions = dependency_graph.next_bn_partitions
+    next_conv_node_list = dependency_graph.next_conv_node_list
 
-    all_connected_nodes= find_all_connected_nodes(model,pattern_partitions)
-    net_weights = get_net_weights_all(model,pattern_partitions,next_conv_node_list,all_connected_nodes,next_bn_partitions,True)
+    all_connected_nodes= dependency_graph.all_connected_nodes
+    net_weights = get_net_weights_all(model,pattern_partitions,next_conv_node_list,all_connected_nodes,next_bn_partitions,True,dependency_graph=dependency_graph)
     #pruning dimension set up
     pruning_dim = {}
     for node_target in net_weights:
         net_weight, dim = net_weights[node_target] 
         pruning_dim[node_target] = dim
     
-    all_partition_nodes =[] 
-    for cls,partitions in pattern_partitions.items():
-        for partition in partitions:
-            all_partition_nodes.extend([node.name for node in partition.nodes])
+    all_partition_nodes = dependency_graph.partition_node_names
     
     
     def adjust_weight_of_next_partitions(node:fx.Node, nonzero_idx:torch.Tensor):
-        next_pruned_nodes = find_next_prunned_partitions(node,model,pattern_partitions,)
+        next_pruned_nodes = dependency_graph.next_pruned_partitions(node)
         for cls,partition in next_pruned_nodes:
             if cls in (nn.LayerNorm,nn.BatchNorm2d):
                 continue
@@ -576,7 +655,7 @@ def create_channel_pruned_model(model:fx.GraphModule):
         if node.name in all_partition_nodes: 
             continue
         if node.op  == 'call_function' and node.target == torch.ops.aten.view.default:
-            prev_nodes = find_prev_pruned_partitions(node,model,pattern_partitions)
+            prev_nodes = dependency_graph.prev_pruned_partitions(node)
             if len(prev_nodes) == 0:
                 continue
             cls,partition = prev_nodes[0]
@@ -597,7 +676,7 @@ def create_channel_pruned_model(model:fx.GraphModule):
         if node.name in old_result:
             return old_result[node.name]
         result:list[tuple[type,SourcePartition]] = []
-        args =_get_proper_input_args(node,model)
+        args = dependency_graph.proper_input_args(node)
         for n_id in args :
             if n_id.op == 'placeholder':
                 continue
@@ -627,7 +706,7 @@ def create_channel_pruned_model(model:fx.GraphModule):
                 if found :
                     break
             if not found:
-                result.extend(find_prev_pruned_partitions(n_id,model,pattern_partitions,old_result))
+                result.extend(find_prev_pruned_partitions(n_id,model,pattern_partitions,old_result,dependency_graph))
         old_result[node.name] = result 
         return result
         
@@ -871,83 +950,61 @@ def create_channel_pruned_model(model:fx.GraphModule):
                 
 
 # remove print statements #TODO
-def find_layers_in_prev(node:fx.Node, connected_list:List[fx.Node|SourcePartition], fx_model:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], visited_nodes:list=None):
+def find_layers_in_prev(node:fx.Node, connected_list:List[fx.Node|SourcePartition], fx_model:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], visited_nodes:set=None,
+                        dependency_graph:PruningDependencyGraph=None):
     # find all the connected nodes in the args(parents) of the current node, whenever a conv is found, we can stop our searching
-    params = dict(fx_model.named_parameters())
+    dependency_graph = get_dependency_graph(fx_model, pattern_partitions, dependency_graph)
+    params = dependency_graph.params
     if visited_nodes is None:
-        visited_nodes = list()
+        visited_nodes = set()
     if node.name in visited_nodes:
         return 
-    temp_args = _get_proper_input_args(node,fx_model)
+    temp_args = dependency_graph.proper_input_args(node)
 
-    all_get_attr_nodes_in_partitions = []
-    for cls,partitions in pattern_partitions.items():
-        for partition in partitions:            
-            all_get_attr_nodes_in_partitions.extend([node.name for node in partition.nodes if node.op == 'get_attr' ])
+    all_get_attr_nodes_in_partitions = dependency_graph.partition_get_attr_node_names
     args = [n for n in temp_args if n.op != 'get_attr']
     args.extend([n for n in temp_args if n.op == 'get_attr'])
     for n_id in args:
         # if isinstance(n_id, torch.fx.Node): # removing if the arg is not a node, but constants
-        n_id
         if n_id.op == 'placeholder':
-            visited_nodes.append(n_id.name)
+            visited_nodes.add(n_id.name)
         
         added=False
         if nn.Conv2d in pattern_partitions :
-            found = False
-            for conv_partition in pattern_partitions[nn.Conv2d]:
-                if n_id in conv_partition.nodes:
-                    found = True
-                    break 
-            if found:
+            conv_partition = dependency_graph.partition_of(n_id, nn.Conv2d)
+            if conv_partition is not None:
             #for conv2d and depthwise conv
                 connected_list.append(conv_partition)
-                visited_nodes.append(conv_partition.output_nodes[0].name)
+                visited_nodes.add(conv_partition.output_nodes[0].name)
                 added = True
                 # if it is a depthwise layer, then we need to go even further into it
                 if params[conv_partition.nodes[0].target].shape[1]==1:
-                    find_layers_in_prev(conv_partition.output_nodes[0], connected_list,  fx_model,visited_nodes)
+                    find_layers_in_prev(conv_partition.output_nodes[0], connected_list, fx_model, pattern_partitions, visited_nodes, dependency_graph)
         if not added and nn.LayerNorm in pattern_partitions :
-            found = False
-            for ln_partition in pattern_partitions[nn.LayerNorm]:
-                if n_id in ln_partition.nodes:
-                    found = True
-                    break 
-            if found:
+            ln_partition = dependency_graph.partition_of(n_id, nn.LayerNorm)
+            if ln_partition is not None:
                 connected_list.append(ln_partition)
-                visited_nodes.append(ln_partition.nodes[2].name)
+                visited_nodes.add(ln_partition.nodes[2].name)
                 added = True
         if not added and nn.BatchNorm2d in pattern_partitions :
-            found = False
-            for bn_partition in pattern_partitions[nn.BatchNorm2d]:
-                if n_id in bn_partition.nodes:
-                    found = True
-                    break 
-            if found:
+            bn_partition = dependency_graph.partition_of(n_id, nn.BatchNorm2d)
+            if bn_partition is not None:
                 # TODO about the bn other than after convs
                 # connected_list.append(bn_partition)
-                visited_nodes.append(bn_partition.nodes[7].name)
+                visited_nodes.add(bn_partition.nodes[7].name)
                 # added = True
-                find_layers_in_prev(partition.input_nodes[0],connected_list,fx_model,pattern_partitions,visited_nodes)
+                find_layers_in_prev(bn_partition.input_nodes[0], connected_list, fx_model, pattern_partitions, visited_nodes, dependency_graph)
         if not added and nn.Linear in pattern_partitions :
-            found = False
-            for fc_partition in pattern_partitions[nn.Linear]:
-                if n_id in fc_partition.nodes:
-                    found = True
-                    break 
-            if found:
+            fc_partition = dependency_graph.partition_of(n_id, nn.Linear)
+            if fc_partition is not None:
                 connected_list.append(fc_partition)
-                visited_nodes.append(fc_partition.nodes[4].name)
+                visited_nodes.add(fc_partition.nodes[4].name)
                 added = True
         if not added and nn.MultiheadAttention in pattern_partitions :
-            found = False
-            for ln_partition in pattern_partitions[nn.MultiheadAttention]:
-                if n_id in ln_partition.nodes:
-                    found = True
-                    break 
-            if found:
-                connected_list.append(ln_partition)
-                visited_nodes.append(ln_partition.nodes[2].name)
+            mha_partition = dependency_graph.partition_of(n_id, nn.MultiheadAttention)
+            if mha_partition is not None:
+                connected_list.append(mha_partition)
+                visited_nodes.add(mha_partition.nodes[2].name)
                 added = True
 
         
@@ -955,18 +1012,19 @@ def find_layers_in_prev(node:fx.Node, connected_list:List[fx.Node|SourcePartitio
             attr = getattr(fx_model,n_id.target)
             if isinstance(attr,torch.nn.Parameter):
                 connected_list.append(n_id)
-                visited_nodes.append(n_id.name)
+                visited_nodes.add(n_id.name)
         if not added:
-            find_layers_in_prev(n_id,connected_list,fx_model,pattern_partitions,visited_nodes)
+            find_layers_in_prev(n_id, connected_list, fx_model, pattern_partitions, visited_nodes, dependency_graph)
                     
-    visited_nodes.append(node.name)
+    visited_nodes.add(node.name)
     return 
 
 # TODO for other modules LayerNorm, MultiHeadAttention, Linear       
-def find_all_connected_nodes(model:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]]):
+def find_all_connected_nodes(model:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], dependency_graph:PruningDependencyGraph=None):
     # returns the list of all conv that share the same output
     fx_model = model
-    params = dict(fx_model.named_parameters())
+    dependency_graph = get_dependency_graph(model, pattern_partitions, dependency_graph)
+    params = dependency_graph.params
     model_graph = fx_model.graph
     connected_list_prev = ['init']
     all_connected_list = []
@@ -997,13 +1055,10 @@ def find_all_connected_nodes(model:fx.GraphModule, pattern_partitions:dict[Any,L
                     connected_list_prev[index] = (item,dim)
         return connected_list_prev
     
-    all_partition_nodes =[]
-    for cls,partitions in pattern_partitions.items():
-        for partition in partitions: 
-            all_partition_nodes.extend([node.name for node in partition.nodes])
+    all_partition_nodes = dependency_graph.partition_node_names
     
     for node in model_graph.nodes:
-        args = _get_proper_input_args(node,fx_model)
+        args = dependency_graph.proper_input_args(node)
         # if (len(node.args)>1) and not(node.target in (torch.mul,operator.mul)): # to find layers like add, removing mul layer
         #     if all(isinstance(n_id, torch.fx.Node) for n_id in node.args): # to remove nodes like gemm, which has node, int as two inputs
                 # this might be a problem for layers like concat, as they have axis as input and thus is a problem #TODO
@@ -1012,7 +1067,7 @@ def find_all_connected_nodes(model:fx.GraphModule, pattern_partitions:dict[Any,L
         is_mul = node.op == 'call_function' and node.target in (operator.mul,torch.mul,)
         if len(args)>1 and not is_mul and node.name not in all_partition_nodes:
             connected_list = []
-            find_layers_in_prev(node, connected_list,  fx_model,pattern_partitions)
+            find_layers_in_prev(node, connected_list, fx_model, pattern_partitions, dependency_graph=dependency_graph)
             if connected_list:
                 if (connected_list_prev[-1] != connected_list[-1]) and (connected_list_prev[0] != connected_list[0]):
                     connected_list_prev = extract_dims(connected_list_prev,pattern_partitions)
@@ -1106,17 +1161,19 @@ def get_weight_from_parameter(node:fx.Node, fx_model:fx.GraphModule, global_prun
         attr = attr.reshape(attr.shape[0],-1)
         return attr.mean(1).unsqueeze(1) if global_pruning else attr
     
-def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], next_conv_node_list:dict[Any,List[SourcePartition]], all_connected_nodes:List[List[fx.Node|SourcePartition]], next_bn_partitions:dict[Any,SourcePartition], channel_pruning, global_pruning=False):
+def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[SourcePartition]], next_conv_node_list:dict[Any,List[SourcePartition]], all_connected_nodes:List[List[fx.Node|SourcePartition]], next_bn_partitions:dict[Any,SourcePartition], channel_pruning, global_pruning=False,
+                        dependency_graph:PruningDependencyGraph=None):
     fx_model = module
     params = dict(fx_model.named_parameters())
     model_graph = fx_model.graph
+    dependency_graph = get_dependency_graph(module, pattern_partitions, dependency_graph)
     
     net_weights = dict()
     
+    # partitions (and get_attr nodes) are tracked by id, membership check on the lists compares all their nodes
+    all_connected_nodes_separated = set()
     
-    all_connected_nodes_separated = []
-    
-    net_weights_added = []
+    net_weights_added = set()
     
     def adjust_and_store_net_weight(weight_sublist:torch.Tensor,param_name:str,dim:int):
         weight = params[param_name]
@@ -1133,7 +1190,7 @@ def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[
     
     if all_connected_nodes is not None:
         for sublist in all_connected_nodes:
-            all_connected_nodes_separated.extend([partition for partition,dim in sublist])
+            all_connected_nodes_separated.update([id(partition) for partition,dim in sublist])
         for sublist in all_connected_nodes:
             ignore_node_name_list = []
             partition,dim = sublist[0]
@@ -1157,7 +1214,7 @@ def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[
                         weight_sublist = torch.concat([weight_sublist, get_net_weight_node_channel_prune(partition, module,pattern_partitions, next_bn_partitions, next_conv_node_list, ignore_node_name_list, global_pruning, net_weights)], axis=1) 
             
             for partition,dim in sublist:
-                if partition in net_weights_added:
+                if id(partition) in net_weights_added:
                     continue
                 if isinstance(partition,fx.Node) and partition.op == 'get_attr':
                     param_name = partition.target
@@ -1167,7 +1224,7 @@ def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[
                         weight_index, bias_index = weight_index[1], bias_index[1]
                     param_name = partition.nodes[weight_index].target
                 adjust_and_store_net_weight(weight_sublist,param_name,dim)
-                net_weights_added.append(partition)
+                net_weights_added.add(id(partition))
                 
                 if isinstance( partition,SourcePartition ) and partition.source == nn.Conv2d:
 
@@ -1177,7 +1234,7 @@ def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[
                         weight_index, bias_index = get_parameter_indices(module,bn_partition.source,bn_partition)
                         param_name = partition.nodes[weight_index].target
                         adjust_and_store_net_weight(weight_sublist,param_name,0)
-                        net_weights_added.append(bn_partition)
+                        net_weights_added.add(id(bn_partition))
 
                     next_conv_nodes = next_conv_node_list[partition.output_nodes[0].name]
                     # for depthwise convs
@@ -1185,7 +1242,7 @@ def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[
                         weight_index, bias_index = get_parameter_indices(module, conv_partition.source, conv_partition)
                         param_name = partition.nodes[weight_index].target
                         adjust_and_store_net_weight(weight_sublist, param_name, 0)
-                        net_weights_added.append(conv_partition)
+                        net_weights_added.add(id(conv_partition))
                         
                         #  for next batchnorm
                         bn_partition = next_bn_partitions.get(conv_partition.output_nodes[0].name,None)
@@ -1193,12 +1250,9 @@ def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[
                             weight_index, bias_index = get_parameter_indices(module, bn_partition.source, partition=bn_partition)
                             param_name = partition.nodes[weight_index].target
                             adjust_and_store_net_weight(weight_sublist, param_name, 0)
-                            net_weights_added.append(bn_partition)
+                            net_weights_added.add(id(bn_partition))
                             
-    all_partition_nodes =[]
-    for cls,partitions in pattern_partitions.items():
-        for partition in partitions:
-            all_partition_nodes.extend([node.name for node in partition.nodes])                  
+    all_partition_nodes = dependency_graph.partition_node_names
     
     for node in model_graph.nodes:
         if node.op=='get_attr': 
@@ -1215,31 +1269,31 @@ def get_net_weights_all(module:fx.GraphModule, pattern_partitions:dict[Any,List[
                 weight_index1,weight_index2 = weight_indices[0],weight_indices[1]   
                 param_name = partition.nodes[weight_index1].target
                 net_weights[param_name] = (params[param_name], 0)
-                if partition not in all_connected_nodes_separated:
+                if id(partition) not in all_connected_nodes_separated:
                     param_name = partition.nodes[weight_index2].target
                     net_weights[param_name] = (params[param_name], 0)
         elif cls == nn.LayerNorm:
             for partition in  partitions:               
                 weight_index, bias_index = get_parameter_indices(module,partition. source, partition)
-                if partition not in all_connected_nodes_separated:
+                if id(partition) not in all_connected_nodes_separated:
                     param_name = partition.nodes[weight_index].target
                     net_weights[param_name] = (params[param_name], 0)
         elif cls == nn.BatchNorm2d:
             for partition in  partitions:               
                 weight_index, bias_index = get_parameter_indices(module,partition. source, partition)
-                if partition not in all_connected_nodes_separated:
+                if id(partition) not in all_connected_nodes_separated:
                     param_name = partition.nodes[weight_index].target
                     net_weights[param_name] = (params[param_name], 0)
         elif cls == nn.Linear:
             for partition in  partitions:
                 weight_index, bias_index = get_parameter_indices(module,partition. source, partition)
-                if partition not in all_connected_nodes_separated:
+                if id(partition) not in all_connected_nodes_separated:
                     param_name = partition.nodes[weight_index].target
                     net_weights[param_name] = (params[param_name], 0)
         elif cls == nn.Conv2d:
             for partition in  partitions: 
                 weight_index, bias_index = get_parameter_indices(module,partition. source, partition)              
-                if partition not in all_connected_nodes_separated:
+                if id(partition) not in all_connected_nodes_separated:
                     param_name = partition.nodes[weight_index].target
                     net_weights[param_name] = (params[param_name], 0)
                     
@@ -30,8 +30,10 @@
 #################################################################################
 
 from . import quant_func_wrapper
+from . import quant_func
 from ...utils.optimization_base import OptimizationBaseModule
 import copy
+import gc
 
 class QuantPT2EBaseModule(OptimizationBaseModule):
     def __init__(self, model, *args, transformation_dict:dict=None, copy_attrs:list[str]=None, add_methods=True, **kwargs):
@@ -82,8 +84,11 @@ class QuantPT2EBaseModule(OptimizationBaseModule):
         return self.module(*args, **kwargs)
 
     def convert(self, *args, **kwargs):
+        share_params = kwargs.pop('share_params', False)
         if kwargs.pop('make_copy', True):
-            model = copy.deepcopy(self) 
+            # with share_params, the copy aliases the parameter/buffer storage of self instead of duplicating it
+            memo = quant_func.shared_storage_memo(self) if share_params else None
+            model = copy.deepcopy(self, memo)
             for name, sub_module in self.module.named_modules():
                 if hasattr(sub_module,'__quant_params__'):
                     if (sub_module1 := dict(model.module.named_modules()).get(name, None)):
@@ -100,4 +105,14 @@ class QuantPT2EBaseModule(OptimizationBaseModule):
         quant_func_wrapper.export(converted_model, *args, transformation_dict=self.transformation_dict, is_converted=True, **kwargs)
         return self
 
-
+    def convert_and_export(self, *args, **kwargs):
+        '''
+        export with only one extra copy of the model alive at a time, that copy shares the parameter storage with self
+        and is released once the export is done
+        '''
+        kwargs.pop('share_params', None)
+        converted_model = self.convert(*args, share_params=True, **kwargs)
+        quant_func_wrapper.export(converted_model, *args, transformation_dict=self.transformation_dict, is_converted=True, **kwargs)
+        del converted_model
+        gc.collect()
+        return self
@@ -43,7 +43,9 @@ from . import quant_utils
 from .quantizers import TIDLRTQuantizer
 
 import copy
+import gc
 import os
+import tempfile
 import types 
 
 def init(model, quantizer=None, is_qat=True, total_epochs=0, example_inputs=None, example_kwargs=None, qconfig_type=None,
@@ -140,6 +142,7 @@ def init(model, quantizer=None, is_qat=True, total_epochs=0, example_inputs=None
         model.unfreeze = types.MethodType(unfreeze, model)
         model.convert = types.MethodType(convert, model)
         model.export = types.MethodType(export, model)
+        model.convert_and_export = types.MethodType(convert_and_export, model)
         model.__deepcopy__ = types.MethodType(deepcopy_graphmodule, model)
     #
     print("Model Preparation is now complete! ")
@@ -209,32 +212,51 @@ def forward(self, *input, **kwargs):
     return self(*input, **kwargs)
 
 
-def deepcopy_graphmodule(gm, memo=None):
-    """Deep copies a GraphModule."""
+def shared_storage_memo(module, memo=None):
+    """Builds a deepcopy memo that maps every parameter and buffer of module to a detached alias of the same storage.
+    Passing this memo to copy.deepcopy gives a copy in which the tensors are new objects (so .to() / re-assignment in
+    the copy does not touch the original) but the underlying data is not duplicated."""
+    memo = {} if memo is None else memo
+    for param in module.parameters():
+        if id(param) not in memo:
+            memo[id(param)] = torch.nn.Parameter(param.detach(), requires_grad=param.requires_grad)
+    for buffer in module.buffers():
+        if id(buffer) not in memo:
+            memo[id(buffer)] = buffer.detach()
+    return memo
+
+
+def deepcopy_graphmodule(gm, memo=None, share_params=False):
+    """Deep copies a GraphModule.
+    If share_params is set (or memo already carries the tensors, see shared_storage_memo), the parameters and buffers
+    of the copy share storage with gm instead of being duplicated."""
+    memo = {} if memo is None else memo
+    if share_params:
+        memo = shared_storage_memo(gm, memo)
 
     # Create a new GraphModule
     fake_mod = torch.nn.Module()
     for key in fake_mod.__dict__.keys():
         try:
-            k_val = copy.deepcopy(gm.__dict__[key]) 
+            k_val = copy.deepcopy(gm.__dict__[key], memo)
         except:
             k_val = {}
             for k_item in gm.__dict__[key].keys():
                 try:
-                    f = copy.deepcopy(gm.__dict__[key][k_item])
+                    f = copy.deepcopy(gm.__dict__[key][k_item], memo)
                 except:
                     f = torch.tensor(gm.__dict__[key][k_item].item(), device=gm.__dict__[key][k_item].device)
                 k_val[k_item] = f
         fake_mod.__dict__[key] = k_val
-    new_gm = GraphModule(fake_mod, copy.deepcopy(gm.graph), gm.__class__.__name__)
+    new_gm = GraphModule(fake_mod, copy.deepcopy(gm.graph, memo), gm.__class__.__name__)
 
-    # Deep copy the parameters and buffers
+    # Deep copy the parameters and buffers (already copied ones are picked up from memo)
     for name, param in gm.named_parameters():
-        new_gm.register_parameter(name, copy.deepcopy(param))
+        new_gm.register_parameter(name, copy.deepcopy(param, memo))
 
     for name, buffer in gm.named_buffers():
         try:
-            buf = copy.deepcopy(buffer)
+            buf = copy.deepcopy(buffer, memo)
         except:
             buf = torch.tensor(buffer.item(), device=buffer.device)
         if "." in name:
@@ -247,18 +269,41 @@ def deepcopy_graphmodule(gm, memo=None):
         else:
             new_gm.register_buffer(name, buf)
 
-    new_gm.meta = copy.deepcopy(gm.meta)
+    new_gm.meta = copy.deepcopy(gm.meta, memo)
     return new_gm
 
 
-def convert(self, *args, device="cpu", make_copy=True, **kwargs):
+def _copy_quant_params(quant_params, share_params=False):
+    # original_model in __quant_params__ is a full float copy of the model, deep copying it again doubles the memory
+    if not share_params:
+        return copy.deepcopy(quant_params)
+    #
+    new_quant_params = xnn.utils.AttrDict()
+    new_quant_params.merge_from(quant_params)
+    new_quant_params.outlier_hooks = []
+    new_quant_params.bias_hooks = []
+    return new_quant_params
+
+
+def convert(self, *args, device="cpu", make_copy=True, share_params=False, **kwargs):
+    """
+    make_copy: convert a copy of the model, leaving the qat/calibrated model usable
+    share_params: when making the copy, share the parameter and buffer storage with the original model
+        instead of duplicating it - convert does not modify them in place, so peak memory stays close to one model
+    """
     if hasattr(self, '__quant_params__'):
-        orig_quant_params = copy.deepcopy(self.__quant_params__)
+        orig_quant_params = _copy_quant_params(self.__quant_params__, share_params=(share_params or not make_copy))
     else:
         warnings.warn("__quant_params__ is missing in quant_func module. it may be due to a deepcopy.")
         orig_quant_params = None
 
-    model = copy.deepcopy(self).eval() if make_copy else self.eval() # calls the deepcopy_graphmodule module
+    if make_copy:
+        # calls the deepcopy_graphmodule module
+        model = deepcopy_graphmodule(self, share_params=True) if share_params else copy.deepcopy(self)
+        model = model.eval()
+    else:
+        model = self.eval()
+    #
     model = model.to(device=device)
     model = quant_utils.move_node_kwargs_to_device(model, device=device)
     model = quant_utils.remove_to_device_node(model)
@@ -345,12 +390,18 @@ def _is_observed_module(module) -> bool:
 
 
 def export(self, example_inputs, filename='model.onnx', opset_version=17, model_qconfig_format=None, preserve_qdq_model=True,
-           simplify=True, skipped_optimizers=None, device='cpu', make_copy=True, insert_metadata=True, is_converted=False, **export_kwargs):
+           simplify=True, skipped_optimizers=None, device='cpu', make_copy=True, insert_metadata=True, is_converted=False,
+           share_params=False, external_data=False, **export_kwargs):
+    """
+    external_data: write the weights to a single <filename>.data file next to the model instead of inside it (needed above 2GB).
+        the weights are then streamed from the torch export to that file - unless simplify is set,
+        as onnx simplifier needs the whole model in memory.
+    """
 
     if _is_observed_module(self):
-        model = convert(self, device=device, make_copy=make_copy)
+        model = convert(self, device=device, make_copy=make_copy, share_params=share_params)
     elif not is_converted:
-        model = convert(self, device=device, make_copy=make_copy)
+        model = convert(self, device=device, make_copy=make_copy, share_params=share_params)
     else:
         model = self
         warnings.warn("model has already been converted before calling export. make sure it is done correctly.")
@@ -358,14 +409,26 @@ def export(self, example_inputs, filename='model.onnx', opset_version=17, model_
     model.module = quant_utils.remove_loss_branch(model.module)
     quant_utils.register_onnx_symbolics()
 
+    # with external data, torch writes large models as one file per tensor - export into a temporary directory,
+    # the weights are gathered into a single data file next to filename when the model is saved at the end
+    export_dir = tempfile.TemporaryDirectory() if external_data else None
+    final_filename = filename
+    if external_data:
+        filename = os.path.join(export_dir.name, os.path.basename(final_filename))
+    #
+
     if model_qconfig_format == qconfig_types.QConfigFormat.INT_MODEL:
         # # Convert QDQ format to Int8 format
         import onnxruntime as ort
-        qdq_filename = os.path.splitext(filename)[0] + '_qdq.onnx'
+        qdq_filename = os.path.splitext(final_filename if preserve_qdq_model else filename)[0] + '_qdq.onnx'
         torch.onnx.export(model, example_inputs.to('cpu'), qdq_filename, opset_version=opset_version, training=torch._C._onnx.TrainingMode.PRESERVE, **export_kwargs)
         so = ort.SessionOptions()
         so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
         so.optimized_model_filepath = filename
+        if external_data:
+            from ....xonnx import external_data_location
+            so.add_session_config_entry('session.optimized_model_external_initializers_file_name', external_data_location(filename))
+        #
         # logger.info("Inplace conversion of QDQ model to INT8 model at: {}".format(onnx_file))
         ort.InferenceSession(qdq_filename, so)
         if not preserve_qdq_model:
@@ -382,18 +445,48 @@ def export(self, example_inputs, filename='model.onnx', opset_version=17, model_
             input_to_export = example_inputs.to(device=device)
         torch.onnx.export(model, input_to_export, filename, opset_version=opset_version, training=torch._C._onnx.TrainingMode.PRESERVE, **export_kwargs)
 
-    if simplify:
-        import onnx
-        from onnxsim import simplify
-        onnx_model = onnx.load(filename)
-        onnx_model, check = simplify(onnx_model, skipped_optimizers=skipped_optimizers)
-        onnx.save(onnx_model, filename)
-    
-    if insert_metadata:
+    # the torch model is not needed anymore, release the converted copy before the onnx model is loaded
+    if model is not self:
+        del model
+        gc.collect()
+    #
+
+    if simplify or insert_metadata or external_data:
+        # load and save the onnx model only once for both the steps
         import onnx
-        from ....version import __version__
-        onnx_model = onnx.load(filename)
-        meta = onnx_model.metadata_props.add()
-        meta.key = "model_source"
-        meta.value = f"edgeai_torchmodelopt_{__version__}"
-        onnx.save(onnx_model, filename)
+        # the weights are loaded only if the simplifier needs them, else they are copied as is
+        onnx_model = onnx.load(filename, load_external_data=(simplify or not external_data))
+        if simplify:
+            from onnxsim import simplify as onnxsim_simplify
+            onnx_model, check = onnxsim_simplify(onnx_model, skipped_optimizers=skipped_optimizers)
+        #
+        if insert_metadata:
+            from ....version import __version__
+            meta = onnx_model.metadata_props.add()
+            meta.key = "model_source"
+            meta.value = f"edgeai_torchmodelopt_{__version__}"
+        #
+        if external_data:
+            from ....xonnx import save_onnx_model
+            save_onnx_model(onnx_model, final_filename, external_data=True, base_dir=export_dir.name)
+        else:
+            onnx.save(onnx_model, filename)
+    #
+    if export_dir is not None:
+        export_dir.cleanup()
+    #
+
+
+def convert_and_export(self, example_inputs, filename='model.onnx', device='cpu', make_copy=True, **export_kwargs):
+    """
+    Converts and exports the model while holding at most one extra copy of it.
+    The converted copy shares the parameter storage with self (see convert with share_params=True),
+    and is released as soon as the torch export is done - so the qat model stays usable after this call.
+    With make_copy=False, the model is converted in place and can not be trained further.
+    """
+    export(self, example_inputs, filename=filename, device=device, make_copy=make_copy, share_params=True, **export_kwargs)
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    #
+    return self
@@ -1,6 +1,7 @@
 from . import quant_func, quant_utils
 from ...utils.transformation_utils import wrapped_transformation_fn
 from ... import utils
+import gc
 
 
 def init(module, *args, example_inputs=None, example_kwargs=None, transformation_dict=None, **kwargs):
@@ -32,17 +33,23 @@ def insert_all_hooks(*args, **kwargs):
 def remove_loss_branch(*args, **kwargs):
     return wrapped_transformation_fn(quant_utils.remove_loss_branch, *args, **kwargs)
 
-def export(self, *args, transformation_dict = None, is_converted = False, device = 'cpu', make_copy = True, **kwargs):
+def export(self, *args, transformation_dict = None, is_converted = False, device = 'cpu', make_copy = True, share_params = False, **kwargs):
     if is_converted:
         model = self
     else:
-        model = convert(self, transformation_dict = transformation_dict, device = device, make_copy = make_copy)
+        model = convert(self, transformation_dict = transformation_dict, device = device, make_copy = make_copy, share_params = share_params)
     model = model.to(device=device)
     model = remove_loss_branch(self, transformation_dict = transformation_dict)
     quant_func.export(model, *args, device = device, make_copy = make_copy, is_converted = True, **kwargs)
     return
 
 
+def convert_and_export(self, *args, transformation_dict = None, device = 'cpu', make_copy = True, **kwargs):
+    export(self, *args, transformation_dict = transformation_dict, device = device, make_copy = make_copy, share_params = True, **kwargs)
+    gc.collect()
+    return self
+
+
 def calibrate(*args, **kwargs):
     return quant_func.calibrate(*args, freeze_bn = freeze, **kwargs)
 
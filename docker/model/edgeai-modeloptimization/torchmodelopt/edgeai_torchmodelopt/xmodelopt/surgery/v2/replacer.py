@@ -176,66 +176,117 @@ def _are_both_node_equal(first_node:Node,second_node:Node,first_graph_module:Uni
     return False
 
 
-# searches pattern with on single input and one output other wise a single node with out checking kwargs
-def straight_chain_searcher(main_module:GraphModule, pattern_module:GraphModule):
-    '''
-    searches for straight pattern matches in node list of the graph
+# operator and torch function counter-parts are hashed to the same signature
+_equivalent_function_dict = {torch.add:operator.add, torch.sub:operator.sub, torch.mul:operator.mul}
 
-    it only allows:
-        i)  if pattern has one input and one output
-        ii) if pattern has only one node other than placeholders or output
 
+def _node_signature(node:Node, modules:Dict[str, nn.Module]):
+    '''
+    returns a hashable signature of the node,
+    two nodes have same signature if and only if _are_both_node_equal returns True for them
+    (placeholder and output nodes are never part of a searched pattern)
+    '''
+    if node.op == 'placeholder':
+        return (node.op, len(node.users))
+    if node.op == 'output':
+        return (node.op, len(node.args)+len(node.kwargs))
+    if node.op == 'call_function':
+        return (node.op, _equivalent_function_dict.get(node.target, node.target))
+    if node.op == 'call_method':
+        return (node.op, node.target)
+    if node.op == 'get_attr':
+        return (node.op, _get_parent_name(node.target)[1])
+    # for call_module node both should be instances of same class
+    return (node.op, str(type(modules[node.target])))
+
+
+class NodeSignatureIndex():
+    '''
+    hash index of the nodes of a GraphModule by their signature (op and target / module type)
+
+    it is built once and can be shared between searches of several patterns,
+    any pattern having a signature not present in the index can be rejected without scanning the graph.
+    refresh() has to be called after the graph is modified.
     '''
+    def __init__(self, main_module:GraphModule):
+        self.main_module = main_module
+        self.refresh()
 
-    main_module_nodes:list[fx.Node] = list(main_module.graph.nodes)
-    pattern_module_nodes = []
+    def refresh(self):
+        modules = dict(self.main_module.named_modules())
+        self.nodes:list[fx.Node] = list(self.main_module.graph.nodes)
+        self.signatures = [_node_signature(node, modules) for node in self.nodes]
+        self.positions:Dict[Any, List[int]] = {}
+        for index, signature in enumerate(self.signatures):
+            self.positions.setdefault(signature, []).append(index)
+        return self
+
+    def contains_all(self, signatures):
+        return all(signature in self.positions for signature in signatures)
+
+
+def _get_pattern_nodes(pattern_module:GraphModule):
+    '''returns operational nodes of the pattern with number of inputs and outputs'''
+    pattern_nodes = []
     number_of_input = 0
     number_of_output = 0
-
-    # removes placeholders or outputs
     for node in pattern_module.graph.nodes:
         if node.op == 'placeholder':
             number_of_input += 1
         elif node.op == 'output':
             number_of_output = len(node.args)
         else:
-            pattern_module_nodes.append(node)
-    main_module_node_num = len(main_module_nodes)
+            pattern_nodes.append(node)
+    return pattern_nodes, number_of_input, number_of_output
+
+
+# searches pattern with on single input and one output other wise a single node with out checking kwargs
+def straight_chain_searcher(main_module:GraphModule, pattern_module:GraphModule, node_index:NodeSignatureIndex=None):
+    '''
+    searches for straight pattern matches in node list of the graph
+
+    it only allows:
+        i)  if pattern has one input and one output
+        ii) if pattern has only one node other than placeholders or output
+
+    nodes are compared by their hashed signatures from node_index (built here if not given),
+    so the graph is not compared node by node if some node of the pattern is not present in it at all
+    '''
+
+    pattern_module_nodes, number_of_input, number_of_output = _get_pattern_nodes(pattern_module)
     pattern_module_node_num = len(pattern_module_nodes)
 
     assert (number_of_input == 1 and number_of_output == 1) or pattern_module_node_num == 1, \
         'This function is not for multi-input or multi-output'
 
+    if node_index is None or node_index.main_module is not main_module:
+        node_index = NodeSignatureIndex(main_module)
+
+    pattern_modules = dict(pattern_module.named_modules())
+    pattern_signatures = [_node_signature(node, pattern_modules) for node in pattern_module_nodes]
+    matched = list()
+    if pattern_module_node_num == 0 or not node_index.contains_all(pattern_signatures):
+        return matched
+
     # similar approach to searching pattern in an list
-    main_index = 0
+    # a partial match is dropped at the first mismatching node and search continues after that node
+    main_module_nodes = node_index.nodes
+    main_signatures = node_index.signatures
+    main_module_node_num = len(main_module_nodes)
+    main_index = node_index.positions[pattern_signatures[0]][0]
     patt_index = 0
-    matched = list()
-    second_start_index = -1
-    inp, out = -1, -1
+    inp = -1
     while(main_index < main_module_node_num):
-        main_node = main_module_nodes[main_index]
-        patn_node = pattern_module_nodes[patt_index]
-        cond = _are_both_node_equal(main_node, patn_node, main_module, pattern_module)
-        if cond:
-            if main_node == pattern_module_nodes[0] and second_start_index ==-1 and patt_index != 0:
-                second_start_index = main_index
+        if main_signatures[main_index] == pattern_signatures[patt_index]:
             if patt_index == 0:
-                inp = main_node
+                inp = main_module_nodes[main_index]
             if patt_index == (pattern_module_node_num-1):
-                out = main_node
-                matched.append((inp, out))
-                second_start_index = -1
-            patt_index += 1
-            patt_index = patt_index % pattern_module_node_num
-            main_index += 1
+                matched.append((inp, main_module_nodes[main_index]))
+            patt_index = (patt_index + 1) % pattern_module_node_num
         else:
-            inp, out = -1, -1
+            inp = -1
             patt_index = 0
-            if second_start_index == -1:
-                main_index += 1
-            else:
-                main_index = second_start_index
-                second_start_index = -1
+        main_index += 1
 
     return matched
 
@@ -457,9 +508,13 @@ def _replace_all_matches(main_module:GraphModule,matches,replace_module:nn.Modul
 
 
 # replace nodes if they don't need any change with their keyword arguments and arguements
-def graph_pattern_replacer(main_module:Union[GraphModule,nn.Module,callable],pattern_module:Union[GraphModule,nn.Module,callable],replace_module:Union[GraphModule,nn.Module,callable], verbose_mode=False):
+def graph_pattern_replacer(main_module:Union[GraphModule,nn.Module,callable],pattern_module:Union[GraphModule,nn.Module,callable],replace_module:Union[GraphModule,nn.Module,callable], verbose_mode=False,
+                           node_index:NodeSignatureIndex=None):
     '''
     searches for all matches in the graph and replaces all of them with replacement module  
+
+    node_index can be shared across calls for several patterns on the same main_module,
+    it is refreshed here only if some replacement is done
     '''
     replace_module = replace_module() if type(replace_module) == type else replace_module
 
@@ -468,22 +523,16 @@ def graph_pattern_replacer(main_module:Union[GraphModule,nn.Module,callable],pat
     if not isinstance(pattern_module, GraphModule):
         pattern_module = custom_symbolic_trace(pattern_module)
 
-    pattern_nodes = []
-    number_of_input = 0
-    number_of_output = 0
-    for node in pattern_module.graph.nodes:
-        if node.op == 'placeholder':
-            number_of_input += 1
-        elif node.op == 'output':
-            # TODO: should it be += ?
-            number_of_output = len(node.args)
-        else:
-            pattern_nodes.append(node)
+    pattern_nodes, number_of_input, number_of_output = _get_pattern_nodes(pattern_module)
 
     # pattern should have a single node or (single input and single output)
     if (number_of_input == 1 and number_of_output == 1) or (len(pattern_nodes) == 1):
-        matches = straight_chain_searcher(main_module, pattern_module)
+        if node_index is None or node_index.main_module is not main_module:
+            node_index = NodeSignatureIndex(main_module)
+        matches = straight_chain_searcher(main_module, pattern_module, node_index=node_index)
         _replace_all_matches(main_module, matches, replace_module)
+        if matches:
+            node_index.refresh()
         if verbose_mode:
             print(type(pattern_module).__name__, len(matches))
     else:
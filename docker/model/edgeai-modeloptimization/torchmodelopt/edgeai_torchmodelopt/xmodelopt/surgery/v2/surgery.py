@@ -36,7 +36,8 @@ from torch.fx import GraphModule
 from inspect import isfunction, ismethod
 
 from . import custom_modules, custom_surgery_functions
-from .replacer import graph_pattern_replacer,replace_module_nodes,replace_function_nodes
+from . import replacer
+from .replacer import graph_pattern_replacer,replace_module_nodes,replace_function_nodes,NodeSignatureIndex
 from .custom_symbolic_trace import custom_symbolic_trace
 
 __all__ = ['_replace_unsupported_layers', ]
@@ -69,6 +70,9 @@ def _replace_unsupported_layers(model:nn.Module, example_inputs:list=None, examp
 
     example_inputs = example_inputs if example_inputs is not None else []
     example_kwargs = example_kwargs or {}
+    # node index of the traced model shared by consecutive module pattern replacements,
+    # it is dropped whenever the model is changed by any other kind of replacement
+    node_index = None
     for pattern, replacement in replacement_dict.items():
         if pattern is None:
             continue
@@ -81,24 +85,32 @@ def _replace_unsupported_layers(model:nn.Module, example_inputs:list=None, examp
             else:
                 kwargs = dict()
             model = replace_function_nodes(model, pattern, replacement, verbose_mode=verbose_mode, **kwargs)
+            node_index = None
         elif isfunction(replacement) or ismethod(replacement):
             # for self-made surgery function 
             model = replacement(model, pattern = pattern, example_inputs = example_inputs, verbose_mode=verbose_mode)
+            node_index = None
         else:
             # class of MOdule of
             if isinstance(pattern, type):
                 replace_module_nodes(model, pattern, replacement, copy_args=copy_args, verbose_mode=verbose_mode)
+                node_index = None
             else:
+                # trace here the same way as graph_pattern_replacer would, so that the index is built only once
+                if not isinstance(model, GraphModule):
+                    model = replacer.custom_symbolic_trace(model)
+                if node_index is None or node_index.main_module is not model:
+                    node_index = NodeSignatureIndex(model)
                 # for nn.Module
                 if pattern.__class__.__name__ in dir(torch.nn):
                     # if the pattern is present in nn directory,
                     # a wrapper module is required, for successful 
                     # surgery on that module
-                    model = graph_pattern_replacer(model, pattern, replacement, verbose_mode=verbose_mode)
+                    model = graph_pattern_replacer(model, pattern, replacement, verbose_mode=verbose_mode, node_index=node_index)
                     pattern = custom_modules.InstaModule(pattern)
 
                 # calls the main surgery function
-                model = graph_pattern_replacer(model, pattern, replacement, verbose_mode=verbose_mode)
+                model = graph_pattern_replacer(model, pattern, replacement, verbose_mode=verbose_mode, node_index=node_index)
     model = custom_surgery_functions.remove_identiy(model)
     model.delete_all_unused_submodules()
     
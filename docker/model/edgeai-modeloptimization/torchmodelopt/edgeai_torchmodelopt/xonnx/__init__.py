@@ -35,4 +35,5 @@ except:
     pass
     
 from .rename_onnx_layers import *
+from .external_data import save_onnx_model, load_external_tensors, has_external_data, external_data_location
 
@@ -29,6 +29,7 @@
 #
 #################################################################################
 import os.path
+import tempfile
 import types
 
 import torch
@@ -38,6 +39,7 @@ import onnxsim
 
 
 from edgeai_torchmodelopt.xmodelopt.utils.hooks import add_example_args_kwargs
+from edgeai_torchmodelopt.xonnx.external_data import save_onnx_model
 
 # in the named modules, the whole model is stored with the key empty string
 # so if the whole model is to be exported, use this key
@@ -58,7 +60,17 @@ def _remove_forward_with_kwargs(module):
     del module.__forward_backup
 
 
-def _export_named_module(named_modules, module_name, exported_filename, opset_version, dynamo):
+def _torch_onnx_export(module, module_args, exported_filename, opset_version, dynamo):
+    if dynamo:
+        # export_options = torch.onnx.ExportOptions(dynamic_shapes=False)
+        # onnx_program = torch.onnx.dynamo_export(module, module_inputs, export_options=export_options)
+        # onnx_program.save(exported_filename)
+        torch.onnx.export(module, module_args, exported_filename, dynamo=dynamo)
+    else:
+        torch.onnx.export(module, module_args, exported_filename, opset_version=opset_version)
+
+
+def _export_named_module(named_modules, module_name, exported_filename, opset_version, dynamo, external_data=False, simplify=None):
         module = named_modules[module_name]
         module_args = tuple(module._example_inputs) if isinstance(module._example_inputs, (list,tuple)) \
                         else (module._example_inputs,)
@@ -71,24 +83,35 @@ def _export_named_module(named_modules, module_name, exported_filename, opset_ve
         # test if the forward works
         module_outputs = module(*module_args, **module_kwargs)
 
-        # onnx export
-        if dynamo:
-            # export_options = torch.onnx.ExportOptions(dynamic_shapes=False)
-            # onnx_program = torch.onnx.dynamo_export(module, module_inputs, export_options=export_options)
-            # onnx_program.save(exported_filename)
-            torch.onnx.export(module, module_args, exported_filename, dynamo=dynamo)
-        else:
-            torch.onnx.export(module, module_args, exported_filename, opset_version=opset_version)
+        # onnx simplifier works on the whole model in memory, by default it is skipped for external data
+        simplify = (not external_data) if simplify is None else simplify
+
+        if not external_data:
+            # onnx export
+            _torch_onnx_export(module, module_args, exported_filename, opset_version, dynamo)
+            _remove_forward_with_kwargs(module)
 
-        _remove_forward_with_kwargs(module)
+            # simplify
+            if simplify:
+                onnx_model = onnx.load(exported_filename)
+                simplified_model, model_ok = onnxsim.simplify(onnx_model)
+                onnx.save(simplified_model, exported_filename)
+            return
 
-        # simplify
-        onnx_model = onnx.load(exported_filename)
-        simplified_model, model_ok = onnxsim.simplify(onnx_model)
-        onnx.save(simplified_model, exported_filename)
+        # torch writes large models as one file per tensor, export into a temporary directory
+        # and gather the weights into a single data file next to exported_filename
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_filename = os.path.join(temp_dir, os.path.basename(exported_filename))
+            _torch_onnx_export(module, module_args, temp_filename, opset_version, dynamo)
+            _remove_forward_with_kwargs(module)
 
+            onnx_model = onnx.load(temp_filename, load_external_data=simplify)
+            if simplify:
+                onnx_model, model_ok = onnxsim.simplify(onnx_model)
+            save_onnx_model(onnx_model, exported_filename, external_data=True, base_dir=temp_dir)
 
-def export_modules(model, example_input, filename, module_names, opset_version, dynamo=False):
+
+def export_modules(model, example_input, filename, module_names, opset_version, dynamo=False, external_data=False, simplify=None):
     """
     Export a model into onnx files in parts
 
@@ -96,6 +119,9 @@ def export_modules(model, example_input, filename, module_names, opset_version,
     dict(model.named_modules()) returns a lists of all names as submodules in a model
     list(dict(model.named_modules()).keys()) returns a list of all submodule keys
     The modules names specified can be a subset of those names.
+
+    With external_data=True, the weights of each part are written to a single <part>.onnx.data file next to it,
+    (needed above 2GB). onnx simplifier is then skipped unless simplify=True, as it loads all the weights.
     """
 
     model.eval()
@@ -116,7 +142,8 @@ def export_modules(model, example_input, filename, module_names, opset_version,
         exported_filename = f"{filename_base}_{module_name}.onnx"
         try:
             print(f"Exporting - {module_name}")
-            _export_named_module(named_modules, module_name, exported_filename, opset_version=opset_version, dynamo=dynamo)
+            _export_named_module(named_modules, module_name, exported_filename, opset_version=opset_version, dynamo=dynamo,
+                                 external_data=external_data, simplify=simplify)
             print(f"Export - {module_name}: COMPLETED")
         except Exception as e:
             print(f"Export - {module_name}: FAILED, {e}")
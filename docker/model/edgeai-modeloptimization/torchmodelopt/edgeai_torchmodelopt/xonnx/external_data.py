@@ -0,0 +1,176 @@
+#################################################################################
+# Copyright (c) 2018-2023, Texas Instruments Incorporated - http://www.ti.com
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#################################################################################
+
+import os
+
+import numpy as np
+import onnx
+from onnx.external_data_helper import ExternalDataInfo, uses_external_data
+
+
+# tensors above this size are written to the external data file at an aligned offset, so that they can be memory mapped
+EXTERNAL_DATA_ALIGN_THRESHOLD = 64*1024
+EXTERNAL_DATA_ALIGNMENT = 4096
+COPY_CHUNK_SIZE = 16*1024*1024
+
+
+def external_data_location(filename):
+    # the weights of model.onnx go to model.onnx.data, next to it
+    return os.path.basename(filename) + '.data'
+
+
+def _iter_tensors(graph):
+    # initializers and constant tensors, including the ones in subgraphs
+    for tensor in graph.initializer:
+        yield tensor
+    for node in graph.node:
+        for attr in node.attribute:
+            if attr.HasField('t'):
+                yield attr.t
+            for tensor in attr.tensors:
+                yield tensor
+            if attr.HasField('g'):
+                yield from _iter_tensors(attr.g)
+            for subgraph in attr.graphs:
+                yield from _iter_tensors(subgraph)
+
+
+def has_external_data(onnx_model):
+    return any(uses_external_data(tensor) for tensor in _iter_tensors(onnx_model.graph))
+
+
+def _external_data_range(tensor, base_dir):
+    info = ExternalDataInfo(tensor)
+    data_path = os.path.join(base_dir, info.location)
+    offset = info.offset or 0
+    length = info.length if info.length is not None else os.path.getsize(data_path) - offset
+    return data_path, offset, length
+
+
+def _set_external_data(tensor, location, offset, length):
+    del tensor.external_data[:]
+    for key, value in (('location', location), ('offset', str(offset)), ('length', str(length))):
+        entry = tensor.external_data.add()
+        entry.key = key
+        entry.value = value
+    #
+    tensor.data_location = onnx.TensorProto.EXTERNAL
+    tensor.ClearField('raw_data')
+
+
+def save_onnx_model(onnx_model, filename, external_data=False, location=None, size_threshold=1024, base_dir=None):
+    """
+    Save an onnx model, with external_data=True all the tensors of size_threshold bytes or more go to a single
+    data file next to it (location, default: <model file name>.data).
+
+    Tensors that are still references to external files (e.g. model loaded with load_external_data=False)
+    are copied in chunks from base_dir (default: the directory of filename) - the weights are written once and
+    never held in memory all together. The model proto is modified in place to refer to the new data file.
+    """
+    out_dir = os.path.dirname(os.path.abspath(filename))
+    base_dir = os.path.abspath(base_dir) if base_dir else out_dir
+    if not external_data:
+        if has_external_data(onnx_model):
+            onnx.load_external_data_for_model(onnx_model, base_dir)
+        #
+        onnx.save_model(onnx_model, filename)
+        return onnx_model
+    #
+    location = location or external_data_location(filename)
+    data_path = os.path.join(out_dir, location)
+    # the source tensors may be in the very file that is being written, write to a temporary file and move it
+    temp_data_path = data_path + '.tmp'
+    offset = 0
+    with open(temp_data_path, 'wb') as data_file:
+        for tensor in _iter_tensors(onnx_model.graph):
+            if uses_external_data(tensor):
+                src_path, src_offset, length = _external_data_range(tensor, base_dir)
+            elif tensor.HasField('raw_data') and len(tensor.raw_data) >= size_threshold:
+                src_path, src_offset, length = None, 0, len(tensor.raw_data)
+            else:
+                continue
+            #
+            if length >= EXTERNAL_DATA_ALIGN_THRESHOLD and offset % EXTERNAL_DATA_ALIGNMENT:
+                padding = EXTERNAL_DATA_ALIGNMENT - offset % EXTERNAL_DATA_ALIGNMENT
+                data_file.write(b'\0' * padding)
+                offset += padding
+            #
+            if src_path is None:
+                data_file.write(tensor.raw_data)
+            else:
+                with open(src_path, 'rb') as src_file:
+                    src_file.seek(src_offset)
+                    remaining = length
+                    while remaining > 0:
+                        chunk = src_file.read(min(COPY_CHUNK_SIZE, remaining))
+                        if not chunk:
+                            raise RuntimeError(f'external data of {tensor.name} is truncated in {src_path}')
+                        data_file.write(chunk)
+                        remaining -= len(chunk)
+            #
+            _set_external_data(tensor, location, offset, length)
+            offset += length
+    #
+    if offset > 0:
+        os.replace(temp_data_path, data_path)
+    else:
+        os.remove(temp_data_path)
+    #
+    onnx.save_model(onnx_model, filename)
+    return onnx_model
+
+
+def load_external_tensors(onnx_model, base_dir, mmap=True):
+    """
+    numpy arrays of the tensors of onnx_model that are stored in external files (in base_dir), by tensor name.
+    with mmap=True these are read only memory maps, nothing is read from the disk until the array is used.
+    """
+    tensors = dict()
+    for tensor in _iter_tensors(onnx_model.graph):
+        if not uses_external_data(tensor):
+            continue
+        #
+        data_path, offset, length = _external_data_range(tensor, base_dir)
+        dtype = onnx.helper.tensor_dtype_to_np_dtype(tensor.data_type)
+        shape = tuple(tensor.dims)
+        count = int(np.prod(shape))
+        if count == 0:
+            array = np.empty((0,), dtype=dtype)
+        elif mmap:
+            array = np.memmap(data_path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+        else:
+            with open(data_path, 'rb') as data_file:
+                data_file.seek(offset)
+                array = np.fromfile(data_file, dtype=dtype, count=count)
+        #
+        tensors[tensor.name] = array.reshape(shape)
+    #
+    return tensors
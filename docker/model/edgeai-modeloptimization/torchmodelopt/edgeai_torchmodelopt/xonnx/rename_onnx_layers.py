@@ -30,10 +30,14 @@
 #################################################################################
 
 
+import os
+
 import onnx
 from onnx import helper
 from onnx import TensorProto,shape_inference 
 
+from .external_data import has_external_data, save_onnx_model, external_data_location
+
 
 def tidlIsNodeOutputNameUsedInGraph(originalGraph,name):
     for node in originalGraph.node:
@@ -45,9 +49,14 @@ def tidlIsNodeOutputNameUsedInGraph(originalGraph,name):
 # This function updates intermediate input/output tensor names to be integers starting from 1
 # The graph's final output names are not updated by default to ensure there are no issues in case they are being used for interfacing in any way
 # In case changing graph's output names is desired, set updateGraphOutputNames = True in function call
-def prune_layer_names(in_model_path, out_model_path, opset_version=11, updateGraphOutputNames=False):
-    #Read ONNX Model
-    model = onnx.load_model(in_model_path)
+# Models with external data are renamed on the graph only, the weights are copied once to the data file of out_model_path
+# (external_data=None keeps the format of the input model, True/False forces it)
+def prune_layer_names(in_model_path, out_model_path, opset_version=11, updateGraphOutputNames=False, external_data=None):
+    #Read ONNX Model - the tensors stored in external files are not needed for renaming
+    model = onnx.load_model(in_model_path, load_external_data=False)
+    in_model_dir = os.path.dirname(os.path.abspath(in_model_path))
+    if external_data is None:
+        external_data = has_external_data(model)
     op = onnx.OperatorSetIdProto()
     #Track orginal opset:
     op.version = model.opset_import[0].version
@@ -85,6 +94,24 @@ def prune_layer_names(in_model_path, out_model_path, opset_version=11, updateGra
     model_def_noShape = helper.make_model(originalGraph, producer_name='onnx-TIDL', opset_imports=[op])
     model_def = shape_inference.infer_shapes(model_def_noShape)
 
+    if external_data:
+        # the checker needs the path to find the external data, so check after saving
+        save_onnx_model(model_def, out_model_path, external_data=True, base_dir=in_model_dir)
+        try:
+            onnx.checker.check_model(out_model_path)
+        except onnx.checker.ValidationError as e:
+            print('Converted model is invalid: %s' % e)
+            os.remove(out_model_path)
+            out_data_path = os.path.join(os.path.dirname(os.path.abspath(out_model_path)), external_data_location(out_model_path))
+            if os.path.exists(out_data_path):
+                os.remove(out_data_path)
+        else:
+            print('Converted model is valid!')
+        return
+    
+    if has_external_data(model_def):
+        onnx.load_external_data_for_model(model_def, in_model_dir)
+
     try:
         onnx.checker.check_model(model_def)
     except onnx.checker.ValidationError as e:
@@ -0,0 +1,108 @@
+#################################################################################
+# Copyright (c) 2018-2023, Texas Instruments Incorporated - http://www.ti.com
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#################################################################################
+
+
+# memory benchmark for convert + export of quantization v3 (pt2e) models
+# each mode is run in a fresh process, as the peak memory of the process can not be reset
+# usage: python main/quantization_memory_benchmark.py --model vit_b_16 --output-path ./data/checkpoints/quant_memory
+
+import os
+import sys
+import argparse
+import datetime
+import resource
+import subprocess
+import time
+import torch
+try:
+    import torchvision
+    has_tv = True
+except:
+    has_tv = False
+
+
+BENCHMARK_MODES = ('deepcopy', 'share_params', 'convert_and_export')
+
+
+def peak_memory_mb():
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(args):
+    from edgeai_torchmodelopt import xmodelopt
+    model = torchvision.models.get_model(args.model)
+    example_input = torch.rand((1,3,224,224))
+    model = xmodelopt.quantization.v3.QATPT2EModule(model, total_epochs=2, example_inputs=(example_input,))
+    model.eval()
+    with torch.no_grad():
+        model(example_input)
+    #
+    memory_after_prepare = peak_memory_mb()
+    output_path = os.path.join(args.output_path, f"{args.model}_{args.mode}.onnx")
+    start_time = time.time()
+    if args.mode == 'deepcopy':
+        model.export(example_input, filename=output_path, simplify=False)
+    elif args.mode == 'share_params':
+        model.export(example_input, filename=output_path, simplify=False, share_params=True)
+    elif args.mode == 'convert_and_export':
+        model.convert_and_export(example_input, filename=output_path, simplify=False)
+    #
+    export_time = time.time() - start_time
+    memory_after_export = peak_memory_mb()
+    print(f"RESULT mode={args.mode} prepare_peak_mb={memory_after_prepare:.1f} "
+          f"export_peak_mb={memory_after_export:.1f} export_overhead_mb={memory_after_export-memory_after_prepare:.1f} "
+          f"export_time_s={export_time:.1f}")
+
+
+def main(args):
+    if not has_tv:
+        print('This script is dependent on torchvision and as it is not installed, the script will close')
+        return
+    os.makedirs(args.output_path, exist_ok=True)
+    if args.mode is not None:
+        run_mode(args)
+        return
+    #
+    for mode in BENCHMARK_MODES:
+        print(f"Benchmarking {args.model} with mode {mode}")
+        cmd = [sys.executable, __file__, "--model", args.model, "--output-path", args.output_path, "--mode", mode]
+        subprocess.run(cmd, check=False)
+
+
+if __name__ == "__main__":
+    date = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    parser = argparse.ArgumentParser(description="PyTorch Quantization Convert/Export Memory Benchmark")
+    parser.add_argument("--model", default="vit_b_16", type=str, help="torchvision model name")
+    parser.add_argument("--output-path", default="./data/checkpoints/quant_memory", type=str, help="output path")
+    parser.add_argument("--mode", default=None, type=str, choices=BENCHMARK_MODES, help="run only this mode (in this process)")
+    args = parser.parse_args()
+    main(args)
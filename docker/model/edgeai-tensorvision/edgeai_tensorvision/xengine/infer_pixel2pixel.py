@@ -49,6 +49,7 @@ from edgeai_torchmodelopt import xnn, xmodelopt
 from edgeai_tensorvision import xvision
 from edgeai_tensorvision.xvision.transforms import image_transforms
 from .engine_utils import *
+from .segmentation_metrics import eval_output, compute_accuracy
 
 # ################################################
 def get_config():
@@ -795,67 +796,6 @@ def upsample_tensors(tensors, output_sizes, upsample_mode):
     return tensors
 
 
-
-
-def eval_output(args, output, label, confusion_matrix, n_classes):
-    if len(label.shape)>2:
-        label = label[:,:,0]
-    gt_labels = label.ravel()
-    det_labels = output.ravel().clip(0,n_classes)
-    gt_labels_valid_ind = np.where(gt_labels != 255)
-    gt_labels_valid = gt_labels[gt_labels_valid_ind]
-    det_labels_valid = det_labels[gt_labels_valid_ind]
-    for r in range(confusion_matrix.shape[0]):
-        for c in range(confusion_matrix.shape[1]):
-            confusion_matrix[r,c] += np.sum((gt_labels_valid==r) & (det_labels_valid==c))
-
-    return confusion_matrix
-
-def compute_accuracy(args, confusion_matrix, n_classes):
-    num_selected_classes = n_classes
-    tp = np.zeros(n_classes)
-    population = np.zeros(n_classes)
-    det = np.zeros(n_classes)
-    iou = np.zeros(n_classes)
-
-    for r in range(n_classes):
-      for c in range(n_classes):
-        population[r] += confusion_matrix[r][c]
-        det[c] += confusion_matrix[r][c]
-        if r == c:
-          tp[r] += confusion_matrix[r][c]
-
-    for cls in range(num_selected_classes):
-      intersection = tp[cls]
-      union = population[cls] + det[cls] - tp[cls]
-      iou[cls] = (intersection / union) if union else 0     # For caffe jacinto script
-      #iou[cls] = (intersection / (union + np.finfo(np.float32).eps))  # For pytorch-jacinto script
-
-    num_nonempty_classes = 0
-    for pop in population:
-      if pop>0:
-        num_nonempty_classes += 1
-
-    mean_iou = np.sum(iou) / num_nonempty_classes if num_nonempty_classes else 0
-    accuracy = np.sum(tp) / np.sum(population) if np.sum(population) else 0
-
-    #F1 score calculation
-    fp = np.zeros(n_classes)
-    fn = np.zeros(n_classes)
-    precision = np.zeros(n_classes)
-    recall = np.zeros(n_classes)
-    f1_score = np.zeros(n_classes)
-
-    for cls in range(num_selected_classes):
-        fp[cls] = det[cls] - tp[cls]
-        fn[cls] = population[cls] - tp[cls]
-        precision[cls] = tp[cls] / (det[cls] + 1e-10)
-        recall[cls] = tp[cls] / (tp[cls] + fn[cls] + 1e-10)
-        f1_score[cls] = 2 * precision[cls]*recall[cls] / (precision[cls] + recall[cls] + 1e-10)
-
-    return accuracy, mean_iou, iou, f1_score
-
-
 def infer_video(args, net):
     videoIpHandle = imageio.get_reader(args.input, 'ffmpeg')
     fps = math.ceil(videoIpHandle.get_meta_data()['fps'])
@@ -0,0 +1,92 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import torch
+
+
+# confusion matrix of segmentation outputs: rows are the ground truth classes, columns are the predicted classes.
+# predictions are clipped to [0, n_classes] - the extra last column counts predictions beyond the valid classes.
+# pixels whose ground truth or prediction has no row or column in the matrix are not counted.
+# the matrix can be a numpy array or a torch tensor - a torch tensor is accumulated on its own device.
+def update_confusion_matrix(confusion_matrix, prediction, label, n_classes, ignore_index=255):
+    n_rows, n_cols = confusion_matrix.shape
+    if isinstance(confusion_matrix, torch.Tensor) or isinstance(prediction, torch.Tensor):
+        device = confusion_matrix.device if isinstance(confusion_matrix, torch.Tensor) else prediction.device
+        gt_labels = torch.as_tensor(label, device=device).reshape(-1).long()
+        det_labels = torch.as_tensor(prediction, device=device).reshape(-1).clip(0, n_classes).long()
+        valid = (gt_labels != ignore_index) & (gt_labels >= 0) & (gt_labels < n_rows) & (det_labels < n_cols)
+        counts = torch.bincount(gt_labels[valid] * n_cols + det_labels[valid], minlength=n_rows * n_cols)
+        counts = counts.reshape(n_rows, n_cols)
+        if isinstance(confusion_matrix, torch.Tensor):
+            confusion_matrix += counts.to(confusion_matrix.dtype)
+        else:
+            confusion_matrix += counts.cpu().numpy()
+        #
+    else:
+        gt_labels = np.asarray(label).ravel().astype(np.int64)
+        det_labels = np.asarray(prediction).ravel().clip(0, n_classes).astype(np.int64)
+        valid = (gt_labels != ignore_index) & (gt_labels >= 0) & (gt_labels < n_rows) & (det_labels < n_cols)
+        counts = np.bincount(gt_labels[valid] * n_cols + det_labels[valid], minlength=n_rows * n_cols)
+        confusion_matrix += counts.reshape(n_rows, n_cols)
+    #
+    return confusion_matrix
+
+
+# pixel accuracy, mean iou, class iou and class f1 score from the confusion matrix
+def confusion_matrix_metrics(confusion_matrix, n_classes):
+    if isinstance(confusion_matrix, torch.Tensor):
+        confusion_matrix = confusion_matrix.cpu().numpy()
+    #
+    confusion_matrix = np.asarray(confusion_matrix, dtype=np.float64)[:n_classes, :n_classes]
+    tp = np.diag(confusion_matrix).copy()
+    population = confusion_matrix.sum(axis=1)
+    det = confusion_matrix.sum(axis=0)
+
+    union = population + det - tp
+    iou = np.divide(tp, union, out=np.zeros(n_classes), where=(union != 0))
+    num_nonempty_classes = np.count_nonzero(population > 0)
+    mean_iou = np.sum(iou) / num_nonempty_classes if num_nonempty_classes else 0
+    accuracy = np.sum(tp) / np.sum(population) if np.sum(population) else 0
+
+    fn = population - tp
+    precision = tp / (det + 1e-10)
+    recall = tp / (tp + fn + 1e-10)
+    f1_score = 2 * precision * recall / (precision + recall + 1e-10)
+    return accuracy, mean_iou, iou, f1_score
+
+
+def eval_output(args, output, label, confusion_matrix, n_classes):
+    if len(label.shape)>2:
+        label = label[:,:,0]
+    #
+    return update_confusion_matrix(confusion_matrix, output, label, n_classes)
+
+
+def compute_accuracy(args, confusion_matrix, n_classes):
+    return confusion_matrix_metrics(confusion_matrix, n_classes)
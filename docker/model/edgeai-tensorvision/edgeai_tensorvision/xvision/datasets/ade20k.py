@@ -50,6 +50,7 @@ import numpy as np
 import PIL
 from torchvision.datasets import utils
 from edgeai_torchmodelopt import xnn
+from .dataset_utils import decode_segmap_lut, get_segmap_decode_lut
 
 
 __all__ = ['ADE20KSegmentation', 'ade20k_segmentation', 'ade20k_seg_noweights', 'ade20k_seg_class32']
@@ -89,6 +90,12 @@ class ADE20KSegmentation:
 
         # if a color representation is needed
         self.color_map = xnn.utils.get_color_palette(num_classes)
+        self.decode_lut_ = get_segmap_decode_lut(self.color_map, self.num_classes_)
+        # lookup table for encode_segmap - all classes >= self.num_classes_ are mapped to 0
+        self.encode_lut_ = np.arange(256, dtype=np.uint8)
+        if self.num_classes_ < 151:
+            self.encode_lut_[self.num_classes_:] = 0
+        #
 
         image_dir = os.path.join(self.kwargs['path'], 'images', self.kwargs['split'])
         images_pattern = os.path.join(image_dir, '*.jpg')
@@ -186,20 +193,7 @@ class ADE20KSegmentation:
         return [self.num_classes_]
 
     def decode_segmap(self, seg_img):
-        r = seg_img.copy()
-        g = seg_img.copy()
-        b = seg_img.copy()
-        for l in range(0, self.num_classes_):
-            r[seg_img == l] = self.color_map[l][0]
-            g[seg_img == l] = self.color_map[l][1]
-            b[seg_img == l] = self.color_map[l][2]
-        #
-
-        rgb = np.zeros((seg_img.shape[0], seg_img.shape[1], 3))
-        rgb[:, :, 0] = r / 255.0
-        rgb[:, :, 1] = g / 255.0
-        rgb[:, :, 2] = b / 255.0
-        return rgb
+        return decode_segmap_lut(seg_img, self.decode_lut_)
 
     def encode_segmap(self, label_img):
         label_img = label_img.convert('L')
@@ -207,9 +201,7 @@ class ADE20KSegmentation:
         if self.ignore_label is not None:
             label_img[self.ignore_label] = 255
         #
-        if self.num_classes_ < 151:
-            label_img[label_img >= self.num_classes_] = 0
-        #
+        label_img = np.take(self.encode_lut_, label_img)
         return label_img
 
     def evaluate(self, predictions, **kwargs):
@@ -106,6 +106,7 @@ from torch.utils import data
 import sys
 import warnings
 from edgeai_torchmodelopt import xnn
+from .dataset_utils import get_segmap_encode_lut, encode_segmap_lut, get_segmap_decode_lut, decode_segmap_lut
 
 ###########################################
 # config settings
@@ -147,31 +148,19 @@ class CityscapesBaseSegmentationLoader():
                                5.29974114, 0.28342531, 0.9396095, 0.81551811, 0.42679146, 3.6399074,
                                2.78376194], dtype=float)
 
+    # lookup tables for encode_segmap and decode_segmap
+    encode_lut_ = get_segmap_encode_lut(void_classes, valid_classes, class_map, ignore_index)
+    decode_lut_ = get_segmap_decode_lut(label_colours, num_classes_)
+
     @classmethod
     def decode_segmap(cls, temp):
-        r = temp.copy()
-        g = temp.copy()
-        b = temp.copy()
-        for l in range(0, cls.num_classes_):
-            r[temp == l] = cls.label_colours[l][0]
-            g[temp == l] = cls.label_colours[l][1]
-            b[temp == l] = cls.label_colours[l][2]
-
-        rgb = np.zeros((temp.shape[0], temp.shape[1], 3))
-        rgb[:, :, 0] = r / 255.0
-        rgb[:, :, 1] = g / 255.0
-        rgb[:, :, 2] = b / 255.0
-        return rgb
+        return decode_segmap_lut(temp, cls.decode_lut_)
 
 
     @classmethod
     def encode_segmap(cls, mask):
-        # Put all void classes to zero
-        for _voidc in cls.void_classes:
-            mask[mask == _voidc] = cls.ignore_index
-        for _validc in cls.valid_classes:
-            mask[mask == _validc] = cls.class_map[_validc]
-        return mask
+        # void classes are put to ignore_index, valid classes are mapped to the train ids
+        return encode_segmap_lut(mask, cls.encode_lut_)
 
 
     @classmethod
@@ -197,30 +186,18 @@ class CityscapesBaseSegmentationLoaderFiveClasses():
 
     class_weights_ = np.array([0.22567085, 1.89944273, 5.24032014, 1., 0.13516443], dtype=float)
 
+    # lookup tables for encode_segmap and decode_segmap
+    encode_lut_ = get_segmap_encode_lut(void_classes, valid_classes, class_map, ignore_index)
+    decode_lut_ = get_segmap_decode_lut(label_colours, num_classes_)
+
     @classmethod
     def decode_segmap(cls, temp):
-        r = temp.copy()
-        g = temp.copy()
-        b = temp.copy()
-        for l in range(0, cls.num_classes_):
-            r[temp == l] = cls.label_colours[l][0]
-            g[temp == l] = cls.label_colours[l][1]
-            b[temp == l] = cls.label_colours[l][2]
-
-        rgb = np.zeros((temp.shape[0], temp.shape[1], 3))
-        rgb[:, :, 0] = r / 255.0
-        rgb[:, :, 1] = g / 255.0
-        rgb[:, :, 2] = b / 255.0
-        return rgb
+        return decode_segmap_lut(temp, cls.decode_lut_)
 
     @classmethod
     def encode_segmap(cls, mask):
-        # Put all void classes to zero
-        for _voidc in cls.void_classes:
-            mask[mask == _voidc] = cls.ignore_index
-        for _validc in cls.valid_classes:
-            mask[mask == _validc] = cls.class_map[_validc]
-        return mask
+        # void classes are put to ignore_index, valid classes are mapped to the train ids
+        return encode_segmap_lut(mask, cls.encode_lut_)
 
     @classmethod
     def class_weights(cls):
@@ -244,30 +221,18 @@ class CityscapesBaseMotionLoader():
     num_classes_ = 2
     class_weights_ = np.array([0.05, 0.95], dtype=float)    #Calculated weights based on mdeian_frequenncy = [ 0.51520306, 16.94405377]
 
+    # lookup tables for encode_segmap and decode_segmap
+    encode_lut_ = get_segmap_encode_lut(void_classes, valid_classes, class_map, ignore_index, void_first=False)
+    decode_lut_ = get_segmap_decode_lut(label_colours, num_classes_)
+
     @classmethod
     def decode_segmap(cls, temp):
-        r = temp.copy()
-        g = temp.copy()
-        b = temp.copy()
-        for l in range(0, cls.num_classes_):
-            r[temp == l] = cls.label_colours[l][0]
-            g[temp == l] = cls.label_colours[l][1]
-            b[temp == l] = cls.label_colours[l][2]
-        #
-        rgb = np.zeros((temp.shape[0], temp.shape[1], 3))
-        rgb[:, :, 0] = r / 255.0
-        rgb[:, :, 1] = g / 255.0
-        rgb[:, :, 2] = b / 255.0
-        return rgb
+        return decode_segmap_lut(temp, cls.decode_lut_)
 
     @classmethod
     def encode_segmap(cls, mask):
-        for _validc in cls.valid_classes:
-            mask[mask == _validc] = cls.class_map[_validc]
-        # Put all void classes to zero
-        for _voidc in cls.void_classes:
-            mask[mask == _voidc] = cls.ignore_index
-        return mask
+        # valid classes are mapped first here, then the void classes are put to ignore_index
+        return encode_segmap_lut(mask, cls.encode_lut_)
 
     @classmethod
     def class_weights(cls):
@@ -79,6 +79,7 @@ import copy
 import cv2
 
 from edgeai_torchmodelopt import xnn
+from .dataset_utils import get_segmap_encode_lut, encode_segmap_lut, get_segmap_decode_lut, decode_segmap_lut
 
 __all__ = ['coco_segmentation', 'coco_seg21']
 
@@ -235,6 +236,9 @@ class COCOSegmentationPlus(COCOSegmentation):
         self.color_map = xnn.utils.get_color_palette(num_classes)
         self.color_map = (self.color_map * self.num_classes_)[:self.num_classes_]
         self.label_colours = dict(zip(range(self.num_classes_), self.color_map))
+        # lookup tables for encode_segmap and decode_segmap
+        self.encode_lut_ = get_segmap_encode_lut(self.void_classes, self.valid_classes, self.class_map, self.ignore_index)
+        self.decode_lut_ = get_segmap_decode_lut(self.label_colours, self.num_classes_)
         self.transforms = transforms
 
     def __getitem__(self, item):
@@ -253,27 +257,11 @@ class COCOSegmentationPlus(COCOSegmentation):
         return nc
 
     def decode_segmap(self, temp):
-        r = temp.copy()
-        g = temp.copy()
-        b = temp.copy()
-        for l in range(0, self.num_classes_):
-            r[temp == l] = self.label_colours[l][0]
-            g[temp == l] = self.label_colours[l][1]
-            b[temp == l] = self.label_colours[l][2]
-        #
-        rgb = np.zeros((temp.shape[0], temp.shape[1], 3))
-        rgb[:, :, 0] = r / 255.0
-        rgb[:, :, 1] = g / 255.0
-        rgb[:, :, 2] = b / 255.0
-        return rgb
+        return decode_segmap_lut(temp, self.decode_lut_)
 
     def encode_segmap(self, mask):
-        # Put all void classes to zero
-        for _voidc in self.void_classes:
-            mask[mask == _voidc] = self.ignore_index
-        for _validc in self.valid_classes:
-            mask[mask == _validc] = self.class_map[_validc]
-        return mask
+        # void classes are put to ignore_index, valid classes are mapped to the train ids
+        return encode_segmap_lut(mask, self.encode_lut_)
 
 
 ###########################################
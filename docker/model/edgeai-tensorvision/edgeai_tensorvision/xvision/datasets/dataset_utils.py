@@ -64,6 +64,53 @@ def load_flo(path):
     return data2D
 
 
+###########################################
+# lookup table based encode/decode of segmentation maps
+def get_segmap_encode_lut(void_classes, valid_classes, class_map, ignore_index, void_first=True):
+    # gives the same result as doing mask[mask == c] = ... for the void and valid classes one after the other,
+    # for every uint8 label. void_first decides the order of these assignments.
+    label_mapping = [(c, ignore_index) for c in void_classes]
+    valid_mapping = [(c, class_map[c]) for c in valid_classes]
+    label_mapping = (label_mapping + valid_mapping) if void_first else (valid_mapping + label_mapping)
+    encode_lut = np.arange(256, dtype=np.uint8)
+    for label, new_label in label_mapping:
+        if 0 <= label < 256:
+            encode_lut[encode_lut == label] = new_label
+        #
+    #
+    return encode_lut
+
+
+def encode_segmap_lut(mask, encode_lut):
+    # encodes in place, as the masked assignments did
+    if mask.dtype == np.uint8:
+        mask[...] = np.take(encode_lut, mask)
+    else:
+        # labels outside the uint8 range are left as they are
+        in_range = (mask >= 0) & (mask < 256)
+        mask[in_range] = encode_lut[mask[in_range].astype(np.int64)]
+    #
+    return mask
+
+
+def get_segmap_decode_lut(label_colours, num_classes):
+    # labels without a colour are shown as gray levels of the label value
+    decode_lut = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+    for label in range(num_classes):
+        decode_lut[label] = label_colours[label]
+    #
+    return decode_lut
+
+
+def decode_segmap_lut(label_img, decode_lut):
+    # uint8 rgb image from the label image
+    label_img = np.asarray(label_img)
+    if not np.issubdtype(label_img.dtype, np.integer):
+        label_img = label_img.astype(np.int64)
+    #
+    return np.take(decode_lut, label_img, axis=0, mode='clip')
+
+
 def _find_annotations_info(dataset_store):
     image_id_to_file_id_dict = dict()
     file_id_to_image_id_dict = dict()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+#################################################################################
+# Copyright (c) 2018-2021, Texas Instruments Incorporated - http://www.ti.com
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#################################################################################
+
+################################################################
+# Throughput benchmark for segmentation map encode/decode.
+# Compares the per class masked assignment (loop) implementation with the
+# lookup table implementation used by the xvision datasets - both as a per frame
+# micro benchmark and inside a torch DataLoader (as used in training workers).
+# Synthetic label maps are used, so no dataset needs to be downloaded.
+#
+# Example:
+#   python ./references/other/benchmark_segmap_dataloader_main.py --num_workers 4
+################################################################
+
+import argparse
+import time
+import numpy as np
+import torch
+
+from edgeai_tensorvision.xvision.datasets import cityscapes_plus
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--height', type=int, default=1024, help='label map height')
+parser.add_argument('--width', type=int, default=2048, help='label map width')
+parser.add_argument('--num_frames', type=int, default=64, help='number of frames in the synthetic dataset')
+parser.add_argument('--batch_size', type=int, default=8, help='dataloader batch size')
+parser.add_argument('--num_workers', type=int, default=0, help='dataloader workers')
+parser.add_argument('--loader', type=str, default='CityscapesBaseSegmentationLoader',
+                    help='dataset loader class in xvision.datasets.cityscapes_plus')
+args = parser.parse_args()
+
+
+################################################################
+# reference loop implementation (the one replaced by the lookup tables)
+def encode_segmap_loop(loader, mask):
+    ignore_index = loader.ignore_index
+    for _voidc in loader.void_classes:
+        mask[mask == _voidc] = ignore_index
+    for _validc in loader.valid_classes:
+        mask[mask == _validc] = loader.class_map[_validc]
+    #
+    return mask
+
+
+def decode_segmap_loop(loader, temp):
+    r = temp.copy()
+    g = temp.copy()
+    b = temp.copy()
+    for l in range(0, loader.num_classes_):
+        r[temp == l] = loader.label_colours[l][0]
+        g[temp == l] = loader.label_colours[l][1]
+        b[temp == l] = loader.label_colours[l][2]
+    #
+    rgb = np.zeros((temp.shape[0], temp.shape[1], 3))
+    rgb[:, :, 0] = r / 255.0
+    rgb[:, :, 1] = g / 255.0
+    rgb[:, :, 2] = b / 255.0
+    return rgb
+
+
+def encode_segmap_lut(loader, mask):
+    return loader.encode_segmap(mask)
+
+
+################################################################
+class SyntheticLabelDataset(torch.utils.data.Dataset):
+    def __init__(self, loader, encode_fn, num_frames, height, width):
+        self.loader = loader
+        self.encode_fn = encode_fn
+        rng = np.random.default_rng(0)
+        # raw label ids, similar to the *_labelIds.png files
+        self.labels = [rng.integers(0, 34, (height, width), dtype=np.uint8) for _ in range(num_frames)]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        mask = self.labels[index].copy()
+        return torch.from_numpy(self.encode_fn(self.loader, mask))
+
+
+def time_frames(fn, frames):
+    start = time.perf_counter()
+    for f in frames:
+        fn(f.copy())
+    #
+    return (time.perf_counter() - start) / len(frames)
+
+
+def time_dataloader(dataset):
+    data_loader = torch.utils.data.DataLoader(dataset, batch_size=args.batch_size, num_workers=args.num_workers,
+                                              shuffle=False, persistent_workers=False)
+    start = time.perf_counter()
+    num_frames = 0
+    for batch in data_loader:
+        num_frames += batch.shape[0]
+    #
+    return num_frames / (time.perf_counter() - start)
+
+
+def main():
+    loader = getattr(cityscapes_plus, args.loader)
+    frames = SyntheticLabelDataset(loader, None, min(args.num_frames, 16), args.height, args.width).labels
+    encoded = [loader.encode_segmap(f.copy()) for f in frames]
+
+    # make sure both implementations agree before timing them
+    assert all(np.array_equal(encode_segmap_loop(loader, f.copy()), e) for f, e in zip(frames, encoded))
+    assert np.array_equal((decode_segmap_loop(loader, encoded[0]) * 255).round().astype(np.uint8),
+                          loader.decode_segmap(encoded[0]))
+
+    print(f'loader: {args.loader}, label map: {args.height}x{args.width}')
+    loop_ms = time_frames(lambda f: encode_segmap_loop(loader, f), frames) * 1000
+    lut_ms = time_frames(loader.encode_segmap, frames) * 1000
+    print(f'encode_segmap - loop: {loop_ms:.2f} ms/frame, lut: {lut_ms:.2f} ms/frame, speedup: {loop_ms/lut_ms:.1f}x')
+    loop_ms = time_frames(lambda f: decode_segmap_loop(loader, f), encoded) * 1000
+    lut_ms = time_frames(loader.decode_segmap, encoded) * 1000
+    print(f'decode_segmap - loop: {loop_ms:.2f} ms/frame, lut: {lut_ms:.2f} ms/frame, speedup: {loop_ms/lut_ms:.1f}x')
+
+    for name, encode_fn in (('loop', encode_segmap_loop), ('lut', encode_segmap_lut)):
+        dataset = SyntheticLabelDataset(loader, encode_fn, args.num_frames, args.height, args.width)
+        fps = time_dataloader(dataset)
+        print(f'dataloader ({name}) - batch_size: {args.batch_size}, num_workers: {args.num_workers}, throughput: {fps:.1f} frames/s')
+    #
+
+
+if __name__ == '__main__':
+    main()
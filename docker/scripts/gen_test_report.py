@@ -57,11 +57,18 @@
 # OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import subprocess
+import argparse
 import csv
 import filecmp
+import json
 import os
 import platform
+import statistics
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 final_report = []
 
 enable_debug = False
@@ -69,6 +76,7 @@ enable_debug = False
 ref_outputs_base_dir = 'test_data' 
 rt_base_dir_py = 'examples/osrt_python/'
 rt_base_dir_bash = 'scripts'
+benchmark_results_dir = 'benchmark_results'
 
 try:
     SOC = os.environ['SOC']
@@ -141,12 +149,32 @@ else:
     print( "Set SOC variable in your shell")
     exit(-1)
 
+# suites are run concurrently on pc (only functional checks there), one at a time on device so that the timings are not disturbed
+parser = argparse.ArgumentParser()
+parser.add_argument('-j', '--jobs', type=int, default=(1 if platform.machine() == 'aarch64' else os.cpu_count()),
+                    help='number of runtime suites run concurrently (limited to the number of cpus)')
+parser.add_argument('-n', '--perf_runs', type=int, default=1,
+                    help='number of runs of each suite, performance status is computed from the median of the runs')
+parser.add_argument('--perf_tolerance_pct', type=float, default=2.0, help='allowed increase of the median total time over the reference, in %%')
+parser.add_argument('--perf_tolerance_ms', type=float, default=0.02, help='allowed increase of the median total time over the reference, in ms')
+parser.add_argument('--out_dtype', default='float32', help='data type of the output binaries, used when comparing with a tolerance')
+parser.add_argument('--atol', type=float, default=0.0, help='absolute tolerance for the output comparison, 0 along with rtol 0 : bit exact')
+parser.add_argument('--rtol', type=float, default=0.0, help='relative tolerance for the output comparison')
+parser.add_argument('--benchmark_iters', type=int, default=0,
+                    help='steady-state iterations of the python suites, when set the performance status is computed from their per iteration times')
+parser.add_argument('--benchmark_warmup', type=int, default=10, help='warm-up iterations of the python suites steady-state benchmark')
+args = parser.parse_args()
+
 currIdx = 0
 if platform.machine() != 'aarch64':
     device = 'pc'
 
+print_lock = threading.Lock()
+
+COMPARE_CHUNK_SIZE = 1024*1024
+
 
-def run_cmd(cmd, dir):
+def run_cmd(cmd, dir, prefix=''):
     try:
         msg = f'Command : {cmd} in Dir : {dir} Started'
         print(msg)
@@ -156,60 +184,67 @@ def run_cmd(cmd, dir):
             b = process.stdout.readline()
             if not len(b):
                 break
-            sys.stdout.write(b)
-            sys.stdout.flush()
+            with print_lock:
+                sys.stdout.write(prefix + b)
+                sys.stdout.flush()
             lines.append(b.rstrip())
 
+        process.wait()
         if process.returncode is not None and process.returncode != 0 :
+            # the models that did not complete are reported as failed
             msg = f'Command : {cmd} in Dir : {dir} Failed with Error code {process.returncode}'
             print(msg)
-            exit(-1)
         return lines
     except Exception as e:
         raise e
 
-num_func_pass = 0
-num_func_fail = 0
-num_perf_pass = 0
-num_perf_fail = 0
 
-for test_config in test_configs:
-    script_name = test_config['script_name']
-    rt_type = test_config['rt_type']
+def compare_output_bin(out_file_name, ref_file_name, dtype, atol, rtol):
+    # returns (match, info), bit exact when both tolerances are 0, else the outputs are compared as dtype tensors in chunks
+    if atol == 0.0 and rtol == 0.0:
+        return filecmp.cmp(out_file_name, ref_file_name, shallow=False), ''
+    dtype = np.dtype(dtype)
+    out_size = os.path.getsize(out_file_name)
+    ref_size = os.path.getsize(ref_file_name)
+    if out_size != ref_size or out_size % dtype.itemsize != 0:
+        return False, f'Output size {out_size} does not match Ref size {ref_size}'
+    max_abs_diff = 0.0
+    num_mismatch = 0
+    with open(out_file_name, 'rb') as out_file, open(ref_file_name, 'rb') as ref_file:
+        while True:
+            out_chunk = np.fromfile(out_file, dtype=dtype, count=COMPARE_CHUNK_SIZE)
+            ref_chunk = np.fromfile(ref_file, dtype=dtype, count=COMPARE_CHUNK_SIZE)
+            if out_chunk.size == 0:
+                break
+            out_chunk = out_chunk.astype(np.float64)
+            ref_chunk = ref_chunk.astype(np.float64)
+            num_mismatch += int(np.count_nonzero(~np.isclose(out_chunk, ref_chunk, rtol=rtol, atol=atol, equal_nan=True)))
+            abs_diff = np.abs(out_chunk - ref_chunk)
+            if np.any(np.isfinite(abs_diff)):
+                max_abs_diff = max(max_abs_diff, float(np.nanmax(abs_diff[np.isfinite(abs_diff)])))
+    info = f'Max Abs Diff {max_abs_diff:.6g}'
+    if num_mismatch > 0:
+        info += f', {num_mismatch} elements out of tolerance'
+    return num_mismatch == 0, info
+
+
+def get_suite_cmd(test_config):
     if(test_config['lang'] == 'bash'):
         rt_base_dir = rt_base_dir_bash
         curr_rt_base_dir= os.path.join(rt_base_dir,test_config['script_dir'])
-        cmd = ('bash '+ script_name)
+        cmd = ('bash '+ test_config['script_name'])
 
     elif(test_config['lang'] == 'py'):
         rt_base_dir = rt_base_dir_py
         curr_rt_base_dir= os.path.join(rt_base_dir,test_config['script_dir'])
-        cmd = ('python3 '+ script_name)
-
-    if device != 'pc':
-        curr_ref_base_dir = ref_outputs_base_dir+'/refs-'+device+'/'
-    else:
-        curr_ref_base_dir = ref_outputs_base_dir+'/refs-'+device+'-'+SOC+'/'
-    
-    curr_ref_output_base_dir = os.path.join(curr_ref_base_dir,"bin")
+        cmd = ('python3 '+ test_config['script_name'])
+        if args.benchmark_iters > 0:
+            cmd += f' --benchmark_iters {args.benchmark_iters} --benchmark_warmup {args.benchmark_warmup}'
+    return cmd, curr_rt_base_dir
 
-    lines = run_cmd(cmd=cmd, dir=curr_rt_base_dir)
-
-    if enable_debug:
-        for i in lines:
-            print(i)
 
+def parse_completed_models(lines):
     rt_report = []
-    golden_ref_file= ""
-    if device != 'pc':
-        golden_ref_file = curr_ref_base_dir+'/golden_ref_'+device+'.csv'
-    else:
-        golden_ref_file = curr_ref_base_dir+'/golden_ref_'+device+'_'+SOC+'.csv'
-    with open(golden_ref_file, 'r') as f:
-        ref_report = [{k:v for k, v in row.items()} for row in csv.DictReader(f, skipinitialspace=True)]
-    if enable_debug:
-        print(ref_report)
-
     for i in lines:
         if i.startswith('Completed_Model : '):
             curr = i.split(',')
@@ -219,14 +254,105 @@ for test_config in test_configs:
                 pair = pair.split(':')
                 tc_dict[pair[0].strip()] = pair[1].strip()
             rt_report.append(tc_dict)
+    return rt_report
+
+
+def load_benchmark_samples(rt_type, name, start_time):
+    # per iteration total times written by the python suites in benchmark mode, None if not written by this run
+    file_name = os.path.join(benchmark_results_dir, f'{rt_type}_{name}.json')
+    if not os.path.exists(file_name) or os.path.getmtime(file_name) < start_time:
+        return None
+    with open(file_name) as f:
+        result = json.load(f)
+    return result.get('samples_ms', {}).get('total', None)
+
+
+def check_output_bin(output_bin_file):
+    # functional status and info of an output binary against its reference
+    out_file_name = os.path.join('./output_binaries', output_bin_file)
+    ref_file_name = os.path.join(curr_ref_output_base_dir, output_bin_file)
+    if not os.path.exists(out_file_name):
+        return 'FAIL', 'Output Bin File Not Found'
+    if not os.path.exists(ref_file_name):
+        return 'FAIL', 'Output Ref File Not Found'
+    match, info = compare_output_bin(out_file_name, ref_file_name, args.out_dtype, args.atol, args.rtol)
+    if match == True:
+        return 'PASS', info
+    return 'FAIL', 'Output Bin File Mismatch' + (f' ({info})' if info else '')
+
+
+def run_suite(test_config):
+    # all the runs of a suite, one after the other : returns the report of each run and the benchmark samples per model
+    cmd, curr_rt_base_dir = get_suite_cmd(test_config)
+    prefix = f"[{test_config['rt_type']}] " if args.jobs > 1 else ''
+    run_reports = []
+    benchmark_samples = {}
+    for run_idx in range(max(1, args.perf_runs)):
+        start_time = time.time()
+        lines = run_cmd(cmd=cmd, dir=curr_rt_base_dir, prefix=prefix)
+        if enable_debug:
+            for i in lines:
+                print(i)
+        run_reports.append(parse_completed_models(lines))
+        if run_idx == 0:
+            # the later runs overwrite the output binaries - compare them now
+            for item in run_reports[0]:
+                if 'Output Bin File' in item:
+                    item['Functional Status'], item['Info'] = check_output_bin(item['Output Bin File'])
+        if args.benchmark_iters > 0 and test_config['lang'] == 'py':
+            for item in run_reports[-1]:
+                samples = load_benchmark_samples(test_config['rt_type'], item['Name'], start_time)
+                if samples:
+                    benchmark_samples.setdefault(item['Name'], []).extend(samples)
+    return run_reports, benchmark_samples
+
+
+num_func_pass = 0
+num_func_fail = 0
+num_perf_pass = 0
+num_perf_fail = 0
+
+if device != 'pc':
+    curr_ref_base_dir = ref_outputs_base_dir+'/refs-'+device+'/'
+    golden_ref_file = curr_ref_base_dir+'/golden_ref_'+device+'.csv'
+else:
+    curr_ref_base_dir = ref_outputs_base_dir+'/refs-'+device+'-'+SOC+'/'
+    golden_ref_file = curr_ref_base_dir+'/golden_ref_'+device+'_'+SOC+'.csv'
+curr_ref_output_base_dir = os.path.join(curr_ref_base_dir,"bin")
+
+with open(golden_ref_file, 'r') as f:
+    ref_report = [{k:v for k, v in row.items()} for row in csv.DictReader(f, skipinitialspace=True)]
+if enable_debug:
+    print(ref_report)
+
+num_jobs = max(1, min(args.jobs, os.cpu_count() or 1, len(test_configs)))
+with ThreadPoolExecutor(max_workers=num_jobs) as executor:
+    suite_reports = list(executor.map(run_suite, test_configs))
+
+for test_config, (run_reports, benchmark_samples) in zip(test_configs, suite_reports):
+    rt_type = test_config['rt_type']
+
+    # the first run is used for the functional check (run_suite compares its outputs before the next run),
+    # total times of all the runs for the performance check
+    rt_index = {}
+    for item in run_reports[0]:
+        rt_index.setdefault(item["Name"], item)
+    total_times = {}
+    for rt_report in run_reports:
+        for item in rt_report:
+            total_times.setdefault(item["Name"], []).append(float(item['Total time']))
+    # the steady-state iterations replace the per run averages when available
+    total_times.update(benchmark_samples)
     if enable_debug:
-        print(rt_report)
+        print(run_reports[0])
 
     for r in ref_report:
-        curr = [item for item in rt_report if ((item["Name"] == r['Name']) and (rt_type == r['rt type']) )]
+        if rt_type != r['rt type']:
+            continue
+        curr = rt_index.get(r['Name'], None)
         if enable_debug:
             print(curr)
-        if (len(curr) == 0 and rt_type == r['rt type']):
+        if curr is None:
             r['Offload Time'] = '0'
             r['Functional Status'] = 'FAIL'
             r['Info'] = 'Output Not Detected'
@@ -235,29 +361,18 @@ for test_config in test_configs:
             final_report[-1]['Runtime'] = rt_type
             currIdx+= 1
             num_func_fail += 1
-        elif(len(curr) != 0 and rt_type == r['rt type']):
-            final_report.append(curr[0])
-            out_file_name = os.path.join('./output_binaries',final_report[-1]['Output Bin File'])
-            ref_file_name = os.path.join(curr_ref_output_base_dir, final_report[-1]['Output Bin File'])
-            if not os.path.exists(out_file_name) or not os.path.exists(ref_file_name):
-                if not os.path.exists(out_file_name):
-                    final_report[-1]['Functional Status'] = 'FAIL'
-                    final_report[-1]['Info'] = 'Output Bin File Not Found'
-                elif not os.path.exists(ref_file_name):
-                    final_report[-1]['Functional Status'] = 'FAIL'
-                    final_report[-1]['Info'] = 'Output Ref File Not Found'
-                num_func_fail += 1
+        else:
+            final_report.append(curr)
+            if final_report[-1].get('Functional Status') == 'PASS':
+                num_func_pass += 1
             else:
-                if filecmp.cmp(out_file_name, ref_file_name) == True:
-                    final_report[-1]['Functional Status'] = 'PASS'
-                    final_report[-1]['Info'] = ''
-                    num_func_pass += 1
-                else:
-                    final_report[-1]['Functional Status'] = 'FAIL'
-                    final_report[-1]['Info'] = 'Output Bin File Mismatch'
-                    num_func_fail += 1
+                num_func_fail += 1
 
             if platform.machine() == 'aarch64':
+                samples = total_times[r['Name']]
+                final_report[-1]['Total time'] = f'{statistics.median(samples):10.2f}'.strip()
+                final_report[-1]['Total Time p90'] = f'{np.percentile(samples, 90):10.2f}'.strip()
+                final_report[-1]['Num Runs'] = len(samples) if r['Name'] not in benchmark_samples else len(run_reports)
                 final_report[-1]['Ref Total Time']   =  r['Total time']
                 final_report[-1]['Ref Offload Time'] =  r['Offload Time']
 
@@ -267,9 +382,9 @@ for test_config in test_configs:
                 final_report[-1]['Total Time Diff']  = f'{diff_in_total_time:5.2f}'
                 final_report[-1]['Total Time Diff(%)']  = f'{diff_in_total_time_pct:5.2f}%'
     
-                if(diff_in_total_time_pct > 2.0 and diff_in_total_time > 0.02):
+                if(diff_in_total_time_pct > args.perf_tolerance_pct and diff_in_total_time > args.perf_tolerance_ms):
                     final_report[-1]['Performance Status']  = "FAIL"
-                    final_report[-1]['Info'] ="Actual time more than Ref time by 0.02ms or 2%"
+                    final_report[-1]['Info'] = f"Actual time more than Ref time by {args.perf_tolerance_ms}ms or {args.perf_tolerance_pct}%"
                     num_perf_fail += 1
                 else :
                     final_report[-1]['Performance Status']  = "PASS"
@@ -293,7 +408,7 @@ if(len(final_report) > 0):
     
     # Sort the dictionary
     sequence = ["Sl No.","Runtime","Name","Output Image File","Output Bin File",
-                "Total time","Offload Time","Ref Total Time","Ref Offload Time",
+                "Total time","Total Time p90","Num Runs","Offload Time","Ref Total Time","Ref Offload Time",
                 "Total Time Diff","Total Time Diff(%)","DDR RW MBs", "Functional Status",
                 "Performance Status","Info"]
     for i in range(len(final_report)):
@@ -315,7 +430,7 @@ if(len(final_report) > 0):
     else:
         report_file = 'test_report_'+device+'_'+ SOC+ '.csv'
     with open(report_file, 'w', newline='')  as output_file:
-        dict_writer = csv.DictWriter(output_file, keys)
+        dict_writer = csv.DictWriter(output_file, keys, extrasaction='ignore')
         dict_writer.writeheader()
         dict_writer.writerows(final_report)
 else:
@@ -327,4 +442,4 @@ if platform.machine() == 'aarch64':
     print("\nPerf Pass: {}\nPerf Fail: {}".format(num_perf_pass, num_perf_fail))
 
 print("\nPlease refer to the output_images and output_binaries directory for generated outputs")
-print("TEST DONE!")
\ No newline at end of file
+print("TEST DONE!")
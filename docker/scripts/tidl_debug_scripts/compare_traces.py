@@ -0,0 +1,296 @@
+# Copyright (c) {2015 - 2023} Texas Instruments Incorporated
+#
+# All rights reserved not granted herein.
+#
+# Limited License.
+#
+# Texas Instruments Incorporated grants a world-wide, royalty-free, non-exclusive
+# license under copyrights and patents it now or hereafter owns or controls to make,
+# have made, use, import, offer to sell and sell ("Utilize") this software subject to the
+# terms herein.  With respect to the foregoing patent license, such license is granted
+# solely to the extent that any such patent is necessary to Utilize the software alone.
+# The patent license shall not apply to any combinations which include this software,
+# other than combinations with devices manufactured by or for TI ("TI Devices").
+# No hardware patent is licensed hereunder.
+#
+# Redistributions must preserve existing copyright notices and reproduce this license
+# (including the above copyright notice and the disclaimer and (if applicable) source
+# code license limitations below) in the documentation and/or other materials provided
+# with the distribution
+#
+# Redistribution and use in binary form, without modification, are permitted provided
+# that the following conditions are met:
+#
+# *       No reverse engineering, decompilation, or disassembly of this software is
+# permitted with respect to any software provided in binary form.
+#
+# *       any redistribution and use are licensed by TI for use only with TI Devices.
+#
+# *       Nothing shall obligate TI to provide you with source code for the software
+# licensed and provided to you in object code.
+#
+# If software source code is provided to you, modification and redistribution of the
+# source code are permitted provided that the following conditions are met:
+#
+# *       any redistribution and use of the source code, including any resulting derivative
+# works, are licensed by TI for use only with TI Devices.
+#
+# *       any redistribution and use of any object code compiled from the source code
+# and any resulting derivative works, are licensed by TI for use only with TI Devices.
+#
+# Neither the name of Texas Instruments Incorporated nor the names of its suppliers
+#
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# DISCLAIMER.
+#
+# THIS SOFTWARE IS PROVIDED BY TI AND TI'S LICENSORS "AS IS" AND ANY EXPRESS
+# OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL TI AND TI'S LICENSORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Compares the layer level traces of two runs, layer by layer (matched by dataId) :
+#   - two trace directories (e.g. host emulation vs target, 8-bit vs 16-bit, TIDL vs TIDL float mode)
+#   - a trace directory and an ONNX Runtime intermediate dump : a directory with one <tensor name>.npy per
+#     intermediate output, mapped to dataIds with the *.layer_info.txt of the compiled artifacts
+# Files are memory mapped and the metrics are accumulated over chunks, so memory is bounded irrespective of the
+# size of the trace set. Layers are compared in parallel and the report is ranked with the worst layer first.
+#
+# Example :
+#   python3 compare_traces.py -r traces_ref -t traces_target -o trace_report
+#   python3 compare_traces.py -r onnx_dump --layerInfo model-artifacts/{model_name}/tempDir/subgraph_0_tidl_net.bin.layer_info.txt -t /tmp -o trace_report
+
+import argparse
+import csv
+import json
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+# <prefix>_<dataId>_<batch>_<dim1>_<dim2>_<channel>_<width>x<height>[_float].y/bin
+TRACE_NAME_PATTERN = re.compile(r'(\d+)_(\d+)_(\d+)_(\d+)_(\d+)_(\d+)x(\d+)(_float)?$')
+# tidl_trace<dataId>_<batch>_<channel>_<width>x<height>[_float].y/bin
+TRACE_NAME_PATTERN_SHORT = re.compile(r'(\d+)_(\d+)_(\d+)_(\d+)x(\d+)(_float)?$')
+
+FIXED_DTYPES = {'int8' : np.int8, 'uint8' : np.uint8, 'int16' : np.int16, 'uint16' : np.uint16, 'int32' : np.int32}
+# dtype of fixed point traces guessed from the file size, when not given explicitly
+FIXED_DTYPE_FROM_SIZE = {1 : np.int8, 2 : np.int16, 4 : np.int32}
+
+CHUNK_SIZE = 4*1024*1024
+
+REPORT_FIELDS = ['rank', 'dataId', 'layerName', 'numElements', 'snrDb', 'maxAbsDiff', 'meanAbsDiff', 'cosine', 'refMaxAbs', 'status', 'refFile', 'testFile']
+
+
+def parseTraceName(filename):
+   # returns (dataId, isFloat, shape) or None if the file is not a trace
+   name, ext = os.path.splitext(os.path.basename(filename))
+   if ext not in ('.y', '.bin'):
+      return None
+   match = TRACE_NAME_PATTERN.search(name)
+   if match is not None:
+      dataId, batch, dim1, dim2, channel, width, height = [int(v) for v in match.groups()[:7]]
+      return dataId, match.group(8) is not None, (batch, dim1, dim2, channel, height, width)
+   match = TRACE_NAME_PATTERN_SHORT.search(name)
+   if match is not None:
+      dataId, batch, channel, width, height = [int(v) for v in match.groups()[:5]]
+      return dataId, match.group(6) is not None, (batch, channel, height, width)
+   return None
+
+
+def indexTraceDir(traceDir, useFloat):
+   # dataId -> (filename, shape), traces of the other kind (fixed/float) are left out
+   index = {}
+   for filename in sorted(os.listdir(traceDir)):
+      parsed = parseTraceName(filename)
+      if parsed is None:
+         continue
+      dataId, isFloat, shape = parsed
+      if isFloat != useFloat:
+         continue
+      if dataId in index:
+         print(f"multiple traces for dataId {dataId}, using {index[dataId][0]} (stitch multi core traces first)")
+         continue
+      index[dataId] = (os.path.join(traceDir, filename), shape)
+   return index
+
+
+def readLayerInfo(layerInfoFile):
+   # *.layer_info.txt : layerId dataId name
+   dataIdToName = {}
+   with open(layerInfoFile, 'r') as file:
+      for line in file:
+         fields = line.split()
+         if len(fields) >= 3:
+            dataIdToName[int(fields[1])] = fields[2]
+   return dataIdToName
+
+
+def onnxDumpFileName(tensorName):
+   # tensor names can have characters that are not allowed in file names
+   return re.sub(r'[^A-Za-z0-9_.\-]', '_', tensorName) + '.npy'
+
+
+def indexOnnxDump(dumpDir, dataIdToName):
+   index = {}
+   for dataId, tensorName in dataIdToName.items():
+      filename = os.path.join(dumpDir, onnxDumpFileName(tensorName))
+      if os.path.exists(filename):
+         index[dataId] = (filename, None)
+   return index
+
+
+def openTensor(filename, shape, fixedDtype):
+   # memory mapped flat view of a trace or a .npy file
+   if filename.endswith('.npy'):
+      return np.load(filename, mmap_mode='r').reshape(-1)
+   numElements = int(np.prod(shape))
+   fileSize = os.path.getsize(filename)
+   if filename.endswith('_float.bin'):
+      dtype = np.dtype(np.float32)
+   elif fixedDtype is not None:
+      dtype = np.dtype(fixedDtype)
+   elif numElements > 0 and fileSize % numElements == 0 and (fileSize // numElements) in FIXED_DTYPE_FROM_SIZE:
+      dtype = np.dtype(FIXED_DTYPE_FROM_SIZE[fileSize // numElements])
+   else:
+      raise ValueError(f"can not find the data type of {filename} of size {fileSize} for {numElements} elements")
+   if fileSize != numElements * dtype.itemsize:
+      raise ValueError(f"size of {filename} ({fileSize}) does not match its dimensions {shape}")
+   if numElements == 0:
+      return np.empty((0,), dtype=dtype)
+   return np.memmap(filename, dtype=dtype, mode='r', shape=(numElements,))
+
+
+def compareLayer(job):
+   dataId, layerName, (refFile, refShape), (testFile, testShape), fixedDtype, chunkSize = job
+   result = {'dataId' : dataId, 'layerName' : layerName, 'refFile' : refFile, 'testFile' : testFile}
+   try:
+      ref = openTensor(refFile, refShape, fixedDtype)
+      test = openTensor(testFile, testShape, fixedDtype)
+   except (ValueError, OSError) as e:
+      result.update(status=f'error: {e}')
+      return result
+   result['numElements'] = int(ref.size)
+   if ref.size != test.size:
+      result.update(status=f'size mismatch: {ref.size} vs {test.size}')
+      return result
+
+   # all the sums are accumulated in float64 over the chunks
+   sumRef2 = sumTest2 = sumErr2 = sumDot = sumAbsErr = 0.0
+   maxAbsErr = refMaxAbs = 0.0
+   for start in range(0, ref.size, chunkSize):
+      refChunk = np.asarray(ref[start:start+chunkSize], dtype=np.float64)
+      testChunk = np.asarray(test[start:start+chunkSize], dtype=np.float64)
+      errChunk = testChunk - refChunk
+      absErrChunk = np.abs(errChunk)
+      sumRef2 += float(np.dot(refChunk, refChunk))
+      sumTest2 += float(np.dot(testChunk, testChunk))
+      sumErr2 += float(np.dot(errChunk, errChunk))
+      sumDot += float(np.dot(refChunk, testChunk))
+      sumAbsErr += float(absErrChunk.sum())
+      maxAbsErr = max(maxAbsErr, float(absErrChunk.max()))
+      refMaxAbs = max(refMaxAbs, float(np.abs(refChunk).max()))
+
+   if sumErr2 == 0.0:
+      snrDb = math.inf
+   elif sumRef2 == 0.0:
+      snrDb = -math.inf
+   else:
+      snrDb = 10.0 * math.log10(sumRef2 / sumErr2)
+   if sumRef2 > 0.0 and sumTest2 > 0.0:
+      cosine = sumDot / math.sqrt(sumRef2 * sumTest2)
+   else:
+      cosine = 1.0 if sumRef2 == sumTest2 else 0.0
+   result.update(snrDb=snrDb, maxAbsDiff=maxAbsErr, meanAbsDiff=(sumAbsErr / ref.size if ref.size else 0.0),
+                 cosine=cosine, refMaxAbs=refMaxAbs, status='ok')
+   return result
+
+
+def rankResults(results):
+   # layers that could not be compared first, then the lowest snr, then the largest absolute difference
+   def sortKey(result):
+      if result['status'] != 'ok':
+         return (0, 0.0, 0.0, result['dataId'])
+      return (1, result['snrDb'], -result['maxAbsDiff'], result['dataId'])
+   results = sorted(results, key=sortKey)
+   for rank, result in enumerate(results):
+      result['rank'] = rank + 1
+   return results
+
+
+def writeReport(results, outputPrefix, reportFormat):
+   filenames = []
+   if reportFormat in ('csv', 'both'):
+      filename = outputPrefix + '.csv'
+      with open(filename, 'w', newline='') as file:
+         writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+         writer.writeheader()
+         writer.writerows(results)
+      filenames.append(filename)
+   if reportFormat in ('json', 'both'):
+      filename = outputPrefix + '.json'
+      with open(filename, 'w') as file:
+         # inf is not valid json, written as a string
+         json.dump([{k : (str(v) if isinstance(v, float) and math.isinf(v) else v) for k, v in result.items()} for result in results], file, indent=1)
+      filenames.append(filename)
+   return filenames
+
+
+def main():
+   parser = argparse.ArgumentParser(description='layer level comparison of TIDL traces')
+   parser.add_argument('-r', '--refDir', required=True, help='reference trace directory, or ONNX Runtime intermediate dump with --layerInfo')
+   parser.add_argument('-t', '--testDir', default='/tmp', help='trace directory to compare')
+   parser.add_argument('-l', '--layerInfo', default='', help='layer_info.txt of the compiled model, reference is then an ONNX Runtime dump (<tensor name>.npy)')
+   parser.add_argument('--refKind', default='float', choices=['float', 'fixed'], help='reference traces to use : _float.bin or fixed point .y')
+   parser.add_argument('--testKind', default='float', choices=['float', 'fixed'], help='test traces to use : _float.bin or fixed point .y')
+   parser.add_argument('--fixedDtype', default='', choices=[''] + list(FIXED_DTYPES.keys()), help='data type of fixed point traces, guessed from the file size by default')
+   parser.add_argument('-o', '--output', default='trace_report', help='report file name without extension')
+   parser.add_argument('-f', '--format', default='both', choices=['csv', 'json', 'both'])
+   parser.add_argument('-j', '--numWorkers', default='0', help='number of processes used to compare the layers, 0 : number of cpus')
+   parser.add_argument('--chunkSize', default=str(CHUNK_SIZE), help='number of elements processed at a time')
+   parser.add_argument('--top', default='10', help='number of worst layers printed')
+   args = parser.parse_args()
+
+   if args.layerInfo != '':
+      dataIdToName = readLayerInfo(args.layerInfo)
+      refIndex = indexOnnxDump(args.refDir, dataIdToName)
+   else:
+      dataIdToName = {}
+      refIndex = indexTraceDir(args.refDir, args.refKind == 'float')
+   testIndex = indexTraceDir(args.testDir, args.testKind == 'float')
+
+   commonDataIds = sorted(set(refIndex.keys()) & set(testIndex.keys()))
+   print(f"layers : reference {len(refIndex)}, test {len(testIndex)}, compared {len(commonDataIds)}")
+   fixedDtype = FIXED_DTYPES[args.fixedDtype] if args.fixedDtype != '' else None
+   jobs = [(dataId, dataIdToName.get(dataId, ''), refIndex[dataId], testIndex[dataId], fixedDtype, int(args.chunkSize))
+           for dataId in commonDataIds]
+
+   numWorkers = int(args.numWorkers) if int(args.numWorkers) > 0 else os.cpu_count()
+   if numWorkers <= 1:
+      results = list(map(compareLayer, jobs))
+   else:
+      with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+         results = list(executor.map(compareLayer, jobs, chunksize=max(1, len(jobs) // (numWorkers * 4))))
+
+   results = rankResults(results)
+   for filename in writeReport(results, args.output, args.format):
+      print("report :", filename)
+   for result in results[:int(args.top)]:
+      if result['status'] == 'ok':
+         print(f"{result['rank']:4d} dataId {result['dataId']:4d} {result['layerName']} snr {result['snrDb']:.2f} dB, max abs diff {result['maxAbsDiff']:.6f}, cosine {result['cosine']:.6f}")
+      else:
+         print(f"{result['rank']:4d} dataId {result['dataId']:4d} {result['layerName']} {result['status']}")
+
+
+if __name__ == '__main__':
+   main()
@@ -59,6 +59,7 @@
 
 import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
 parser = argparse.ArgumentParser()
@@ -70,6 +71,7 @@ parser.add_argument('-m', '--mapping_file', default='')
 parser.add_argument('-n', '--numCores', default='4')
 parser.add_argument('-s', '--coreStartIdx', default='0')
 parser.add_argument('-c','--layerIdxToSkip', default= ['-1'],nargs='+')
+parser.add_argument('-j', '--numWorkers', default='0', help='number of processes used to stitch the layers, 0 : number of cpus')
 args = parser.parse_args()
 
 BATCH_IDX    = 0
@@ -82,6 +84,8 @@ FILENAME_IDX = 6
 FOUND_IDX    = 7
 IS_FLOAT_CHECK_IDX = 8
 
+MAX_NUM_LAYERS = 1024
+
 
 
 mapping_layer_to_dataId_golden = {};
@@ -101,48 +105,52 @@ def createMappingDictionary(filename, dictionaryLayerToDataId, dictionaryDataIdT
 
    return 
 
-def getFileNameFromDataId(dataId, coreId, numberofskipLayer):   
+# The trace directory is listed only once, the files of each core are indexed by dataId (in the listing order)
+# traceIndex[coreId]['files'][dataId] : list of (filename, splitString, baseIdx, isFloat)
+# traceIndex[coreId]['lastIsFloat']  : isFloat of the last file of that core in the listing
+def createTraceIndex(traceDir, numCores, coreStartIdx):
+   traceIndex = {coreId : {'files' : {}, 'lastIsFloat' : 0} for coreId in range(0, numCores)}
+   coreNumToId = {(coreId + coreStartIdx + 1) : coreId for coreId in range(0, numCores)}
+   for filename in os.listdir(traceDir):
+      tempFileName = os.path.splitext(filename)[0]
+      splitString = tempFileName.split("_")
+      if(splitString[0] != "C7x" or int(splitString[1]) not in coreNumToId):
+         continue
+      coreIndex = traceIndex[coreNumToId[int(splitString[1])]]
+      isFloat = 0
+      if("float" in splitString[-1]):
+         baseIdx = -1
+         isFloat = 1
+      else:
+         baseIdx = 0
+      dataIdInt  = int(splitString[baseIdx-6])
+      coreIndex['lastIsFloat'] = isFloat
+      coreIndex['files'].setdefault(dataIdInt, []).append((filename, splitString, baseIdx, isFloat))
+   return traceIndex
+
+def getFileNameFromDataId(traceIndex, dataId, coreId, numberofskipLayer):
    file_path = os.path.join(args.traceDir)
-   found = 0
-   batch = 0
-   dim1 = 0
-   dim2 = 0
-   channel = 0
-   width = 0
-   height = 0
-   filename = 0
-   isFloat = 0
-   for filename in os.listdir(file_path):      
-      if (1):         
-         tempFileName = os.path.splitext(filename)[0]         
-         splitString = tempFileName.split("_")  
-         if(splitString[0] == "C7x" and int(splitString[1]) == (coreId + int(args.coreStartIdx) + 1)):
-            isFloat = 0
-            if("float" in splitString[-1]):
-               baseIdx = -1
-               isFloat = 1
-            else:
-               baseIdx = 0
-            dataIdInt  = int(splitString[baseIdx-6])
-            dataIdStr = str(dataIdInt)
-
-
-            if ( dataIdInt == dataId ):
-               if(dataIdStr in args.layerIdxToSkip):
-                  if(coreId == int(args.coreStartIdx)):
-                     print("skipped layer", dataIdStr)
-                     numberofskipLayer[0] = numberofskipLayer[0] + 1
-               else:
-                  batch   = int(splitString[baseIdx-5])
-                  dim1    = int(splitString[baseIdx-4])
-                  dim2    = int(splitString[baseIdx-3])
-                  channel = int(splitString[baseIdx-2])
-                  width   = int(splitString[baseIdx-1].split("x")[0])
-                  height  = int(splitString[baseIdx-1].split("x")[1])
-                  found   = 1
-                  filename = os.path.join(file_path,filename)
-                  break
-   return [batch, dim1, dim2, channel, width, height, filename, found, isFloat ]
+   coreIndex = traceIndex[coreId]
+   candidates = coreIndex['files'].get(dataId, [])
+   if(str(dataId) in args.layerIdxToSkip):
+      # every trace of a skipped layer is counted (only for the first core)
+      if(coreId == int(args.coreStartIdx)):
+         for candidate in candidates:
+            print("skipped layer", str(dataId))
+            numberofskipLayer[0] = numberofskipLayer[0] + 1
+      return [0, 0, 0, 0, 0, 0, 0, 0, coreIndex['lastIsFloat']]
+   if(len(candidates) == 0):
+      return [0, 0, 0, 0, 0, 0, 0, 0, coreIndex['lastIsFloat']]
+
+   filename, splitString, baseIdx, isFloat = candidates[0]
+   batch   = int(splitString[baseIdx-5])
+   dim1    = int(splitString[baseIdx-4])
+   dim2    = int(splitString[baseIdx-3])
+   channel = int(splitString[baseIdx-2])
+   width   = int(splitString[baseIdx-1].split("x")[0])
+   height  = int(splitString[baseIdx-1].split("x")[1])
+   filename = os.path.join(file_path,filename)
+   return [batch, dim1, dim2, channel, width, height, filename, 1, isFloat ]
 
 def isDataIdFoundForAllCores(coreList, numCoresForLayer):
    found = 1
@@ -185,63 +193,90 @@ def getStitchedDimensionsNew(coreList, dataId, numCoresForLayer, dataIdGolden):
    filename = filename.replace(args.traceDir, stitch_dir)
 
    return coreList[0][BATCH_IDX], coreList[0][DIM1_IDX], coreList[0][DIM2_IDX], coreList[0][CHANNEL_IDX], coreList[0][WIDTH_IDX], height, filename
+# reads the trace of each core (memory mapped) into one preallocated output, stitched along the height
+def stitchLayer(job):
+   filename, dtype, coreFiles = job
+   if(len(coreFiles) == 1):
+      inFilename, shape = coreFiles[0]
+      count = os.path.getsize(inFilename) // np.dtype(dtype).itemsize
+      data = np.memmap(inFilename, dtype=dtype, mode='r', shape=(count,)) if count > 0 else np.empty((0,), dtype=dtype)
+      data.tofile(filename)
+      return filename
+
+   batch, dim1, dim2, channel, _, width = coreFiles[0][1]
+   height = sum(shape[4] for _, shape in coreFiles)
+   finalData = np.empty((batch, dim1, dim2, channel, height, width), dtype=dtype)
+   heightOffset = 0
+   for inFilename, shape in coreFiles:
+      count = int(np.prod(shape))
+      if(os.path.getsize(inFilename) != count * np.dtype(dtype).itemsize):
+         raise ValueError(f"size of {inFilename} does not match its dimensions {shape}")
+      if(count > 0):
+         finalData[:, :, :, :, heightOffset:heightOffset+shape[4], :] = np.memmap(inFilename, dtype=dtype, mode='r', shape=shape)
+      heightOffset += shape[4]
+   finalData.tofile(filename)
+   return filename
+
 ##################################################################
 
-if(args.mapping_golden_file != '' and args.mapping_file != ''):
-   createMappingDictionary(args.mapping_golden_file, mapping_layer_to_dataId_golden, mapping_dataId_to_layer_golden);
-   createMappingDictionary(args.mapping_file, mapping_layer_to_dataId, mapping_dataId_to_layer);
-   print(mapping_layer_to_dataId_golden)
+if __name__ == '__main__':
+   if(args.mapping_golden_file != '' and args.mapping_file != ''):
+      createMappingDictionary(args.mapping_golden_file, mapping_layer_to_dataId_golden, mapping_dataId_to_layer_golden);
+      createMappingDictionary(args.mapping_file, mapping_layer_to_dataId, mapping_dataId_to_layer);
+      print(mapping_layer_to_dataId_golden)
 
-numberofskipLayer = [0]
-alreadySkipped = []
+   numberofskipLayer = [0]
+   alreadySkipped = []
 
-#create directoty for Stiched Traces
-stitch_dir = os.path.join(args.traceDir, 'stitch_traces')
-if(not(os.path.isdir(stitch_dir))) : 
-   os.mkdir(stitch_dir)
+   #create directoty for Stiched Traces
+   stitch_dir = os.path.join(args.traceDir, 'stitch_traces')
+   if(not(os.path.isdir(stitch_dir))) : 
+      os.mkdir(stitch_dir)
 
-for layer in range (0,1024):
-   coreList= []
-   numCoresForLayer=0
-   for coreIdx in range (0, int(args.numCores)):
-      output = getFileNameFromDataId(layer, coreIdx, numberofskipLayer)
-      if(output[FOUND_IDX] == 1):
-         numCoresForLayer = numCoresForLayer + 1
-         coreList.append(output)
+   traceIndex = createTraceIndex(args.traceDir, int(args.numCores), int(args.coreStartIdx))
 
-      if(args.mapping_golden_file != '' and args.mapping_file != ''):
-         if (numCoresForLayer > 0 and isDataIdFoundForAllCores(coreList, numCoresForLayer) == 1):
-            layerNameGolden = mapping_dataId_to_layer[layer]
-            if mapping_layer_to_dataId_golden.get(layerNameGolden) is not None:      
-               dataIdGolden = mapping_layer_to_dataId_golden[layerNameGolden]
-            else:
-               continue;
+   # output filename -> job, a layer stitched to the same name as an earlier one replaces it (as it would overwrite it)
+   stitchJobs = {}
+   for layer in range (0,MAX_NUM_LAYERS):
+      coreList= []
+      numCoresForLayer=0
+      for coreIdx in range (0, int(args.numCores)):
+         output = getFileNameFromDataId(traceIndex, layer, coreIdx, numberofskipLayer)
+         if(output[FOUND_IDX] == 1):
+            numCoresForLayer = numCoresForLayer + 1
+            coreList.append(output)
+
+      if(numCoresForLayer == 0 or isDataIdFoundForAllCores(coreList, numCoresForLayer) == 0):
+         continue
 
+      if(args.mapping_golden_file != '' and args.mapping_file != ''):
+         layerNameGolden = mapping_dataId_to_layer[layer]
+         if mapping_layer_to_dataId_golden.get(layerNameGolden) is None:
+            print("no golden layer for", layerNameGolden, "skipped layer", layer)
+            continue
+         dataIdGolden = mapping_layer_to_dataId_golden[layerNameGolden]
          batch, dim1, dim2, channel, width, height, filename  = getStitchedDimensionsNew(coreList, layer, numCoresForLayer, dataIdGolden)
-      elif (numCoresForLayer > 0 and isDataIdFoundForAllCores(coreList, numCoresForLayer) == 1):
+      else:
          batch, dim1, dim2, channel, width, height, filename  = getStitchedDimensions(coreList, layer - numberofskipLayer[0], numCoresForLayer)
 
-   coreDataList = []
-   for coreIdx in range (0, numCoresForLayer):   
+      # the data type is decided by the trace of the last core
       if(output[IS_FLOAT_CHECK_IDX] == 1):
-         print(coreList[coreIdx][FILENAME_IDX], "Dumping float data")
-         data = np.fromfile(coreList[coreIdx][FILENAME_IDX], dtype=np.float32)
+         for coreIdx in range (0, numCoresForLayer):
+            print(coreList[coreIdx][FILENAME_IDX], "Dumping float data")
+         dtype = np.float32
       else:
-         data = np.fromfile(coreList[coreIdx][FILENAME_IDX], dtype=np.int8)
-      if(numCoresForLayer > 1):
+         dtype = np.int8
+
+      coreFiles = [(core[FILENAME_IDX], (core[BATCH_IDX], core[DIM1_IDX], core[DIM2_IDX], core[CHANNEL_IDX], core[HEIGHT_IDX], core[WIDTH_IDX]))
+                   for core in coreList]
+      stitchJobs.pop(filename, None)
+      stitchJobs[filename] = (filename, dtype, coreFiles)
+
+   numWorkers = int(args.numWorkers) if int(args.numWorkers) > 0 else os.cpu_count()
+   if(numWorkers <= 1):
+      for filename in map(stitchLayer, stitchJobs.values()):
          print(filename)
-         data = data.reshape( coreList[coreIdx][BATCH_IDX],
-                              coreList[coreIdx][DIM1_IDX],
-                              coreList[coreIdx][DIM2_IDX],
-                              coreList[coreIdx][CHANNEL_IDX],
-                              coreList[coreIdx][HEIGHT_IDX],
-                              coreList[coreIdx][WIDTH_IDX] )
-      coreDataList.append(data)
-   
-      finalData = coreDataList[0]
-   if(numCoresForLayer > 1):
-      for coreIdx in range (0, numCoresForLayer - 1):
-         finalData = np.concatenate( (finalData, coreDataList[coreIdx + 1]) , axis=4 )
-   if(numCoresForLayer > 0):
-      print(filename)
-      finalData.tofile(filename)
+   else:
+      with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+         for filename in executor.map(stitchLayer, stitchJobs.values()):
+            print(filename)